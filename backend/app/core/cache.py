@@ -0,0 +1,66 @@
+# app/core/cache.py
+"""
+Cache TTL em memória (por processo), compartilhado entre routers.
+
+Mesma ideia do `_CACHE_TTL` de routers/gestao.py, mas reutilizável:
+- cada uso cria seu próprio `TTLCache` (namespace isolado)
+- limite de entradas (descarta as mais antigas) para não crescer sem fim
+- thread-safe (handlers sync rodam no threadpool)
+
+Obs: é cache "leve" — cada worker uvicorn tem o seu. Não substitui Redis.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    def __init__(self, ttl_s: float, max_itens: int = 512) -> None:
+        self.ttl_s = float(ttl_s)
+        self.max_itens = int(max_itens)
+        self._dados: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, ttl_s: Optional[float] = None) -> Any:
+        """Retorna o valor (ou None se ausente/expirado)."""
+        ttl = self.ttl_s if ttl_s is None else float(ttl_s)
+        with self._lock:
+            item = self._dados.get(key)
+            if item is None:
+                return None
+            ts, val = item
+            if (time.monotonic() - ts) > ttl:
+                self._dados.pop(key, None)
+                return None
+            self._dados.move_to_end(key)
+            return val
+
+    def set(self, key: Hashable, val: Any) -> None:
+        with self._lock:
+            self._dados[key] = (time.monotonic(), val)
+            self._dados.move_to_end(key)
+            while len(self._dados) > self.max_itens:
+                self._dados.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._dados.pop(key, None)
+
+    def pop_where(self, pred: Callable[[Hashable], bool]) -> int:
+        """Remove as chaves para as quais `pred(chave)` é verdadeiro; devolve quantas."""
+        with self._lock:
+            chaves = [k for k in self._dados if pred(k)]
+            for k in chaves:
+                self._dados.pop(k, None)
+            return len(chaves)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._dados.clear()
+
+    def __len__(self) -> int:
+        return len(self._dados)
@@ -0,0 +1,237 @@
+# app/core/concorrencia.py
+"""
+Perfil de concorrência do processo: threadpool, vagas de trabalho lento e
+tempo de fila.
+
+Quase toda rota é `def` com Session síncrona: cada request ocupa uma ficha do
+threadpool padrão do AnyIO (40 por processo, se ninguém configurar). Um
+relatório de 20 s segura a ficha o tempo todo; com relatórios/PDFs suficientes
+ao mesmo tempo, um GET barato espera na fila sem nada a ver com eles. Aqui:
+
+- o tamanho do pool é explícito (POPRUA_THREADPOOL, aplicado no startup)
+- vagas nomeadas limitam quantos trabalhos lentos rodam ao mesmo tempo:
+      @router.post("/gerar", dependencies=[Depends(concorrencia.vaga("pdf"))])
+  a espera pela vaga é assíncrona (no event loop, sem segurar thread) e dura
+  até POPRUA_VAGA_ESPERA_S; depois disso 503 com Retry-After. A vaga só é
+  devolvida depois da resposta enviada (streaming incluído). Com a soma das
+  vagas abaixo do pool, sempre sobra thread para o resto
+- a IA (app/services/ai_gateway.py) usa a vaga "ia" como seu semáforo
+- tempo de fila: do início do request até a 1ª execução numa thread
+  (`marcar_thread`, chamado no get_session) vai para perf.Medicao (header
+  Server-Timing `fila`, média/máx por rota) e para a amostra global daqui;
+  no 1º request de um router ainda não carregado inclui o import dele
+  (app/core/rotas.py). A espera por vaga também é medida. Tudo em
+  GET /admin/perf -> concorrencia
+
+Config (env):
+  POPRUA_THREADPOOL=60          fichas do threadpool padrão (0 = não mexe)
+  POPRUA_VAGAS_RELATORIO=4      relatórios/CSV pesados simultâneos
+  POPRUA_VAGAS_PDF=3            geração de PDF (documento, lotes)
+  POPRUA_VAGAS_IA=4             chamadas ao provedor de IA (padrão: POPRUA_AI_MAX_CONCORRENCIA)
+  POPRUA_VAGAS_EXPORTACAO=2     exportação analítica (/exportacao)
+  POPRUA_VAGA_ESPERA_S=30       espera máxima por vaga (0 = sem limite)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+import weakref
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Deque, Dict
+
+from fastapi import HTTPException, status
+
+from app.core import perf
+
+_AMOSTRAS = 2000
+
+
+def _env_int(nome: str, default: int) -> int:
+    try:
+        return int(str(os.getenv(nome, "")).strip() or default)
+    except Exception:
+        return default
+
+
+class _Amostras:
+    """Últimas N medições (ms) para p50/p95/máx, thread-safe."""
+
+    def __init__(self, n: int = _AMOSTRAS) -> None:
+        self._v: Deque[float] = deque(maxlen=n)
+        self._lock = threading.Lock()
+        self.total = 0
+
+    def add(self, ms: float) -> None:
+        with self._lock:
+            self._v.append(ms)
+            self.total += 1
+
+    def resumo(self) -> Dict[str, Any]:
+        with self._lock:
+            v = sorted(self._v)
+            total = self.total
+        if not v:
+            return {"n": total, "p50_ms": None, "p95_ms": None, "max_ms": None}
+        return {
+            "n": total,
+            "p50_ms": round(v[len(v) // 2], 1),
+            "p95_ms": round(v[min(len(v) - 1, int(len(v) * 0.95))], 1),
+            "max_ms": round(v[-1], 1),
+        }
+
+    def limpar(self) -> None:
+        with self._lock:
+            self._v.clear()
+            self.total = 0
+
+
+# ============================
+# Threadpool
+# ============================
+fila_threadpool = _Amostras()
+_limitador: Any = None
+
+
+def configurar_threadpool() -> int:
+    """Fixa as fichas do threadpool padrão (chamar no startup, na thread do loop)."""
+    global _limitador
+    import anyio.to_thread
+
+    lim = anyio.to_thread.current_default_thread_limiter()
+    n = _env_int("POPRUA_THREADPOOL", 60)
+    if n > 0:
+        lim.total_tokens = n
+    _limitador = lim
+    return int(lim.total_tokens)
+
+
+def marcar_thread() -> None:
+    """1ª execução do request numa thread do pool: registra quanto esperou na fila."""
+    m = perf.medicao_atual()
+    if m is None or m.t_thread is not None:
+        return
+    m.t_thread = time.perf_counter()
+    fila_threadpool.add((m.t_thread - m.t0) * 1000.0)
+
+
+# ============================
+# Vagas nomeadas
+# ============================
+class VagaEsgotada(HTTPException):
+    def __init__(self, nome: str, retry_s: int) -> None:
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Muitas tarefas do tipo '{nome}' em andamento. Tente novamente em instantes.",
+            headers={"Retry-After": str(max(1, int(retry_s)))},
+        )
+
+
+class Vaga:
+    """Semáforo nomeado (um asyncio.Semaphore por event loop, como o gateway de IA)."""
+
+    def __init__(self, nome: str, limite: int, espera_s: float) -> None:
+        self.nome = nome
+        self.limite = max(1, int(limite))
+        self.espera_s = float(espera_s)
+        self._semaforos: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self.em_uso = 0
+        self.esperando = 0
+        self.recusadas = 0
+        self.esperas = _Amostras()
+
+    def _semaforo(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        sem = self._semaforos.get(loop)
+        if sem is None:
+            sem = asyncio.Semaphore(self.limite)
+            self._semaforos[loop] = sem
+        return sem
+
+    def _somar(self, campo: str, n: int) -> None:
+        with self._lock:
+            setattr(self, campo, getattr(self, campo) + n)
+
+    @asynccontextmanager
+    async def ocupar(self) -> AsyncIterator[None]:
+        sem = self._semaforo()
+        t0 = time.perf_counter()
+        self._somar("esperando", 1)
+        try:
+            if self.espera_s > 0:
+                await asyncio.wait_for(sem.acquire(), timeout=self.espera_s)
+            else:
+                await sem.acquire()
+        except asyncio.TimeoutError:
+            self._somar("recusadas", 1)
+            raise VagaEsgotada(self.nome, self.espera_s)
+        finally:
+            self._somar("esperando", -1)
+        self.esperas.add((time.perf_counter() - t0) * 1000.0)
+        self._somar("em_uso", 1)
+        try:
+            yield
+        finally:
+            self._somar("em_uso", -1)
+            sem.release()
+
+    async def dependencia(self) -> AsyncIterator[None]:
+        async with self.ocupar():
+            yield
+
+    def resumo(self) -> Dict[str, Any]:
+        return {
+            "limite": self.limite,
+            "em_uso": self.em_uso,
+            "esperando": self.esperando,
+            "recusadas": self.recusadas,
+            "espera": self.esperas.resumo(),
+        }
+
+
+def _limite_ia() -> int:
+    return _env_int("POPRUA_VAGAS_IA", _env_int("POPRUA_AI_MAX_CONCORRENCIA", 4))
+
+
+_ESPERA_S = float(_env_int("POPRUA_VAGA_ESPERA_S", 30))
+
+VAGAS: Dict[str, Vaga] = {
+    "relatorio": Vaga("relatorio", _env_int("POPRUA_VAGAS_RELATORIO", 4), _ESPERA_S),
+    "pdf": Vaga("pdf", _env_int("POPRUA_VAGAS_PDF", 3), _ESPERA_S),
+    "ia": Vaga("ia", _limite_ia(), _ESPERA_S),
+    "exportacao": Vaga("exportacao", _env_int("POPRUA_VAGAS_EXPORTACAO", 2), _ESPERA_S),
+}
+
+
+def vaga(nome: str) -> Callable[[], AsyncIterator[None]]:
+    """Dependência FastAPI que segura a vaga `nome` durante o request."""
+    return VAGAS[nome].dependencia
+
+
+# ============================
+# Resumo (/admin/perf)
+# ============================
+def resumo() -> Dict[str, Any]:
+    pool: Dict[str, Any] = {"configurado": _limitador is not None}
+    if _limitador is not None:
+        est = _limitador.statistics()
+        pool.update(
+            fichas=int(_limitador.total_tokens),
+            em_uso=int(est.borrowed_tokens),
+            esperando=int(est.tasks_waiting),
+        )
+    pool["fila"] = fila_threadpool.resumo()
+    return {
+        "threadpool": pool,
+        "vagas": {nome: v.resumo() for nome, v in VAGAS.items()},
+    }
+
+
+def limpar() -> None:
+    fila_threadpool.limpar()
+    for v in VAGAS.values():
+        v.esperas.limpar()
@@ -1,7 +1,10 @@
 # app/core/db.py
 import os
+import hashlib
 import importlib
-from typing import Generator
+import time
+from pathlib import Path
+from typing import Generator, List, Optional
 
 from sqlmodel import SQLModel, Session, create_engine
 
@@ -42,7 +45,8 @@ def _importar_models() -> None:
         "app.models.pessoarua",       # se existir no seu projeto
 
         "app.models.atendimento",
-        "app.models.acolhimentos",
+        "app.models.acolhimento",
+        "app.models.familia_beneficio",
         "app.models.saude",
         "app.models.saude_intersetorial",
 
@@ -64,6 +68,9 @@ def _importar_models() -> None:
 "app.models.cras_paif",
         "app.models.cras_unidade",
         "app.models.cras_triagem",
+        "app.models.cras_tarefas",
+        "app.models.cras_automacoes",
+        "app.models.rede_metrica",
 
         # ✅ CRAS (Cadastros SUAS + Casos + Programas)
         "app.models.pessoa_suas",
@@ -75,6 +82,7 @@ def _importar_models() -> None:
     
         # ✅ CRAS CadÚnico
         "app.models.cadunico_precadastro",
+        "app.models.cadastro_importacao",
 
         # ✅ CRAS PIA/PAIF (caso)
         "app.models.cras_pia",
@@ -103,9 +111,23 @@ def _importar_models() -> None:
         "app.models.municipio_branding",
         "app.models.documento_template",
         "app.models.documento_emitido",
+        "app.models.documento_verificacao",
         "app.models.documento_config",
         "app.models.documento_sequencia",        "app.models.suas_encaminhamento",
 
+        # ✅ Exportação analítica (marca d'água da carga incremental)
+        "app.models.exportacao_marca",
+
+        # ✅ Versões por recurso (ETag / GET condicional)
+        "app.models.recurso_versao",
+
+        # ✅ Arquivo (arq_*: casos encerrados e eventos antigos; depois das tabelas de origem)
+        "app.models.arquivo",
+
+        # ✅ Automações (agenda/lease do agendador em background)
+        "app.models.automacao_agenda",
+        "app.models.gestao_automacoes",
+
 ]
 
     for m in modules:
@@ -115,10 +137,154 @@ def _importar_models() -> None:
             # ok: não existe no seu projeto
             continue
 
+    global _models_importados
+    _models_importados = True
+
+
+_models_importados = False
+
+
+def _models_antes_do_flush(session, flush_context, instances) -> None:
+    # O flush ordena as tabelas pelas FKs, e toda tabela referenciada precisa
+    # estar no metadata. Com o boot rápido (esquema inalterado) os models só
+    # são importados aqui, no primeiro flush do processo.
+    if not _models_importados:
+        _importar_models()
+
+
+# ============================
+# IMPRESSÃO DIGITAL DO ESQUEMA
+# ============================
+# Cada worker (uvicorn, agendador, scripts) chamava init_db no boot: importava
+# todos os models, create_all, ensure_indexes e PRAGMA table_info por tabela.
+# Agora o hash dos arquivos que definem o esquema fica gravado no próprio banco;
+# se bater, o boot pula toda a verificação. Qualquer mudança em app/models,
+# app/migrations, db.py, db_indexes.py ou migracoes.py muda o hash e a
+# verificação roda de novo (uma vez).
+# Forçar sempre: export POPRUA_SCHEMA_VERIFICAR=1
+# Tempos de cada etapa no log do boot: export POPRUA_STARTUP_PERFIL=1
+_TABELA_IMPRESSAO = "schema_impressao"
+_CHAVE_IMPRESSAO = "esquema"
+
+
+def _env_on(nome: str, default: str = "") -> bool:
+    return str(os.getenv(nome, default)).strip().lower() in ("1", "true", "yes", "on")
+
+
+def _arquivos_esquema() -> List[Path]:
+    app_dir = Path(__file__).resolve().parent.parent
+    arquivos = sorted((app_dir / "models").glob("*.py")) + sorted((app_dir / "migrations").glob("*.py"))
+    arquivos += [app_dir / "core" / "db.py", app_dir / "core" / "db_indexes.py", app_dir / "core" / "migracoes.py"]
+    return arquivos
+
+
+def _impressao_schema() -> str:
+    h = hashlib.sha256(DATABASE_URL.split(":", 1)[0].encode("utf-8"))
+    app_dir = Path(__file__).resolve().parent.parent
+    for arq in _arquivos_esquema():
+        try:
+            dados = arq.read_bytes()
+        except OSError:
+            continue
+        h.update(str(arq.relative_to(app_dir)).encode("utf-8"))
+        h.update(b"\0")
+        h.update(dados)
+    return h.hexdigest()
+
+
+def _impressao_gravada() -> Optional[str]:
+    from sqlalchemy import text
+
+    try:
+        with engine.connect() as conn:
+            row = conn.execute(
+                text(f"SELECT valor FROM {_TABELA_IMPRESSAO} WHERE chave = :c"),
+                {"c": _CHAVE_IMPRESSAO},
+            ).first()
+    except Exception:
+        # banco novo (tabela ainda não existe)
+        return None
+    return str(row[0]) if row else None
+
+
+def _gravar_impressao(valor: str) -> None:
+    from datetime import datetime
+
+    from sqlalchemy import text
+
+    agora = datetime.utcnow().isoformat(timespec="seconds")
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                f"CREATE TABLE IF NOT EXISTS {_TABELA_IMPRESSAO} "
+                "(chave VARCHAR(64) PRIMARY KEY, valor VARCHAR(128) NOT NULL, atualizado_em VARCHAR(32))"
+            )
+        )
+        n = conn.execute(
+            text(f"UPDATE {_TABELA_IMPRESSAO} SET valor = :v, atualizado_em = :t WHERE chave = :c"),
+            {"v": valor, "t": agora, "c": _CHAVE_IMPRESSAO},
+        ).rowcount
+        if not n:
+            conn.execute(
+                text(f"INSERT INTO {_TABELA_IMPRESSAO} (chave, valor, atualizado_em) VALUES (:c, :v, :t)"),
+                {"v": valor, "t": agora, "c": _CHAVE_IMPRESSAO},
+            )
+
+
+def init_db(forcar: bool = False, backfill_auto: Optional[bool] = None) -> None:
+    """Cria/atualiza o esquema. Backfills pendentes vão para uma thread em
+    background (POPRUA_BACKFILL_AUTO=0 desliga; rode `python -m app.core.migracoes`)."""
+    from app.core import migracoes, projecoes
+
+    # eventos de domínio -> read models (app/core/projecoes.py), nos dois caminhos
+    projecoes.instalar()
+
+    if backfill_auto is None:
+        backfill_auto = _env_on("POPRUA_BACKFILL_AUTO", "1")
+
+    t0 = time.perf_counter()
+    impressao = _impressao_schema()
+    if not forcar and not _env_on("POPRUA_SCHEMA_VERIFICAR") and _impressao_gravada() == impressao:
+        from sqlalchemy import event
+        from sqlalchemy.orm import Session as OrmSession
+
+        if not event.contains(OrmSession, "before_flush", _models_antes_do_flush):
+            event.listen(OrmSession, "before_flush", _models_antes_do_flush)
+        if backfill_auto:
+            migracoes.backfills_em_background(engine)
+        if _env_on("POPRUA_STARTUP_PERFIL"):
+            print(f"INFO: init_db: esquema inalterado ({impressao[:12]}), verificação pulada em {(time.perf_counter() - t0) * 1000:.1f}ms")
+        return
+
+    etapas: List[str] = []
+    marca = time.perf_counter()
+
+    def _etapa(nome: str) -> None:
+        nonlocal marca
+        agora = time.perf_counter()
+        etapas.append(f"{nome}={(agora - marca) * 1000:.0f}ms")
+        marca = agora
 
-def init_db() -> None:
     _importar_models()
+    _etapa("models")
     SQLModel.metadata.create_all(engine)
+    _etapa("create_all")
+
+    # Colunas novas em tabelas existentes: migrações versionadas (schema_version),
+    # aplicadas uma vez; antes dos índices, que podem usar as colunas novas.
+    migracoes.migrar(engine, log=lambda s: print(f"INFO: {s}"))
+    _etapa("migracoes")
+
+    # Arquivo (arq_*) acompanha colunas novas das tabelas quentes
+    try:
+        from app.services.arquivo import sincronizar_colunas
+
+        with engine.begin() as conn:
+            for c in sincronizar_colunas(conn):
+                print(f"INFO: arquivo: coluna {c} adicionada")
+    except Exception as e:
+        print("WARN: init_db: sincronização do arquivo falhou:", e)
+    _etapa("arquivo")
 
     # PERF: cria índices idempotentes (principalmente SQLite em DEV)
     try:
@@ -126,89 +292,22 @@ def init_db() -> None:
         ensure_indexes(engine, DATABASE_URL)
     except Exception:
         pass
+    _etapa("indices")
 
-    # SQLite não altera esquema automaticamente em create_all.
-    # Então garantimos colunas novas (B1/B2) com ALTER TABLE quando necessário.
-    if DATABASE_URL.startswith("sqlite"):
-        _ensure_sqlite_columns()
-
-
-def _ensure_sqlite_columns() -> None:
-    """Adiciona colunas novas em tabelas existentes (SQLite) de forma idempotente."""
-    from sqlalchemy import text
-
-    # tabela de pessoas
-    pessoa_cols = {
-        # complementos
-        "estado_civil": "TEXT",
-        "apelido": "TEXT",
-        "telefone": "TEXT",
-        "whatsapp": "TEXT",
-        "contato_referencia_nome": "TEXT",
-        "contato_referencia_telefone": "TEXT",
-        "permanencia_rua": "TEXT",
-        "pontos_circulacao": "TEXT",
-        "horario_mais_encontrado": "TEXT",
-        "motivo_rua": "TEXT",
-        "escolaridade": "TEXT",
-        "ocupacao": "TEXT",
-        "interesses_reinsercao": "TEXT",
-        "cadunico_status": "TEXT",
-        "documentos_pendentes": "TEXT",
-        "fonte_renda": "TEXT",
-        "violencia_risco": "TEXT",
-        "ameaca_territorio": "TEXT",
-        "gestante_status": "TEXT",
-        "protecao_imediata": "TEXT",
-        "interesse_acolhimento": "TEXT",
-        "moradia_recente": "TEXT",
-        "tentativas_saida_rua": "TEXT",
-        "dependencia_quimica": "TEXT",
-    }
-
-    def _cols(conn, table: str) -> set:
-        existing = set()
-        res = conn.execute(text(f"PRAGMA table_info('{table}')"))
-        for row in res.fetchall():
-            existing.add(row[1])
-        return existing
-
-    with engine.begin() as conn:
-        # ---- pessoarua (complementos) ----
-        try:
-            existing = _cols(conn, "pessoarua")
-        except Exception:
-            existing = set()
-
-        for col, ddl_type in pessoa_cols.items():
-            if col in existing:
-                continue
-            try:
-                conn.execute(text(f"ALTER TABLE pessoarua ADD COLUMN {col} {ddl_type}"))
-            except Exception:
-                pass
-
-        # ---- paif_acompanhamento (ponte SUAS + caso) ----
-        try:
-            existing = _cols(conn, "paif_acompanhamento")
-            if "pessoa_suas_id" not in existing:
-                conn.execute(text("ALTER TABLE paif_acompanhamento ADD COLUMN pessoa_suas_id INTEGER"))
-            if "caso_id" not in existing:
-                conn.execute(text("ALTER TABLE paif_acompanhamento ADD COLUMN caso_id INTEGER"))
-        except Exception:
-            pass
-
-        # ---- cras_triagem (ponte SUAS + caso) ----
-        try:
-            existing = _cols(conn, "cras_triagem")
-            if "pessoa_suas_id" not in existing:
-                conn.execute(text("ALTER TABLE cras_triagem ADD COLUMN pessoa_suas_id INTEGER"))
-            if "caso_id" not in existing:
-                conn.execute(text("ALTER TABLE cras_triagem ADD COLUMN caso_id INTEGER"))
-        except Exception:
-            pass
+    try:
+        _gravar_impressao(impressao)
+    except Exception as e:
+        print("WARN: init_db: não foi possível gravar a impressão do esquema:", e)
+    if backfill_auto:
+        migracoes.backfills_em_background(engine)
+    if _env_on("POPRUA_STARTUP_PERFIL"):
+        print(f"INFO: init_db: esquema verificado ({impressao[:12]}) {' '.join(etapas)}")
 
 
 def get_session() -> Generator[Session, None, None]:
+    # 1ª dependência síncrona do request: mede a espera por thread do pool
+    from app.core.concorrencia import marcar_thread
+
+    marcar_thread()
     with Session(engine) as session:
         yield session
@@ -0,0 +1,165 @@
+# app/core/db_async.py
+"""
+Leitura assíncrona para rotas de alto fan-out (chamadas por toda tela, várias
+ao mesmo tempo), sem ocupar ficha do threadpool padrão.
+
+    @router.get("/")
+    async def listar(leitura: LeituraAssincrona = Depends(get_leitura)):
+        return await leitura.todos(select(Municipio).order_by(Municipio.nome))
+
+Dois modos, mesma interface (`todos`, `primeiro`, `obter`):
+
+- nativo: AsyncSession num engine assíncrono (sqlite+aiosqlite ou
+  postgresql+asyncpg), quando o driver está instalado; a URL sai de
+  POPRUA_DATABASE_URL
+- threads: sem driver assíncrono, Session síncrona num CapacityLimiter
+  próprio (POPRUA_DB_ASYNC_THREADS), separado do pool das rotas `def` — o
+  fan-out espera no limitador dele, não na fila das outras rotas
+
+Só leitura: nada aqui faz commit.
+
+Config (env):
+  POPRUA_DB_ASYNC=auto          auto | 0 (força o modo threads)
+  POPRUA_DB_ASYNC_URL=          URL assíncrona explícita (ex.: postgresql+asyncpg://...)
+  POPRUA_DB_ASYNC_THREADS=8     threads do modo sem driver
+"""
+
+from __future__ import annotations
+
+import importlib
+import os
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from sqlmodel import Session
+
+from app.core.db import DATABASE_URL, engine
+
+try:  # pragma: no cover
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlmodel.ext.asyncio.session import AsyncSession
+except Exception:  # pragma: no cover
+    create_async_engine = None  # type: ignore
+    AsyncSession = None  # type: ignore
+
+# esquema síncrono -> (esquema assíncrono, módulo do driver)
+_DRIVERS = {
+    "sqlite": ("sqlite+aiosqlite", "aiosqlite"),
+    "sqlite+pysqlite": ("sqlite+aiosqlite", "aiosqlite"),
+    "postgresql": ("postgresql+asyncpg", "asyncpg"),
+    "postgresql+psycopg2": ("postgresql+asyncpg", "asyncpg"),
+    "postgres": ("postgresql+asyncpg", "asyncpg"),
+}
+
+_motor: Any = None
+_motor_resolvido = False
+_limitador: Any = None
+
+
+def _env_int(nome: str, default: int) -> int:
+    try:
+        return int(str(os.getenv(nome, "")).strip() or default)
+    except Exception:
+        return default
+
+
+def url_assincrona(url: str) -> Optional[str]:
+    """URL do engine assíncrono equivalente (None se o driver não está instalado)."""
+    explicita = str(os.getenv("POPRUA_DB_ASYNC_URL", "")).strip()
+    if explicita:
+        return explicita
+    esquema, _, resto = str(url or "").partition("://")
+    alvo = _DRIVERS.get(esquema.lower())
+    if alvo is None:
+        return None
+    try:
+        importlib.import_module(alvo[1])
+    except Exception:
+        return None
+    return f"{alvo[0]}://{resto}"
+
+
+def motor() -> Any:
+    """Engine assíncrono (criado na 1ª leitura) ou None no modo threads."""
+    global _motor, _motor_resolvido
+    if _motor_resolvido:
+        return _motor
+    _motor_resolvido = True
+    if create_async_engine is None or str(os.getenv("POPRUA_DB_ASYNC", "auto")).strip().lower() in ("0", "false", "no", "off"):
+        return None
+    url = url_assincrona(DATABASE_URL)
+    if url is None:
+        return None
+    try:
+        _motor = create_async_engine(url, echo=False)
+    except Exception as e:
+        print("WARN: db_async: engine assíncrono indisponível, usando threads:", e)
+        _motor = None
+    return _motor
+
+
+def limitador_threads() -> Any:
+    """CapacityLimiter (anyio) do modo threads; criado dentro do event loop."""
+    global _limitador
+    if _limitador is None:
+        import anyio
+
+        _limitador = anyio.CapacityLimiter(max(1, _env_int("POPRUA_DB_ASYNC_THREADS", 8)))
+    return _limitador
+
+
+class LeituraAssincrona:
+    def __init__(self, sessao: Any, nativa: bool) -> None:
+        self._s = sessao
+        self.nativa = nativa
+
+    async def _em_thread(self, fn: Any) -> Any:
+        import anyio.to_thread
+
+        return await anyio.to_thread.run_sync(fn, limiter=limitador_threads())
+
+    async def todos(self, stmt: Any) -> List[Any]:
+        if self.nativa:
+            return list((await self._s.exec(stmt)).all())
+        return await self._em_thread(lambda: list(self._s.exec(stmt).all()))
+
+    async def primeiro(self, stmt: Any) -> Any:
+        if self.nativa:
+            return (await self._s.exec(stmt)).first()
+        return await self._em_thread(lambda: self._s.exec(stmt).first())
+
+    async def obter(self, modelo: Any, ident: Any) -> Any:
+        if self.nativa:
+            return await self._s.get(modelo, ident)
+        return await self._em_thread(lambda: self._s.get(modelo, ident))
+
+    async def fechar(self) -> None:
+        if self.nativa:
+            await self._s.close()
+        else:
+            await self._em_thread(self._s.close)
+
+
+async def get_leitura() -> AsyncIterator[LeituraAssincrona]:
+    """Dependência FastAPI: sessão de leitura assíncrona (nativa ou em threads próprias)."""
+    eng = motor()
+    if eng is not None:
+        leitura = LeituraAssincrona(AsyncSession(eng, expire_on_commit=False), nativa=True)
+    else:
+        leitura = LeituraAssincrona(Session(engine), nativa=False)
+    try:
+        yield leitura
+    finally:
+        await leitura.fechar()
+
+
+def resumo() -> Dict[str, Any]:
+    eng = motor()
+    if eng is not None:
+        return {"modo": "nativo", "driver": eng.url.drivername}
+    est = _limitador.statistics() if _limitador is not None else None
+    return {
+        "modo": "threads",
+        "threads": _env_int("POPRUA_DB_ASYNC_THREADS", 8),
+        "em_uso": int(est.borrowed_tokens) if est is not None else 0,
+        "esperando": int(est.tasks_waiting) if est is not None else 0,
+    }
@@ -10,7 +10,7 @@ Objetivo: evitar travamentos quando o volume cresce (fila/casos/intermunicipal).
 
 from __future__ import annotations
 
-from typing import Iterable, List, Set, Tuple
+from typing import Any, Iterable, List, Optional, Set, Tuple
 
 from sqlalchemy import text
 from sqlalchemy.engine import Engine
@@ -36,9 +36,11 @@ def _cols(conn, table: str) -> Set[str]:
     return cols
 
 
-def _mk_index_sql(name: str, table: str, cols: Iterable[str]) -> str:
+def _mk_index_sql(name: str, table: str, cols: Iterable[str], where: Optional[str] = None) -> str:
     cols_sql = ", ".join([c for c in cols])
-    return f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({cols_sql})"
+    sql = f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({cols_sql})"
+    # índice parcial: a query precisa repetir o WHERE literalmente (sem bind param)
+    return f"{sql} WHERE {where}" if where else sql
 
 
 def ensure_indexes(engine: Engine, database_url: str) -> List[str]:
@@ -51,8 +53,8 @@ def ensure_indexes(engine: Engine, database_url: str) -> List[str]:
     if not (database_url or "").startswith("sqlite"):
         return created
 
-    # Lista de índices desejados (tabela, nome, colunas)
-    desired: List[Tuple[str, str, Tuple[str, ...]]] = [
+    # Lista de índices desejados (tabela, nome, colunas[, WHERE do índice parcial])
+    desired: List[Tuple[Any, ...]] = [
         # PopRua - casos
         ("casopoprua", "idx_casopoprua_muni_status_ativo", ("municipio_id", "status", "ativo")),
         ("casopoprua", "idx_casopoprua_muni_etapa", ("municipio_id", "etapa_atual")),
@@ -70,13 +72,26 @@ def ensure_indexes(engine: Engine, database_url: str) -> List[str]:
         ("pessoarua", "idx_pessoarua_muni_nome", ("municipio_origem_id", "nome_civil")),
         ("pessoarua", "idx_pessoarua_muni_nome_social", ("municipio_origem_id", "nome_social")),
 
+        # CRAS automações (anti-join "já existe tarefa aberta" e devolutivas)
+        ("crastarefa", "idx_crastarefa_ref_muni_status", ("ref_tipo", "ref_id", "municipio_id", "status")),
+        ("caso_cras_historico", "idx_caso_cras_hist_caso_criado", ("caso_id", "criado_em")),
+        ("cras_encaminhamento_evento", "idx_cras_enc_evento_enc_tipo", ("encaminhamento_id", "tipo")),
+
+        # CRAS tarefas: vencidas do resumo (só abertas; concluídas só crescem)
+        ("crastarefa", "idx_crastarefa_abertas_muni_venc", ("municipio_id", "data_vencimento", "unidade_id", "responsavel_id"), "status != 'concluida'"),
+
+        # Rede: atrasados/em risco da /gestao/rede/metricas (só pendentes; o resto vem de rede_metrica)
+        ("cras_encaminhamento", "idx_cras_enc_pendentes_muni", ("municipio_id", "destino_tipo", "destino_nome"), "status NOT IN ('concluido','cancelado')"),
+        ("encaminhamentos_intermunicipais", "idx_intermun_pendentes_dest", ("municipio_destino_id",), "status NOT IN ('concluido','cancelado')"),
+        ("encaminhamentos_intermunicipais", "idx_intermun_pendentes_orig", ("municipio_origem_id",), "status NOT IN ('concluido','cancelado')"),
+
         # Usuários (login/listas)
         ("usuarios", "idx_usuarios_email", ("email",)),
         ("usuarios", "idx_usuarios_muni_perfil", ("municipio_id", "perfil")),
     ]
 
     with engine.begin() as conn:
-        for table, idx_name, cols in desired:
+        for table, idx_name, cols, *where in desired:
             if not _table_exists(conn, table):
                 continue
             existing_cols = _cols(conn, table)
@@ -84,7 +99,7 @@ def ensure_indexes(engine: Engine, database_url: str) -> List[str]:
                 continue
             if any(c not in existing_cols for c in cols):
                 continue
-            sql = _mk_index_sql(idx_name, table, cols)
+            sql = _mk_index_sql(idx_name, table, cols, where[0] if where else None)
             try:
                 conn.execute(text(sql))
                 created.append(idx_name)
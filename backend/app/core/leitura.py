@@ -0,0 +1,463 @@
+# app/core/leitura.py
+"""
+Roteamento de leitura: relatórios e dashboards fora do banco principal.
+
+Endpoints só-leitura (agregações, relatórios, CSV) declaram quanta defasagem
+aceitam e recebem a sessão de onde der para servir:
+
+    session: Session = Depends(sessao_leitura(max_atraso_s=300))
+
+Ordem de escolha (a primeira que couber na tolerância):
+  1) réplica (POPRUA_LEITURA_URL, ex.: Postgres em streaming replication); o
+     atraso é medido com pg_last_xact_replay_timestamp() e guardado por 5s;
+  2) cópia instantânea do SQLite (backup API do sqlite3), aberta read-only e
+     `immutable` — o relatório longo não segura lock no arquivo principal, então
+     a recepção do CRAS continua gravando no fechamento do mês;
+  3) o banco principal (nada configurado, cópia velha demais, réplica fora).
+
+A cópia é renovada em background (uma por vez, sem bloquear o request) quando
+passa de POPRUA_SNAPSHOT_S; se o arquivo principal não mudou (contador de
+alterações do cabeçalho), só renova a idade. Enquanto a renovação não termina,
+quem não tolera a idade atual vai para o principal.
+
+A cópia é compartilhada entre os workers: fica em POPRUA_SNAPSHOT_DIR com a
+hora e o contador no nome, só um processo copia por vez (trava `.renovando`) e
+os outros adotam a mais recente em vez de copiar de novo. A cópia anda de
+POPRUA_SNAPSHOT_PAGINAS em POPRUA_SNAPSHOT_PAGINAS páginas, soltando o lock
+compartilhado do principal entre os passos, para não travar os commits da
+recepção (journal rollback) durante a cópia de um banco grande.
+
+Sessões de leitura recusam escrita (arquivo read-only / réplica); endpoints que
+gravam continuam com get_session. O header X-Leitura diz a origem e a idade
+(não aparece quando o endpoint devolve o próprio Response, ex.: CSV; veja
+GET /admin/perf -> leitura.uso).
+
+Config (env):
+  POPRUA_LEITURA_URL=                 URL da réplica (vazio = sem réplica)
+  POPRUA_SNAPSHOT=1                   liga a cópia instantânea (só SQLite; padrão: desligado)
+  POPRUA_SNAPSHOT_S=60                idade a partir da qual a cópia é renovada
+  POPRUA_SNAPSHOT_DIR=storage/leitura pasta das cópias (compartilhada entre os workers)
+  POPRUA_SNAPSHOT_PAGINAS=256         páginas copiadas por passo (0 = tudo de uma vez)
+  POPRUA_SNAPSHOT_PAUSA_MS=5          pausa entre os passos, com o principal liberado
+  POPRUA_LEITURA_ATRASO_MAX_S=        teto para a tolerância de todos os endpoints (0 = sempre principal)
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Generator, List, Optional, Tuple
+
+from fastapi import Response
+from sqlalchemy import text
+from sqlmodel import Session, create_engine
+
+from app.core.db import engine as engine_principal
+
+_REPLICA_CHECAGEM_S = 5.0
+_REPLICA_PAUSA_FALHA_S = 30.0
+_COPIAS_ANTIGAS = 1  # a anterior fica aberta para leituras longas que ainda a usam
+_COPIAS_NA_PASTA = 2  # as mais recentes nunca são apagadas
+_RETENCAO_MIN_S = 600  # nem as cópias (ou travas) mais novas que isso: outro worker pode usá-las
+_REINICIOS_MAX = 50  # o principal mudou a cada passo: desiste e tenta na próxima renovação
+
+
+def _env_int(nome: str, default: Optional[int]) -> Optional[int]:
+    v = (os.getenv(nome) or "").strip()
+    if not v:
+        return default
+    try:
+        return int(v)
+    except Exception:
+        return default
+
+
+def _env_on(nome: str) -> bool:
+    return (os.getenv(nome) or "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def _pasta_copias() -> Path:
+    p = (os.getenv("POPRUA_SNAPSHOT_DIR") or "").strip()
+    if p:
+        return Path(p)
+    return Path(__file__).resolve().parents[2] / "storage" / "leitura"
+
+
+def _contador_alteracoes(arquivo: Path) -> Optional[int]:
+    """File change counter (offset 24 do cabeçalho). Em WAL o cabeçalho não acompanha
+    cada commit, então não serve para detectar mudança -> None (sempre copia)."""
+    try:
+        if Path(str(arquivo) + "-wal").exists():
+            return None
+        with open(arquivo, "rb") as f:
+            f.seek(24)
+            b = f.read(4)
+        return int.from_bytes(b, "big") if len(b) == 4 else None
+    except Exception:
+        return None
+
+
+def _prefixo(origem: Path) -> str:
+    """Prefixo das cópias de `origem` (a pasta pode servir a mais de um banco)."""
+    return "poprua-leitura-" + hashlib.sha1(str(origem).encode("utf-8")).hexdigest()[:8] + "-"
+
+
+def _copias_prontas(pasta: Path, prefixo: str) -> List[Tuple[float, Optional[int], Path]]:
+    """(gerada_em, contador, arquivo) das cópias terminadas, mais recente primeiro."""
+    out: List[Tuple[float, Optional[int], Path]] = []
+    try:
+        arquivos = list(pasta.glob(prefixo + "*.db"))
+    except Exception:
+        return out
+    for a in arquivos:
+        partes = a.stem[len(prefixo):].split("-")
+        if len(partes) != 2:
+            continue
+        try:
+            gerada_em = int(partes[0]) / 1000.0
+            contador = None if partes[1] == "x" else int(partes[1])
+        except ValueError:
+            continue
+        out.append((gerada_em, contador, a))
+    out.sort(key=lambda t: t[0], reverse=True)
+    return out
+
+
+def _pegar_trava(trava: Path, retencao_s: float) -> bool:
+    """Só um processo copia por vez; trava de quem morreu no meio expira por idade."""
+    try:
+        if time.time() - trava.stat().st_mtime > retencao_s:
+            trava.unlink()
+    except FileNotFoundError:
+        pass
+    except Exception:
+        return False
+    try:
+        fd = os.open(str(trava), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    os.write(fd, str(os.getpid()).encode("ascii"))
+    os.close(fd)
+    return True
+
+
+def _copiar(origem: Path, parcial: Path) -> None:
+    """Backup em passos: entre um passo e outro o principal fica livre para escrita."""
+    paginas = max(0, _env_int("POPRUA_SNAPSHOT_PAGINAS", 256) or 0)
+    pausa = max(0, _env_int("POPRUA_SNAPSHOT_PAUSA_MS", 5) or 0) / 1000.0
+    restantes = [None]
+    reinicios = [0]
+
+    def _progresso(status: int, faltam: int, total: int) -> None:
+        # quem grava no principal entre dois passos faz o backup recomeçar do zero
+        if restantes[0] is not None and faltam > restantes[0]:
+            reinicios[0] += 1
+            if reinicios[0] > _REINICIOS_MAX:
+                raise RuntimeError(f"principal alterado durante a cópia ({_REINICIOS_MAX} recomeços)")
+        restantes[0] = faltam
+
+    src = sqlite3.connect(str(origem), timeout=30)
+    try:
+        dst = sqlite3.connect(str(parcial))
+        try:
+            if paginas:
+                src.backup(dst, pages=paginas, progress=_progresso, sleep=pausa)
+            else:
+                src.backup(dst)
+        finally:
+            dst.close()
+    finally:
+        src.close()
+
+
+def _limpar_pasta(pasta: Path, prefixo: str, retencao_s: float) -> None:
+    """Apaga cópias antigas (fora das mais recentes e paradas há mais que a retenção)
+    e `.parcial` órfãos de quem morreu copiando."""
+    agora = time.time()
+    prontas = [a for _, _, a in _copias_prontas(pasta, prefixo)]
+    velhas = prontas[_COPIAS_NA_PASTA:] + list(pasta.glob(prefixo + "*.parcial"))
+    for a in velhas:
+        try:
+            if agora - a.stat().st_mtime > retencao_s:
+                a.unlink()
+        except Exception:
+            pass  # Windows: ainda aberta por uma leitura longa; fica para a próxima
+
+
+@dataclass
+class _Copia:
+    engine: Any
+    arquivo: Path
+    gerada_em: float  # instante (time.time) a que os dados correspondem
+    contador: Optional[int]
+    copia_ms: float
+
+
+class Roteador:
+    """Escolhe o engine de leitura por tolerância de atraso. Thread-safe."""
+
+    def __init__(self, principal: Any) -> None:
+        self.principal = principal
+        self._lock = threading.Lock()
+        self._copia: Optional[_Copia] = None
+        self._antigas: List[_Copia] = []
+        self._renovando = False
+        self._ultimo_erro: Optional[str] = None
+        self._replica: Any = None
+        self._replica_url: Optional[str] = None
+        self._replica_atraso: Optional[float] = None
+        self._replica_checada = 0.0
+        self._replica_fora_ate = 0.0
+        self._uso: Counter = Counter()
+
+    # ---------------- config ----------------
+    def _arquivo_principal(self) -> Optional[Path]:
+        url = self.principal.url
+        if url.get_backend_name() != "sqlite" or not url.database or url.database == ":memory:":
+            return None
+        return Path(url.database).resolve()
+
+    def copia_habilitada(self) -> bool:
+        return _env_on("POPRUA_SNAPSHOT") and self._arquivo_principal() is not None
+
+    # ---------------- réplica ----------------
+    def _engine_replica(self) -> Any:
+        url = (os.getenv("POPRUA_LEITURA_URL") or "").strip()
+        if not url:
+            return None
+        if self._replica is None or self._replica_url != url:
+            if time.time() < self._replica_fora_ate:
+                return None
+            kw: Dict[str, Any] = {"pool_pre_ping": True}
+            if url.startswith("sqlite"):
+                kw["connect_args"] = {"check_same_thread": False}
+            try:
+                self._replica = _instrumentar(create_engine(url, **kw))
+            except Exception as e:  # driver ausente, URL inválida
+                self._replica_fora_ate = time.time() + _REPLICA_PAUSA_FALHA_S
+                self._ultimo_erro = f"replica: {e}"
+                print("WARN: leitura: réplica não configurada:", e)
+                return None
+            self._replica_url = url
+            self._replica_checada = 0.0
+        return self._replica
+
+    def _atraso_replica(self, eng: Any) -> Optional[float]:
+        agora = time.time()
+        if agora < self._replica_fora_ate:
+            return None
+        if agora - self._replica_checada < _REPLICA_CHECAGEM_S:
+            return self._replica_atraso
+        try:
+            with eng.connect() as conn:
+                if eng.dialect.name == "postgresql":
+                    v = conn.execute(
+                        text(
+                            "SELECT CASE WHEN pg_is_in_recovery() "
+                            "THEN COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) "
+                            "ELSE 0 END"
+                        )
+                    ).scalar()
+                    atraso = max(0.0, float(v or 0))
+                else:
+                    conn.execute(text("SELECT 1"))
+                    atraso = 0.0  # sem como medir: o operador responde pela defasagem
+        except Exception as e:
+            self._replica_fora_ate = agora + _REPLICA_PAUSA_FALHA_S
+            self._ultimo_erro = f"replica: {e}"
+            print("WARN: leitura: réplica indisponível:", e)
+            return None
+        self._replica_atraso = atraso
+        self._replica_checada = agora
+        return atraso
+
+    # ---------------- cópia instantânea ----------------
+    def _agendar_renovacao(self) -> None:
+        with self._lock:
+            if self._renovando:
+                return
+            self._renovando = True
+        threading.Thread(target=self._renovar, name="poprua-leitura-copia", daemon=True).start()
+
+    def _adotar(self, arquivo: Path, gerada_em: float, contador: Optional[int], copia_ms: float) -> None:
+        eng = _instrumentar(
+            create_engine(
+                f"sqlite:///file:{arquivo.as_posix()}?mode=ro&immutable=1&uri=true",
+                connect_args={"check_same_thread": False},
+            )
+        )
+        nova = _Copia(engine=eng, arquivo=arquivo, gerada_em=gerada_em, contador=contador, copia_ms=copia_ms)
+        with self._lock:
+            if self._copia is not None:
+                self._antigas.append(self._copia)
+            self._copia = nova
+            descartar = self._antigas[:-_COPIAS_ANTIGAS] if len(self._antigas) > _COPIAS_ANTIGAS else []
+            self._antigas = self._antigas[len(descartar):]
+        for c in descartar:
+            _descartar(c)
+
+    def _renovar(self) -> None:
+        try:
+            origem = self._arquivo_principal()
+            if origem is None or not origem.exists():
+                return
+            inicio = time.time()
+            contador = _contador_alteracoes(origem)
+            ttl = _env_int("POPRUA_SNAPSHOT_S", 60) or 60
+            retencao = max(_RETENCAO_MIN_S, 3 * ttl)
+            pasta = _pasta_copias()
+            pasta.mkdir(parents=True, exist_ok=True)
+            prefixo = _prefixo(origem)
+            atual = self._copia
+
+            prontas = _copias_prontas(pasta, prefixo)
+            if prontas:
+                gerada_em, c_recente, arq = prontas[0]
+                nada_mudou = contador is not None and c_recente == contador
+                if nada_mudou or inicio - gerada_em < ttl:
+                    # outro worker já copiou (ou o principal não mudou desde a cópia): reaproveita
+                    if atual is None or atual.arquivo != arq:
+                        self._adotar(arq, gerada_em, c_recente, 0.0)
+                        atual = self._copia
+                    if nada_mudou and atual is not None:
+                        atual.gerada_em = inicio
+                    self._ultimo_erro = None
+                    return
+
+            trava = pasta / (prefixo + ".renovando")
+            if not _pegar_trava(trava, retencao):
+                return  # outro worker está copiando; a próxima renovação adota a cópia dele
+            try:
+                destino = pasta / f"{prefixo}{int(inicio * 1000)}-{'x' if contador is None else contador}.db"
+                parcial = destino.with_name(destino.name + ".parcial")
+                t0 = time.perf_counter()
+                try:
+                    _copiar(origem, parcial)
+                except Exception:
+                    try:
+                        parcial.unlink()
+                    except Exception:
+                        pass
+                    raise
+                os.replace(parcial, destino)
+                copia_ms = (time.perf_counter() - t0) * 1000.0
+            finally:
+                try:
+                    trava.unlink()
+                except Exception:
+                    pass
+            self._adotar(destino, inicio, contador, copia_ms)
+            _limpar_pasta(pasta, prefixo, retencao)
+            self._ultimo_erro = None
+        except Exception as e:
+            self._ultimo_erro = f"copia: {e}"
+            print("WARN: leitura: cópia instantânea falhou:", e)
+        finally:
+            with self._lock:
+                self._renovando = False
+
+    # ---------------- escolha ----------------
+    def escolher(self, max_atraso_s: float) -> Tuple[Any, str, Optional[float]]:
+        """(engine, origem, idade_s) para uma leitura que tolera `max_atraso_s`."""
+        teto = _env_int("POPRUA_LEITURA_ATRASO_MAX_S", None)
+        if teto is not None:
+            max_atraso_s = min(max_atraso_s, teto)
+        if max_atraso_s <= 0:
+            self._uso["principal"] += 1
+            return self.principal, "principal", None
+
+        rep = self._engine_replica()
+        if rep is not None:
+            atraso = self._atraso_replica(rep)
+            if atraso is not None and atraso <= max_atraso_s:
+                self._uso["replica"] += 1
+                return rep, "replica", atraso
+
+        if self.copia_habilitada():
+            copia = self._copia
+            idade = (time.time() - copia.gerada_em) if copia is not None else None
+            if idade is None or idade >= (_env_int("POPRUA_SNAPSHOT_S", 60) or 60):
+                self._agendar_renovacao()
+            if copia is not None and idade is not None and idade <= max_atraso_s:
+                self._uso["copia"] += 1
+                return copia.engine, "copia", idade
+
+        self._uso["principal"] += 1
+        return self.principal, "principal", None
+
+    def resumo(self) -> Dict[str, Any]:
+        copia = self._copia
+        return {
+            "replica": bool(self._replica_url),
+            "replica_atraso_s": self._replica_atraso,
+            "copia_habilitada": self.copia_habilitada(),
+            "copia": None
+            if copia is None
+            else {
+                "arquivo": copia.arquivo.name,
+                "idade_s": round(time.time() - copia.gerada_em, 1),
+                "copia_ms": round(copia.copia_ms, 1),
+            },
+            "renovando": self._renovando,
+            "uso": dict(self._uso),
+            "ultimo_erro": self._ultimo_erro,
+        }
+
+    def parar(self) -> None:
+        """Fecha os engines (shutdown). Os arquivos ficam: outros workers podem estar
+        usando; a limpeza por idade da próxima renovação cuida deles."""
+        with self._lock:
+            copias = ([self._copia] if self._copia else []) + self._antigas
+            self._copia = None
+            self._antigas = []
+        for c in copias:
+            _descartar(c)
+        if self._replica is not None:
+            self._replica.dispose()
+            self._replica = None
+            self._replica_url = None
+
+
+def _instrumentar(eng: Any) -> Any:
+    from app.core import perf
+
+    if perf.habilitado():
+        perf.instalar_sql(eng)
+    return eng
+
+
+def _descartar(c: _Copia) -> None:
+    try:
+        c.engine.dispose()
+    except Exception:
+        pass
+
+
+roteador = Roteador(engine_principal)
+
+
+def engine_leitura(max_atraso_s: float) -> Tuple[Any, str, Optional[float]]:
+    return roteador.escolher(max_atraso_s)
+
+
+def _header(origem: str, idade: Optional[float]) -> str:
+    return origem if idade is None else f"{origem}; idade={int(idade)}s"
+
+
+def sessao_leitura(max_atraso_s: float) -> Callable[..., Generator[Session, None, None]]:
+    """Dependência FastAPI: sessão só-leitura que aceita dados com até `max_atraso_s` de atraso."""
+
+    def _dep(response: Response) -> Generator[Session, None, None]:
+        eng, origem, idade = roteador.escolher(max_atraso_s)
+        response.headers["X-Leitura"] = _header(origem, idade)
+        with Session(eng) as session:
+            yield session
+
+    _dep.__name__ = f"sessao_leitura_{int(max_atraso_s)}s"
+    return _dep
@@ -0,0 +1,68 @@
+# app/core/limites.py
+"""
+Limite de taxa por cliente (balde de fichas), em memória por processo.
+
+Usado nas rotas públicas (sem token), como a verificação de documento por QR:
+uma rajada de leituras vinda do mesmo IP não pode ocupar o servidor.
+
+- cada chave (ex.: IP) tem um balde com `rajada` fichas, reabastecido a
+  `por_minuto` fichas/min; requisição sem ficha => 429 com Retry-After
+- número de chaves limitado (descarta as menos recentes)
+- thread-safe; cada worker uvicorn tem o seu (não substitui limite no proxy)
+
+IP do cliente: `request.client.host`. Atrás de proxy reverso confiável,
+export POPRUA_CONFIAR_PROXY=1 para usar o 1º IP de X-Forwarded-For.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Tuple
+
+
+def _env_on(nome: str, default: str = "") -> bool:
+    return str(os.getenv(nome, default)).strip().lower() in ("1", "true", "yes", "on")
+
+
+def ip_cliente(request: Any) -> str:
+    if _env_on("POPRUA_CONFIAR_PROXY"):
+        xff = (request.headers.get("x-forwarded-for") or "").split(",")[0].strip()
+        if xff:
+            return xff
+    cliente = getattr(request, "client", None)
+    return (getattr(cliente, "host", None) or "-") if cliente else "-"
+
+
+class LimiteTaxa:
+    def __init__(self, por_minuto: float, rajada: int, max_chaves: int = 10000) -> None:
+        self.taxa_s = max(0.0, float(por_minuto)) / 60.0
+        self.rajada = max(1, int(rajada))
+        self.max_chaves = int(max_chaves)
+        self._baldes: "OrderedDict[Hashable, Tuple[float, float]]" = OrderedDict()  # chave -> (fichas, ts)
+        self._lock = threading.Lock()
+
+    def permitir(self, chave: Hashable) -> Tuple[bool, int]:
+        """(permitido, segundos até a próxima ficha)."""
+        agora = time.monotonic()
+        with self._lock:
+            fichas, ts = self._baldes.get(chave, (float(self.rajada), agora))
+            fichas = min(float(self.rajada), fichas + (agora - ts) * self.taxa_s)
+            if fichas >= 1.0:
+                self._baldes[chave] = (fichas - 1.0, agora)
+                ok, espera = True, 0
+            else:
+                self._baldes[chave] = (fichas, agora)
+                falta = 1.0 - fichas
+                ok, espera = False, (math.ceil(falta / self.taxa_s) if self.taxa_s > 0 else 60)
+            self._baldes.move_to_end(chave)
+            while len(self._baldes) > self.max_chaves:
+                self._baldes.popitem(last=False)
+        return ok, espera
+
+    def clear(self) -> None:
+        with self._lock:
+            self._baldes.clear()
@@ -0,0 +1,339 @@
+# app/core/migracoes.py
+"""
+Migrações versionadas do esquema (tabela schema_version) + backfills em lote.
+
+Antes: `_ensure_sqlite_columns` (db.py) fazia PRAGMA table_info + ALTER TABLE a
+cada boot, e scripts soltos em app/migrations rodavam "na mão". Agora:
+
+- cada mudança é uma `Migracao` numerada (lista em app/migrations/versoes.py),
+  aplicada UMA vez e registrada em schema_version; o boot só lê as versões
+- a parte DDL é rápida por construção: ADD COLUMN sem reescrever a tabela
+  (nullable ou com DEFAULT constante; SQLite e PostgreSQL só mexem no catálogo)
+- preencher a coluna nova (prazo, chave de busca...) é um `Backfill`: lotes
+  pequenos por id, um commit por lote, progresso em schema_backfill. Se o
+  processo cair, continua do último id; leituras/escritas da API seguem
+  entre os lotes (a tabela nunca fica travada por minutos)
+
+Os backfills pendentes rodam numa thread em background depois do boot
+(desligue com POPRUA_BACKFILL_AUTO=0) ou pela CLI:
+
+  python -m app.core.migracoes              # aplica migrações + backfills
+  python -m app.core.migracoes --status     # versões aplicadas / progresso
+  python -m app.core.migracoes --sem-backfill
+"""
+
+from __future__ import annotations
+
+import argparse
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+
+@dataclass(frozen=True)
+class Backfill:
+    """Preenche colunas derivadas em lotes (retomável).
+
+    - `pendentes`: WHERE (SQL literal) das linhas que ainda precisam do valor
+      (ex.: "nome_busca IS NULL"); também é o que torna o lote idempotente
+    - `colunas`: colunas lidas para calcular o valor (o id vem sempre)
+    - `calcular(linha) -> {coluna: valor}`: cálculo em Python por linha
+      (quando o SQL do banco não basta, ex.: remover acentos no SQLite)
+    """
+
+    tabela: str
+    pendentes: str
+    colunas: Sequence[str]
+    calcular: Callable[[Dict[str, Any]], Dict[str, Any]]
+    lote: int = 500
+    pausa_s: float = 0.01  # entre lotes: deixa a API pegar o lock de escrita
+
+
+@dataclass(frozen=True)
+class Migracao:
+    versao: int
+    nome: str
+    aplicar: Callable[[Connection], None]
+    backfill: Optional[Backfill] = None
+
+
+# ============================
+# Helpers de DDL (idempotentes: o banco pode já ter a coluna via create_all)
+# ============================
+def tabela_existe(conn: Connection, tabela: str) -> bool:
+    return inspect(conn).has_table(tabela)
+
+
+def colunas(conn: Connection, tabela: str) -> set:
+    try:
+        return {c["name"] for c in inspect(conn).get_columns(tabela)}
+    except Exception:
+        return set()
+
+
+def adicionar_colunas(conn: Connection, tabela: str, cols: Dict[str, str]) -> List[str]:
+    """ALTER TABLE ... ADD COLUMN para as colunas que faltam. Tabela ausente: nada.
+
+    Use tipos nullable ou com DEFAULT constante: assim o ALTER não reescreve a
+    tabela (valores derivados entram depois, por Backfill).
+    """
+    if not tabela_existe(conn, tabela):
+        return []
+    existentes = colunas(conn, tabela)
+    feitas: List[str] = []
+    for nome, ddl in cols.items():
+        if nome in existentes:
+            continue
+        conn.execute(text(f"ALTER TABLE {tabela} ADD COLUMN {nome} {ddl}"))
+        feitas.append(nome)
+    return feitas
+
+
+def remover_colunas(conn: Connection, tabela: str, nomes: Sequence[str]) -> List[str]:
+    """ALTER TABLE ... DROP COLUMN para as colunas que ainda existem.
+
+    Só colunas sem índice/constraint (o SQLite, 3.35+, recusa as outras).
+    """
+    if not tabela_existe(conn, tabela):
+        return []
+    existentes = colunas(conn, tabela)
+    feitas: List[str] = []
+    for nome in nomes:
+        if nome not in existentes:
+            continue
+        conn.execute(text(f"ALTER TABLE {tabela} DROP COLUMN {nome}"))
+        feitas.append(nome)
+    return feitas
+
+
+def criar_indice(conn: Connection, nome: str, tabela: str, cols: Sequence[str], where: Optional[str] = None) -> None:
+    if not tabela_existe(conn, tabela):
+        return
+    sql = f"CREATE INDEX IF NOT EXISTS {nome} ON {tabela} ({', '.join(cols)})"
+    conn.execute(text(f"{sql} WHERE {where}" if where else sql))
+
+
+# ============================
+# Controle (schema_version / schema_backfill)
+# ============================
+def _agora() -> str:
+    return datetime.utcnow().isoformat(timespec="seconds")
+
+
+def _garantir_controle(engine: Engine) -> None:
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "CREATE TABLE IF NOT EXISTS schema_version ("
+                "versao INTEGER PRIMARY KEY, nome VARCHAR(200) NOT NULL, "
+                "aplicada_em VARCHAR(32), duracao_ms INTEGER)"
+            )
+        )
+        conn.execute(
+            text(
+                "CREATE TABLE IF NOT EXISTS schema_backfill ("
+                "versao INTEGER PRIMARY KEY, tabela VARCHAR(200) NOT NULL, "
+                "ultimo_id INTEGER NOT NULL DEFAULT 0, linhas INTEGER NOT NULL DEFAULT 0, "
+                "concluido INTEGER NOT NULL DEFAULT 0, atualizado_em VARCHAR(32))"
+            )
+        )
+
+
+def versoes_aplicadas(engine: Engine) -> Dict[int, Dict[str, Any]]:
+    try:
+        with engine.connect() as conn:
+            rows = conn.execute(text("SELECT versao, nome, aplicada_em, duracao_ms FROM schema_version")).fetchall()
+    except Exception:
+        return {}
+    return {int(r[0]): {"nome": r[1], "aplicada_em": r[2], "duracao_ms": r[3]} for r in rows}
+
+
+def backfills_pendentes(engine: Engine) -> List[int]:
+    """Versões com backfill não concluído (1 SELECT; usado no boot rápido)."""
+    try:
+        with engine.connect() as conn:
+            rows = conn.execute(text("SELECT versao FROM schema_backfill WHERE concluido = 0 ORDER BY versao")).fetchall()
+    except Exception:
+        return []
+    return [int(r[0]) for r in rows]
+
+
+def _lista() -> List[Migracao]:
+    from app.migrations.versoes import MIGRACOES
+
+    vistas = set()
+    for m in MIGRACOES:
+        if m.versao in vistas:
+            raise RuntimeError(f"migração com versão repetida: {m.versao}")
+        vistas.add(m.versao)
+    return sorted(MIGRACOES, key=lambda m: m.versao)
+
+
+# ============================
+# Execução
+# ============================
+def migrar(engine: Engine, log: Optional[Callable[[str], None]] = None) -> List[int]:
+    """Aplica as migrações pendentes (só DDL). Retorna as versões aplicadas agora."""
+    _garantir_controle(engine)
+    aplicadas = versoes_aplicadas(engine)
+    feitas: List[int] = []
+    for m in _lista():
+        if m.versao in aplicadas:
+            continue
+        t0 = time.perf_counter()
+        try:
+            with engine.begin() as conn:
+                m.aplicar(conn)
+                dur = int((time.perf_counter() - t0) * 1000)
+                conn.execute(
+                    text("INSERT INTO schema_version (versao, nome, aplicada_em, duracao_ms) VALUES (:v, :n, :t, :d)"),
+                    {"v": m.versao, "n": m.nome, "t": _agora(), "d": dur},
+                )
+                if m.backfill is not None:
+                    conn.execute(
+                        text("INSERT INTO schema_backfill (versao, tabela, atualizado_em) VALUES (:v, :t, :a)"),
+                        {"v": m.versao, "t": m.backfill.tabela, "a": _agora()},
+                    )
+        except Exception:
+            # outro worker subindo junto pode ter aplicado a mesma versão
+            if m.versao in versoes_aplicadas(engine):
+                continue
+            raise
+        feitas.append(m.versao)
+        if log:
+            log(f"migração {m.versao:04d} {m.nome} aplicada em {int((time.perf_counter() - t0) * 1000)}ms")
+    return feitas
+
+
+def _executar_backfill(engine: Engine, m: Migracao, log: Optional[Callable[[str], None]] = None) -> int:
+    bf = m.backfill
+    assert bf is not None
+    with engine.connect() as conn:
+        row = conn.execute(text("SELECT ultimo_id, linhas FROM schema_backfill WHERE versao = :v"), {"v": m.versao}).first()
+    ultimo = int(row[0]) if row else 0
+    total = int(row[1]) if row else 0
+
+    cols = ", ".join(["id", *bf.colunas])
+    sel = text(
+        f"SELECT {cols} FROM {bf.tabela} WHERE id > :ultimo AND ({bf.pendentes}) ORDER BY id LIMIT :lote"
+    )
+    while True:
+        with engine.begin() as conn:
+            linhas = [dict(r._mapping) for r in conn.execute(sel, {"ultimo": ultimo, "lote": int(bf.lote)}).fetchall()]
+            if not linhas:
+                conn.execute(
+                    text("UPDATE schema_backfill SET concluido = 1, atualizado_em = :a WHERE versao = :v"),
+                    {"a": _agora(), "v": m.versao},
+                )
+                break
+            por_colunas: Dict[tuple, List[Dict[str, Any]]] = {}
+            for ln in linhas:
+                valores = bf.calcular(ln) or {}
+                if valores:
+                    por_colunas.setdefault(tuple(sorted(valores)), []).append({**valores, "_id": ln["id"]})
+            for chaves, params in por_colunas.items():
+                sets = ", ".join(f"{c} = :{c}" for c in chaves)
+                conn.execute(text(f"UPDATE {bf.tabela} SET {sets} WHERE id = :_id"), params)
+            ultimo = int(linhas[-1]["id"])
+            total += len(linhas)
+            conn.execute(
+                text("UPDATE schema_backfill SET ultimo_id = :u, linhas = :n, atualizado_em = :a WHERE versao = :v"),
+                {"u": ultimo, "n": total, "a": _agora(), "v": m.versao},
+            )
+        if bf.pausa_s > 0:
+            time.sleep(bf.pausa_s)
+    if log:
+        log(f"backfill {m.versao:04d} {m.nome}: {total} linhas em {bf.tabela}")
+    return total
+
+
+def executar_backfills(engine: Engine, log: Optional[Callable[[str], None]] = None) -> Dict[int, int]:
+    """Roda os backfills pendentes até o fim (retoma do último id gravado)."""
+    pendentes = set(backfills_pendentes(engine))
+    out: Dict[int, int] = {}
+    for m in _lista():
+        if m.versao in pendentes and m.backfill is not None:
+            out[m.versao] = _executar_backfill(engine, m, log)
+    return out
+
+
+_thread: Optional[threading.Thread] = None
+_thread_lock = threading.Lock()
+
+
+def backfills_em_background(engine: Engine) -> bool:
+    """Dispara os backfills pendentes numa thread daemon (uma por processo)."""
+    global _thread
+    if not backfills_pendentes(engine):
+        return False
+    with _thread_lock:
+        if _thread is not None and _thread.is_alive():
+            return False
+
+        def _rodar() -> None:
+            try:
+                executar_backfills(engine, log=lambda s: print(f"INFO: {s}"))
+            except Exception as e:
+                # progresso já gravado fica; o próximo boot continua
+                print("WARN: backfill interrompido:", e)
+
+        _thread = threading.Thread(target=_rodar, name="poprua-backfill", daemon=True)
+        _thread.start()
+    return True
+
+
+def status(engine: Engine) -> Dict[str, Any]:
+    aplicadas = versoes_aplicadas(engine)
+    try:
+        with engine.connect() as conn:
+            bfs = {
+                int(r[0]): {"tabela": r[1], "ultimo_id": r[2], "linhas": r[3], "concluido": bool(r[4]), "atualizado_em": r[5]}
+                for r in conn.execute(
+                    text("SELECT versao, tabela, ultimo_id, linhas, concluido, atualizado_em FROM schema_backfill")
+                ).fetchall()
+            }
+    except Exception:
+        bfs = {}
+    return {
+        "versoes": [
+            {
+                "versao": m.versao,
+                "nome": m.nome,
+                "aplicada": m.versao in aplicadas,
+                "aplicada_em": (aplicadas.get(m.versao) or {}).get("aplicada_em"),
+                "backfill": bfs.get(m.versao),
+            }
+            for m in _lista()
+        ]
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import json
+
+    from app.core.db import engine, init_db
+
+    ap = argparse.ArgumentParser(description="Migrações versionadas do banco (schema_version).")
+    ap.add_argument("--status", action="store_true", help="só mostra versões e progresso dos backfills")
+    ap.add_argument("--sem-backfill", action="store_true", help="aplica só as migrações (DDL)")
+    args = ap.parse_args(argv)
+
+    if args.status:
+        _garantir_controle(engine)
+        print(json.dumps(status(engine), ensure_ascii=False, indent=2))
+        return 0
+
+    init_db(forcar=True, backfill_auto=False)
+    if not args.sem_backfill:
+        executar_backfills(engine, log=print)
+    print(json.dumps(status(engine), ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,420 @@
+# app/core/perf.py
+"""
+Instrumentação de performance por request (SQL + tempos + tamanho).
+
+- eventos do SQLAlchemy no engine: conta queries, soma tempo de banco e guarda
+  as mais lentas do request (SQL compactado; parâmetros SUBSTITUÍDOS pelo tipo,
+  nunca o valor — CPF/NIS/nome não vão para memória nem para o /admin/perf)
+- middleware ASGI: mede o request inteiro, o tempo entre o fim do endpoint e o
+  início da resposta (serialização/validação) e os bytes enviados
+- header `Server-Timing` (DevTools > Network > Timing):
+    db;dur=..;desc="N queries", app;dur=.., ser;dur=.., fila;dur=..
+  (fila = espera até a 1ª thread do pool, app/core/concorrencia.py)
+- histogramas por rota em janela móvel (fatias de 1 min) + amostras dos
+  requests lentos, lidos por GET /admin/perf
+
+SQL repetido no mesmo request é contado por texto: "SELECT ... WHERE id = ?"
+executado 80x no mesmo request é o N+1 aparecendo em `repetida_max`.
+
+Config (env):
+  POPRUA_PERF=0                 desliga tudo (padrão: ligado)
+  POPRUA_PERF_JANELA_MIN=15     janela dos histogramas (minutos)
+  POPRUA_PERF_LENTO_MS=500      request acima disso vira amostra lenta
+"""
+
+from __future__ import annotations
+
+import functools
+import inspect
+import os
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# limites (ms) dos baldes do histograma; o último é "acima"
+BALDES_MS: Tuple[float, ...] = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_TOP_SQL = 5
+_SQL_MAX_CHARS = 400
+_MAX_AMOSTRAS_LENTAS = 50
+
+
+def habilitado() -> bool:
+    return str(os.getenv("POPRUA_PERF", "1")).strip().lower() not in ("0", "false", "no", "off")
+
+
+def _janela_min() -> int:
+    try:
+        return max(1, int(os.getenv("POPRUA_PERF_JANELA_MIN", "15")))
+    except Exception:
+        return 15
+
+
+def _lento_ms() -> float:
+    try:
+        return float(os.getenv("POPRUA_PERF_LENTO_MS", "500"))
+    except Exception:
+        return 500.0
+
+
+# =========================================================
+# Medição do request atual
+# =========================================================
+
+class Medicao:
+    __slots__ = ("t0", "queries", "db_ms", "lentas", "por_sql", "t_endpoint_fim", "t_resposta", "t_thread")
+
+    def __init__(self) -> None:
+        self.t0 = time.perf_counter()
+        self.queries = 0
+        self.db_ms = 0.0
+        self.lentas: List[Tuple[float, str, List[str]]] = []
+        self.por_sql: Counter = Counter()
+        self.t_endpoint_fim: Optional[float] = None
+        self.t_resposta: Optional[float] = None
+        self.t_thread: Optional[float] = None  # 1ª execução numa thread do pool
+
+    def registrar_sql(self, statement: str, params: Any, ms: float) -> None:
+        self.queries += 1
+        self.db_ms += ms
+        sql = _compactar_sql(statement)
+        self.por_sql[sql] += 1
+        if len(self.lentas) < _TOP_SQL or ms > self.lentas[-1][0]:
+            self.lentas.append((ms, sql, _redigir_params(params)))
+            self.lentas.sort(key=lambda x: x[0], reverse=True)
+            del self.lentas[_TOP_SQL:]
+
+    def app_ms(self) -> float:
+        fim = self.t_resposta or time.perf_counter()
+        return (fim - self.t0) * 1000.0
+
+    def serializacao_ms(self) -> Optional[float]:
+        if self.t_endpoint_fim is None or self.t_resposta is None:
+            return None
+        return max(0.0, (self.t_resposta - self.t_endpoint_fim) * 1000.0)
+
+    def fila_ms(self) -> Optional[float]:
+        if self.t_thread is None:
+            return None
+        return max(0.0, (self.t_thread - self.t0) * 1000.0)
+
+
+_atual: ContextVar[Optional[Medicao]] = ContextVar("poprua_perf_medicao", default=None)
+
+
+def medicao_atual() -> Optional[Medicao]:
+    return _atual.get()
+
+
+_ESPACOS = re.compile(r"\s+")
+
+
+def _compactar_sql(statement: str) -> str:
+    s = _ESPACOS.sub(" ", str(statement or "")).strip()
+    return s if len(s) <= _SQL_MAX_CHARS else s[:_SQL_MAX_CHARS] + "…"
+
+
+def _redigir_params(params: Any) -> List[str]:
+    """Só o tipo de cada parâmetro (nunca o valor)."""
+    if params is None:
+        return []
+    if isinstance(params, (list, tuple)) and params and isinstance(params[0], (list, tuple, dict)):
+        return [f"<executemany x{len(params)}>"]
+    if isinstance(params, dict):
+        return [f"{k}=<{type(v).__name__}>" for k, v in params.items()]
+    if isinstance(params, (list, tuple)):
+        return [f"<{type(v).__name__}>" for v in params]
+    return [f"<{type(params).__name__}>"]
+
+
+# =========================================================
+# SQLAlchemy
+# =========================================================
+
+_instalados: set = set()
+
+
+def instalar_sql(engine: Any) -> None:
+    """Pendura os eventos de cursor no engine (idempotente)."""
+    from sqlalchemy import event
+
+    if id(engine) in _instalados:
+        return
+    _instalados.add(id(engine))
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _antes(conn, cursor, statement, parameters, context, executemany):  # noqa: ANN001
+        if _atual.get() is not None:
+            conn.info.setdefault("_perf_t0", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _depois(conn, cursor, statement, parameters, context, executemany):  # noqa: ANN001
+        m = _atual.get()
+        if m is None:
+            return
+        pilha = conn.info.get("_perf_t0")
+        if not pilha:
+            return
+        ms = (time.perf_counter() - pilha.pop()) * 1000.0
+        m.registrar_sql(statement, parameters, ms)
+
+
+# =========================================================
+# Fim do endpoint (separa execução de serialização)
+# =========================================================
+
+def _marcar_fim_endpoint() -> None:
+    m = _atual.get()
+    if m is not None:
+        m.t_endpoint_fim = time.perf_counter()
+
+
+def instrumentar_rotas(app: Any) -> None:
+    """Envolve o endpoint de cada APIRoute para marcar quando ele retorna."""
+    try:
+        from fastapi.routing import APIRoute
+    except Exception:  # pragma: no cover
+        return
+
+    for route in getattr(app, "routes", []):
+        if not isinstance(route, APIRoute):
+            continue
+        dep = getattr(route, "dependant", None)
+        call = getattr(dep, "call", None)
+        if call is None or getattr(call, "_poprua_perf", False):
+            continue
+
+        if inspect.iscoroutinefunction(call):
+            @functools.wraps(call)
+            async def _wrap(*a: Any, __call=call, **kw: Any) -> Any:
+                try:
+                    return await __call(*a, **kw)
+                finally:
+                    _marcar_fim_endpoint()
+        else:
+            @functools.wraps(call)
+            def _wrap(*a: Any, __call=call, **kw: Any) -> Any:
+                try:
+                    return __call(*a, **kw)
+                finally:
+                    _marcar_fim_endpoint()
+
+        _wrap._poprua_perf = True  # type: ignore[attr-defined]
+        dep.call = _wrap
+
+
+# =========================================================
+# Estatísticas por rota (janela móvel)
+# =========================================================
+
+class _Fatia:
+    __slots__ = ("minuto", "n", "baldes", "soma_ms", "max_ms", "soma_db_ms", "soma_queries", "max_queries", "soma_bytes", "soma_ser_ms", "n_ser", "soma_fila_ms", "max_fila_ms", "n_fila", "erros")
+
+    def __init__(self, minuto: int) -> None:
+        self.minuto = minuto
+        self.n = 0
+        self.baldes = [0] * (len(BALDES_MS) + 1)
+        self.soma_ms = 0.0
+        self.max_ms = 0.0
+        self.soma_db_ms = 0.0
+        self.soma_queries = 0
+        self.max_queries = 0
+        self.soma_bytes = 0
+        self.soma_ser_ms = 0.0
+        self.n_ser = 0
+        self.soma_fila_ms = 0.0
+        self.max_fila_ms = 0.0
+        self.n_fila = 0
+        self.erros = 0
+
+
+def _balde(ms: float) -> int:
+    for i, lim in enumerate(BALDES_MS):
+        if ms <= lim:
+            return i
+    return len(BALDES_MS)
+
+
+def _percentil_hist(baldes: List[int], p: float) -> Optional[float]:
+    """Percentil aproximado: limite superior do balde que contém a posição."""
+    total = sum(baldes)
+    if not total:
+        return None
+    alvo = p * total
+    acc = 0
+    for i, c in enumerate(baldes):
+        acc += c
+        if acc >= alvo:
+            return float(BALDES_MS[i]) if i < len(BALDES_MS) else float("inf")
+    return float("inf")
+
+
+class Estatisticas:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._rotas: Dict[str, Deque[_Fatia]] = {}
+        self._lentas: Deque[Dict[str, Any]] = deque(maxlen=_MAX_AMOSTRAS_LENTAS)
+
+    def registrar(self, rota: str, status: int, m: Medicao, bytes_resposta: int) -> None:
+        ms = m.app_ms()
+        ser = m.serializacao_ms()
+        fila = m.fila_ms()
+        minuto = int(time.time() // 60)
+        janela = _janela_min()
+        with self._lock:
+            fatias = self._rotas.setdefault(rota, deque())
+            if not fatias or fatias[-1].minuto != minuto:
+                fatias.append(_Fatia(minuto))
+            while fatias and fatias[0].minuto <= minuto - janela:
+                fatias.popleft()
+            f = fatias[-1]
+            f.n += 1
+            f.baldes[_balde(ms)] += 1
+            f.soma_ms += ms
+            f.max_ms = max(f.max_ms, ms)
+            f.soma_db_ms += m.db_ms
+            f.soma_queries += m.queries
+            f.max_queries = max(f.max_queries, m.queries)
+            f.soma_bytes += int(bytes_resposta)
+            if ser is not None:
+                f.soma_ser_ms += ser
+                f.n_ser += 1
+            if fila is not None:
+                f.soma_fila_ms += fila
+                f.max_fila_ms = max(f.max_fila_ms, fila)
+                f.n_fila += 1
+            if status >= 500:
+                f.erros += 1
+
+            if ms >= _lento_ms():
+                repetida = m.por_sql.most_common(1)
+                self._lentas.append(
+                    {
+                        "em": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                        "rota": rota,
+                        "status": status,
+                        "ms": round(ms, 1),
+                        "db_ms": round(m.db_ms, 1),
+                        "queries": m.queries,
+                        "serializacao_ms": round(ser, 1) if ser is not None else None,
+                        "fila_ms": round(fila, 1) if fila is not None else None,
+                        "bytes": int(bytes_resposta),
+                        "sql_lentas": [{"ms": round(x[0], 2), "sql": x[1], "params": x[2]} for x in m.lentas],
+                        "repetida_max": {"sql": repetida[0][0], "vezes": repetida[0][1]} if repetida else None,
+                    }
+                )
+
+    def resumo(self, top: int = 50) -> Dict[str, Any]:
+        minuto = int(time.time() // 60)
+        janela = _janela_min()
+        rotas: List[Dict[str, Any]] = []
+        with self._lock:
+            for rota, fatias in self._rotas.items():
+                vivas = [f for f in fatias if f.minuto > minuto - janela]
+                n = sum(f.n for f in vivas)
+                if not n:
+                    continue
+                baldes = [sum(f.baldes[i] for f in vivas) for i in range(len(BALDES_MS) + 1)]
+                n_ser = sum(f.n_ser for f in vivas)
+                n_fila = sum(f.n_fila for f in vivas)
+                soma_ms = sum(f.soma_ms for f in vivas)
+                rotas.append(
+                    {
+                        "rota": rota,
+                        "n": n,
+                        "erros_5xx": sum(f.erros for f in vivas),
+                        "total_ms": round(soma_ms, 1),
+                        "media_ms": round(soma_ms / n, 2),
+                        "p50_ms": _percentil_hist(baldes, 0.50),
+                        "p95_ms": _percentil_hist(baldes, 0.95),
+                        "p99_ms": _percentil_hist(baldes, 0.99),
+                        "max_ms": round(max(f.max_ms for f in vivas), 1),
+                        "db_ms_media": round(sum(f.soma_db_ms for f in vivas) / n, 2),
+                        "queries_media": round(sum(f.soma_queries for f in vivas) / n, 1),
+                        "queries_max": max(f.max_queries for f in vivas),
+                        "serializacao_ms_media": round(sum(f.soma_ser_ms for f in vivas) / n_ser, 2) if n_ser else None,
+                        "fila_ms_media": round(sum(f.soma_fila_ms for f in vivas) / n_fila, 2) if n_fila else None,
+                        "fila_ms_max": round(max(f.max_fila_ms for f in vivas), 1) if n_fila else None,
+                        "bytes_media": int(sum(f.soma_bytes for f in vivas) / n),
+                        "histograma": {
+                            (f"<={int(BALDES_MS[i])}ms" if i < len(BALDES_MS) else f">{int(BALDES_MS[-1])}ms"): c
+                            for i, c in enumerate(baldes)
+                        },
+                    }
+                )
+            lentas = list(self._lentas)
+
+        rotas.sort(key=lambda r: r["total_ms"], reverse=True)
+        return {
+            "janela_min": janela,
+            "lento_ms": _lento_ms(),
+            "rotas": rotas[: max(1, int(top))],
+            "lentas": list(reversed(lentas)),
+        }
+
+    def limpar(self) -> None:
+        with self._lock:
+            self._rotas.clear()
+            self._lentas.clear()
+
+
+estatisticas = Estatisticas()
+
+
+# =========================================================
+# Middleware ASGI
+# =========================================================
+
+def _server_timing(m: Medicao) -> str:
+    partes = [f'db;dur={m.db_ms:.1f};desc="{m.queries} queries"', f"app;dur={m.app_ms():.1f}"]
+    ser = m.serializacao_ms()
+    if ser is not None:
+        partes.append(f"ser;dur={ser:.1f}")
+    fila = m.fila_ms()
+    if fila is not None:
+        partes.append(f"fila;dur={fila:.1f}")
+    return ", ".join(partes)
+
+
+class PerfMiddleware:
+    """ASGI puro (não BaseHTTPMiddleware): não bufferiza streaming e preserva contextvars."""
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope.get("type") != "http":
+            await self.app(scope, receive, send)
+            return
+
+        m = Medicao()
+        token = _atual.set(m)
+        estado = {"status": 500, "bytes": 0}
+
+        async def _send(message: Dict[str, Any]) -> None:
+            tipo = message.get("type")
+            if tipo == "http.response.start":
+                m.t_resposta = time.perf_counter()
+                estado["status"] = int(message.get("status") or 0)
+                headers = list(message.get("headers") or [])
+                headers.append((b"server-timing", _server_timing(m).encode("latin-1")))
+                message = dict(message, headers=headers)
+            elif tipo == "http.response.body":
+                estado["bytes"] += len(message.get("body") or b"")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            _atual.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", None)
+            if path:
+                rota = f"{scope.get('method', '')} {path}"
+                try:
+                    estatisticas.registrar(rota, estado["status"], m, estado["bytes"])
+                except Exception:
+                    pass
@@ -0,0 +1,426 @@
+# app/core/projecoes.py
+"""
+Projeções: read models (contadores, agregados) mantidos a partir de eventos de
+domínio, em vez de recalculados a cada request.
+
+Cada projeção declara as tabelas-fonte que observa e um `aplicar(session,
+eventos)`. Os eventos saem sozinhos do unit of work do ORM:
+
+  before_flush  guarda o estado ANTES das linhas alteradas/excluídas (o que não
+                estiver carregado vem do banco, uma consulta por linha)
+  after_flush   monta Evento(tabela, op, id, antes, depois, campos) para
+                inserts/updates/deletes das tabelas observadas
+  before_commit projeções síncronas aplicam os eventos na MESMA transação
+                (o read model nunca fica à frente/atrás da fonte)
+  after_commit  projeções assíncronas recebem os eventos numa fila; uma
+                thread aplica em sessão própria e, se falhar, chama o
+                `invalidar` da projeção (a próxima leitura reconstrói)
+  rollback      descarta o que estava pendente
+
+Escrita fora do ORM (insert()/update() em lote via session.execute) não gera
+evento: quem grava assim chama `emitir(session, tabela, depois=linha)` ou o
+`invalidar` da projeção.
+
+Toda projeção tem `reconstruir(session, municipio_id)` a partir das tabelas
+fonte: `python scripts/projecoes.py --listar | <nome> | --todas`.
+
+Registrar uma projeção nova: `projecoes.registrar(Projecao(...))` no fim do
+módulo do serviço + o módulo em MODULOS (carregados no primeiro flush, como os
+models no boot rápido). Estado da fila/tempos: GET /admin/perf -> projecoes.
+"""
+
+from __future__ import annotations
+
+import importlib
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import event, inspect as sa_inspect, select
+from sqlalchemy.orm import Session as OrmSession
+from sqlalchemy.orm.base import NO_VALUE
+
+# serviços que registram projeções (importados no primeiro flush)
+MODULOS: Tuple[str, ...] = (
+    "app.services.cras_tarefas_contadores",
+    "app.services.rede_metricas",
+    "app.services.cras_relatorios_cache",
+    "app.core.versoes",
+)
+
+_MAX_RODADAS = 10  # projeção que gera evento para outra: flush -> aplicar, até estabilizar
+_ANTES = "projecoes_antes"
+_SINC = "projecoes_sinc"
+_ASSINC = "projecoes_assinc"
+
+
+@dataclass(frozen=True)
+class Evento:
+    tabela: str
+    op: str  # criado|alterado|excluido
+    id: Any
+    antes: Optional[Dict[str, Any]]  # None em criado
+    depois: Optional[Dict[str, Any]]  # None em excluido
+    campos: Tuple[str, ...] = ()  # colunas que mudaram (alterado)
+
+
+@dataclass
+class Projecao:
+    nome: str
+    tabelas: Tuple[str, ...]
+    aplicar: Callable[[Any, List[Evento]], None]
+    reconstruir: Callable[[Any, Optional[int]], Any]
+    descricao: str = ""
+    assincrona: bool = False
+    invalidar: Optional[Callable[[Any], None]] = None
+
+
+@dataclass
+class _Estat:
+    eventos: int = 0
+    lotes: int = 0
+    ms: float = 0.0
+    falhas: int = 0
+    ultima_falha: Optional[str] = None
+    reconstrucoes: int = 0
+
+
+_REGISTRO: Dict[str, Projecao] = {}
+_POR_TABELA: Dict[str, List[Projecao]] = {}
+_ESTAT: Dict[str, _Estat] = {}
+_lock = threading.Lock()
+_carregado = False
+
+
+def registrar(p: Projecao) -> Projecao:
+    with _lock:
+        _REGISTRO[p.nome] = p
+        _ESTAT.setdefault(p.nome, _Estat())
+        _POR_TABELA.clear()
+        for q in _REGISTRO.values():
+            for t in q.tabelas:
+                _POR_TABELA.setdefault(t, []).append(q)
+    return p
+
+
+def _carregar() -> None:
+    global _carregado
+    if _carregado:
+        return
+    _carregado = True
+    for m in MODULOS:
+        try:
+            importlib.import_module(m)
+        except Exception as e:
+            print(f"WARN: projecoes: {m} não carregou:", e)
+
+
+def projecoes() -> Dict[str, Projecao]:
+    _carregar()
+    return dict(_REGISTRO)
+
+
+# ============================
+# Captura (unit of work)
+# ============================
+def _tabela(obj: Any) -> Optional[str]:
+    t = getattr(obj, "__table__", None)
+    return getattr(t, "name", None)
+
+
+def _observada(obj: Any) -> bool:
+    return _tabela(obj) in _POR_TABELA
+
+
+def _colunas(state: Any) -> List[str]:
+    return [a.key for a in state.mapper.column_attrs]
+
+
+def _id(state: Any) -> Any:
+    ident = state.identity or state.mapper.primary_key_from_instance(state.obj())
+    if ident is None:
+        return None
+    return ident[0] if len(ident) == 1 else tuple(ident)
+
+
+def _estado_antes(session: Any, obj: Any) -> Dict[str, Any]:
+    """Valores como estão no banco (antes deste flush)."""
+    state = sa_inspect(obj)
+    cols = _colunas(state)
+    antes: Dict[str, Any] = {}
+    for k in cols:
+        if k in state.committed_state:
+            v = state.committed_state[k]
+            if v is not NO_VALUE:
+                antes[k] = v
+        elif k in state.dict:
+            antes[k] = state.dict[k]
+    faltam = [k for k in cols if k not in antes]
+    if faltam and state.identity is not None:
+        # atributo expirado/nunca lido e já alterado: lê a linha atual
+        t = obj.__table__
+        pk = list(t.primary_key.columns)
+        cond = [c == v for c, v in zip(pk, state.identity)]
+        row = session.connection().execute(select(t).where(*cond)).mappings().first()
+        if row is not None:
+            for k in faltam:
+                col = state.mapper.get_property(k).columns[0]
+                antes[k] = row.get(col.name)
+    return antes
+
+
+def _estado_atual(obj: Any, antes: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Valores após o flush; o que não está carregado no objeto não mudou (vem de `antes`)."""
+    state = sa_inspect(obj)
+    base = antes or {}
+    return {k: state.dict[k] if k in state.dict else base.get(k) for k in _colunas(state)}
+
+
+def _fila_da_sessao(session: Any, chave: str) -> List[Evento]:
+    return session.info.setdefault(chave, [])
+
+
+def _enfileirar(session: Any, ev: Evento) -> None:
+    sinc = assinc = False
+    for p in _POR_TABELA.get(ev.tabela, ()):
+        if p.assincrona:
+            assinc = True
+        else:
+            sinc = True
+    if sinc:
+        _fila_da_sessao(session, _SINC).append(ev)
+    if assinc:
+        _fila_da_sessao(session, _ASSINC).append(ev)
+
+
+def _antes_do_flush(session: Any, flush_context: Any, instances: Any) -> None:
+    _carregar()
+    if not _POR_TABELA:
+        return
+    guardados: Dict[int, Dict[str, Any]] = session.info.setdefault(_ANTES, {})
+    for obj in session.dirty:
+        if _observada(obj) and id(obj) not in guardados and session.is_modified(obj, include_collections=False):
+            guardados[id(obj)] = _estado_antes(session, obj)
+    for obj in session.deleted:
+        if _observada(obj) and id(obj) not in guardados:
+            guardados[id(obj)] = _estado_antes(session, obj)
+
+
+def _depois_do_flush(session: Any, flush_context: Any) -> None:
+    guardados: Dict[int, Dict[str, Any]] = session.info.pop(_ANTES, None) or {}
+    if not _POR_TABELA:
+        return
+    for obj in session.new:
+        if _observada(obj):
+            state = sa_inspect(obj)
+            _enfileirar(session, Evento(_tabela(obj) or "", "criado", _id(state), None, _estado_atual(obj)))
+    for obj in session.dirty:
+        antes = guardados.get(id(obj))
+        if antes is None:
+            continue
+        depois = _estado_atual(obj, antes)
+        campos = tuple(k for k in depois if k in antes and antes[k] != depois[k])
+        if campos:
+            _enfileirar(session, Evento(_tabela(obj) or "", "alterado", _id(sa_inspect(obj)), antes, depois, campos))
+    for obj in session.deleted:
+        antes = guardados.get(id(obj))
+        if antes is not None:
+            _enfileirar(session, Evento(_tabela(obj) or "", "excluido", _id(sa_inspect(obj)), antes, None))
+
+
+def emitir(
+    session: Any,
+    tabela: str,
+    *,
+    antes: Optional[Dict[str, Any]] = None,
+    depois: Optional[Dict[str, Any]] = None,
+    id: Any = None,
+) -> None:
+    """Evento de escrita feita fora do ORM (ex.: insert() em lote). Aplicado no commit."""
+    _carregar()
+    if tabela not in _POR_TABELA:
+        return
+    op = "criado" if antes is None else ("excluido" if depois is None else "alterado")
+    if id is None:
+        id = (depois or antes or {}).get("id")
+    campos = tuple(k for k in (depois or {}) if antes is not None and antes.get(k) != depois.get(k)) if op == "alterado" else ()
+    _enfileirar(session, Evento(tabela, op, id, antes, depois, campos))
+
+
+# ============================
+# Aplicação
+# ============================
+def _aplicar(session: Any, p: Projecao, eventos: List[Evento]) -> None:
+    evs = [e for e in eventos if e.tabela in p.tabelas]
+    if not evs:
+        return
+    t0 = time.perf_counter()
+    p.aplicar(session, evs)
+    ms = (time.perf_counter() - t0) * 1000.0
+    with _lock:
+        st = _ESTAT[p.nome]
+        st.eventos += len(evs)
+        st.lotes += 1
+        st.ms += ms
+
+
+def _antes_do_commit(session: Any) -> None:
+    for _ in range(_MAX_RODADAS):
+        session.flush()
+        eventos = session.info.pop(_SINC, None)
+        if not eventos:
+            return
+        for p in list(_REGISTRO.values()):
+            if not p.assincrona:
+                _aplicar(session, p, eventos)
+    print(f"WARN: projecoes: eventos ainda pendentes após {_MAX_RODADAS} rodadas (projeções em ciclo?)")
+
+
+def _depois_do_commit(session: Any) -> None:
+    eventos = session.info.pop(_ASSINC, None)
+    if eventos:
+        fila.enfileirar(eventos)
+
+
+def _depois_do_rollback(session: Any) -> None:
+    for k in (_ANTES, _SINC, _ASSINC):
+        session.info.pop(k, None)
+
+
+class _Fila:
+    """Uma thread aplica as projeções assíncronas, em ordem, numa sessão própria."""
+
+    def __init__(self) -> None:
+        self._q: "queue.Queue[Optional[Tuple[float, List[Evento]]]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.espera_ms_max = 0.0
+
+    def enfileirar(self, eventos: List[Evento]) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._rodar, name="poprua-projecoes", daemon=True)
+                self._thread.start()
+        self._q.put((time.perf_counter(), eventos))
+
+    def _rodar(self) -> None:
+        from sqlmodel import Session
+
+        from app.core.db import engine
+
+        while True:
+            item = self._q.get()
+            try:
+                if item is None:
+                    return
+                t_fila, eventos = item
+                self.espera_ms_max = max(self.espera_ms_max, (time.perf_counter() - t_fila) * 1000.0)
+                for p in list(_REGISTRO.values()):
+                    if not p.assincrona:
+                        continue
+                    with Session(engine) as s:
+                        try:
+                            _aplicar(s, p, eventos)
+                            s.commit()
+                        except Exception as e:
+                            s.rollback()
+                            _falhou(s, p, e)
+            finally:
+                self._q.task_done()
+
+    def pendentes(self) -> int:
+        return self._q.qsize()
+
+    def drenar(self, timeout_s: float = 30.0) -> bool:
+        """Espera a fila esvaziar (scripts/testes e shutdown)."""
+        fim = time.time() + timeout_s
+        while self._q.unfinished_tasks and time.time() < fim:
+            time.sleep(0.02)
+        return not self._q.unfinished_tasks
+
+    def parar(self, timeout_s: float = 5.0) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            self.drenar(timeout_s)
+            self._q.put(None)
+
+
+fila = _Fila()
+
+
+def _falhou(session: Any, p: Projecao, erro: Exception) -> None:
+    with _lock:
+        st = _ESTAT[p.nome]
+        st.falhas += 1
+        st.ultima_falha = f"{type(erro).__name__}: {erro}"
+    print(f"WARN: projecoes: {p.nome} falhou ao aplicar eventos:", erro)
+    if p.invalidar is None:
+        return
+    try:
+        p.invalidar(session)
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        print(f"WARN: projecoes: {p.nome}: invalidar também falhou:", e)
+
+
+# ============================
+# Instalação / reconstrução / resumo
+# ============================
+_OUVINTES = (
+    ("before_flush", _antes_do_flush),
+    ("after_flush", _depois_do_flush),
+    ("before_commit", _antes_do_commit),
+    ("after_commit", _depois_do_commit),
+    ("after_rollback", _depois_do_rollback),
+)
+
+
+def instalar() -> None:
+    """Liga a captura de eventos em todas as sessões (idempotente; chamado no init_db)."""
+    for nome, fn in _OUVINTES:
+        if not event.contains(OrmSession, nome, fn):
+            event.listen(OrmSession, nome, fn)
+
+
+def reconstruir(nome: str, municipio_id: Optional[int] = None, engine: Any = None) -> Any:
+    """Refaz a projeção a partir das tabelas fonte (commita)."""
+    from sqlmodel import Session
+
+    p = projecoes().get(nome)
+    if p is None:
+        raise KeyError(nome)
+    if engine is None:
+        from app.core.db import engine as engine_principal
+
+        engine = engine_principal
+    with Session(engine) as s:
+        out = p.reconstruir(s, municipio_id)
+        s.commit()
+    with _lock:
+        _ESTAT[p.nome].reconstrucoes += 1
+    return out
+
+
+def resumo() -> Dict[str, Any]:
+    with _lock:
+        itens = {
+            nome: {
+                "tabelas": list(p.tabelas),
+                "assincrona": p.assincrona,
+                "eventos": _ESTAT[nome].eventos,
+                "lotes": _ESTAT[nome].lotes,
+                "ms_total": round(_ESTAT[nome].ms, 1),
+                "falhas": _ESTAT[nome].falhas,
+                "ultima_falha": _ESTAT[nome].ultima_falha,
+                "reconstrucoes": _ESTAT[nome].reconstrucoes,
+            }
+            for nome, p in _REGISTRO.items()
+        }
+    return {
+        "instalado": event.contains(OrmSession, "after_flush", _depois_do_flush),
+        "fila_pendentes": fila.pendentes(),
+        "fila_espera_ms_max": round(fila.espera_ms_max, 1),
+        "projecoes": itens,
+    }
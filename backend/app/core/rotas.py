@@ -0,0 +1,288 @@
+# app/core/rotas.py
+"""
+Registro dos routers da API e carga sob demanda.
+
+O main.py importava ~45 módulos de router no boot (e, com eles, models,
+services, pydantic schemas...). Cada worker do uvicorn pagava isso ao subir,
+mesmo que só fosse atender /health ou meia dúzia de telas.
+
+Aqui cada router vira uma entrada (módulo + prefixo) na MESMA ordem de antes.
+Com a carga sob demanda (padrão), o módulo só é importado quando chega a
+primeira requisição cujo caminho começa com o prefixo dele:
+
+- todas as entradas com prefixo compatível são carregadas juntas (vários
+  routers dividem "/cras", "/pessoas", "/casos", "/gestao"), então o roteamento
+  enxerga exatamente as mesmas rotas candidatas do boot antigo
+- as rotas entram em app.router.routes na posição da ordem do registro, não no
+  fim: quem ganhava empate de caminho continua ganhando
+- /openapi.json, /docs e /redoc carregam tudo
+- se um router tiver rota fora do prefixo declarado, avisa e carrega tudo
+- o import roda numa thread (anyio.to_thread), não no event loop: a primeira
+  requisição do prefixo espera, as outras em andamento seguem. As rotas novas
+  são montadas numa cópia da lista e publicadas de uma vez (quem está
+  roteando nunca vê a lista pela metade)
+
+Desligue com: export POPRUA_ROTAS_LAZY=0   (boot carrega tudo, como antes)
+Tempos de import por router no log: export POPRUA_STARTUP_PERFIL=1
+"""
+
+from __future__ import annotations
+
+import copy
+import importlib
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import anyio.to_thread
+
+
+@dataclass(frozen=True)
+class Rota:
+    modulo: str
+    prefixo: str
+    opcional: bool = False  # módulo ausente/quebrado não derruba a API
+
+
+# Ordem = ordem de include_router (empates de caminho resolvem por ela).
+ROTAS: List[Rota] = [
+    Rota("app.routers.auth", "/auth"),
+    Rota("app.routers.cras_tarefas", "/cras/tarefas"),
+    Rota("app.routers.municipios", "/municipios"),
+    Rota("app.routers.pessoas", "/pessoas"),
+    Rota("app.routers.atendimentos", "/pessoas"),
+    Rota("app.routers.casos", "/casos"),
+    Rota("app.routers.acolhimentos", "/pessoas"),
+    Rota("app.routers.familia_router", "/pessoas"),
+    Rota("app.routers.encaminhamentos", "/encaminhamentos"),
+    Rota("app.routers.linha_metro", "/casos"),
+    Rota("app.routers.saude", "/saude"),
+    Rota("app.routers.protocolo", "/casos"),
+    Rota("app.routers.dashboard", "/dashboard"),
+    Rota("app.routers.usuarios", "/usuarios", opcional=True),
+    Rota("app.routers.cras", "/cras"),
+    Rota("app.routers.cras_prontuario", "/cras/prontuario", opcional=True),
+    Rota("app.routers.cras_pes", "/cras/pes", opcional=True),
+    Rota("app.routers.cras_rma", "/cras/rma", opcional=True),
+    Rota("app.routers.cras_casos", "/cras"),
+    Rota("app.routers.cras_cadastros", "/cras/cadastros"),
+    Rota("app.routers.cras_programas", "/cras"),
+    Rota("app.routers.cras_linha_metro", "/cras"),
+    Rota("app.routers.cras_cadunico", "/cras/cadunico"),
+    Rota("app.routers.cras_encaminhamentos", "/cras/encaminhamentos"),
+    Rota("app.routers.cras_pia", "/cras"),
+    Rota("app.routers.cras_scfv", "/cras/scfv"),
+    Rota("app.routers.cras_ficha", "/cras/ficha"),
+    Rota("app.routers.cras_identidade", "/cras/identidade"),
+    Rota("app.routers.cras_ficha_uploads", "/cras/ficha", opcional=True),
+    Rota("app.routers.cras_relatorios", "/cras/relatorios"),
+    Rota("app.routers.cras_automacoes", "/automacoes", opcional=True),
+    Rota("app.routers.creas", "/creas", opcional=True),
+    Rota("app.routers.osc", "/osc", opcional=True),
+    Rota("app.routers.terceiro_setor", "/terceiro-setor", opcional=True),
+    Rota("app.routers.config", "/config", opcional=True),
+    Rota("app.routers.config_documentos", "/config/documentos", opcional=True),
+    Rota("app.routers.branding", "/config/branding", opcional=True),
+    Rota("app.routers.documentos", "/documentos", opcional=True),
+    Rota("app.routers.ia", "/ia", opcional=True),
+    Rota("app.routers.gestao_fila_plus", "/gestao", opcional=True),
+    Rota("app.routers.gestao_fila_lote", "/gestao/fila/lote", opcional=True),
+    Rota("app.routers.gestao_automacoes", "/gestao/automacoes", opcional=True),
+    Rota("app.routers.suas_encaminhamentos", "/suas/encaminhamentos", opcional=True),
+    Rota("app.routers.gestao", "/gestao"),
+    Rota("app.routers.exportacao", "/exportacao", opcional=True),
+    Rota("app.routers.admin_perf", "/admin"),
+]
+
+
+def _env_on(nome: str, default: str = "") -> bool:
+    return str(os.getenv(nome, default)).strip().lower() in ("1", "true", "yes", "on")
+
+
+def lazy_habilitado() -> bool:
+    return _env_on("POPRUA_ROTAS_LAZY", "1")
+
+
+def perfil_habilitado() -> bool:
+    return _env_on("POPRUA_STARTUP_PERFIL")
+
+
+def _casa(caminho: str, prefixo: str) -> bool:
+    p = caminho.rstrip("/") or "/"
+    return p == prefixo or p.startswith(prefixo + "/")
+
+
+class CarregadorRotas:
+    """Inclui os routers do registro no app, todos de uma vez ou por prefixo."""
+
+    def __init__(
+        self,
+        app: Any,
+        rotas: Sequence[Rota] = ROTAS,
+        ao_carregar: Optional[Callable[[Any], None]] = None,
+    ) -> None:
+        self.app = app
+        self.rotas = list(rotas)
+        self.ao_carregar = ao_carregar
+        self.completo = False
+        self.tempos_ms: Dict[str, float] = {}
+        self.falhas: Dict[str, str] = {}
+        self._incluidas: Dict[int, List[Any]] = {}  # índice no registro -> rotas do router
+        self._tentadas: set = set()
+        self._lock = threading.RLock()
+        self._sempre_tudo = {
+            u for u in (getattr(app, "openapi_url", None), getattr(app, "docs_url", None), getattr(app, "redoc_url", None)) if u
+        }
+
+    # ---------------- carga ----------------
+    def _importar(self, idx: int) -> Optional[Any]:
+        rota = self.rotas[idx]
+        t0 = time.perf_counter()
+        try:
+            mod = importlib.import_module(rota.modulo)
+            router = getattr(mod, "router")
+        except Exception as e:
+            if not rota.opcional:
+                raise
+            self.falhas[rota.modulo] = f"{type(e).__name__}: {e}"
+            return None
+        finally:
+            self.tempos_ms[rota.modulo] = round((time.perf_counter() - t0) * 1000, 1)
+        return router
+
+    def _posicao(self, idx: int, rotas_app: List[Any]) -> int:
+        """Onde inserir as rotas da entrada `idx`: antes da próxima entrada já carregada."""
+        for j in sorted(k for k in self._incluidas if k > idx):
+            primeiras = self._incluidas[j]
+            if not primeiras:
+                continue
+            alvo = primeiras[0]
+            for pos, r in enumerate(rotas_app):
+                if r is alvo:
+                    return pos
+        return len(rotas_app)
+
+    def _incluir(self, idx: int, trabalho: Any) -> bool:
+        """Importa e inclui uma entrada em `trabalho` (cópia do app.router).
+        False = router com rota fora do prefixo."""
+        router = self._importar(idx)
+        self._tentadas.add(idx)
+        if router is None:
+            self._incluidas[idx] = []
+            return True
+
+        rotas_app = trabalho.routes
+        antes = len(rotas_app)
+        trabalho.include_router(router)
+        novas = rotas_app[antes:]
+        del rotas_app[antes:]
+        pos = self._posicao(idx, rotas_app)
+        rotas_app[pos:pos] = novas
+        self._incluidas[idx] = list(novas)
+
+        prefixo = self.rotas[idx].prefixo
+        fora = [getattr(r, "path", "") for r in novas if not _casa(getattr(r, "path", ""), prefixo)]
+        if fora:
+            print(f"WARN: rotas: {self.rotas[idx].modulo} tem rotas fora de {prefixo!r} ({fora[:3]}); carregando tudo")
+            return False
+        return True
+
+    def _finalizar(self, indices: List[int]) -> None:
+        if not indices:
+            return
+        # schema do OpenAPI é cacheado no app; as rotas novas precisam aparecer nele
+        self.app.openapi_schema = None
+        if self.ao_carregar is not None:
+            self.ao_carregar(self.app)
+        if perfil_habilitado():
+            partes = " ".join(f"{self.rotas[i].modulo.rsplit('.', 1)[-1]}={self.tempos_ms.get(self.rotas[i].modulo, 0):.0f}ms" for i in indices)
+            print(f"INFO: rotas carregadas: {partes}")
+
+    def carregar(self, indices: Sequence[int]) -> None:
+        with self._lock:
+            # cópia rasa do router (mesmas configs do app) com lista própria;
+            # app.router.routes só troca no fim, numa atribuição
+            trabalho = copy.copy(self.app.router)
+            trabalho.routes = list(self.app.router.routes)
+            feitas: List[int] = []
+            tudo = False
+            try:
+                for idx in indices:
+                    if idx in self._tentadas:
+                        continue
+                    if not self._incluir(idx, trabalho):
+                        tudo = True
+                    feitas.append(idx)
+            finally:
+                if feitas:
+                    self.app.router.routes = trabalho.routes
+                    self.app.router.lifespan_context = trabalho.lifespan_context
+            self._finalizar(feitas)
+            if tudo:
+                self.carregar_tudo()
+
+    def carregar_tudo(self) -> None:
+        with self._lock:
+            if self.completo:
+                return
+            self.carregar(range(len(self.rotas)))
+            self.completo = True
+
+    def _pendentes(self, caminho: str) -> List[int]:
+        return [i for i, r in enumerate(self.rotas) if i not in self._tentadas and _casa(caminho, r.prefixo)]
+
+    def precisa(self, caminho: str) -> bool:
+        """Há router a importar para `caminho`? (barato; roda no event loop)"""
+        if self.completo:
+            return False
+        return caminho in self._sempre_tudo or bool(self._pendentes(caminho))
+
+    def garantir(self, caminho: str) -> None:
+        """Carrega as entradas que podem atender `caminho` (chamado antes do roteamento).
+
+        Síncrono (importa módulos): no servidor roda numa thread, pelo middleware.
+        """
+        if self.completo:
+            return
+        if caminho in self._sempre_tudo:
+            self.carregar_tudo()
+            return
+        pendentes = self._pendentes(caminho)
+        if pendentes:
+            self.carregar(pendentes)
+
+    def resumo(self) -> Dict[str, Any]:
+        return {
+            "lazy": lazy_habilitado(),
+            "completo": self.completo,
+            "carregados": [self.rotas[i].modulo for i in sorted(self._incluidas)],
+            "pendentes": [r.modulo for i, r in enumerate(self.rotas) if i not in self._tentadas],
+            "falhas": dict(self.falhas),
+            "import_ms": dict(self.tempos_ms),
+        }
+
+
+class RotasSobDemandaMiddleware:
+    """ASGI puro: antes de rotear, garante que os routers do prefixo estão carregados.
+
+    O import vai para o threadpool (anyio): o event loop continua atendendo as
+    outras requisições (verificação pública, IA...) enquanto o módulo carrega.
+    Duas requisições do mesmo prefixo: a segunda espera o lock do carregador
+    na thread dela e encontra tudo pronto.
+    """
+
+    def __init__(self, app: Any, carregador: CarregadorRotas) -> None:
+        self.app = app
+        self.carregador = carregador
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope.get("type") in ("http", "websocket") and not self.carregador.completo:
+            caminho = scope.get("path") or "/"
+            raiz = scope.get("root_path") or ""
+            if raiz and caminho.startswith(raiz):
+                caminho = caminho[len(raiz):] or "/"
+            if self.carregador.precisa(caminho):
+                await anyio.to_thread.run_sync(self.carregador.garantir, caminho)
+        await self.app(scope, receive, send)
@@ -0,0 +1,233 @@
+# app/core/versoes.py
+"""
+ETag / GET condicional para leituras que quase nunca mudam (configuração,
+unidades, municípios, templates, modelos e etapas).
+
+Essas listas eram recalculadas e reenviadas inteiras a cada tela aberta — caro
+para o iPad em 4G fraco em campo. Aqui:
+
+- cada recurso (= tabela fonte, ver RECURSOS) tem um contador em
+  recurso_versao, somado na MESMA transação de qualquer escrita ORM na tabela:
+  projeção "versoes" (app/core/projecoes.py). Escrita fora do ORM chama
+  `tocar(session, tabela)`
+- a rota declara de quais tabelas a resposta depende:
+      @router.get("/unidades", dependencies=[Depends(versoes.condicional("cras_unidade"))])
+  a dependência lê os contadores (consulta por PK) e monta um ETag fraco com
+  contadores + versão do código + rota/query + escopo do usuário (id, perfil,
+  município). Se bater com If-None-Match: 304 sem corpo, sem rodar o endpoint.
+  Senão o endpoint roda e a resposta leva ETag e Cache-Control
+- listas fixas no código (etapas, modelos de documento): `condicional()` sem
+  tabelas; o ETag muda a cada deploy (POPRUA_VERSAO ou hash dos .py de app/)
+- Cache-Control: `no-cache` (o cliente guarda e revalida sempre; revalidar
+  custa um 304 de poucos bytes) ou `max-age=N` onde N s sem revalidar é ok;
+  `private` em rota autenticada, `public` nas abertas
+
+ETag fraco (W/): o corpo pode sair com ou sem GZip; o que ele garante é o
+mesmo conteúdo.
+
+Config (env):
+  POPRUA_ETAG=0       desliga (sempre 200, sem ETag)
+  POPRUA_VERSAO=      identificador do deploy (padrão: hash dos fontes de app/)
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from fastapi import Depends, HTTPException, Request, Response
+from sqlalchemy import update
+from sqlmodel import Session, select
+
+from app.core import projecoes
+from app.core.auth import get_current_user
+from app.core.db import get_session
+from app.core.db_async import LeituraAssincrona, get_leitura
+from app.models.recurso_versao import RecursoVersao
+from app.models.usuario import Usuario
+
+# tabelas cujas escritas mudam a versão do recurso de mesmo nome
+RECURSOS: Tuple[str, ...] = (
+    "documento_template",
+    "sla_regra",
+    "meta_kpi",
+    "municipio_branding",
+    "municipio",
+    "cras_unidade",
+    "creas_unidade",
+)
+
+_APP_DIR = Path(__file__).resolve().parents[1]  # backend/app
+_versao_codigo: Optional[str] = None
+_lock = threading.Lock()
+_estat: Dict[str, int] = {"200": 0, "304": 0}
+
+
+def habilitado() -> bool:
+    return str(os.getenv("POPRUA_ETAG", "1")).strip().lower() not in ("0", "false", "no", "off")
+
+
+def versao_codigo() -> str:
+    """Muda a cada deploy: POPRUA_VERSAO ou hash dos fontes (igual em todos os workers)."""
+    global _versao_codigo
+    if _versao_codigo is None:
+        explicita = str(os.getenv("POPRUA_VERSAO", "")).strip()
+        if explicita:
+            _versao_codigo = explicita
+        else:
+            h = hashlib.sha1()
+            for p in sorted(_APP_DIR.rglob("*.py")):
+                h.update(str(p.relative_to(_APP_DIR)).encode("utf-8"))
+                h.update(p.read_bytes())
+            _versao_codigo = h.hexdigest()[:16]
+    return _versao_codigo
+
+
+# ============================
+# Escrita: contadores
+# ============================
+def tocar(session: Session, tabelas: Iterable[str]) -> None:
+    """Nova versão para os recursos (não commita)."""
+    agora = datetime.utcnow()
+    for nome in sorted(set(tabelas)):
+        res = session.execute(
+            update(RecursoVersao)
+            .where(RecursoVersao.nome == nome)
+            .values(versao=RecursoVersao.versao + 1, atualizado_em=agora)
+        )
+        if not res.rowcount:
+            session.add(RecursoVersao(nome=nome, versao=int(time.time() * 1000), atualizado_em=agora))
+            session.flush()
+
+
+def _aplicar_eventos(session: Session, eventos: List[projecoes.Evento]) -> None:
+    tocar(session, (ev.tabela for ev in eventos))
+
+
+def _reconstruir(session: Session, municipio_id: Optional[int] = None) -> Dict[str, Any]:
+    """Não há o que recalcular: nova versão para tudo (clientes rebaixam uma vez)."""
+    tocar(session, RECURSOS)
+    return {"recursos": len(RECURSOS)}
+
+
+projecoes.registrar(
+    projecoes.Projecao(
+        nome="versoes",
+        tabelas=RECURSOS,
+        aplicar=_aplicar_eventos,
+        reconstruir=_reconstruir,
+        descricao="Versão por recurso para ETag (GET condicional)",
+        invalidar=lambda session: tocar(session, RECURSOS),
+    )
+)
+
+
+# ============================
+# Leitura: ETag / 304
+# ============================
+def ler(session: Session, tabelas: Sequence[str]) -> Dict[str, int]:
+    rows = session.exec(select(RecursoVersao.nome, RecursoVersao.versao).where(RecursoVersao.nome.in_(list(tabelas)))).all()
+    return {str(n): int(v or 0) for n, v in rows}
+
+
+def etag(request: Request, versoes: Dict[str, int], escopo: Any = None) -> str:
+    partes = [
+        versao_codigo(),
+        request.url.path,
+        "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items())),
+        repr(escopo),
+        ",".join(f"{k}={versoes[k]}" for k in sorted(versoes)),
+    ]
+    return 'W/"' + hashlib.sha1("|".join(partes).encode("utf-8")).hexdigest()[:20] + '"'
+
+
+def casa(if_none_match: Optional[str], valor: str) -> bool:
+    """If-None-Match usa comparação fraca: W/"x" e "x" são o mesmo."""
+    if not if_none_match:
+        return False
+    alvo = valor[2:] if valor.startswith("W/") else valor
+    for item in if_none_match.split(","):
+        item = item.strip()
+        if item == "*":
+            return True
+        if (item[2:] if item.startswith("W/") else item) == alvo:
+            return True
+    return False
+
+
+def _responder(request: Request, response: Response, valor: str, cache_control: str) -> None:
+    headers = {"ETag": valor, "Cache-Control": cache_control}
+    if casa(request.headers.get("if-none-match"), valor):
+        with _lock:
+            _estat["304"] += 1
+        # 304 sai sem corpo (handler de HTTPException do FastAPI) e o endpoint não roda
+        raise HTTPException(status_code=304, headers=headers)
+    with _lock:
+        _estat["200"] += 1
+    response.headers.update(headers)
+
+
+def _cache_control(publico: bool, max_age: int) -> str:
+    escopo = "public" if publico else "private"
+    return f"{escopo}, max-age={int(max_age)}" if max_age > 0 else f"{escopo}, no-cache"
+
+
+def condicional(*tabelas: str, publico: bool = False, max_age: int = 0) -> Callable[..., Any]:
+    """Dependência de GET condicional para uma rota cuja resposta só depende de `tabelas`
+    (e do código, da URL e do usuário).
+
+    publico=True: rota sem login (não pede usuário; lê as versões pela leitura
+    assíncrona, app/core/db_async.py).
+    """
+    desconhecidas = [t for t in tabelas if t not in RECURSOS]
+    if desconhecidas:
+        raise ValueError(f"versoes: tabelas sem contador: {', '.join(desconhecidas)} (inclua em RECURSOS)")
+    cc = _cache_control(publico, max_age)
+
+    if publico and not tabelas:
+
+        async def _dep_codigo(request: Request, response: Response) -> None:
+            if habilitado():
+                _responder(request, response, etag(request, {}), cc)
+
+        return _dep_codigo
+
+    if publico:
+
+        async def _dep_publico(
+            request: Request,
+            response: Response,
+            leitura: LeituraAssincrona = Depends(get_leitura),
+        ) -> None:
+            if not habilitado():
+                return
+            rows = await leitura.todos(
+                select(RecursoVersao.nome, RecursoVersao.versao).where(RecursoVersao.nome.in_(list(tabelas)))
+            )
+            _responder(request, response, etag(request, {str(n): int(v or 0) for n, v in rows}), cc)
+
+        return _dep_publico
+
+    def _dep(
+        request: Request,
+        response: Response,
+        session: Session = Depends(get_session),
+        usuario: Usuario = Depends(get_current_user),
+    ) -> None:
+        if not habilitado():
+            return
+        escopo = (getattr(usuario, "id", None), getattr(usuario, "perfil", None), getattr(usuario, "municipio_id", None))
+        versoes = ler(session, tabelas) if tabelas else {}
+        _responder(request, response, etag(request, versoes, escopo), cc)
+
+    return _dep
+
+
+def resumo() -> Dict[str, Any]:
+    with _lock:
+        return {"habilitado": habilitado(), "respostas_200": _estat["200"], "respostas_304": _estat["304"]}
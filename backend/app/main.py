@@ -6,133 +6,29 @@ from fastapi.staticfiles import StaticFiles
 import os
 from pathlib import Path
 
-from .routers import cras_tarefas
-
-from app.core.db import init_db
-
-from app.routers.auth import router as auth_router
-from app.routers.municipios import router as municipios_router
-from app.routers.pessoas import router as pessoas_router
-from app.routers.atendimentos import router as atendimentos_router
-from app.routers.casos import router as casos_router
-from app.routers.acolhimentos import router as acolhimentos_router
-from app.routers.familia_router import router as familia_beneficios_router
-from app.routers.encaminhamentos import router as encaminhamentos_router
-from app.routers.linha_metro import router as linha_metro_router
-from app.routers.saude import router as saude_router
-from app.routers.protocolo import router as protocolo_router
-from app.routers.dashboard import router as dashboard_router
-
-try:
-    from app.routers.usuarios import router as usuarios_router  # type: ignore
-except Exception:
-    usuarios_router = None
-
-from app.routers.cras import router as cras_router
-from app.routers.cras_casos import router as cras_casos_router
-from app.routers.cras_cadastros import router as cras_cadastros_router
-from app.routers.cras_programas import router as cras_programas_router
-from app.routers.cras_linha_metro import router as cras_linha_metro_router
-from app.routers.cras_cadunico import router as cras_cadunico_router
-from app.routers.cras_pia import router as cras_pia_router
-from app.routers.cras_scfv import router as cras_scfv_router
-from app.routers.cras_ficha import router as cras_ficha_router
-from app.routers.cras_identidade import router as cras_identidade_router
-
-try:
-    from app.routers.cras_ficha_uploads import router as cras_ficha_uploads_router  # type: ignore
-except Exception:
-    cras_ficha_uploads_router = None
-
-from app.routers.cras_relatorios import router as cras_relatorios_router
-
-try:
-    from app.routers.cras_automacoes import router as cras_automacoes_router  # type: ignore
-except Exception:
-    cras_automacoes_router = None
-from app.routers.cras_encaminhamentos import router as cras_encaminhamentos_router
-
-try:
-    from app.routers.suas_encaminhamentos import router as suas_encaminhamentos_router  # type: ignore
-except Exception:
-    suas_encaminhamentos_router = None
-
-try:
-    from app.routers.creas import router as creas_router  # type: ignore
-except Exception:
-    creas_router = None
-
-try:
-    from app.routers.osc import router as osc_router  # type: ignore
-except Exception:
-    osc_router = None
-
-try:
-    from app.routers.terceiro_setor import router as terceiro_setor_router  # type: ignore
-except Exception:
-    terceiro_setor_router = None
-
-try:
-    from app.routers.config import router as config_router  # type: ignore
-except Exception:
-    config_router = None
-
-try:
-    from app.routers.config_documentos import router as config_documentos_router  # type: ignore
-except Exception:
-    config_documentos_router = None
-
-try:
-    from app.routers.branding import router as branding_router  # type: ignore
-except Exception:
-    branding_router = None
-
-try:
-    from app.routers.documentos import router as documentos_router  # type: ignore
-except Exception:
-    documentos_router = None
-
-try:
-    from app.routers.ia import router as ia_router  # type: ignore
-except Exception:
-    ia_router = None
-
-from app.routers.gestao import router as gestao_router
-
-try:
-    from app.routers.cras_pes import router as cras_pes_router  # type: ignore
-except Exception:
-    cras_pes_router = None
-
-try:
-    from app.routers.cras_prontuario import router as cras_prontuario_router  # type: ignore
-except Exception:
-    cras_prontuario_router = None
-
-try:
-    from app.routers.cras_rma import router as cras_rma_router  # type: ignore
-except Exception:
-    cras_rma_router = None
-
-# opcionais (não quebram se arquivo não existir)
-try:
-    from app.routers.gestao_fila_plus import router as gestao_fila_plus_router  # type: ignore
-except Exception:
-    gestao_fila_plus_router = None
-
-try:
-    from app.routers.gestao_fila_lote import router as gestao_fila_lote_router  # type: ignore
-except Exception:
-    gestao_fila_lote_router = None
-
-try:
-    from app.routers.gestao_automacoes import router as gestao_automacoes_router  # type: ignore
-except Exception:
-    gestao_automacoes_router = None
+from app.core.db import engine, init_db
+from app.core import perf
+from app.core import rotas
+
+# Routers: registro em app/core/rotas.py (mesma ordem de include de antes).
+# Por padrão cada router é importado na primeira requisição do seu prefixo —
+# o worker sobe sem importar ~45 módulos. Boot com tudo: POPRUA_ROTAS_LAZY=0
 
 
 app = FastAPI(title="Sistema Pop Rua")
 
+carregador_rotas = rotas.CarregadorRotas(
+    app,
+    rotas.ROTAS,
+    ao_carregar=perf.instrumentar_rotas if perf.habilitado() else None,
+)
+app.state.carregador_rotas = carregador_rotas
+
+# Primeiro middleware = mais interno: o import sob demanda entra no tempo do
+# request (e no Server-Timing), mas já com o roteamento pronto.
+if rotas.lazy_habilitado():
+    app.add_middleware(rotas.RotasSobDemandaMiddleware, carregador=carregador_rotas)
+
 # ✅ Compressão de respostas (ajuda bastante quando há JSON grande)
 # Obs.: em produção, se houver proxy (Nginx/Traefik) ele também pode comprimir,
 # mas isso já melhora muito no dev e em deploy simples.
@@ -170,11 +66,52 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ✅ Perf por request (queries, tempo de banco, serialização, bytes) + Server-Timing.
+# Por último = mais externo: mede CORS/GZip juntos e os bytes já comprimidos.
+# Desligue com: export POPRUA_PERF=0   (leitura: GET /admin/perf)
+if perf.habilitado():
+    perf.instalar_sql(engine)
+    app.add_middleware(perf.PerfMiddleware)
+
 
 @app.on_event("startup")
 def on_startup():
     init_db()
 
+    # threadpool explícito + vagas de trabalho lento (app/core/concorrencia.py)
+    try:
+        from app.core import concorrencia
+
+        fichas = concorrencia.configurar_threadpool()
+        if str(os.getenv("POPRUA_STARTUP_PERFIL", "")).strip().lower() in ("1", "true", "yes", "on"):
+            vagas = " ".join(f"{n}={v.limite}" for n, v in concorrencia.VAGAS.items())
+            print(f"INFO: concorrencia: threadpool={fichas} vagas: {vagas}")
+    except Exception as e:
+        print("WARN: configuração do threadpool falhou:", e)
+
+    # Contadores de tarefas CRAS de municípios sem marca (banco antigo, seed/import
+    # direto): recálculo em background, fora do request
+    try:
+        from app.core.db import engine
+        from app.services import cras_tarefas_contadores
+
+        cras_tarefas_contadores.recalcular_em_background(engine)
+    except Exception as e:
+        print("WARN: recálculo dos contadores de tarefas falhou:", e)
+
+    # Importações de cadastro que estavam rodando num worker que morreu
+    try:
+        from sqlmodel import Session
+        from app.core.db import engine
+        from app.services import cadastro_importacao
+
+        with Session(engine) as session:
+            n = cadastro_importacao.marcar_interrompidas(session)
+        if n:
+            print(f"WARN: {n} importação(ões) de cadastro interrompida(s) marcada(s) como erro")
+    except Exception as e:
+        print("WARN: verificação das importações interrompidas falhou:", e)
+
     # Seed opcional de regras padrão (automacoes) — idempotente.
     # Ative com: export GESTAO_AUTOMACOES_SEED=true
     # Opcional: export GESTAO_AUTOMACOES_SEED_MUNICIPIO_ID=1
@@ -200,95 +137,66 @@ def on_startup():
         except Exception as e:
             print("WARN: seed automacoes falhou:", e)
 
+    # Agendador das automações (Gestão/CRAS) em background — opcional.
+    # Ative com: export POPRUA_AGENDADOR=1  (ou rode scripts/worker_automacoes.py)
+    try:
+        from app.services.automacoes_agendador import agendador, habilitado
 
+        if habilitado():
+            agendador.iniciar()
+            print("INFO: agendador de automacoes iniciado")
+    except Exception as e:
+        print("WARN: agendador de automacoes falhou:", e)
 
-@app.get("/health")
-def health_check():
-    return {"status": "ok"}
-
-
-# ✅ Routers
-app.include_router(auth_router)
-app.include_router(cras_tarefas.router)
-app.include_router(municipios_router)
-app.include_router(pessoas_router)
-app.include_router(atendimentos_router)
-app.include_router(casos_router)
-app.include_router(acolhimentos_router)
-app.include_router(familia_beneficios_router)
-app.include_router(encaminhamentos_router)
-app.include_router(linha_metro_router)
-app.include_router(saude_router)
-app.include_router(protocolo_router)
-app.include_router(dashboard_router)
-
-if usuarios_router:
-    app.include_router(usuarios_router)
 
-app.include_router(cras_router)
 
-if cras_prontuario_router:
-    app.include_router(cras_prontuario_router)
+@app.on_event("shutdown")
+async def on_shutdown():
+    try:
+        from app.services.automacoes_agendador import agendador
+        agendador.parar()
+    except Exception:
+        pass
 
-if cras_pes_router:
-    app.include_router(cras_pes_router)
+    # projeções assíncronas ainda na fila (app/core/projecoes.py)
+    try:
+        import sys
 
-if cras_rma_router:
-    app.include_router(cras_rma_router)
-app.include_router(cras_casos_router)
-app.include_router(cras_cadastros_router)
-app.include_router(cras_programas_router)
-app.include_router(cras_linha_metro_router)
-app.include_router(cras_cadunico_router)
-app.include_router(cras_encaminhamentos_router)
+        if "app.core.projecoes" in sys.modules:
+            from app.core.projecoes import fila
+            fila.parar()
+    except Exception:
+        pass
 
-app.include_router(cras_pia_router)
-app.include_router(cras_scfv_router)
-app.include_router(cras_ficha_router)
-app.include_router(cras_identidade_router)
+    # cópias instantâneas de leitura deste processo (app/core/leitura.py)
+    try:
+        import sys
 
-if cras_ficha_uploads_router:
-    app.include_router(cras_ficha_uploads_router)
+        if "app.core.leitura" in sys.modules:
+            from app.core.leitura import roteador
+            roteador.parar()
+    except Exception:
+        pass
 
-app.include_router(cras_relatorios_router)
+    # fecha o pool HTTP do gateway de IA (se foi usado; não importa só para fechar)
+    try:
+        import sys
 
-if cras_automacoes_router:
-    app.include_router(cras_automacoes_router)
+        if "app.services.ai_gateway" in sys.modules:
+            from app.services.ai_gateway import gateway
+            await gateway.fechar()
+    except Exception:
+        pass
 
-if creas_router:
-    app.include_router(creas_router)
 
-if osc_router:
-    app.include_router(osc_router)
-
-if terceiro_setor_router:
-    app.include_router(terceiro_setor_router)
-
-if config_router:
-    app.include_router(config_router)
-
-if config_documentos_router:
-    app.include_router(config_documentos_router)
-
-if branding_router:
-    app.include_router(branding_router)
-
-if documentos_router:
-    app.include_router(documentos_router)
-
-if ia_router:
-    app.include_router(ia_router)
-
-if gestao_fila_plus_router:
-    app.include_router(gestao_fila_plus_router)
-
-if gestao_fila_lote_router:
-    app.include_router(gestao_fila_lote_router)
+@app.get("/health")
+def health_check():
+    return {"status": "ok"}
 
-if gestao_automacoes_router:
-    app.include_router(gestao_automacoes_router)
 
-if suas_encaminhamentos_router:
-    app.include_router(suas_encaminhamentos_router)
+# ✅ Routers
+if not rotas.lazy_habilitado():
+    carregador_rotas.carregar_tudo()
 
-app.include_router(gestao_router)
+if perf.habilitado():
+    perf.instrumentar_rotas(app)
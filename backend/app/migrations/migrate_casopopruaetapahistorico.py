@@ -1,32 +1,7 @@
-import sqlite3
-from pathlib import Path
-
-DB_PATH = Path("poprua.db")
-
-COLS = [
-    ("responsavel_funcao", "TEXT"),
-    ("responsavel_servico", "TEXT"),
-    ("responsavel_contato", "TEXT"),
-]
-
-def main():
-    con = sqlite3.connect(DB_PATH)
-    cur = con.cursor()
-
-    cur.execute("PRAGMA table_info(casopopruaetapahistorico)")
-    existing = {row[1] for row in cur.fetchall()}
-
-    for name, ddl in COLS:
-        if name in existing:
-            print(f"OK: {name} já existe")
-            continue
-        sql = f"ALTER TABLE casopopruaetapahistorico ADD COLUMN {name} {ddl}"
-        print("Applying:", sql)
-        cur.execute(sql)
-
-    con.commit()
-    con.close()
-    print("✅ Migração concluída.")
+# Substituído pelas migrações versionadas (app/migrations/versoes.py).
+# Mantido para quem ainda roda este script: aplica TODAS as migrações pendentes
+# no banco de POPRUA_DATABASE_URL (padrão: ./poprua.db), como o boot faria.
+from app.core.migracoes import main
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    raise SystemExit(main(["--sem-backfill"]))
@@ -0,0 +1,155 @@
+# app/migrations/versoes.py
+"""
+Lista ordenada das migrações do esquema (executor: app/core/migracoes.py).
+
+Regras:
+- versão nova = próximo número; nunca renumere nem edite uma migração já
+  publicada (bancos existentes não rodam de novo)
+- `aplicar` só faz DDL rápido (ADD COLUMN nullable/DEFAULT constante,
+  CREATE INDEX); preencher dados vai em `backfill=Backfill(...)`
+- as colunas também devem existir no model: banco novo nasce pelo create_all
+  e a migração só registra a versão
+"""
+
+from __future__ import annotations
+
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from app.core.migracoes import Backfill, Migracao, adicionar_colunas, criar_indice, remover_colunas
+from app.services import cadastro_busca
+
+
+# 0001-0003: o que `_ensure_sqlite_columns` conferia a cada boot
+def _m0001(conn: Connection) -> None:
+    adicionar_colunas(
+        conn,
+        "pessoarua",
+        {
+            "estado_civil": "TEXT",
+            "apelido": "TEXT",
+            "telefone": "TEXT",
+            "whatsapp": "TEXT",
+            "contato_referencia_nome": "TEXT",
+            "contato_referencia_telefone": "TEXT",
+            "permanencia_rua": "TEXT",
+            "pontos_circulacao": "TEXT",
+            "horario_mais_encontrado": "TEXT",
+            "motivo_rua": "TEXT",
+            "escolaridade": "TEXT",
+            "ocupacao": "TEXT",
+            "interesses_reinsercao": "TEXT",
+            "cadunico_status": "TEXT",
+            "documentos_pendentes": "TEXT",
+            "fonte_renda": "TEXT",
+            "violencia_risco": "TEXT",
+            "ameaca_territorio": "TEXT",
+            "gestante_status": "TEXT",
+            "protecao_imediata": "TEXT",
+            "interesse_acolhimento": "TEXT",
+            "moradia_recente": "TEXT",
+            "tentativas_saida_rua": "TEXT",
+            "dependencia_quimica": "TEXT",
+        },
+    )
+
+
+def _m0002(conn: Connection) -> None:
+    adicionar_colunas(conn, "paif_acompanhamento", {"pessoa_suas_id": "INTEGER", "caso_id": "INTEGER"})
+
+
+def _m0003(conn: Connection) -> None:
+    adicionar_colunas(conn, "cras_triagem", {"pessoa_suas_id": "INTEGER", "caso_id": "INTEGER"})
+
+
+# 0004-0005: antigos scripts app/migrations/migrate_*.py
+def _m0004(conn: Connection) -> None:
+    adicionar_colunas(
+        conn,
+        "casopoprua",
+        {
+            "data_prevista_proxima_acao": "TEXT",
+            "data_ultima_acao": "TEXT",
+            "flag_estagnado": "INTEGER NOT NULL DEFAULT 0",
+            "dias_estagnado": "INTEGER NOT NULL DEFAULT 0",
+            "tipo_estagnacao": "TEXT",
+            "motivo_estagnacao": "TEXT",
+        },
+    )
+
+
+def _m0005(conn: Connection) -> None:
+    adicionar_colunas(
+        conn,
+        "casopopruaetapahistorico",
+        {"responsavel_funcao": "TEXT", "responsavel_servico": "TEXT", "responsavel_contato": "TEXT"},
+    )
+
+
+# 0006-0007: busca indexada dos cadastros SUAS (/cras/cadastros)
+def _m0006(conn: Connection) -> None:
+    adicionar_colunas(conn, "pessoa_suas", {"busca": "VARCHAR(1000)"})
+    cadastro_busca.criar_fts(conn, *cadastro_busca.FTS_PESSOA)
+
+
+def _m0007(conn: Connection) -> None:
+    adicionar_colunas(conn, "familia_suas", {"busca": "VARCHAR(1000)"})
+    cadastro_busca.criar_fts(conn, *cadastro_busca.FTS_FAMILIA)
+
+
+# 0008: batimento da importação de cadastros (app/services/cadastro_importacao.py)
+def _m0008(conn: Connection) -> None:
+    adicionar_colunas(conn, "cadastro_importacao", {"atualizado_em": "DATETIME"})
+
+
+# 0009: contadores de tarefas CRAS sem o nome do técnico (o resumo lê de Usuario)
+def _m0009(conn: Connection) -> None:
+    remover_colunas(conn, "cras_tarefa_contador", ["responsavel_nome"])
+
+
+# 0010: keyset de GET /encaminhamentos/ (lado origem/destino, ORDER BY id desc).
+# Sai o par (município, status) que repetia o prefixo de idx_intermun_*_status_upd.
+# No SQLite o índice de coluna única do município já leva o rowid (= id) junto;
+# (município, id) só é criado nos outros bancos.
+def _m0010(conn: Connection) -> None:
+    for nome in ("idx_intermun_orig_status", "idx_intermun_dest_status"):
+        conn.execute(text(f"DROP INDEX IF EXISTS {nome}"))
+    if conn.dialect.name != "sqlite":
+        criar_indice(conn, "idx_intermun_orig_id", "encaminhamentos_intermunicipais", ("municipio_origem_id", "id"))
+        criar_indice(conn, "idx_intermun_dest_id", "encaminhamentos_intermunicipais", ("municipio_destino_id", "id"))
+
+
+MIGRACOES: List[Migracao] = [
+    Migracao(1, "pessoarua: complementos do cadastro", _m0001),
+    Migracao(2, "paif_acompanhamento: ponte SUAS + caso", _m0002),
+    Migracao(3, "cras_triagem: ponte SUAS + caso", _m0003),
+    Migracao(4, "casopoprua: próxima ação e estagnação", _m0004),
+    Migracao(5, "casopopruaetapahistorico: dados do responsável", _m0005),
+    Migracao(
+        6,
+        "pessoa_suas: chave de busca normalizada + FTS",
+        _m0006,
+        backfill=Backfill(
+            "pessoa_suas",
+            "busca IS NULL",
+            ("nome", "nome_social", "cpf", "nis", "bairro", "territorio"),
+            lambda ln: {"busca": cadastro_busca.chave_pessoa(ln)},
+        ),
+    ),
+    Migracao(
+        7,
+        "familia_suas: chave de busca normalizada + FTS",
+        _m0007,
+        backfill=Backfill(
+            "familia_suas",
+            "busca IS NULL",
+            ("nis_familia", "bairro", "territorio", "endereco"),
+            lambda ln: {"busca": cadastro_busca.chave_familia(ln)},
+        ),
+    ),
+    Migracao(8, "cadastro_importacao: batimento do progresso", _m0008),
+    Migracao(9, "cras_tarefa_contador: sem responsavel_nome", _m0009),
+    Migracao(10, "encaminhamentos_intermunicipais: índices do keyset da lista", _m0010),
+]
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+from typing import Dict, Sequence, Tuple
+
+from sqlalchemy import Column, DateTime, Index, Table
+from sqlmodel import SQLModel
+
+from app.models.caso_cras import CasoCras, CasoCrasHistorico
+from app.models.caso_pop_rua import CasoPopRua, CasoPopRuaEtapaHistorico
+from app.models.creas_caso import CreasCaso, CreasCasoHistorico
+from app.models.ficha_evento import FichaEvento
+from app.models.linha_metro_registro import CasoEtapaRegistro, CasoEtapaRegistroVinculo
+from app.models.rma_evento import RmaEvento
+
+PREFIXO = "arq_"
+
+
+def _arquivo_de(origem: Table, indices: Sequence[Tuple[str, ...]]) -> Table:
+    """Tabela de arquivo com as mesmas colunas da origem (mesmo id), sem FKs/uniques,
+    só com os índices das leituras de histórico e da marca d'água da exportação
+    (app/services/exportacao.py), + arquivado_em."""
+    cols = [
+        Column(c.name, c.type, primary_key=c.primary_key, nullable=c.nullable, autoincrement=False)
+        for c in origem.columns
+    ]
+    cols.append(Column("arquivado_em", DateTime, nullable=False))
+    t = Table(f"{PREFIXO}{origem.name}", SQLModel.metadata, *cols, extend_existing=True)
+    for nomes in indices:
+        Index(f"ix_{t.name}_{'_'.join(nomes)}", *[t.c[n] for n in nomes])
+    return t
+
+
+# tabela quente -> tabela de arquivo (app/services/arquivo.py move; leituras via com_arquivo)
+ARQUIVO: Dict[str, Table] = {
+    t.name: _arquivo_de(t, idx)
+    for t, idx in (
+        (CasoPopRua.__table__, (("pessoa_id",), ("municipio_id",), ("data_ultima_atualizacao",))),
+        (CasoPopRuaEtapaHistorico.__table__, (("caso_id",),)),
+        (CasoEtapaRegistro.__table__, (("caso_id",),)),
+        (CasoEtapaRegistroVinculo.__table__, (("registro_id",),)),
+        (CasoCras.__table__, (("pessoa_id",), ("familia_id",), ("municipio_id",), ("atualizado_em",))),
+        (CasoCrasHistorico.__table__, (("caso_id",), ("criado_em",))),
+        (CreasCaso.__table__, (("pessoa_id",), ("familia_id",), ("municipio_id",), ("atualizado_em",))),
+        (CreasCasoHistorico.__table__, (("caso_id",),)),
+        (RmaEvento.__table__, (("municipio_id", "data_evento"), ("criado_em",))),
+        (FichaEvento.__table__, (("municipio_id", "alvo_tipo", "alvo_id"),)),
+    )
+}
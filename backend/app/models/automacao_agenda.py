@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import UniqueConstraint
+from sqlmodel import Field, SQLModel
+
+
+class AutomacaoAgenda(SQLModel, table=True):
+    """Agenda + lease de execução das regras de automação (Gestão e CRAS).
+
+    Uma linha por regra (escopo + regra_id):
+    - base_em: horário nominal calculado a partir da regra (schedule/frequência)
+    - proxima_execucao_em: base_em + jitter (espalha regras do mesmo horário)
+    - lease_dono/lease_ate: quem está executando e até quando o lease vale.
+      Vários workers (ou várias instâncias da API) podem rodar o agendador;
+      só quem ganha o lease (UPDATE condicional) executa a regra.
+    """
+
+    __tablename__ = "automacao_agenda"
+    __table_args__ = (UniqueConstraint("escopo", "regra_id", name="uq_automacao_agenda_regra"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+
+    escopo: str = Field(index=True, max_length=20)  # gestao|cras
+    regra_id: int = Field(index=True)
+    municipio_id: Optional[int] = Field(default=None, index=True)
+
+    base_em: Optional[datetime] = Field(default=None)
+    proxima_execucao_em: Optional[datetime] = Field(default=None, index=True)
+
+    lease_dono: Optional[str] = Field(default=None, max_length=120)
+    lease_ate: Optional[datetime] = Field(default=None, index=True)
+
+    ultima_execucao_em: Optional[datetime] = Field(default=None)
+    ultimo_status: Optional[str] = Field(default=None, max_length=20)
+    ultimo_erro: Optional[str] = Field(default=None, max_length=2000)
+    ultima_duracao_ms: Optional[int] = Field(default=None)
+
+    atualizado_em: datetime = Field(default_factory=datetime.utcnow)
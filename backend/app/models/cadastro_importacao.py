@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import Column, Text
+from sqlmodel import Field, SQLModel
+
+
+class CadastroImportacao(SQLModel, table=True):
+    """Importação em lote de cadastros SUAS (CSV / extrato CadÚnico) e seu progresso."""
+
+    __tablename__ = "cadastro_importacao"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+
+    municipio_id: int = Field(foreign_key="municipio.id", index=True)
+    unidade_id: Optional[int] = Field(default=None, foreign_key="cras_unidade.id", index=True)
+
+    layout: str = Field(default="csv", max_length=20)  # csv|cadunico
+    arquivo_nome: Optional[str] = Field(default=None, max_length=255)
+    simular: bool = Field(default=False)
+
+    status: str = Field(default="na_fila", index=True, max_length=20)  # na_fila|processando|concluido|erro
+    mensagem: Optional[str] = Field(default=None, max_length=1000)
+
+    bytes_total: Optional[int] = None
+    bytes_lidos: int = 0
+    linhas_lidas: int = 0
+    linhas_com_erro: int = 0
+    avisos: int = 0
+
+    pessoas_inseridas: int = 0
+    pessoas_atualizadas: int = 0
+    familias_inseridas: int = 0
+    familias_atualizadas: int = 0
+    membros_inseridos: int = 0
+    precadastros_inseridos: int = 0
+
+    # lista JSON [{linha, erro}] (limitada; ver app/services/cadastro_importacao.py)
+    erros_json: Optional[str] = Field(default=None, sa_column=Column(Text))
+
+    criado_por_usuario_id: Optional[int] = Field(default=None, index=True)
+    criado_em: datetime = Field(default_factory=datetime.utcnow, index=True)
+    iniciado_em: Optional[datetime] = None
+    atualizado_em: Optional[datetime] = None  # batimento: gravado a cada lote (importação parada = worker morreu)
+    concluido_em: Optional[datetime] = None
@@ -11,8 +11,8 @@ class CrasAutomacaoRegra(SQLModel, table=True):
     """
     Regras de automação do CRAS (ex.: criar tarefas a partir de gatilhos).
     Observação:
-      - O backend não roda em background sozinho.
-      - Para executar automaticamente, um cron/job externo chama /cras/automacoes/executar-devidas.
+      - Execução automática: POPRUA_AGENDADOR=1 (thread na API) ou scripts/worker_automacoes.py.
+      - Um cron/job externo ainda pode chamar /cras/automacoes/executar-devidas.
     """
 
     __tablename__ = "cras_automacao_regra"
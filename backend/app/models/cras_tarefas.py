@@ -1,5 +1,6 @@
 from typing import Optional
 from datetime import datetime, date
+from sqlalchemy import UniqueConstraint
 from sqlmodel import SQLModel, Field
 
 class CrasTarefa(SQLModel, table=True):
@@ -29,3 +30,39 @@ class CrasTarefa(SQLModel, table=True):
 
     criado_em: datetime = Field(default_factory=datetime.utcnow, index=True)
     atualizado_em: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+
+class CrasTarefaContador(SQLModel, table=True):
+    """Contadores de tarefas por (município, unidade, responsável) para /cras/tarefas/resumo.
+
+    Mantidos incrementalmente em criar/atualizar/excluir tarefa e no insert em lote
+    das automações (app/services/cras_tarefas_contadores.py). Sem unidade/sem
+    responsável = 0 (NULL não entra na unique).
+    """
+
+    __tablename__ = "cras_tarefa_contador"
+    __table_args__ = (UniqueConstraint("municipio_id", "unidade_id", "responsavel_id", name="uq_cras_tarefa_contador"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+
+    municipio_id: int = Field(index=True)
+    unidade_id: int = Field(default=0)
+    responsavel_id: int = Field(default=0)
+
+    abertas: int = Field(default=0)  # status != concluida (mesma regra do resumo)
+    concluidas: int = Field(default=0)
+
+    atualizado_em: datetime = Field(default_factory=datetime.utcnow)
+
+
+class CrasTarefaContadorMunicipio(SQLModel, table=True):
+    """Marca que os contadores do município foram (re)calculados a partir de crastarefa.
+
+    Sem linha aqui o resumo conta direto de crastarefa e o município é
+    recalculado em background (instalações antigas, seed/import direto no banco).
+    """
+
+    __tablename__ = "cras_tarefa_contador_municipio"
+
+    municipio_id: int = Field(primary_key=True)
+    recalculado_em: datetime = Field(default_factory=datetime.utcnow)
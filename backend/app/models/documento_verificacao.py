@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Optional
+
+from sqlmodel import Field, SQLModel
+
+
+class DocumentoVerificacao(SQLModel, table=True):
+    """Dados públicos da verificação (QR) de um documento emitido, já calculados.
+
+    Só leitura no GET /documentos/{id}/verificar: hash do código, rótulos e
+    SHA-256 do PDF ficam prontos na emissão (ou na 1ª verificação de documentos
+    antigos), sem recalcular HMAC/ler o arquivo a cada leitura de QR.
+    """
+
+    __tablename__ = "documento_verificacao"
+
+    documento_id: int = Field(primary_key=True)  # = documento_emitido.id
+    municipio_id: Optional[int] = Field(default=None, index=True)
+
+    # sha256 do código (maiúsculo); o código em si não é guardado
+    codigo_hash: str
+    # impressão do segredo usado (POPRUA_DOC_VERIF_SECRET trocado => linha recalculada)
+    segredo_versao: str
+
+    tipo: Optional[str] = None
+    tipo_label: Optional[str] = None
+    numero: Optional[str] = None
+    ano: Optional[int] = None
+    emissor: Optional[str] = None
+    municipio_label: Optional[str] = None
+    criado_em: Optional[datetime] = None
+
+    arquivo_path: Optional[str] = None
+    arquivo_sha256: Optional[str] = None
+    tamanho_bytes: Optional[int] = None
+
+    atualizado_em: datetime = Field(default_factory=datetime.utcnow)
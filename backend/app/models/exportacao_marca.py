@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import UniqueConstraint
+from sqlmodel import Field, SQLModel
+
+
+class ExportacaoMarca(SQLModel, table=True):
+    """Marca d'água da exportação incremental (até onde cada destino já recebeu)."""
+
+    __tablename__ = "exportacao_marca"
+    __table_args__ = (UniqueConstraint("destino", "conjunto", "municipio_id", name="uq_exportacao_marca"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+
+    destino: str = Field(index=True, max_length=300)  # pasta/consumidor da exportação
+    conjunto: str = Field(index=True, max_length=80)
+    municipio_id: int = Field(default=0, index=True)  # 0 = todos
+
+    valor: str = Field(max_length=40)  # ISO (data/hora) ou id, conforme o conjunto
+    linhas: int = 0
+
+    atualizado_em: datetime = Field(default_factory=datetime.utcnow)
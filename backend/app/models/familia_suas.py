@@ -3,6 +3,7 @@ from __future__ import annotations
 from datetime import datetime
 from typing import Optional
 
+from sqlalchemy import event
 from sqlmodel import SQLModel, Field
 
 
@@ -25,10 +26,21 @@ class FamiliaSUAS(SQLModel, table=True):
 
     observacoes: Optional[str] = Field(default=None, max_length=1000)
 
+    # chave normalizada da busca (app/services/cadastro_busca.py); preenchida no flush
+    busca: Optional[str] = Field(default=None, max_length=1000)
+
     criado_em: datetime = Field(default_factory=datetime.utcnow, index=True)
     atualizado_em: datetime = Field(default_factory=datetime.utcnow, index=True)
 
 
+@event.listens_for(FamiliaSUAS, "before_insert")
+@event.listens_for(FamiliaSUAS, "before_update")
+def _familia_suas_busca(mapper, connection, target) -> None:
+    from app.services.cadastro_busca import chave_familia
+
+    target.busca = chave_familia(target)
+
+
 class FamiliaMembro(SQLModel, table=True):
     """Vínculo pessoa ⇄ família."""
 
@@ -11,8 +11,9 @@ class GestaoLoteRegra(SQLModel, table=True):
     """Regra de automação de lote para Gestão (fila).
 
     Observação importante:
-    - O backend NÃO executa isso sozinho em background.
-    - Para rodar automático, um cron/job externo chama o endpoint /gestao/automacoes/executar-devidas.
+    - Execução automática: POPRUA_AGENDADOR=1 (thread na API) ou scripts/worker_automacoes.py
+      (agenda/lease em automacao_agenda — ver app/services/automacoes_agendador.py).
+    - Um cron/job externo ainda pode chamar /gestao/automacoes/executar-devidas.
     """
 
     __tablename__ = "gestao_lote_regra"
@@ -0,0 +1,18 @@
+from typing import Optional
+from datetime import datetime
+from sqlmodel import SQLModel, Field
+
+
+class RecursoVersao(SQLModel, table=True):
+    """Contador de versão por recurso (tabela fonte) para ETag / GET condicional.
+
+    Somado na mesma transação de qualquer escrita na tabela (app/core/versoes.py).
+    Começa no relógio (ms) e não no 1: apagar a linha nunca faz um ETag antigo
+    voltar a bater.
+    """
+
+    __tablename__ = "recurso_versao"
+
+    nome: str = Field(primary_key=True)
+    versao: int = Field(default=0)
+    atualizado_em: Optional[datetime] = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,73 @@
+from typing import Optional
+from datetime import datetime
+from sqlalchemy import UniqueConstraint
+from sqlmodel import SQLModel, Field
+
+
+class RedeMetrica(SQLModel, table=True):
+    """Agregados de encaminhamentos da rede por destino e mês (/gestao/rede/metricas).
+
+    Mantidos por delta nas transições de status (app/services/rede_metricas.py).
+    Cada contador cai no mês do próprio marco: total no envio/solicitação,
+    recebidos no recebido_em, devolutivas no devolutiva_em, etc.; a soma de
+    todos os meses é o acumulado do destino.
+
+    rede=cras: municipio_id = município do encaminhamento, destino = (tipo, nome).
+    rede=intermunicipal: municipio_id = origem (0 = sem origem),
+    municipio_destino_id = destino; destino_tipo/destino_nome vazios.
+    Colunas da outra rede ficam em 0.
+    """
+
+    __tablename__ = "rede_metrica"
+    __table_args__ = (
+        UniqueConstraint(
+            "rede", "municipio_id", "municipio_destino_id", "destino_tipo", "destino_nome", "periodo", name="uq_rede_metrica"
+        ),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+
+    rede: str = Field(index=True)  # cras|intermunicipal
+    municipio_id: int = Field(default=0, index=True)
+    municipio_destino_id: int = Field(default=0, index=True)
+    destino_tipo: str = Field(default="")
+    destino_nome: str = Field(default="")
+    periodo: int = Field(default=0, index=True)  # AAAAMM (0 = sem data)
+
+    total: int = Field(default=0)
+    concluidos: int = Field(default=0)
+    cancelados: int = Field(default=0)
+
+    # CRAS
+    recebidos: int = Field(default=0)
+    recebidos_no_prazo: int = Field(default=0)
+    soma_horas_recebido: float = Field(default=0.0)
+    devolutivas: int = Field(default=0)
+    devolutivas_no_prazo: int = Field(default=0)
+    devolutivas_medidas: int = Field(default=0)
+    soma_horas_devolutiva: float = Field(default=0.0)
+    conclusoes: int = Field(default=0)
+    conclusoes_no_prazo: int = Field(default=0)
+    conclusoes_medidas: int = Field(default=0)
+    soma_dias_conclusao: float = Field(default=0.0)
+
+    # Intermunicipal
+    contatos: int = Field(default=0)
+    contatos_no_prazo: int = Field(default=0)
+    soma_horas_contato: float = Field(default=0.0)
+
+    atualizado_em: datetime = Field(default_factory=datetime.utcnow)
+
+
+class RedeMetricaMarca(SQLModel, table=True):
+    """Marca de que rede_metrica da rede foi (re)calculada, e com qual versão do SLA.
+
+    Sem linha (instalação antiga, seed/import direto) ou com versão de SLA
+    diferente da atual, a próxima leitura recalcula a rede inteira.
+    """
+
+    __tablename__ = "rede_metrica_marca"
+
+    rede: str = Field(primary_key=True)
+    sla_versao: Optional[str] = Field(default=None)
+    recalculado_em: datetime = Field(default_factory=datetime.utcnow)
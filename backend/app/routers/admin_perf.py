@@ -0,0 +1,46 @@
+# app/routers/admin_perf.py
+"""Leitura da instrumentação de performance (app/core/perf.py). Só admin."""
+
+from __future__ import annotations
+
+from typing import Any, Dict
+
+from fastapi import APIRouter, Depends, Query, Request
+
+from app.core.auth import exigir_minimo_perfil
+from app.core import concorrencia, db_async, leitura, perf, projecoes, versoes
+
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+@router.get("/perf", dependencies=[Depends(exigir_minimo_perfil("admin"))])
+def admin_perf(
+    request: Request,
+    top: int = Query(default=50, ge=1, le=500, description="Rotas (ordenadas por tempo total na janela)."),
+) -> Dict[str, Any]:
+    """Histogramas por rota na janela móvel + amostras de requests lentos (SQL sem valores)."""
+    out = perf.estatisticas.resumo(top=top)
+    out["habilitado"] = perf.habilitado()
+    # routers carregados sob demanda e tempo de import de cada um (app/core/rotas.py)
+    carregador = getattr(request.app.state, "carregador_rotas", None)
+    if carregador is not None:
+        out["carregador_rotas"] = carregador.resumo()
+    # origem das leituras de relatório (app/core/leitura.py)
+    out["leitura"] = leitura.roteador.resumo()
+    # read models mantidos por evento (app/core/projecoes.py)
+    out["projecoes"] = projecoes.resumo()
+    # threadpool, fila e vagas de trabalho lento (app/core/concorrencia.py)
+    out["concorrencia"] = concorrencia.resumo()
+    out["concorrencia"]["leitura_assincrona"] = db_async.resumo()
+    # GET condicional (app/core/versoes.py)
+    out["etag"] = versoes.resumo()
+    return out
+
+
+@router.delete("/perf", dependencies=[Depends(exigir_minimo_perfil("admin"))])
+def admin_perf_limpar() -> Dict[str, Any]:
+    """Zera histogramas e amostras (ex.: antes de medir uma mudança)."""
+    perf.estatisticas.limpar()
+    concorrencia.limpar()
+    return {"ok": True}
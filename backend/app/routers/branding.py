@@ -8,13 +8,16 @@ from io import BytesIO
 from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import FileResponse
 from pydantic import BaseModel
 from sqlmodel import Session, select
 
+from app.core import versoes
 from app.core.auth import exigir_minimo_perfil, get_current_user, pode_acesso_global
 from app.core.db import get_session
 from app.models.usuario import Usuario
 from app.models.municipio_branding import MunicipioBranding
+from app.services import branding_logo
 
 
 router = APIRouter(prefix="/config/branding", tags=["config"])
@@ -150,9 +153,41 @@ def _save_logo_png(municipio_id: int, raw: bytes) -> str:
     except Exception:
         raise HTTPException(status_code=422, detail="Não foi possível salvar o logo. Tente outro arquivo.")
 
+    # variantes pdf/web/thumb (tamanho limitado, nome com hash do conteúdo)
+    try:
+        branding_logo.gerar_variantes(abs_path)
+    except Exception:
+        raise HTTPException(status_code=422, detail="Não foi possível processar o logo. Tente outro arquivo.")
+
     return _to_relpath(abs_path)
 
 
+def _to_abspath(path: str) -> str:
+    if os.path.isabs(path):
+        return path
+    return os.path.join(_backend_dir(), path)
+
+
+def _logo_urls(municipio_id: int, logo_path: Optional[str]) -> Optional[dict]:
+    """URLs (com hash) das variantes do logo — cacheáveis por tempo indeterminado."""
+    if not logo_path:
+        return None
+    man = branding_logo.garantir_variantes(_to_abspath(logo_path))
+    if not man:
+        return None
+    return {
+        nome: f"{router.prefix}/logo/{municipio_id}/{v['arquivo']}"
+        for nome, v in (man.get("variantes") or {}).items()
+    }
+
+
+def _branding_out(branding: MunicipioBranding, mid: int) -> dict:
+    data = branding.model_dump()
+    data["public_base_url"] = _read_public_base_url(mid)
+    data["logo_urls"] = _logo_urls(mid, branding.logo_path)
+    return data
+
+
 # =========================================================
 # Schemas
 # =========================================================
@@ -193,7 +228,7 @@ class LogoUpload(BaseModel):
 # Endpoints
 # =========================================================
 
-@router.get("", dependencies=[Depends(exigir_minimo_perfil("operador"))])
+@router.get("", dependencies=[Depends(exigir_minimo_perfil("operador")), Depends(versoes.condicional("municipio_branding"))])
 def get_branding(
     municipio_id: Optional[int] = Query(default=None),
     session: Session = Depends(get_session),
@@ -206,9 +241,7 @@ def get_branding(
     if not branding:
         branding = MunicipioBranding(municipio_id=mid)
 
-    data = branding.model_dump()
-    data["public_base_url"] = _read_public_base_url(mid)
-    return data
+    return _branding_out(branding, mid)
 
 
 @router.post("", dependencies=[Depends(exigir_minimo_perfil("coord_municipal"))])
@@ -258,9 +291,7 @@ def upsert_branding(
     session.commit()
     session.refresh(branding)
 
-    data = branding.model_dump()
-    data["public_base_url"] = _read_public_base_url(mid)
-    return data
+    return _branding_out(branding, mid)
 
 
 @router.post("/logo", dependencies=[Depends(exigir_minimo_perfil("coord_municipal"))])
@@ -288,6 +319,21 @@ def upload_logo(
     session.commit()
     session.refresh(branding)
 
-    data = branding.model_dump()
-    data["public_base_url"] = _read_public_base_url(mid)
-    return data
+    return _branding_out(branding, mid)
+
+
+@router.get("/logo/{municipio_id}/{arquivo}")
+def get_logo_variante(municipio_id: int, arquivo: str):
+    """Variante do logo pelo nome com hash (público: usado em <img> e já vai impresso nos documentos)."""
+    if not branding_logo.ARQUIVO_RE.match(arquivo or ""):
+        raise HTTPException(status_code=404, detail="Logo não encontrado.")
+    abs_path = os.path.join(_branding_dir(int(municipio_id)), arquivo)
+    if not os.path.exists(abs_path):
+        raise HTTPException(status_code=404, detail="Logo não encontrado.")
+    # o nome muda quando o conteúdo muda: cache longo e imutável
+    etag = '"' + arquivo.rsplit("_", 1)[-1].split(".", 1)[0] + '"'
+    return FileResponse(
+        abs_path,
+        media_type="image/png",
+        headers={"Cache-Control": "public, max-age=31536000, immutable", "ETag": etag},
+    )
@@ -14,6 +14,7 @@ from app.core.auth import get_current_user, pode_acesso_global, nivel_perfil
 from app.core.poprua_fluxo import etapa_metro
 from app.models.usuario import Usuario
 from app.models.caso_pop_rua import CasoPopRua, CasoPopRuaEtapaHistorico
+from app.services.arquivo import com_arquivo, obter
 
 router = APIRouter(prefix="/casos", tags=["casos"])
 
@@ -270,26 +271,30 @@ def listar_casos(
 
     _exigir_nivel(usuario, NIVEL_VER, acao="listar casos")
 
+    # casos encerrados há tempo ficam em arq_casopoprua (app/services/arquivo.py);
+    # "ativo" não separa quente de arquivo, então a lista lê sempre os dois
+    C = com_arquivo(CasoPopRua)
+
     # Filters
     conds = []
 
     if not incluir_inativos:
-        conds.append(CasoPopRua.ativo == True)  # noqa: E712
+        conds.append(C.ativo == True)  # noqa: E712
 
     # município: usuários comuns ficam restritos ao próprio município
     if pode_acesso_global(usuario):
         if municipio_id is not None:
-            conds.append(CasoPopRua.municipio_id == int(municipio_id))
+            conds.append(C.municipio_id == int(municipio_id))
     else:
         mun_user = getattr(usuario, "municipio_id", None)
         if mun_user is not None:
-            conds.append(CasoPopRua.municipio_id == int(mun_user))
+            conds.append(C.municipio_id == int(mun_user))
 
     if pessoa_id is not None:
-        conds.append(CasoPopRua.pessoa_id == int(pessoa_id))
+        conds.append(C.pessoa_id == int(pessoa_id))
 
     # total
-    total_stmt = select(func.count()).select_from(CasoPopRua)
+    total_stmt = select(func.count()).select_from(C)
     for c in conds:
         total_stmt = total_stmt.where(c)
     total = session.exec(total_stmt).one() or 0
@@ -304,25 +309,25 @@ def listar_casos(
     # list (preview)
     stmt = (
         select(
-            CasoPopRua.id,
-            CasoPopRua.pessoa_id,
-            CasoPopRua.municipio_id,
-            CasoPopRua.status,
-            CasoPopRua.etapa_atual,
-            CasoPopRua.ativo,
-            CasoPopRua.data_abertura,
-            CasoPopRua.data_ultima_atualizacao,
-            CasoPopRua.data_inicio_etapa_atual,
-            CasoPopRua.prazo_etapa_dias,
-            CasoPopRua.estagnado,
-            CasoPopRua.motivo_estagnacao,
-            CasoPopRua.data_prevista_proxima_acao,
-            CasoPopRua.data_ultima_acao,
-            CasoPopRua.flag_estagnado,
-            CasoPopRua.dias_estagnado,
-            CasoPopRua.tipo_estagnacao,
+            C.id,
+            C.pessoa_id,
+            C.municipio_id,
+            C.status,
+            C.etapa_atual,
+            C.ativo,
+            C.data_abertura,
+            C.data_ultima_atualizacao,
+            C.data_inicio_etapa_atual,
+            C.prazo_etapa_dias,
+            C.estagnado,
+            C.motivo_estagnacao,
+            C.data_prevista_proxima_acao,
+            C.data_ultima_acao,
+            C.flag_estagnado,
+            C.dias_estagnado,
+            C.tipo_estagnacao,
         )
-        .order_by(CasoPopRua.id.desc())
+        .order_by(C.id.desc())
         .offset(int(offset))
         .limit(int(limit))
     )
@@ -398,7 +403,7 @@ def obter_caso(
 ):
     _exigir_nivel(usuario, NIVEL_VER, acao="visualizar caso")
 
-    caso = session.get(CasoPopRua, caso_id)
+    caso = obter(session, CasoPopRua, caso_id)  # encerrado há tempo: vem do arquivo
     if not caso:
         raise HTTPException(status_code=404, detail="Caso não encontrado.")
 
@@ -674,16 +679,17 @@ def historico_etapas(
 ):
     _exigir_nivel(usuario, NIVEL_VER, acao="ver histórico")
 
-    caso = session.get(CasoPopRua, caso_id)
+    caso = obter(session, CasoPopRua, caso_id)
     if not caso:
         raise HTTPException(status_code=404, detail="Caso não encontrado.")
 
     _verifica_acesso_caso(usuario, caso)
 
+    H = com_arquivo(CasoPopRuaEtapaHistorico)
     stmt = (
-        select(CasoPopRuaEtapaHistorico)
-        .where(CasoPopRuaEtapaHistorico.caso_id == caso_id)
-        .order_by(CasoPopRuaEtapaHistorico.data_acao.desc())
+        select(H)
+        .where(H.caso_id == caso_id)
+        .order_by(H.data_acao.desc())
     )
     itens = session.exec(stmt).all()
 
@@ -8,12 +8,14 @@ from pydantic import BaseModel, Field as PField
 from sqlalchemy import or_  # type: ignore
 from sqlmodel import Session, select
 
+from app.core import versoes
 from app.core.auth import exigir_minimo_perfil, get_current_user, pode_acesso_global
 from app.core.db import get_session
 from app.models.usuario import Usuario
 
 from app.models.sla_regra import SlaRegra
 from app.models.meta_kpi import MetaKpi
+from app.services import sla_resolver
 
 
 router = APIRouter(prefix="/config", tags=["config"])
@@ -47,77 +49,6 @@ def _resolver_municipio(usuario: Usuario, municipio_id: Optional[int]) -> Option
     return int(mid)
 
 
-def _selecionar_regra_sla(
-    regras: List[SlaRegra],
-    municipio_id: Optional[int],
-    unidade_tipo: Optional[str],
-    unidade_id: Optional[int],
-    modulo: str,
-    etapa: str,
-) -> Optional[SlaRegra]:
-    """Seleciona a melhor regra aplicável (mais específica ganha)."""
-    mod = _norm_str(modulo) or ""
-    st = _norm_str(etapa) or ""
-    ut = _norm_str(unidade_tipo)
-    uid = int(unidade_id) if unidade_id is not None else None
-
-    best: Optional[SlaRegra] = None
-    best_score = -1
-
-    for r in regras:
-        if not getattr(r, "ativo", True):
-            continue
-        if _norm_str(getattr(r, "modulo", None)) != mod:
-            continue
-        if _norm_str(getattr(r, "etapa", None)) != st:
-            continue
-
-        r_mid = getattr(r, "municipio_id", None)
-        if r_mid is not None and municipio_id is not None:
-            if int(r_mid) != int(municipio_id):
-                continue
-        elif r_mid is not None and municipio_id is None:
-            # regra municipal não vale para consulta global sem municipio_id
-            continue
-        # se r_mid is None => global: ok
-
-        r_ut = _norm_str(getattr(r, "unidade_tipo", None))
-        r_uid = getattr(r, "unidade_id", None)
-        r_uid = int(r_uid) if r_uid is not None else None
-
-        # compat de unidade_tipo
-        if r_ut is not None:
-            if ut is None:
-                continue
-            if r_ut != ut:
-                continue
-
-        # compat de unidade_id
-        if r_uid is not None:
-            if uid is None:
-                continue
-            if int(r_uid) != int(uid):
-                continue
-
-        score = 0
-        score += 4 if r_mid is not None else 0
-        score += 2 if r_ut is not None else 0
-        score += 1 if r_uid is not None else 0
-
-        if score > best_score:
-            best = r
-            best_score = score
-        elif score == best_score and best is not None:
-            # desempate: mais recente
-            b_upd = getattr(best, "atualizado_em", None)
-            r_upd = getattr(r, "atualizado_em", None)
-            if isinstance(r_upd, datetime) and isinstance(b_upd, datetime):
-                if r_upd > b_upd:
-                    best = r
-
-    return best
-
-
 # =========================
 # SLA
 # =========================
@@ -134,7 +65,7 @@ class SlaUpsert(BaseModel):
     ativo: bool = True
 
 
-@router.get("/sla", response_model=List[SlaRegra])
+@router.get("/sla", response_model=List[SlaRegra], dependencies=[Depends(versoes.condicional("sla_regra"))])
 def listar_sla(
     municipio_id: Optional[int] = Query(default=None),
     unidade_tipo: Optional[str] = Query(default=None),
@@ -263,21 +194,9 @@ def sla_efetivo(
     mod = _norm_str(modulo) or ""
     st = _norm_str(etapa) or ""
 
-    # carrega candidatas (municipal + global)
-    stmt = select(SlaRegra).where(
-        SlaRegra.ativo == True,  # noqa: E712
-        SlaRegra.modulo == mod,
-        SlaRegra.etapa == st,
-    )
-    if mid is not None:
-        # pode aplicar regra municipal ou global
-        stmt = stmt.where((SlaRegra.municipio_id == int(mid)) | (SlaRegra.municipio_id == None))  # noqa: E711
-    else:
-        # sem município (consulta global): só globais
-        stmt = stmt.where(SlaRegra.municipio_id == None)  # noqa: E711
-
-    regras = list(session.exec(stmt).all())
-    regra = _selecionar_regra_sla(regras, mid, ut, uid, mod, st)
+    # sem município (consulta global): a matriz só tem regras globais
+    r = sla_resolver.resolvedor(session).matriz(mid).regra(ut, uid, mod, st)
+    regra = session.get(SlaRegra, r.id) if r is not None else None
 
     return {
         "sla_dias": int(getattr(regra, "sla_dias")) if regra else int(default_dias),
@@ -286,6 +205,18 @@ def sla_efetivo(
     }
 
 
+@router.get("/sla/matriz")
+def sla_matriz(
+    municipio_id: Optional[int] = Query(default=None),
+    session: Session = Depends(get_session),
+    usuario: Usuario = Depends(get_current_user),
+) -> Dict[str, Any]:
+    """SLA efetivo de todas as combinações modulo x etapa x unidade do município (uma chamada)."""
+
+    mid = _resolver_municipio(usuario, municipio_id)
+    return sla_resolver.montar_matriz(session, mid)
+
+
 # =========================
 # METAS
 # =========================
@@ -303,7 +234,7 @@ class MetaUpsert(BaseModel):
     ativo: bool = True
 
 
-@router.get("/metas", response_model=List[MetaKpi])
+@router.get("/metas", response_model=List[MetaKpi], dependencies=[Depends(versoes.condicional("meta_kpi"))])
 def listar_metas(
     municipio_id: Optional[int] = Query(default=None),
     include_globais: bool = Query(default=False, description="Se true, inclui metas globais (municipio_id=NULL) como fallback."),
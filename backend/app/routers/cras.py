@@ -6,6 +6,7 @@ from typing import Any, Dict, List, Optional
 from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlmodel import Session, select
 
+from app.core import versoes
 from app.core.db import get_session
 from app.core.auth import get_current_user, pode_acesso_global
 from app.models.usuario import Usuario
@@ -109,7 +110,7 @@ def _ensure_defaults(session: Session, paif: PaifAcompanhamento, usuario: Usuari
     return protocolo
 
 
-@router.get("/paif/etapas")
+@router.get("/paif/etapas", dependencies=[Depends(versoes.condicional(max_age=300))])
 def listar_etapas(usuario: Usuario = Depends(get_current_user)):
     return {"etapas": PAIF_ETAPAS}
 
@@ -342,7 +343,7 @@ def _coerce_municipio(usuario: Usuario, municipio_id: Optional[int]) -> int:
         return int(municipio_id) if municipio_id is not None else _mun_usuario(usuario)
     return _mun_usuario(usuario)
 
-@router.get("/unidades")
+@router.get("/unidades", dependencies=[Depends(versoes.condicional("cras_unidade"))])
 def listar_unidades(
     municipio_id: Optional[int] = Query(default=None),
     session: Session = Depends(get_session),
@@ -1,9 +1,11 @@
 from __future__ import annotations
 
+import time
 from datetime import date, datetime, timedelta
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
+from sqlalchemy import and_, exists, func, insert, or_
 from sqlmodel import Session, select
 
 from app.core.auth import exigir_minimo_perfil, get_current_user, pode_acesso_global
@@ -12,6 +14,7 @@ from app.models.usuario import Usuario
 
 from app.models.cras_automacoes import CrasAutomacaoExecucao, CrasAutomacaoRegra
 from app.models.cras_tarefas import CrasTarefa
+from app.core import projecoes
 
 from app.models.caso_cras import CasoCras, CasoCrasHistorico
 from app.models.cras_pia import CrasPiaPlano, CrasPiaAcao
@@ -77,19 +80,33 @@ def _ensure_scope(usuario: Usuario, municipio_id: int) -> None:
             raise HTTPException(status_code=403, detail="Sem acesso a este município.")
 
 
-def _task_exists(session: Session, ref_tipo: str, ref_id: int, municipio_id: int, unidade_id: Optional[int]) -> bool:
-    stmt = select(CrasTarefa).where(CrasTarefa.ref_tipo == ref_tipo, CrasTarefa.ref_id == ref_id)
-    stmt = stmt.where(CrasTarefa.municipio_id == municipio_id)
-    if unidade_id:
-        stmt = stmt.where(CrasTarefa.unidade_id == unidade_id)
+# status de tarefa que contam como duplicidade (já existe tarefa "viva" para o mesmo ref)
+_STATUS_TAREFA_ABERTA = ("aberta", "em_andamento")
 
-    # somente abertas/em andamento contam como duplicidade
-    stmt = stmt.where(CrasTarefa.status.in_(["aberta", "em_andamento"]))
-    return session.exec(stmt).first() is not None
+# quantos ref_ids o dry-run devolve como amostra
+_AMOSTRA_DRY_RUN = 20
 
 
-def _create_task(
-    session: Session,
+def _sem_tarefa_aberta(ref_tipo: str, ref_col: Any, unidade_col: Any, municipio_id: int) -> Any:
+    """Anti-join contra CrasTarefa: nenhuma tarefa aberta/em andamento para o mesmo ref.
+
+    Mesma regra do antigo _task_exists (uma query por candidato), agora dentro da
+    query de candidatos: mesmo município e, se o item tem unidade, mesma unidade.
+    """
+    return ~exists().where(
+        CrasTarefa.ref_tipo == ref_tipo,
+        CrasTarefa.ref_id == ref_col,
+        CrasTarefa.municipio_id == municipio_id,
+        or_(unidade_col.is_(None), CrasTarefa.unidade_id == unidade_col),
+        CrasTarefa.status.in_(_STATUS_TAREFA_ABERTA),
+    )
+
+
+def _contar(session: Session, stmt: Any) -> int:
+    return int(session.exec(select(func.count()).select_from(stmt.subquery())).one() or 0)
+
+
+def _nova_tarefa(
     municipio_id: int,
     unidade_id: Optional[int],
     ref_tipo: str,
@@ -99,26 +116,43 @@ def _create_task(
     prioridade: str,
     data_vencimento: Optional[date],
     responsavel_id: Optional[int] = None,
-) -> CrasTarefa:
-    t = CrasTarefa(
-        municipio_id=municipio_id,
-        unidade_id=unidade_id,
-        ref_tipo=ref_tipo,
-        ref_id=ref_id,
-        titulo=titulo[:200],
-        descricao=(descricao or "")[:2000],
-        prioridade=(prioridade or "media")[:20],
-        status="aberta",
-        data_vencimento=data_vencimento,
-        responsavel_id=responsavel_id,
-        responsavel_nome=None,
-        criado_em=_now(),
-        atualizado_em=_now(),
-    )
-    session.add(t)
-    session.commit()
-    session.refresh(t)
-    return t
+) -> Dict[str, Any]:
+    """Linha de CrasTarefa pronta para o insert em lote."""
+    agora = _now()
+    return {
+        "municipio_id": municipio_id,
+        "unidade_id": unidade_id,
+        "ref_tipo": ref_tipo,
+        "ref_id": ref_id,
+        "titulo": titulo[:200],
+        "descricao": (descricao or "")[:2000],
+        "prioridade": (prioridade or "media")[:20],
+        "status": "aberta",
+        "data_vencimento": data_vencimento,
+        "data_conclusao": None,
+        "responsavel_id": responsavel_id,
+        "responsavel_nome": None,
+        "criado_em": agora,
+        "atualizado_em": agora,
+    }
+
+
+def _gravar_tarefas(session: Session, tarefas: List[Dict[str, Any]], candidatos: int, dry_run: bool) -> Dict[str, Any]:
+    """Insere as tarefas num único executemany/transação (ou só conta, no dry-run)."""
+    if tarefas and not dry_run:
+        session.execute(insert(CrasTarefa), tarefas)
+        # insert em lote não passa pelo ORM: contadores do resumo via evento explícito
+        for t in tarefas:
+            projecoes.emitir(session, CrasTarefa.__tablename__, depois=t)
+        session.commit()
+    out: Dict[str, Any] = {
+        "created": len(tarefas),
+        "skipped": max(0, int(candidatos) - len(tarefas)),
+        "candidatos": int(candidatos),
+    }
+    if dry_run:
+        out["amostra_ref_ids"] = [t["ref_id"] for t in tarefas[:_AMOSTRA_DRY_RUN]]
+    return out
 
 
 def _seed_defaults(session: Session, usuario: Usuario, municipio_id: int, unidade_id: Optional[int] = None) -> List[Dict[str, Any]]:
@@ -264,67 +298,53 @@ def _exec_regra_caso_sem_movimentacao(
     unidade_id: Optional[int],
     params: Dict[str, Any],
     dry_run: bool,
-) -> Tuple[int, int]:
+) -> Dict[str, Any]:
     dias = int(params.get("dias_sem_mov") or 7)
     prazo_dias = int(params.get("prazo_dias") or 2)
     prioridade = str(params.get("prioridade") or "alta")
     cutoff = _now() - timedelta(days=dias)
     hoje = date.today()
     venc = hoje + timedelta(days=prazo_dias)
+    ref_tipo = "caso_sem_movimentacao"
 
-    stmt = select(CasoCras).where(CasoCras.municipio_id == mun)
+    base = select(CasoCras.id).where(CasoCras.municipio_id == mun)
     if unidade_id:
-        stmt = stmt.where(CasoCras.unidade_id == unidade_id)
+        base = base.where(CasoCras.unidade_id == unidade_id)
     # caso aberto
-    try:
-        stmt = stmt.where(CasoCras.data_encerramento.is_(None))
-    except Exception:
-        pass
-
-    casos = session.exec(stmt).all()
-    created = 0
-    skipped = 0
-    for caso in casos:
-        # última movimentação = último histórico
-        last_dt = None
-        h = session.exec(
-            select(CasoCrasHistorico).where(CasoCrasHistorico.caso_id == caso.id).order_by(CasoCrasHistorico.criado_em.desc())
-        ).first()
-        if h and getattr(h, "criado_em", None):
-            last_dt = h.criado_em
-        else:
-            last_dt = getattr(caso, "atualizado_em", None) or getattr(caso, "data_abertura", None) or _now()
-
-        if last_dt and last_dt < cutoff:
-            ref_tipo = "caso_sem_movimentacao"
-            ref_id = int(caso.id)
-            if _task_exists(session, ref_tipo, ref_id, mun, getattr(caso, "unidade_id", None)):
-                skipped += 1
-                continue
+    base = base.where(CasoCras.data_encerramento.is_(None))
+
+    # última movimentação = último histórico (senão atualizado_em/data_abertura)
+    ultimo_hist = (
+        select(func.max(CasoCrasHistorico.criado_em))
+        .where(CasoCrasHistorico.caso_id == CasoCras.id)
+        .correlate(CasoCras)
+        .scalar_subquery()
+    )
+    ultima_mov = func.coalesce(ultimo_hist, CasoCras.atualizado_em, CasoCras.data_abertura)
 
-            titulo = f"Caso #{caso.id}: sem movimentação ({dias}d)"
-            etapa = getattr(caso, "etapa_atual", None) or getattr(caso, "etapa", None) or ""
-            descricao = f"Caso aberto sem movimentação há {dias} dias. Etapa atual: {etapa}".strip()
-            responsavel_id = getattr(caso, "tecnico_responsavel_id", None)
+    stmt = (
+        select(CasoCras.id, CasoCras.unidade_id, CasoCras.etapa_atual, CasoCras.tecnico_responsavel_id)
+        .where(CasoCras.id.in_(base))
+        .where(ultima_mov < cutoff)
+        .where(_sem_tarefa_aberta(ref_tipo, CasoCras.id, CasoCras.unidade_id, mun))
+        .order_by(CasoCras.id)
+    )
 
-            if not dry_run:
-                _create_task(
-                    session=session,
-                    municipio_id=mun,
-                    unidade_id=getattr(caso, "unidade_id", unidade_id),
-                    ref_tipo=ref_tipo,
-                    ref_id=ref_id,
-                    titulo=titulo,
-                    descricao=descricao,
-                    prioridade=prioridade,
-                    data_vencimento=venc,
-                    responsavel_id=responsavel_id,
-                )
-            created += 1
-        else:
-            skipped += 1
+    tarefas: List[Dict[str, Any]] = []
+    for caso_id, caso_unidade, etapa, responsavel_id in session.exec(stmt).all():
+        tarefas.append(_nova_tarefa(
+            municipio_id=mun,
+            unidade_id=caso_unidade if caso_unidade is not None else unidade_id,
+            ref_tipo=ref_tipo,
+            ref_id=int(caso_id),
+            titulo=f"Caso #{caso_id}: sem movimentação ({dias}d)",
+            descricao=f"Caso aberto sem movimentação há {dias} dias. Etapa atual: {etapa or ''}".strip(),
+            prioridade=prioridade,
+            data_vencimento=venc,
+            responsavel_id=responsavel_id,
+        ))
 
-    return created, skipped
+    return _gravar_tarefas(session, tarefas, _contar(session, base), dry_run)
 
 
 def _exec_regra_pia_acao_vencida(
@@ -333,68 +353,56 @@ def _exec_regra_pia_acao_vencida(
     unidade_id: Optional[int],
     params: Dict[str, Any],
     dry_run: bool,
-) -> Tuple[int, int]:
+) -> Dict[str, Any]:
     prazo_dias = int(params.get("prazo_dias") or 1)
     prioridade = str(params.get("prioridade") or "alta")
     hoje = date.today()
     venc = hoje + timedelta(days=prazo_dias)
+    ref_tipo = "pia_acao_vencida"
 
-    stmt = (
-        select(CrasPiaAcao, CrasPiaPlano)
+    base = (
+        select(CrasPiaAcao.id)
         .join(CrasPiaPlano, CrasPiaAcao.plano_id == CrasPiaPlano.id)
         .where(CrasPiaPlano.municipio_id == mun)
     )
     if unidade_id:
-        stmt = stmt.where(CrasPiaPlano.unidade_id == unidade_id)
+        base = base.where(CrasPiaPlano.unidade_id == unidade_id)
 
     # apenas pendentes e com prazo vencido
-    stmt = stmt.where(CrasPiaAcao.status != "concluida")
-    stmt = stmt.where(CrasPiaAcao.prazo.is_not(None))
-    stmt = stmt.where(CrasPiaAcao.prazo < hoje)
-
-    rows = session.exec(stmt).all()
-    created = 0
-    skipped = 0
-    for acao, plano in rows:
-        ref_tipo = "pia_acao_vencida"
-        ref_id = int(getattr(acao, "id") or 0)
-        if not ref_id:
-            continue
-        if _task_exists(session, ref_tipo, ref_id, mun, getattr(plano, "unidade_id", unidade_id)):
-            skipped += 1
-            continue
+    base = base.where(CrasPiaAcao.status != "concluida")
+    base = base.where(CrasPiaAcao.prazo.is_not(None))
+    base = base.where(CrasPiaAcao.prazo < hoje)
 
-        caso_id = getattr(plano, "caso_id", None)
-        titulo = f"PIA: ação vencida (Caso #{caso_id})" if caso_id else "PIA: ação vencida"
-        descricao = f"Ação vencida em {getattr(acao,'prazo',None)}: {getattr(acao,'descricao','')}".strip()
-        responsavel_id = getattr(acao, "responsavel_usuario_id", None)
-
-        if not dry_run:
-            _create_task(
-                session=session,
-                municipio_id=mun,
-                unidade_id=getattr(plano, "unidade_id", unidade_id),
-                ref_tipo=ref_tipo,
-                ref_id=ref_id,
-                titulo=titulo,
-                descricao=descricao,
-                prioridade=prioridade,
-                data_vencimento=venc,
-                responsavel_id=responsavel_id,
-            )
-        created += 1
-
-    return created, skipped
+    stmt = (
+        select(
+            CrasPiaAcao.id,
+            CrasPiaAcao.prazo,
+            CrasPiaAcao.descricao,
+            CrasPiaAcao.responsavel_usuario_id,
+            CrasPiaPlano.caso_id,
+            CrasPiaPlano.unidade_id,
+        )
+        .join(CrasPiaPlano, CrasPiaAcao.plano_id == CrasPiaPlano.id)
+        .where(CrasPiaAcao.id.in_(base))
+        .where(_sem_tarefa_aberta(ref_tipo, CrasPiaAcao.id, CrasPiaPlano.unidade_id, mun))
+        .order_by(CrasPiaAcao.id)
+    )
 
+    tarefas: List[Dict[str, Any]] = []
+    for acao_id, prazo, descricao, responsavel_id, caso_id, plano_unidade in session.exec(stmt).all():
+        tarefas.append(_nova_tarefa(
+            municipio_id=mun,
+            unidade_id=plano_unidade if plano_unidade is not None else unidade_id,
+            ref_tipo=ref_tipo,
+            ref_id=int(acao_id),
+            titulo=f"PIA: ação vencida (Caso #{caso_id})" if caso_id else "PIA: ação vencida",
+            descricao=f"Ação vencida em {prazo}: {descricao or ''}".strip(),
+            prioridade=prioridade,
+            data_vencimento=venc,
+            responsavel_id=responsavel_id,
+        ))
 
-def _has_devolutiva(session: Session, encaminhamento_id: int) -> bool:
-    ev = session.exec(
-        select(CrasEncaminhamentoEvento)
-        .where(CrasEncaminhamentoEvento.encaminhamento_id == encaminhamento_id)
-        .where(CrasEncaminhamentoEvento.tipo.in_(["devolutiva", "concluido", "cancelado"]))
-        .order_by(CrasEncaminhamentoEvento.em.desc())
-    ).first()
-    return ev is not None
+    return _gravar_tarefas(session, tarefas, _contar(session, base), dry_run)
 
 
 def _exec_regra_encaminhamento_sem_devolutiva(
@@ -403,60 +411,60 @@ def _exec_regra_encaminhamento_sem_devolutiva(
     unidade_id: Optional[int],
     params: Dict[str, Any],
     dry_run: bool,
-) -> Tuple[int, int]:
+) -> Dict[str, Any]:
     prazo_dias = int(params.get("prazo_dias") or 1)
     prioridade = str(params.get("prioridade") or "alta")
     hoje = date.today()
     venc = hoje + timedelta(days=prazo_dias)
+    ref_tipo = "encaminhamento_sem_devolutiva"
 
-    stmt = select(CrasEncaminhamento).where(CrasEncaminhamento.municipio_id == mun)
+    base = select(CrasEncaminhamento.id).where(CrasEncaminhamento.municipio_id == mun)
     if unidade_id:
-        stmt = stmt.where(CrasEncaminhamento.unidade_id == unidade_id)
-
+        base = base.where(CrasEncaminhamento.unidade_id == unidade_id)
     # candidatos: não concluídos/cancelados
-    stmt = stmt.where(CrasEncaminhamento.status.notin_(["concluido", "cancelado"]))
-    encs = session.exec(stmt).all()
-
-    created = 0
-    skipped = 0
-    for enc in encs:
-        # usa prazo específico do encaminhamento (default 7 dias)
-        prazo_enc = int(getattr(enc, "prazo_devolutiva_dias", 7) or 7)
-        enviado_em = getattr(enc, "enviado_em", None) or getattr(enc, "criado_em", None) or _now()
-        if (enviado_em + timedelta(days=prazo_enc)).date() >= hoje:
-            skipped += 1
-            continue
-        if _has_devolutiva(session, int(enc.id)):
-            skipped += 1
-            continue
+    base = base.where(CrasEncaminhamento.status.notin_(["concluido", "cancelado"]))
+
+    # prazo específico do encaminhamento (default 7 dias). "Vencido" = (enviado + prazo).date() < hoje,
+    # ou seja, enviado < hoje 00:00 - prazo. Como o prazo varia por linha, monta um OR por prazo
+    # distinto (são poucos) — portátil entre SQLite e Postgres, sem aritmética de data no SQL.
+    prazo_col = func.coalesce(func.nullif(CrasEncaminhamento.prazo_devolutiva_dias, 0), 7)
+    enviado_col = func.coalesce(CrasEncaminhamento.enviado_em, CrasEncaminhamento.criado_em)
+    hoje_0h = datetime.combine(hoje, datetime.min.time())
+    prazos = [int(p) for p in session.exec(select(prazo_col).where(CrasEncaminhamento.id.in_(base)).distinct()).all() if p is not None]
+    if not prazos:
+        return _gravar_tarefas(session, [], 0, dry_run)
+    vencido = or_(*[and_(prazo_col == p, enviado_col < hoje_0h - timedelta(days=p)) for p in prazos])
+
+    sem_devolutiva = ~exists().where(
+        CrasEncaminhamentoEvento.encaminhamento_id == CrasEncaminhamento.id,
+        CrasEncaminhamentoEvento.tipo.in_(["devolutiva", "concluido", "cancelado"]),
+    )
 
-        ref_tipo = "encaminhamento_sem_devolutiva"
-        ref_id = int(enc.id)
-        if _task_exists(session, ref_tipo, ref_id, mun, getattr(enc, "unidade_id", unidade_id)):
-            skipped += 1
-            continue
+    stmt = (
+        select(CrasEncaminhamento.id, CrasEncaminhamento.unidade_id, CrasEncaminhamento.destino_nome, CrasEncaminhamento.motivo)
+        .where(CrasEncaminhamento.id.in_(base))
+        .where(vencido)
+        .where(sem_devolutiva)
+        .where(_sem_tarefa_aberta(ref_tipo, CrasEncaminhamento.id, CrasEncaminhamento.unidade_id, mun))
+        .order_by(CrasEncaminhamento.id)
+    )
 
-        destino = getattr(enc, "destino_nome", "") or ""
-        titulo = f"Encaminhamento sem devolutiva: {destino}".strip() or f"Encaminhamento #{enc.id}: sem devolutiva"
-        motivo = (getattr(enc, "motivo", "") or "")
-        descricao = f"Encaminhamento #{enc.id} para {destino} sem devolutiva. Motivo: {motivo[:300]}".strip()
-
-        if not dry_run:
-            _create_task(
-                session=session,
-                municipio_id=mun,
-                unidade_id=getattr(enc, "unidade_id", unidade_id),
-                ref_tipo=ref_tipo,
-                ref_id=ref_id,
-                titulo=titulo,
-                descricao=descricao,
-                prioridade=prioridade,
-                data_vencimento=venc,
-                responsavel_id=None,
-            )
-        created += 1
+    tarefas: List[Dict[str, Any]] = []
+    for enc_id, enc_unidade, destino_nome, motivo in session.exec(stmt).all():
+        destino = destino_nome or ""
+        tarefas.append(_nova_tarefa(
+            municipio_id=mun,
+            unidade_id=enc_unidade if enc_unidade is not None else unidade_id,
+            ref_tipo=ref_tipo,
+            ref_id=int(enc_id),
+            titulo=f"Encaminhamento sem devolutiva: {destino}".strip() or f"Encaminhamento #{enc_id}: sem devolutiva",
+            descricao=f"Encaminhamento #{enc_id} para {destino} sem devolutiva. Motivo: {(motivo or '')[:300]}".strip(),
+            prioridade=prioridade,
+            data_vencimento=venc,
+            responsavel_id=None,
+        ))
 
-    return created, skipped
+    return _gravar_tarefas(session, tarefas, _contar(session, base), dry_run)
 
 
 def _exec_regra_cadunico_agendamento_passou(
@@ -465,67 +473,60 @@ def _exec_regra_cadunico_agendamento_passou(
     unidade_id: Optional[int],
     params: Dict[str, Any],
     dry_run: bool,
-) -> Tuple[int, int]:
+) -> Dict[str, Any]:
     prazo_dias = int(params.get("prazo_dias") or 1)
     prioridade = str(params.get("prioridade") or "media")
     hoje = date.today()
     venc = hoje + timedelta(days=prazo_dias)
+    ref_tipo = "cadunico_agendamento_passou"
 
-    stmt = select(CadunicoPreCadastro).where(CadunicoPreCadastro.municipio_id == mun)
+    base = select(CadunicoPreCadastro.id).where(CadunicoPreCadastro.municipio_id == mun)
     if unidade_id:
-        stmt = stmt.where(CadunicoPreCadastro.unidade_id == unidade_id)
-
-    stmt = stmt.where(CadunicoPreCadastro.status == "agendado")
-    stmt = stmt.where(CadunicoPreCadastro.data_agendada.is_not(None))
+        base = base.where(CadunicoPreCadastro.unidade_id == unidade_id)
+    base = base.where(CadunicoPreCadastro.status == "agendado")
+    base = base.where(CadunicoPreCadastro.data_agendada.is_not(None))
 
-    rows = session.exec(stmt).all()
-    created = 0
-    skipped = 0
-    for pc in rows:
-        dt = getattr(pc, "data_agendada", None)
-        if not dt:
-            continue
-        try:
-            ag_date = dt.date()
-        except Exception:
-            ag_date = hoje
+    # agendamento passou = data agendada antes de hoje
+    stmt = (
+        select(
+            CadunicoPreCadastro.id,
+            CadunicoPreCadastro.unidade_id,
+            CadunicoPreCadastro.data_agendada,
+            CadunicoPreCadastro.caso_id,
+            CadunicoPreCadastro.pessoa_id,
+            CasoCras.tecnico_responsavel_id,
+        )
+        .outerjoin(CasoCras, CasoCras.id == CadunicoPreCadastro.caso_id)
+        .where(CadunicoPreCadastro.id.in_(base))
+        .where(CadunicoPreCadastro.data_agendada < datetime.combine(hoje, datetime.min.time()))
+        .where(_sem_tarefa_aberta(ref_tipo, CadunicoPreCadastro.id, CadunicoPreCadastro.unidade_id, mun))
+        .order_by(CadunicoPreCadastro.id)
+    )
 
-        if ag_date >= hoje:
-            skipped += 1
-            continue
+    tarefas: List[Dict[str, Any]] = []
+    for pc_id, pc_unidade, data_agendada, caso_id, pessoa_id, responsavel_id in session.exec(stmt).all():
+        ag_date = data_agendada.date()
+        tarefas.append(_nova_tarefa(
+            municipio_id=mun,
+            unidade_id=pc_unidade if pc_unidade is not None else unidade_id,
+            ref_tipo=ref_tipo,
+            ref_id=int(pc_id),
+            titulo=f"CadÚnico: agendamento passou (pré-cadastro #{pc_id})",
+            descricao=f"Agendado em {ag_date} e ainda não finalizado. Caso={caso_id} Pessoa={pessoa_id}".strip(),
+            prioridade=prioridade,
+            data_vencimento=venc,
+            responsavel_id=responsavel_id if caso_id else None,
+        ))
 
-        ref_tipo = "cadunico_agendamento_passou"
-        ref_id = int(pc.id)
-        if _task_exists(session, ref_tipo, ref_id, mun, getattr(pc, "unidade_id", unidade_id)):
-            skipped += 1
-            continue
+    return _gravar_tarefas(session, tarefas, _contar(session, base), dry_run)
 
-        titulo = f"CadÚnico: agendamento passou (pré-cadastro #{pc.id})"
-        desc = f"Agendado em {ag_date} e ainda não finalizado. Caso={getattr(pc,'caso_id',None)} Pessoa={getattr(pc,'pessoa_id',None)}".strip()
-
-        responsavel_id = None
-        caso_id = getattr(pc, "caso_id", None)
-        if caso_id:
-            caso = session.get(CasoCras, caso_id)
-            if caso:
-                responsavel_id = getattr(caso, "tecnico_responsavel_id", None)
-
-        if not dry_run:
-            _create_task(
-                session=session,
-                municipio_id=mun,
-                unidade_id=getattr(pc, "unidade_id", unidade_id),
-                ref_tipo=ref_tipo,
-                ref_id=ref_id,
-                titulo=titulo,
-                descricao=desc,
-                prioridade=prioridade,
-                data_vencimento=venc,
-                responsavel_id=responsavel_id,
-            )
-        created += 1
 
-    return created, skipped
+_EXECUTORES = {
+    "caso_sem_movimentacao": _exec_regra_caso_sem_movimentacao,
+    "pia_acao_vencida": _exec_regra_pia_acao_vencida,
+    "encaminhamento_sem_devolutiva": _exec_regra_encaminhamento_sem_devolutiva,
+    "cadunico_agendamento_passou": _exec_regra_cadunico_agendamento_passou,
+}
 
 
 def _executar_regra(
@@ -535,65 +536,42 @@ def _executar_regra(
     unidade_id: Optional[int],
     dry_run: bool,
 ) -> Dict[str, Any]:
-    params = reg.parametros()
     chave = reg.chave
-    created = 0
-    skipped = 0
-
-    if chave == "caso_sem_movimentacao":
-        created, skipped = _exec_regra_caso_sem_movimentacao(session, mun, unidade_id, params, dry_run)
-    elif chave == "pia_acao_vencida":
-        created, skipped = _exec_regra_pia_acao_vencida(session, mun, unidade_id, params, dry_run)
-    elif chave == "encaminhamento_sem_devolutiva":
-        created, skipped = _exec_regra_encaminhamento_sem_devolutiva(session, mun, unidade_id, params, dry_run)
-    elif chave == "cadunico_agendamento_passou":
-        created, skipped = _exec_regra_cadunico_agendamento_passou(session, mun, unidade_id, params, dry_run)
-    else:
+    fn = _EXECUTORES.get(chave)
+    if fn is None:
         # desconhecida
         return {"chave": chave, "created": 0, "skipped": 0, "erro": "Regra não implementada."}
 
-    return {"chave": chave, "created": created, "skipped": skipped}
+    t0 = time.perf_counter()
+    res = fn(session, mun, unidade_id, reg.parametros(), dry_run)
+    return {"chave": chave, **res, "dry_run": bool(dry_run), "duracao_ms": int((time.perf_counter() - t0) * 1000)}
 
 
-def _devida(reg: CrasAutomacaoRegra) -> bool:
+def _proxima_execucao(reg: CrasAutomacaoRegra) -> Optional[datetime]:
+    """Próximo horário (UTC) em que a regra fica devida; None se inativa."""
     if not reg.ativo:
-        return False
-    if not reg.frequencia_minutos:
-        return True
+        return None
     if not reg.ultima_execucao_em:
-        return True
-    delta = _now() - reg.ultima_execucao_em
-    return delta.total_seconds() >= int(reg.frequencia_minutos) * 60
-
-
-@router.post("/executar")
-def executar(
-    municipio_id: Optional[int] = None,
-    unidade_id: Optional[int] = None,
-    dry_run: bool = False,
-    somente_chaves: Optional[List[str]] = Query(default=None),
-    session: Session = Depends(get_session),
-    usuario: Usuario = Depends(get_current_user),
-) -> Dict[str, Any]:
-    mun = _resolve_municipio(usuario, municipio_id)
-    _ensure_scope(usuario, mun)
-
-    # garante regras base para o município (evita vazio no começo)
-    _seed_defaults(session, usuario, mun, unidade_id=None)
+        return reg.criado_em or _now()
+    if not reg.frequencia_minutos:
+        # sem frequência = sempre devida
+        return reg.ultima_execucao_em
+    return reg.ultima_execucao_em + timedelta(minutes=int(reg.frequencia_minutos))
 
-    stmt = select(CrasAutomacaoRegra).where(CrasAutomacaoRegra.municipio_id == mun)
-    if unidade_id is None:
-        stmt = stmt.where(CrasAutomacaoRegra.unidade_id.is_(None))
-    else:
-        stmt = stmt.where((CrasAutomacaoRegra.unidade_id.is_(None)) | (CrasAutomacaoRegra.unidade_id == unidade_id))
 
-    stmt = stmt.where(CrasAutomacaoRegra.ativo == True)  # noqa: E712
-    regs = session.exec(stmt).all()
+def _devida(reg: CrasAutomacaoRegra) -> bool:
+    prox = _proxima_execucao(reg)
+    return prox is not None and prox <= _now()
 
-    if somente_chaves:
-        wanted = {str(x).strip() for x in somente_chaves if str(x).strip()}
-        regs = [r for r in regs if r.chave in wanted]
 
+def _executar_regras(
+    session: Session,
+    regs: List[CrasAutomacaoRegra],
+    mun: int,
+    unidade_id: Optional[int],
+    dry_run: bool,
+) -> List[Dict[str, Any]]:
+    """Executa as regras registrando uma execução por regra (usado pelas rotas e pelo agendador)."""
     resultados: List[Dict[str, Any]] = []
     for reg in regs:
         exec_row = CrasAutomacaoExecucao(
@@ -614,11 +592,13 @@ def executar(
             exec_row.status = "ok"
             exec_row.erro = None
 
-            # marca última execução
-            reg.ultima_execucao_em = _now()
-            reg.atualizado_em = _now()
-            session.add(reg)
+            # marca última execução (dry-run não conta: senão "adiaria" a execução real)
+            if not dry_run:
+                reg.ultima_execucao_em = _now()
+                reg.atualizado_em = _now()
+                session.add(reg)
         except Exception as e:
+            session.rollback()
             exec_row.finalizado_em = _now()
             exec_row.status = "erro"
             exec_row.erro = f"{type(e).__name__}: {e}"
@@ -636,6 +616,38 @@ def executar(
             "status": exec_row.status,
             "resumo": exec_row.resumo(),
         })
+    return resultados
+
+
+@router.post("/executar")
+def executar(
+    municipio_id: Optional[int] = None,
+    unidade_id: Optional[int] = None,
+    dry_run: bool = False,
+    somente_chaves: Optional[List[str]] = Query(default=None),
+    session: Session = Depends(get_session),
+    usuario: Usuario = Depends(get_current_user),
+) -> Dict[str, Any]:
+    mun = _resolve_municipio(usuario, municipio_id)
+    _ensure_scope(usuario, mun)
+
+    # garante regras base para o município (evita vazio no começo)
+    _seed_defaults(session, usuario, mun, unidade_id=None)
+
+    stmt = select(CrasAutomacaoRegra).where(CrasAutomacaoRegra.municipio_id == mun)
+    if unidade_id is None:
+        stmt = stmt.where(CrasAutomacaoRegra.unidade_id.is_(None))
+    else:
+        stmt = stmt.where((CrasAutomacaoRegra.unidade_id.is_(None)) | (CrasAutomacaoRegra.unidade_id == unidade_id))
+
+    stmt = stmt.where(CrasAutomacaoRegra.ativo == True)  # noqa: E712
+    regs = session.exec(stmt).all()
+
+    if somente_chaves:
+        wanted = {str(x).strip() for x in somente_chaves if str(x).strip()}
+        regs = [r for r in regs if r.chave in wanted]
+
+    resultados = _executar_regras(session, list(regs), mun, unidade_id, dry_run)
 
     return {
         "municipio_id": mun,
@@ -648,13 +660,19 @@ def executar(
 
 @router.post("/executar-devidas")
 def executar_devidas(
+    background_tasks: BackgroundTasks,
     municipio_id: Optional[int] = None,
     unidade_id: Optional[int] = None,
     dry_run: bool = False,
+    em_background: bool = Query(default=False, description="Se true, responde na hora e executa em background (agendador)."),
     session: Session = Depends(get_session),
     usuario: Usuario = Depends(get_current_user),
 ) -> Dict[str, Any]:
-    """Executa apenas regras 'devidas' (por frequência). Útil para cron/job externo."""
+    """Executa apenas regras 'devidas' (por frequência). Útil para cron/job externo.
+
+    Com POPRUA_AGENDADOR=1 o backend já roda as regras sozinho; aqui vale o mesmo
+    lease do agendador (uma regra nunca roda em dois lugares ao mesmo tempo).
+    """
     mun = _resolve_municipio(usuario, municipio_id)
     _ensure_scope(usuario, mun)
 
@@ -669,5 +687,47 @@ def executar_devidas(
     stmt = stmt.where(CrasAutomacaoRegra.ativo == True)  # noqa: E712
     regs = [r for r in session.exec(stmt).all() if _devida(r)]
 
-    # reaproveita /executar para registrar execuções
-    return executar(municipio_id=mun, unidade_id=unidade_id, dry_run=dry_run, somente_chaves=[r.chave for r in regs], session=session, usuario=usuario)
+    if dry_run:
+        # reaproveita /executar para registrar execuções
+        return executar(municipio_id=mun, unidade_id=unidade_id, dry_run=dry_run, somente_chaves=[r.chave for r in regs], session=session, usuario=usuario)
+
+    from app.services import automacoes_agendador as agendador
+
+    if em_background:
+        background_tasks.add_task(agendador.executar_tick, escopos=(agendador.ESCOPO_CRAS,), municipio_id=mun)
+        return {
+            "municipio_id": mun,
+            "unidade_id": unidade_id,
+            "dry_run": False,
+            "em_background": True,
+            "total_regras": len(regs),
+            "resultados": [{"regra_id": r.id, "chave": r.chave, "titulo": r.titulo} for r in regs],
+        }
+
+    dono = agendador.dono_lease("http")
+    resultados: List[Dict[str, Any]] = []
+    for reg in regs:
+        if not agendador.adquirir_lease(session, agendador.ESCOPO_CRAS, int(reg.id), dono, municipio_id=mun, exigir_devida=False):
+            resultados.append({"regra_id": reg.id, "chave": reg.chave, "titulo": reg.titulo, "status": "em_execucao"})
+            continue
+        res: List[Dict[str, Any]] = []
+        try:
+            res = _executar_regras(session, [reg], mun, unidade_id, False)
+            resultados.extend(res)
+        finally:
+            agendador.liberar_lease(
+                session,
+                agendador.ESCOPO_CRAS,
+                int(reg.id),
+                dono,
+                status=(str(res[0].get("status")) if res else "erro"),
+                proxima=_proxima_execucao(reg),
+            )
+
+    return {
+        "municipio_id": mun,
+        "unidade_id": unidade_id,
+        "dry_run": False,
+        "total_regras": len(resultados),
+        "resultados": resultados,
+    }
@@ -1,17 +1,23 @@
 from __future__ import annotations
 
+import os
+import shutil
+import tempfile
 from datetime import datetime
 from typing import Any, Dict, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, Response, UploadFile
 from sqlmodel import Session, select
 
 from app.core.db import get_session
-from app.core.auth import get_current_user, pode_acesso_global
+from app.core.auth import exigir_minimo_perfil, get_current_user, pode_acesso_global
 from app.models.usuario import Usuario
 
 from app.models.pessoa_suas import PessoaSUAS
 from app.models.familia_suas import FamiliaSUAS, FamiliaMembro
+from app.models.cras_unidade import CrasUnidade
+from app.models.cadastro_importacao import CadastroImportacao
+from app.services import cadastro_busca, cadastro_importacao
 
 router = APIRouter(prefix="/cras/cadastros", tags=["cras-cadastros"])
 
@@ -33,31 +39,117 @@ def _check_municipio(usuario: Usuario, municipio_id: int) -> None:
         raise HTTPException(status_code=403, detail="Acesso negado (município).")
 
 
-@router.get("/pessoas")
-def listar_pessoas(
-    q: Optional[str] = Query(default=None),
-    session: Session = Depends(get_session),
-    usuario: Usuario = Depends(get_current_user),
-) -> List[PessoaSUAS]:
-    stmt = select(PessoaSUAS).order_by(PessoaSUAS.id.desc())
+# Listas: projeção leve (seleção/listagem). Registro completo com expand=completo.
+_CAMPOS_PESSOA = (
+    PessoaSUAS.id,
+    PessoaSUAS.municipio_id,
+    PessoaSUAS.nome,
+    PessoaSUAS.nome_social,
+    PessoaSUAS.cpf,
+    PessoaSUAS.nis,
+    PessoaSUAS.data_nascimento,
+    PessoaSUAS.sexo,
+    PessoaSUAS.telefone,
+    PessoaSUAS.bairro,
+    PessoaSUAS.territorio,
+    PessoaSUAS.atualizado_em,
+)
+
+_CAMPOS_FAMILIA = (
+    FamiliaSUAS.id,
+    FamiliaSUAS.municipio_id,
+    FamiliaSUAS.nis_familia,
+    FamiliaSUAS.endereco,
+    FamiliaSUAS.bairro,
+    FamiliaSUAS.territorio,
+    FamiliaSUAS.referencia_pessoa_id,
+    FamiliaSUAS.atualizado_em,
+)
+
+
+_LIMITE_PADRAO = 200  # página quando só `cursor` vem
+
+
+def _registro(obj: Any) -> Dict[str, Any]:
+    """Registro completo sem a chave de busca interna."""
+    return obj.model_dump(exclude={"busca"})
+
+
+def _listar(
+    session: Session,
+    usuario: Usuario,
+    model: Any,
+    campos: tuple,
+    tabelas_fts: tuple,
+    q: Optional[str],
+    limit: Optional[int],
+    cursor: Optional[int],
+    expand: Optional[str],
+    response: Optional[Response],
+) -> List[Any]:
+    """Lista por id desc com busca no SQL (app/services/cadastro_busca.py).
+
+    Sem `limit`/`cursor` devolve tudo, com o registro completo (contrato antigo,
+    usado pelos seletores das telas). Com `limit` ou `cursor`: página por cursor
+    (X-Next-Cursor) e projeção leve, salvo expand=completo.
+    """
+    paginado = limit is not None or cursor is not None
+    expand_set = {x.strip().lower() for x in (expand or "").split(",") if x.strip()}
+    completo = "completo" in expand_set or (not paginado and "leve" not in expand_set)
+    stmt = select(model) if completo else select(*campos)
     if not pode_acesso_global(usuario):
         um = _mun_id(usuario)
         if um is None:
             raise HTTPException(status_code=403, detail="Usuário sem município.")
-        stmt = stmt.where(PessoaSUAS.municipio_id == um)
+        stmt = stmt.where(model.municipio_id == um)
+
+    cond = cadastro_busca.filtro(session, model, tabelas_fts, q)
+    if cond is not None:
+        stmt = stmt.where(cond)
+    if cursor is not None:
+        stmt = stmt.where(model.id < int(cursor))
+    stmt = stmt.order_by(model.id.desc())
+
+    if not paginado:
+        linhas = session.exec(stmt).all()
+        return [_registro(r) for r in linhas] if completo else [dict(r._mapping) for r in linhas]
 
-    pessoas = session.exec(stmt).all()
+    limit = int(limit or _LIMITE_PADRAO)
+    linhas = session.exec(stmt.limit(limit + 1)).all()
+    pagina = linhas[:limit]
 
-    qn = (q or "").strip().lower()
-    if not qn:
-        return pessoas
+    if response is not None:
+        if len(linhas) > limit:
+            response.headers["X-Next-Cursor"] = str(pagina[-1].id)
+        # permite ler no browser (CORS)
+        prev = response.headers.get("Access-Control-Expose-Headers")
+        expose = "X-Next-Cursor" if not prev else f"{prev}, X-Next-Cursor"
+        response.headers["Access-Control-Expose-Headers"] = expose
+
+    if completo:
+        return [_registro(r) for r in pagina]
+    return [dict(r._mapping) for r in pagina]
+
+
+@router.get("/pessoas")
+def listar_pessoas(
+    response: Response,
+    q: Optional[str] = Query(default=None, description="Nome, nome social, CPF, NIS, bairro ou território (sem acento/pontuação)."),
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Paginação por cursor (máx 500). Sem limit/cursor: lista inteira."),
+    cursor: Optional[int] = Query(None, ge=1, description="Próxima página: valor do header X-Next-Cursor."),
+    expand: Optional[str] = Query(None, description="completo: registro inteiro (observações, e-mail, endereço...); leve: projeção mesmo sem paginar."),
+    session: Session = Depends(get_session),
+    usuario: Usuario = Depends(get_current_user),
+) -> List[Any]:
+    """Cadastro SUAS (pessoas).
 
-    out = []
-    for p in pessoas:
-        hay = " ".join([p.nome or "", p.nome_social or "", p.cpf or "", p.nis or "", p.bairro or "", p.territorio or ""]).lower()
-        if qn in hay:
-            out.append(p)
-    return out
+    - Ordem: id desc. Sem `limit`/`cursor`: lista inteira, registro completo.
+    - Com `limit` ou `cursor`: página leve; a próxima no header X-Next-Cursor
+      (ausente na última).
+    - `q` filtra no banco pela chave normalizada, por substring (3+ letras pelo
+      índice FTS trigram; 1-2 letras por LIKE na coluna normalizada).
+    """
+    return _listar(session, usuario, PessoaSUAS, _CAMPOS_PESSOA, cadastro_busca.FTS_PESSOA, q, limit, cursor, expand, response)
 
 
 @router.post("/pessoas")
@@ -130,29 +222,16 @@ def atualizar_pessoa(
 
 @router.get("/familias")
 def listar_familias(
-    q: Optional[str] = Query(default=None),
+    response: Response,
+    q: Optional[str] = Query(default=None, description="NIS da família, bairro, território ou endereço."),
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Paginação por cursor (máx 500). Sem limit/cursor: lista inteira."),
+    cursor: Optional[int] = Query(None, ge=1, description="Próxima página: valor do header X-Next-Cursor."),
+    expand: Optional[str] = Query(None, description="completo: registro inteiro (com observações); leve: projeção mesmo sem paginar."),
     session: Session = Depends(get_session),
     usuario: Usuario = Depends(get_current_user),
-) -> List[FamiliaSUAS]:
-    stmt = select(FamiliaSUAS).order_by(FamiliaSUAS.id.desc())
-    if not pode_acesso_global(usuario):
-        um = _mun_id(usuario)
-        if um is None:
-            raise HTTPException(status_code=403, detail="Usuário sem município.")
-        stmt = stmt.where(FamiliaSUAS.municipio_id == um)
-
-    familias = session.exec(stmt).all()
-
-    qn = (q or "").strip().lower()
-    if not qn:
-        return familias
-
-    out = []
-    for f in familias:
-        hay = " ".join([f.nis_familia or "", f.bairro or "", f.territorio or "", f.endereco or ""]).lower()
-        if qn in hay:
-            out.append(f)
-    return out
+) -> List[Any]:
+    """Cadastro SUAS (famílias) — mesmo esquema de /pessoas (cursor, busca no banco)."""
+    return _listar(session, usuario, FamiliaSUAS, _CAMPOS_FAMILIA, cadastro_busca.FTS_FAMILIA, q, limit, cursor, expand, response)
 
 
 @router.post("/familias")
@@ -236,3 +315,76 @@ def adicionar_membro(
     session.commit()
     session.refresh(m)
     return m
+
+
+# =========================================================
+# Importação em lote (CSV / extrato CadÚnico)
+# =========================================================
+@router.post("/importar", dependencies=[Depends(exigir_minimo_perfil("coord_municipal"))])
+def importar_cadastros(
+    arquivo: UploadFile = File(...),
+    layout: str = Form("csv"),
+    municipio_id: Optional[int] = Form(None),
+    unidade_id: Optional[int] = Form(None, description="Se informado, cria pré-cadastro CadÚnico (pendente) para cada família sem um."),
+    simular: bool = Form(False, description="Só valida e conta (não grava)."),
+    session: Session = Depends(get_session),
+    usuario: Usuario = Depends(get_current_user),
+) -> Dict[str, Any]:
+    """Importa pessoas/famílias em lote (upsert por CPF/NIS), em background.
+
+    Responde na hora com o registro da importação; acompanhe em
+    GET /cras/cadastros/importar/{id}. Ver app/services/cadastro_importacao.py.
+    """
+    layout = (layout or "csv").strip().lower()
+    if layout not in cadastro_importacao.LAYOUTS:
+        raise HTTPException(status_code=400, detail=f"layout inválido (use {', '.join(cadastro_importacao.LAYOUTS)}).")
+
+    if municipio_id is None:
+        municipio_id = _mun_id(usuario)
+    if municipio_id is None:
+        raise HTTPException(status_code=400, detail="municipio_id não informado e usuário sem município.")
+    _check_municipio(usuario, int(municipio_id))
+
+    if unidade_id is not None:
+        un = session.get(CrasUnidade, int(unidade_id))
+        if not un or int(un.municipio_id) != int(municipio_id):
+            raise HTTPException(status_code=400, detail="unidade_id não pertence ao município.")
+
+    # cópia em disco em blocos (o upload não é lido inteiro para a memória)
+    fd, caminho = tempfile.mkstemp(prefix="poprua-importacao-", suffix=".csv")
+    with os.fdopen(fd, "wb") as destino:
+        shutil.copyfileobj(arquivo.file, destino, 1024 * 1024)
+        tamanho = destino.tell()
+
+    imp = CadastroImportacao(
+        municipio_id=int(municipio_id),
+        unidade_id=int(unidade_id) if unidade_id is not None else None,
+        layout=layout,
+        arquivo_nome=(arquivo.filename or "")[:255] or None,
+        simular=bool(simular),
+        bytes_total=tamanho,
+        criado_por_usuario_id=getattr(usuario, "id", None),
+        criado_em=_now(),
+    )
+    session.add(imp)
+    session.commit()
+    session.refresh(imp)
+
+    cadastro_importacao.executar_em_background(int(imp.id), caminho)
+    return cadastro_importacao.como_dict(imp)
+
+
+@router.get("/importar/{importacao_id}")
+def status_importacao(
+    importacao_id: int,
+    session: Session = Depends(get_session),
+    usuario: Usuario = Depends(get_current_user),
+) -> Dict[str, Any]:
+    imp = session.get(CadastroImportacao, importacao_id)
+    if not imp:
+        raise HTTPException(status_code=404, detail="Importação não encontrada.")
+    _check_municipio(usuario, int(imp.municipio_id))
+    if imp.status in cadastro_importacao.STATUS_EM_ANDAMENTO:
+        cadastro_importacao.marcar_interrompidas(session, int(imp.id))  # commita: recarrega abaixo
+        session.refresh(imp)
+    return cadastro_importacao.como_dict(imp)
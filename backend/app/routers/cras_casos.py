@@ -6,6 +6,7 @@ from typing import Any, Dict, List, Optional
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlmodel import Session, select
 
+from app.core import versoes
 from app.core.db import get_session
 from app.core.auth import get_current_user, pode_acesso_global
 from app.models.usuario import Usuario
@@ -14,6 +15,8 @@ from app.models.cras_unidade import CrasUnidade
 from app.models.pessoa_suas import PessoaSUAS
 from app.models.familia_suas import FamiliaSUAS
 from app.models.caso_cras import CasoCras, CasoCrasHistorico
+from app.services.arquivo import com_arquivo, obter
+from app.services.usuarios_diretorio import DiretorioUsuarios, get_diretorio_usuarios
 
 router = APIRouter(prefix="/cras", tags=["cras-casos"])
 
@@ -153,7 +156,7 @@ def _case_dict(session: Session, caso: CasoCras) -> Dict[str, Any]:
     refp = session.get(PessoaSUAS, familia.referencia_pessoa_id) if (familia and familia.referencia_pessoa_id) else None
     return _case_to_dict(caso, pessoa=pessoa, familia=familia, ref_pessoa=refp)
 
-@router.get("/linha-metro/etapas")
+@router.get("/linha-metro/etapas", dependencies=[Depends(versoes.condicional(publico=True, max_age=300))])
 def listar_etapas_metro() -> List[Dict[str, Any]]:
     return METRO_ETAPAS
 
@@ -167,20 +170,23 @@ def listar_casos(
     session: Session = Depends(get_session),
     usuario: Usuario = Depends(get_current_user),
 ) -> List[Dict[str, Any]]:
-    stmt = select(CasoCras).order_by(CasoCras.id.desc())
+    # encerrados há tempo ficam no arquivo (app/services/arquivo.py); só o filtro
+    # por status aberto dispensa a leitura dele
+    C = CasoCras if status and status != "encerrado" else com_arquivo(CasoCras)
+    stmt = select(C).order_by(C.id.desc())
 
     if not pode_acesso_global(usuario):
         um = _mun_id(usuario)
         if um is None:
             raise HTTPException(status_code=403, detail="Usuário sem município.")
-        stmt = stmt.where(CasoCras.municipio_id == um)
+        stmt = stmt.where(C.municipio_id == um)
 
     if status:
-        stmt = stmt.where(CasoCras.status == status)
+        stmt = stmt.where(C.status == status)
     if etapa:
-        stmt = stmt.where(CasoCras.etapa_atual == etapa)
+        stmt = stmt.where(C.etapa_atual == etapa)
     if unidade_id:
-        stmt = stmt.where(CasoCras.unidade_id == unidade_id)
+        stmt = stmt.where(C.unidade_id == unidade_id)
 
     casos = session.exec(stmt).all()
 
@@ -307,7 +313,7 @@ def obter_caso(
     session: Session = Depends(get_session),
     usuario: Usuario = Depends(get_current_user),
 ) -> Dict[str, Any]:
-    caso = session.get(CasoCras, caso_id)
+    caso = obter(session, CasoCras, caso_id)  # encerrado há tempo: vem do arquivo
     if not caso:
         raise HTTPException(status_code=404, detail="Caso não encontrado.")
     _check_municipio(usuario, caso.municipio_id)
@@ -486,18 +492,23 @@ def historico(
     caso_id: int,
     session: Session = Depends(get_session),
     usuario: Usuario = Depends(get_current_user),
+    diretorio: DiretorioUsuarios = Depends(get_diretorio_usuarios),
 ) -> List[Dict[str, Any]]:
-    caso = session.get(CasoCras, caso_id)
+    caso = obter(session, CasoCras, caso_id)
     if not caso:
         raise HTTPException(status_code=404, detail="Caso não encontrado.")
     _check_municipio(usuario, caso.municipio_id)
 
+    H = com_arquivo(CasoCrasHistorico)
     items = session.exec(
-        select(CasoCrasHistorico)
-        .where(CasoCrasHistorico.caso_id == caso_id)
-        .order_by(CasoCrasHistorico.id.asc())
+        select(H)
+        .where(H.caso_id == caso_id)
+        .order_by(H.id.asc())
     ).all()
 
+    # registros antigos podem ter só usuario_id (sem nome gravado)
+    nomes = diretorio.resolve(it.usuario_id for it in items if not it.usuario_nome)
+
     out = []
     for it in items:
         out.append(
@@ -507,7 +518,7 @@ def historico(
                 "etapa": it.etapa,
                 "tipo_acao": it.tipo_acao,
                 "usuario_id": it.usuario_id,
-                "usuario_nome": it.usuario_nome,
+                "usuario_nome": it.usuario_nome or nomes.get(it.usuario_id or 0),
                 "observacoes": it.observacoes,
                 "motivo_estagnacao": it.motivo_estagnacao,
                 "criado_em": it.criado_em,
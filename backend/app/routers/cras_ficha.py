@@ -9,6 +9,7 @@ from sqlalchemy import or_
 
 from app.core.db import get_session
 from app.core.auth import get_current_user, pode_acesso_global
+from app.services.arquivo import com_arquivo
 from app.models.usuario import Usuario
 
 from app.models.pessoa_suas import PessoaSUAS
@@ -132,23 +133,25 @@ def ficha_pessoa(
     familia = session.get(FamiliaSUAS, vinc.familia_id) if vinc else None
     membros = session.exec(select(FamiliaMembro).where(FamiliaMembro.familia_id == familia.id)).all() if familia else []
 
-    # casos CRAS vinculados à pessoa ou à família
-    conds = [CasoCras.pessoa_id == pessoa_id]
+    # casos CRAS vinculados à pessoa ou à família (inclui arquivados)
+    C = com_arquivo(CasoCras)
+    conds = [C.pessoa_id == pessoa_id]
     if familia:
-        conds.append(CasoCras.familia_id == familia.id)
+        conds.append(C.familia_id == familia.id)
 
     casos = session.exec(
-        select(CasoCras).where(or_(*conds)).order_by(CasoCras.id.desc())
+        select(C).where(or_(*conds)).order_by(C.id.desc())
     ).all()
     caso_ids = [c.id for c in casos]
 
     # histórico auditável
     hist = []
     if caso_ids:
+        H = com_arquivo(CasoCrasHistorico)
         hist = session.exec(
-            select(CasoCrasHistorico)
-            .where(CasoCrasHistorico.caso_id.in_(caso_ids))
-            .order_by(CasoCrasHistorico.id.desc())
+            select(H)
+            .where(H.caso_id.in_(caso_ids))
+            .order_by(H.id.desc())
         ).all()
 
     # CadÚnico
@@ -447,16 +450,18 @@ def ficha_familia(
         pessoas_map = {p.id: p for p in pessoas}
 
     # Casos da família
-    casos = session.exec(select(CasoCras).where(CasoCras.familia_id == familia_id).order_by(CasoCras.id.desc())).all()
+    C = com_arquivo(CasoCras)
+    casos = session.exec(select(C).where(C.familia_id == familia_id).order_by(C.id.desc())).all()
     caso_ids = [c.id for c in casos]
 
     # Histórico dos casos
     hist = []
     if caso_ids:
+        H = com_arquivo(CasoCrasHistorico)
         hist = session.exec(
-            select(CasoCrasHistorico)
-            .where(CasoCrasHistorico.caso_id.in_(caso_ids))
-            .order_by(CasoCrasHistorico.id.desc())
+            select(H)
+            .where(H.caso_id.in_(caso_ids))
+            .order_by(H.id.desc())
         ).all()
 
     # CadÚnico (por família / membros / casos)
@@ -669,7 +674,8 @@ def ficha_familia(
         })
     # eventos de auditoria da ficha (família)
     try:
-        evs = session.exec(select(FichaEvento).where(FichaEvento.alvo_tipo=='familia').where(FichaEvento.alvo_id==familia_id).order_by(FichaEvento.id.desc())).all()
+        E = com_arquivo(FichaEvento)
+        evs = session.exec(select(E).where(E.alvo_tipo=='familia').where(E.alvo_id==familia_id).order_by(E.id.desc())).all()
         for ev in evs[:30]:
             timeline.append({
                 'tipo': 'ficha_evento',
@@ -842,12 +848,13 @@ def listar_eventos(
         _check_municipio(usuario, int(fa.municipio_id))
         municipio_id = int(fa.municipio_id)
 
+    E = com_arquivo(FichaEvento)
     rows = session.exec(
-        select(FichaEvento)
-        .where(FichaEvento.municipio_id == municipio_id)
-        .where(FichaEvento.alvo_tipo == alvo_tipo)
-        .where(FichaEvento.alvo_id == int(alvo_id))
-        .order_by(FichaEvento.id.desc())
+        select(E)
+        .where(E.municipio_id == municipio_id)
+        .where(E.alvo_tipo == alvo_tipo)
+        .where(E.alvo_id == int(alvo_id))
+        .order_by(E.id.desc())
     ).all()
     return rows
 
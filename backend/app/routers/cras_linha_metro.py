@@ -3,12 +3,15 @@ from __future__ import annotations
 from typing import Any, Dict, List
 
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import func
 from sqlmodel import Session, select
 
 from app.core.db import get_session
 from app.core.auth import get_current_user
 from app.models.usuario import Usuario
 from app.models.caso_cras import CasoCras, CasoCrasHistorico
+from app.services.arquivo import com_arquivo, obter
+from app.services.usuarios_diretorio import DiretorioUsuarios, get_diretorio_usuarios
 
 router = APIRouter(prefix="/cras", tags=["cras-linha-metro"])
 
@@ -35,29 +38,33 @@ def _status_etapa(caso: CasoCras, codigo: str) -> str:
         return "em_andamento"
     return "nao_iniciada"
 
-def _ultima_atualizacao(session: Session, caso_id: int, codigo: str):
-    return session.exec(
-        select(CasoCrasHistorico)
-        .where(CasoCrasHistorico.caso_id == caso_id)
-        .where(CasoCrasHistorico.etapa == codigo)
-        .order_by(CasoCrasHistorico.id.desc())
-    ).first()
+def _ultimas_atualizacoes(session: Session, caso_id: int) -> Dict[str, CasoCrasHistorico]:
+    """Último registro de histórico por etapa (uma query para todas as etapas)."""
+    H = com_arquivo(CasoCrasHistorico)  # caso encerrado há tempo: histórico no arquivo
+    ultimo_id = select(func.max(H.id)).where(H.caso_id == caso_id).group_by(H.etapa)
+    rows = session.exec(select(H).where(H.id.in_(ultimo_id))).all()
+    return {r.etapa: r for r in rows}
 
 @router.get("/casos/{caso_id}/linha-metro")
 def linha_metro_do_caso_cras(
     caso_id: int,
     session: Session = Depends(get_session),
     usuario: Usuario = Depends(get_current_user),
+    diretorio: DiretorioUsuarios = Depends(get_diretorio_usuarios),
 ) -> Dict[str, Any]:
-    caso = session.get(CasoCras, caso_id)
+    caso = obter(session, CasoCras, caso_id)
     if not caso:
         raise HTTPException(status_code=404, detail="Caso não encontrado.")
     _check_access(usuario, caso)
 
+    ultimos = _ultimas_atualizacoes(session, caso_id)
+    # registros antigos podem ter só usuario_id (sem nome gravado)
+    nomes = diretorio.resolve(h.usuario_id for h in ultimos.values() if not h.usuario_nome)
+
     etapas: List[Dict[str, Any]] = []
     for ordem, e in enumerate(ETAPAS, start=1):
         st = _status_etapa(caso, e["codigo"])
-        last = _ultima_atualizacao(session, caso_id, e["codigo"])
+        last = ultimos.get(e["codigo"])
 
         etapas.append({
             "codigo": e["codigo"],
@@ -65,7 +72,7 @@ def linha_metro_do_caso_cras(
             "descricao": e["descricao"],
             "status": st,
             "data_hora": (last.criado_em.isoformat() if last and last.criado_em else None),
-            "responsavel": (last.usuario_nome if last and last.usuario_nome else None),
+            "responsavel": ((last.usuario_nome or nomes.get(last.usuario_id or 0)) if last else None),
             "observacao": (last.observacoes if last and last.observacoes else None),
             "sla_dias": e["sla_dias"],
         })
@@ -14,6 +14,7 @@ from app.core.db import get_session
 from app.core.security import decodificar_token
 from app.models.usuario import Usuario
 from app.models.ficha_evento import FichaEvento
+from app.services.arquivo import com_arquivo
 
 # opcional: encaminhamentos SUAS (banco)
 from app.models.suas_encaminhamento import SuasEncaminhamento
@@ -72,22 +73,23 @@ def eventos(
 
     items: List[dict] = []
 
-    # FichaEvento (pessoa/familia)
+    # FichaEvento (pessoa/familia), inclusive arquivados
+    E = com_arquivo(FichaEvento)
     if pessoa_id is not None:
-        q = select(FichaEvento).where(
-            FichaEvento.municipio_id == int(mid),
-            FichaEvento.alvo_tipo == "pessoa",
-            FichaEvento.alvo_id == int(pessoa_id),
-        ).order_by(FichaEvento.criado_em.desc())
+        q = select(E).where(
+            E.municipio_id == int(mid),
+            E.alvo_tipo == "pessoa",
+            E.alvo_id == int(pessoa_id),
+        ).order_by(E.criado_em.desc())
         for e in session.exec(q).all():
             items.append(_to_item(e.tipo, e.criado_em, "Ficha (Pessoa 360)", e.detalhe or "", "ficha"))
 
     if familia_id is not None:
-        q = select(FichaEvento).where(
-            FichaEvento.municipio_id == int(mid),
-            FichaEvento.alvo_tipo == "familia",
-            FichaEvento.alvo_id == int(familia_id),
-        ).order_by(FichaEvento.criado_em.desc())
+        q = select(E).where(
+            E.municipio_id == int(mid),
+            E.alvo_tipo == "familia",
+            E.alvo_id == int(familia_id),
+        ).order_by(E.criado_em.desc())
         for e in session.exec(q).all():
             items.append(_to_item(e.tipo, e.criado_em, "Ficha (Família 360)", e.detalhe or "", "ficha"))
 
@@ -5,10 +5,14 @@ from typing import Any, Dict, List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlmodel import Session, select
-from sqlalchemy import or_
+from sqlalchemy import case, exists, func, or_
 
+from app.core import concorrencia
 from app.core.db import get_session
+from app.core.leitura import sessao_leitura
 from app.core.auth import get_current_user, pode_acesso_global
+from app.services.arquivo import com_arquivo
+from app.services.cras_relatorios_cache import OVERVIEW as _OVERVIEW_CACHE
 from app.models.usuario import Usuario
 
 from app.models.caso_cras import CasoCras
@@ -21,6 +25,9 @@ from app.models.cras_tarefas import CrasTarefa
 
 router = APIRouter(prefix="/cras/relatorios", tags=["cras-relatorios"])
 
+# Máximo de linhas de detalhe devolvidas em cada lista do overview
+_LIMITE_LINHAS = 30
+
 
 def _mun_id(usuario: Usuario) -> Optional[int]:
     mid = getattr(usuario, "municipio_id", None)
@@ -37,7 +44,7 @@ def _parse_weekdays(dias_str: str) -> List[int]:
     return sorted(set(out))
 
 
-@router.get("/overview")
+@router.get("/overview", dependencies=[Depends(concorrencia.vaga("relatorio"))])
 def overview(
     unidade_id: int = Query(...),
     ano: Optional[int] = Query(default=None),
@@ -45,9 +52,15 @@ def overview(
     dias_cadunico: int = Query(30, ge=1, le=365),
     limite_evasao: int = Query(3, ge=1, le=60),
     limite_presenca_min: float = Query(0.75, ge=0.0, le=1.0),
+    nocache: bool = Query(default=False, description="Ignora cache TTL (debug/perf)."),
     session: Session = Depends(get_session),
     usuario: Usuario = Depends(get_current_user),
 ) -> Dict[str, Any]:
+    """Painel do mês da unidade. Fica 30s em cache por (município, unidade, mês,
+    parâmetros); escrita em caso/PIA descarta o cache do município neste worker.
+    Outros workers, SCFV, CadÚnico e tarefas: até 30s de atraso (`nocache=true`
+    recalcula). Lê do banco principal, não da cópia de leitura: recalcular
+    depois do descarte tem de ver a escrita (o cache já limita a carga)."""
     # período
     today = date.today()
     ano = int(ano or today.year)
@@ -55,44 +68,67 @@ def overview(
     start = date(ano, mes, 1)
     end = (start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
 
-    # Casos CRAS da unidade
-    stmt = select(CasoCras).where(CasoCras.unidade_id == int(unidade_id))
+    # Escopo municipal (mesmo recorte usado em todas as queries abaixo)
+    mun_user: Optional[int] = None
     if not pode_acesso_global(usuario):
-        um = _mun_id(usuario)
-        if um is None:
+        mun_user = _mun_id(usuario)
+        if mun_user is None:
             raise HTTPException(status_code=403, detail="Usuário sem município.")
-        stmt = stmt.where(CasoCras.municipio_id == um)
-
-    casos = session.exec(stmt).all()
-    caso_ids = [c.id for c in casos if c.id]
 
-    # PIA faltando (casos em andamento sem plano)
-    caso_com_plano = set()
-    if caso_ids:
-        rows = session.exec(select(CrasPiaPlano.caso_id).where(CrasPiaPlano.caso_id.in_(caso_ids))).all()
-        caso_com_plano = set([x for x in rows if x is not None])
-
-    faltando = [c for c in casos if c.status == "em_andamento" and (c.id not in caso_com_plano)]
+    # cache TTL curto por (município, unidade, mês, parâmetros)
+    cache_key = (
+        "overview", mun_user, int(unidade_id), ano, mes,
+        int(dias_cadunico), int(limite_evasao), float(limite_presenca_min),
+    )
+    if not nocache:
+        cached = _OVERVIEW_CACHE.get(cache_key)
+        if isinstance(cached, dict):
+            out = dict(cached)
+            out["_cached"] = True
+            return out
+
+    # PIA faltando (casos em andamento sem plano) — anti-join no SQL
+    sem_plano = ~exists().where(CrasPiaPlano.caso_id == CasoCras.id)
+    conds_pia = [
+        CasoCras.unidade_id == int(unidade_id),
+        CasoCras.status == "em_andamento",
+        sem_plano,
+    ]
+    if mun_user is not None:
+        conds_pia.append(CasoCras.municipio_id == mun_user)
 
-    # mapeia pessoas dos casos faltando
-    pessoas_map: Dict[int, PessoaSUAS] = {}
-    pessoa_ids = [c.pessoa_id for c in faltando if c.pessoa_id]
-    if pessoa_ids:
-        for p in session.exec(select(PessoaSUAS).where(PessoaSUAS.id.in_(pessoa_ids))).all():
-            pessoas_map[p.id] = p
+    pia_faltando_total = int(session.exec(select(func.count(CasoCras.id)).where(*conds_pia)).one() or 0)
 
     pia_faltando_por_tecnico: Dict[str, int] = {}
+    for tid, n in session.exec(
+        select(CasoCras.tecnico_responsavel_id, func.count(CasoCras.id))
+        .where(*conds_pia)
+        .group_by(CasoCras.tecnico_responsavel_id)
+    ).all():
+        pia_faltando_por_tecnico[str(tid or "sem_tecnico")] = int(n or 0)
+
+    terr_expr = case(
+        (PessoaSUAS.id.is_(None), "sem_pessoa"),
+        else_=func.coalesce(func.nullif(PessoaSUAS.territorio, ""), PessoaSUAS.bairro),
+    )
     pia_faltando_por_territorio: Dict[str, int] = {}
-    pia_faltando_rows = []
-
-    for c in faltando[:30]:
-        k = str(c.tecnico_responsavel_id or "sem_tecnico")
-        pia_faltando_por_tecnico[k] = pia_faltando_por_tecnico.get(k, 0) + 1
-
-        pe = pessoas_map.get(c.pessoa_id)
-        terr = (pe.territorio or pe.bairro) if pe else "sem_pessoa"
-        pia_faltando_por_territorio[terr] = pia_faltando_por_territorio.get(terr, 0) + 1
+    for terr, n in session.exec(
+        select(terr_expr, func.count(CasoCras.id))
+        .select_from(CasoCras)
+        .outerjoin(PessoaSUAS, PessoaSUAS.id == CasoCras.pessoa_id)
+        .where(*conds_pia)
+        .group_by(terr_expr)
+    ).all():
+        pia_faltando_por_territorio[terr] = int(n or 0)
 
+    pia_faltando_rows = []
+    for c, pe in session.exec(
+        select(CasoCras, PessoaSUAS)
+        .outerjoin(PessoaSUAS, PessoaSUAS.id == CasoCras.pessoa_id)
+        .where(*conds_pia)
+        .order_by(CasoCras.id)
+        .limit(_LIMITE_LINHAS)
+    ).all():
         pia_faltando_rows.append({
             "caso_id": c.id,
             "pessoa_id": c.pessoa_id,
@@ -106,25 +142,33 @@ def overview(
             "bairro": pe.bairro if pe else None,
         })
 
-    # CadÚnico atrasado
+    # CadÚnico atrasado (janela de data no SQL)
     cut = datetime.utcnow() - timedelta(days=int(dias_cadunico))
-    cad_stmt = (
-        select(CadunicoPreCadastro)
-        .where(CadunicoPreCadastro.unidade_id == int(unidade_id))
-        .where(CadunicoPreCadastro.status.in_(["pendente", "agendado"]))
-    )
-    if not pode_acesso_global(usuario):
-        cad_stmt = cad_stmt.where(CadunicoPreCadastro.municipio_id == _mun_id(usuario))
-
-    cad_rows = session.exec(cad_stmt).all()
-    cad_atrasados = [x for x in cad_rows if x.criado_em and x.criado_em <= cut]
+    conds_cad = [
+        CadunicoPreCadastro.unidade_id == int(unidade_id),
+        CadunicoPreCadastro.status.in_(["pendente", "agendado"]),
+        CadunicoPreCadastro.criado_em <= cut,
+    ]
+    if mun_user is not None:
+        conds_cad.append(CadunicoPreCadastro.municipio_id == mun_user)
 
     cadunico_atrasado_por_status: Dict[str, int] = {}
-    cadunico_atrasado_rows = []
+    for st, n in session.exec(
+        select(CadunicoPreCadastro.status, func.count(CadunicoPreCadastro.id))
+        .where(*conds_cad)
+        .group_by(CadunicoPreCadastro.status)
+    ).all():
+        cadunico_atrasado_por_status[st] = int(n or 0)
+    cadunico_atrasado_total = sum(cadunico_atrasado_por_status.values())
 
-    for x in cad_atrasados[:30]:
-        cadunico_atrasado_por_status[x.status] = cadunico_atrasado_por_status.get(x.status, 0) + 1
-        pe = session.get(PessoaSUAS, int(x.pessoa_id)) if x.pessoa_id else None
+    cadunico_atrasado_rows = []
+    for x, pe in session.exec(
+        select(CadunicoPreCadastro, PessoaSUAS)
+        .outerjoin(PessoaSUAS, PessoaSUAS.id == CadunicoPreCadastro.pessoa_id)
+        .where(*conds_cad)
+        .order_by(CadunicoPreCadastro.id)
+        .limit(_LIMITE_LINHAS)
+    ).all():
         cadunico_atrasado_rows.append({
             "precadastro_id": x.id,
             "caso_id": x.caso_id,
@@ -153,7 +197,7 @@ def overview(
 
     part_ids = [p.id for p in parts]
     pres = session.exec(
-        select(ScfvPresenca)
+        select(ScfvPresenca.participante_id, ScfvPresenca.data, ScfvPresenca.presente_bool)
         .where(ScfvPresenca.participante_id.in_(part_ids))
         .where(ScfvPresenca.data >= start)
         .where(ScfvPresenca.data <= end)
@@ -236,21 +280,21 @@ def overview(
     top_turmas.sort(key=lambda x: (-x["evasao"], -x["baixa_presenca"], -x["sem_registro"], x["turma_nome"]))
 
     top_pendencias = [
-        {"tipo": "PIA faltando", "total": len(faltando)},
-        {"tipo": f"CadÚnico atrasado (+{dias_cadunico}d)", "total": len(cad_atrasados)},
+        {"tipo": "PIA faltando", "total": pia_faltando_total},
+        {"tipo": f"CadÚnico atrasado (+{dias_cadunico}d)", "total": cadunico_atrasado_total},
         {"tipo": "SCFV evasão", "total": total_evasao},
         {"tipo": "SCFV baixa presença", "total": total_baixa},
         {"tipo": "SCFV sem registro", "total": total_sem_reg},
     ]
     top_pendencias.sort(key=lambda x: -x["total"])
 
-    return {
+    out = {
         "periodo": {"ano": ano, "mes": mes},
-        "pia_faltando_total": len(faltando),
+        "pia_faltando_total": pia_faltando_total,
         "pia_faltando_por_tecnico": pia_faltando_por_tecnico,
         "pia_faltando_por_territorio": pia_faltando_por_territorio,
         "pia_faltando_rows": pia_faltando_rows,
-        "cadunico_atrasado_total": len(cad_atrasados),
+        "cadunico_atrasado_total": cadunico_atrasado_total,
         "cadunico_atrasado_por_status": cadunico_atrasado_por_status,
         "cadunico_atrasado_rows": cadunico_atrasado_rows,
         "scfv_evasao_total": total_evasao,
@@ -259,6 +303,9 @@ def overview(
         "scfv_top_turmas": top_turmas[:10],
         "top_pendencias": top_pendencias[:10],
     }
+    if not nocache:
+        _OVERVIEW_CACHE.set(cache_key, out)
+    return out
 
 
 def _month_start(d: date) -> date:
@@ -272,12 +319,12 @@ def _add_months(d: date, months: int) -> date:
     return date(y, m, 1)
 
 
-@router.get("/serie")
+@router.get("/serie", dependencies=[Depends(concorrencia.vaga("relatorio"))])
 def serie(
     unidade_id: int = Query(...),
     meses: int = Query(12, ge=1, le=60),
     dias_cadunico: int = Query(30, ge=1, le=365),
-    session: Session = Depends(get_session),
+    session: Session = Depends(sessao_leitura(300)),
     usuario: Usuario = Depends(get_current_user),
 ) -> Dict[str, Any]:
     """Série histórica (mensal) para gestão.
@@ -301,12 +348,14 @@ def serie(
             raise HTTPException(status_code=403, detail="Usuário sem município.")
 
     # Pré-fetch leve (MVP): pega registros da unidade e calcula em memória.
-    stmt_casos = select(CasoCras).where(CasoCras.unidade_id == int(unidade_id))
+    # Casos encerrados arquivados (app/services/arquivo.py) entram nos meses passados.
+    C = com_arquivo(CasoCras)
+    stmt_casos = select(C).where(C.unidade_id == int(unidade_id))
     stmt_cad = select(CadunicoPreCadastro).where(CadunicoPreCadastro.unidade_id == int(unidade_id))
     stmt_tarefas = select(CrasTarefa).where(CrasTarefa.unidade_id == int(unidade_id))
 
     if not pode_acesso_global(usuario):
-        stmt_casos = stmt_casos.where(CasoCras.municipio_id == mun_user)
+        stmt_casos = stmt_casos.where(C.municipio_id == mun_user)
         stmt_cad = stmt_cad.where(CadunicoPreCadastro.municipio_id == mun_user)
         stmt_tarefas = stmt_tarefas.where(CrasTarefa.municipio_id == mun_user)
 
@@ -425,11 +474,11 @@ def serie(
     }
 
 
-@router.get("/cruzamentos")
+@router.get("/cruzamentos", dependencies=[Depends(concorrencia.vaga("relatorio"))])
 def cruzamentos(
     unidade_id: int = Query(...),
     meses: int = Query(12, ge=1, le=60),
-    session: Session = Depends(get_session),
+    session: Session = Depends(sessao_leitura(300)),
     usuario: Usuario = Depends(get_current_user),
 ) -> Dict[str, Any]:
     """Cruzamentos simples (pessoas em múltiplos serviços) — recorte por unidade."""
@@ -443,10 +492,11 @@ def cruzamentos(
         if mun_user is None:
             raise HTTPException(status_code=403, detail="Usuário sem município.")
 
-    # Casos
-    stmt_casos = select(CasoCras).where(CasoCras.unidade_id == int(unidade_id))
+    # Casos (inclusive encerrados arquivados)
+    C = com_arquivo(CasoCras)
+    stmt_casos = select(C).where(C.unidade_id == int(unidade_id))
     if not pode_acesso_global(usuario):
-        stmt_casos = stmt_casos.where(CasoCras.municipio_id == mun_user)
+        stmt_casos = stmt_casos.where(C.municipio_id == mun_user)
     casos = session.exec(stmt_casos).all()
 
     set_casos = set()
@@ -10,10 +10,13 @@ from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordBearer
 from sqlmodel import Session, select
 
+from app.core import concorrencia
 from app.core.db import get_session
+from app.core.leitura import sessao_leitura
 from app.core.security import decodificar_token
 from app.models.usuario import Usuario
 from app.models.rma_evento import RmaEvento
+from app.services.arquivo import com_arquivo
 
 from app.models.rma_meta import RmaMeta
 router = APIRouter(prefix="/cras/rma", tags=["cras_rma"])
@@ -63,6 +66,17 @@ def _in_month(d: date, yy: int, mm: int) -> bool:
     return d.year == yy and d.month == mm
 
 
+def _eventos_mes(mid: int, yy: int, mm: int, unidade_id: Optional[int] = None):
+    """Eventos do mês (quente + arquivo), filtrados no banco pelo intervalo de datas."""
+    E = com_arquivo(RmaEvento)
+    ini = date(yy, mm, 1)
+    fim = date(yy + 1, 1, 1) if mm == 12 else date(yy, mm + 1, 1)
+    q = select(E).where(E.municipio_id == int(mid), E.data_evento >= ini, E.data_evento < fim)
+    if unidade_id is not None:
+        q = q.where(E.unidade_id == int(unidade_id))
+    return E, q.order_by(E.id)
+
+
 @router.get("/health")
 def health():
     return {"status": "ok"}
@@ -157,7 +171,7 @@ def resumo_mes(
     unidade_id: Optional[int] = Query(None),
     servico: Optional[str] = Query(None),
     municipio_id: Optional[int] = Query(None),
-    session: Session = Depends(get_session),
+    session: Session = Depends(sessao_leitura(120)),
     usuario: Usuario = Depends(get_current_user),
 ):
     yy, mm = _parse_mes(mes)
@@ -168,11 +182,9 @@ def resumo_mes(
     if not _is_admin_or_consorcio(usuario):
         mid = getattr(usuario, "municipio_id", None)
 
-    q = select(RmaEvento).where(RmaEvento.municipio_id == int(mid))
-    if unidade_id is not None:
-        q = q.where(RmaEvento.unidade_id == int(unidade_id))
+    E, q = _eventos_mes(int(mid), yy, mm, unidade_id)
     if servico:
-        q = q.where(RmaEvento.servico == str(servico).strip().upper())
+        q = q.where(E.servico == str(servico).strip().upper())
 
     rows = session.exec(q).all()
     rows = [r for r in rows if _in_month(r.data_evento, yy, mm)]
@@ -205,12 +217,12 @@ def resumo_mes(
     }
 
 
-@router.get("/export.csv")
+@router.get("/export.csv", dependencies=[Depends(concorrencia.vaga("relatorio"))])
 def export_csv(
     mes: str = Query(..., description="YYYY-MM"),
     unidade_id: Optional[int] = Query(None),
     municipio_id: Optional[int] = Query(None),
-    session: Session = Depends(get_session),
+    session: Session = Depends(sessao_leitura(300)),
     usuario: Usuario = Depends(get_current_user),
 ):
     yy, mm = _parse_mes(mes)
@@ -221,9 +233,7 @@ def export_csv(
     if not _is_admin_or_consorcio(usuario):
         mid = getattr(usuario, "municipio_id", None)
 
-    q = select(RmaEvento).where(RmaEvento.municipio_id == int(mid))
-    if unidade_id is not None:
-        q = q.where(RmaEvento.unidade_id == int(unidade_id))
+    _, q = _eventos_mes(int(mid), yy, mm, unidade_id)
 
     rows = session.exec(q).all()
     rows = [r for r in rows if _in_month(r.data_evento, yy, mm)]
@@ -368,12 +378,12 @@ def upsert_meta(
 
 # RMA_PRESTACAO_V1
 
-@router.get("/prestacao.csv")
+@router.get("/prestacao.csv", dependencies=[Depends(concorrencia.vaga("relatorio"))])
 def prestacao_csv(
     mes: str = Query(..., description="YYYY-MM"),
     unidade_id: Optional[int] = Query(None),
     municipio_id: Optional[int] = Query(None),
-    session: Session = Depends(get_session),
+    session: Session = Depends(sessao_leitura(300)),
     usuario: Usuario = Depends(get_current_user),
 ):
     yy, mm = _parse_mes(mes)
@@ -384,9 +394,7 @@ def prestacao_csv(
     if not _is_admin_or_consorcio(usuario):
         mid = getattr(usuario, "municipio_id", None)
 
-    q = select(RmaEvento).where(RmaEvento.municipio_id == int(mid))
-    if unidade_id is not None:
-        q = q.where(RmaEvento.unidade_id == int(unidade_id))
+    _, q = _eventos_mes(int(mid), yy, mm, unidade_id)
     rows = session.exec(q).all()
     rows = [r for r in rows if _in_month(r.data_evento, yy, mm)]
 
@@ -8,6 +8,7 @@ from app.core.db import get_session
 from app.core.auth import get_current_user, pode_acesso_global
 from app.models.usuario import Usuario
 from app.models.cras_tarefas import CrasTarefa
+from app.services import cras_tarefas_contadores as contadores
 
 router = APIRouter(prefix="/cras/tarefas", tags=["CRAS · Tarefas"])
 
@@ -111,51 +112,10 @@ def resumo(
     session: Session = Depends(get_session),
     usuario: Usuario = Depends(get_current_user),
 ):
-    today = date.today()
-
     mid = _check_municipio(usuario, municipio_id)
 
-    q = select(CrasTarefa).where(CrasTarefa.municipio_id == mid)
-    if unidade_id is not None:
-        q = q.where(CrasTarefa.unidade_id == unidade_id)
-
-    tarefas = session.exec(q).all()
-
-    por: Dict[str, Dict[str, Any]] = {}
-    total_abertas = 0
-    total_vencidas = 0
-
-    for t in tarefas:
-        if t.status != "concluida":
-            total_abertas += 1
-            if t.data_vencimento and t.data_vencimento < today:
-                total_vencidas += 1
-
-        key = str(t.responsavel_id or 0)
-        if key not in por:
-            por[key] = {
-                "responsavel_id": t.responsavel_id,
-                "responsavel_nome": t.responsavel_nome or "—",
-                "abertas": 0,
-                "vencidas": 0,
-                "concluidas": 0,
-            }
-
-        if t.status == "concluida":
-            por[key]["concluidas"] += 1
-        else:
-            por[key]["abertas"] += 1
-            if t.data_vencimento and t.data_vencimento < today:
-                por[key]["vencidas"] += 1
-
-    lista = list(por.values())
-    lista.sort(key=lambda x: (x["vencidas"], x["abertas"]), reverse=True)
-
-    return {
-        "total_abertas": total_abertas,
-        "total_vencidas": total_vencidas,
-        "por_tecnico": lista,
-    }
+    # contadores incrementais + vencidas só entre as abertas (não lê concluídas)
+    return contadores.resumo(session, mid, unidade_id=unidade_id)
 
 
 @router.get("/{tarefa_id}", response_model=CrasTarefa)
@@ -6,12 +6,15 @@ from typing import Any, Dict, List, Optional
 from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlmodel import Session, select
 
+from app.core import versoes
 from app.core.db import get_session
+from app.core.leitura import sessao_leitura
 from app.core.auth import get_current_user, pode_acesso_global
 from app.models.usuario import Usuario
 
 from app.models.creas_unidade import CreasUnidade
 from app.models.creas_caso import CreasCaso, CreasCasoHistorico
+from app.services.arquivo import com_arquivo, obter
 
 from app.models.pessoa_suas import PessoaSUAS
 from app.models.familia_suas import FamiliaSUAS
@@ -162,12 +165,12 @@ def _case_dict(session: Session, caso: CreasCaso) -> Dict[str, Any]:
     return _case_to_dict(caso, pessoa=pessoa, familia=familia, ref_pessoa=refp)
 
 
-@router.get("/linha-metro/etapas")
+@router.get("/linha-metro/etapas", dependencies=[Depends(versoes.condicional(publico=True, max_age=300))])
 def listar_etapas_metro() -> List[Dict[str, Any]]:
     return CREAS_ETAPAS
 
 
-@router.get("/unidades")
+@router.get("/unidades", dependencies=[Depends(versoes.condicional("creas_unidade"))])
 def listar_unidades(
     municipio_id: Optional[int] = Query(default=None),
     session: Session = Depends(get_session),
@@ -219,20 +222,23 @@ def listar_casos(
     session: Session = Depends(get_session),
     usuario: Usuario = Depends(get_current_user),
 ) -> List[Dict[str, Any]]:
-    stmt = select(CreasCaso).order_by(CreasCaso.id.desc())
+    # encerrados há tempo ficam no arquivo (app/services/arquivo.py); só o filtro
+    # por status aberto dispensa a leitura dele
+    C = CreasCaso if status and status != "encerrado" else com_arquivo(CreasCaso)
+    stmt = select(C).order_by(C.id.desc())
 
     if not pode_acesso_global(usuario):
         um = _mun_id(usuario)
         if um is None:
             raise HTTPException(status_code=403, detail="Usuário sem município.")
-        stmt = stmt.where(CreasCaso.municipio_id == um)
+        stmt = stmt.where(C.municipio_id == um)
 
     if status:
-        stmt = stmt.where(CreasCaso.status == status)
+        stmt = stmt.where(C.status == status)
     if etapa:
-        stmt = stmt.where(CreasCaso.etapa_atual == etapa)
+        stmt = stmt.where(C.etapa_atual == etapa)
     if unidade_id:
-        stmt = stmt.where(CreasCaso.unidade_id == unidade_id)
+        stmt = stmt.where(C.unidade_id == unidade_id)
 
     casos = session.exec(stmt).all()
 
@@ -373,7 +379,7 @@ def obter_caso(
     session: Session = Depends(get_session),
     usuario: Usuario = Depends(get_current_user),
 ) -> Dict[str, Any]:
-    caso = session.get(CreasCaso, caso_id)
+    caso = obter(session, CreasCaso, caso_id)  # encerrado há tempo: vem do arquivo
     if not caso:
         raise HTTPException(status_code=404, detail="Caso CREAS não encontrado.")
 
@@ -518,15 +524,16 @@ def encerrar_caso(
 
 @router.get("/relatorios/overview")
 def overview(
-    session: Session = Depends(get_session),
+    session: Session = Depends(sessao_leitura(300)),
     usuario: Usuario = Depends(get_current_user),
 ) -> Dict[str, Any]:
-    stmt = select(CreasCaso)
+    C = com_arquivo(CreasCaso)  # encerrados arquivados também contam
+    stmt = select(C)
     if not pode_acesso_global(usuario):
         um = _mun_id(usuario)
         if um is None:
             raise HTTPException(status_code=403, detail="Usuário sem município.")
-        stmt = stmt.where(CreasCaso.municipio_id == um)
+        stmt = stmt.where(C.municipio_id == um)
 
     total = 0
     ativos = 0
@@ -8,10 +8,12 @@ from sqlmodel import Session, select
 from sqlalchemy import func
 
 from app.core.db import get_session
+from app.core.leitura import sessao_leitura
 from app.core.auth import get_current_user
 from app.models.usuario import Usuario
 from app.models.pessoa import PessoaRua
 from app.models.municipio import Municipio
+from app.services.arquivo import com_arquivo
 
 try:
     from app.models.caso_pop_rua import CasoPopRua  # type: ignore
@@ -79,7 +81,7 @@ def _norm_sim_nao(v: Optional[str]) -> str:
 @router.get("/overview")
 def dashboard_overview(
     municipio_id: Optional[int] = Query(default=None, description="Filtro opcional por município (gestor/admin)"),
-    session: Session = Depends(get_session),
+    session: Session = Depends(sessao_leitura(120)),
     usuario: Usuario = Depends(get_current_user),
 ):
     """Retorna métricas agregadas para o dashboard (B2)."""
@@ -111,7 +113,8 @@ def dashboard_overview(
         # pessoas vinculadas ao município (origem) OU com caso/atendimento no município
         conds = [PessoaRua.municipio_origem_id == int(municipio_id)]
         if CasoPopRua is not None:
-            sub = select(CasoPopRua.pessoa_id).where(CasoPopRua.municipio_id == int(municipio_id))
+            C = com_arquivo(CasoPopRua)  # caso encerrado arquivado ainda vincula a pessoa
+            sub = select(C.pessoa_id).where(C.municipio_id == int(municipio_id))
             conds.append(PessoaRua.id.in_(sub))
         if Atendimento is not None:
             suba = select(Atendimento.pessoa_id).where(Atendimento.municipio_id == int(municipio_id))
@@ -127,9 +130,10 @@ def dashboard_overview(
     # Casos
     total_casos = 0
     if CasoPopRua is not None:
-        stmt_casos = select(func.count()).select_from(CasoPopRua)
+        C = com_arquivo(CasoPopRua)  # total histórico: quente + arquivo
+        stmt_casos = select(func.count()).select_from(C)
         if municipio_id is not None:
-            stmt_casos = stmt_casos.where(CasoPopRua.municipio_id == int(municipio_id))
+            stmt_casos = stmt_casos.where(C.municipio_id == int(municipio_id))
         total_casos = int(session.exec(stmt_casos).one())
 
     genero: Dict[str, int] = {}
@@ -12,18 +12,23 @@ from zoneinfo import ZoneInfo
 from io import BytesIO
 from typing import Any, Dict, List, Optional
 
+import anyio
 from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
-from fastapi.responses import FileResponse, StreamingResponse, HTMLResponse
+from fastapi.responses import FileResponse, StreamingResponse, HTMLResponse, JSONResponse
 from pydantic import BaseModel, Field as PField
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import Session, select
 
+from app.core import concorrencia, versoes
 from app.core.auth import exigir_minimo_perfil, get_current_user, pode_acesso_global
-from app.core.db import get_session
+from app.core.db import engine, get_session
+from app.core.limites import ip_cliente
 from app.models.usuario import Usuario
 from app.models.municipio import Municipio
 from app.models.municipio_branding import MunicipioBranding
 from app.models.documento_template import DocumentoTemplate
 from app.models.documento_emitido import DocumentoEmitido
+from app.models.documento_verificacao import DocumentoVerificacao
 from app.models.documento_config import DocumentoConfig
 from app.models.documento_sequencia import DocumentoSequencia
 from app.models.cras_encaminhamento import CrasEncaminhamento
@@ -33,6 +38,8 @@ try:
 except Exception:  # pragma: no cover
     EncaminhamentoIntermunicipal = None  # type: ignore
 
+from app.services import documento_verificacao
+from app.services.branding_logo import variante as variante_logo
 from app.services.documentos_modelos import get_modelo, listar_modelos
 
 # IA (opcional)
@@ -595,6 +602,9 @@ def _build_pdf_bytes(
     if branding.logo_path:
         abs_logo = _to_abspath(branding.logo_path)
         if os.path.exists(abs_logo):
+            # variante "pdf" (tamanho limitado, gerada no upload); original como fallback
+            var = variante_logo(abs_logo, "pdf")
+            src_logo, px_w, px_h = var if var else (abs_logo, 0, 0)
             w = float(getattr(branding, "logo_width_mm", 28.0) or 28.0) * mm
             h_cfg = getattr(branding, "logo_height_mm", None)
             if h_cfg:
@@ -602,16 +612,17 @@ def _build_pdf_bytes(
             else:
                 # mantém proporção automaticamente pelo tamanho do arquivo (px)
                 h = w
-                try:
-                    from PIL import Image as PILImage  # type: ignore
-
-                    im = PILImage.open(abs_logo)
-                    iw, ih = im.size
-                    if iw and ih:
-                        h = w * (float(ih) / float(iw))
-                except Exception:
-                    pass
-            story.append(RLImage(abs_logo, width=w, height=h))
+                if not (px_w and px_h):
+                    try:
+                        from PIL import Image as PILImage  # type: ignore
+
+                        with PILImage.open(abs_logo) as im:
+                            px_w, px_h = im.size
+                    except Exception:
+                        pass
+                if px_w and px_h:
+                    h = w * (float(px_h) / float(px_w))
+            story.append(RLImage(src_logo, width=w, height=h))
             story.append(Spacer(1, 6))
 
     if branding.header_text:
@@ -770,7 +781,7 @@ class DocumentoGerar(BaseModel):
 # =========================================================
 
 
-@router.get("/modelos", dependencies=[Depends(exigir_minimo_perfil("operador"))])
+@router.get("/modelos", dependencies=[Depends(exigir_minimo_perfil("operador")), Depends(versoes.condicional(max_age=300))])
 def listar_modelos_documentos():
     """Biblioteca de modelos prontos (campos guiados)."""
     out = []
@@ -849,7 +860,7 @@ def aplicar_modelos_no_municipio(
     session.commit()
     return {"municipio_id": mid, "insert": insert, "update": update, "skip": skip}
 
-@router.get("/templates", dependencies=[Depends(exigir_minimo_perfil("operador"))])
+@router.get("/templates", dependencies=[Depends(exigir_minimo_perfil("operador")), Depends(versoes.condicional("documento_template"))])
 def listar_templates(
     municipio_id: Optional[int] = Query(default=None),
     tipo: Optional[str] = Query(default=None),
@@ -932,7 +943,7 @@ def atualizar_template(
 # Documentos emitidos
 # =========================================================
 
-@router.post("/gerar", dependencies=[Depends(exigir_minimo_perfil("operador"))])
+@router.post("/gerar", dependencies=[Depends(exigir_minimo_perfil("operador")), Depends(concorrencia.vaga("pdf"))])
 def gerar_documento(
     payload: DocumentoGerar,
     request: Request,
@@ -1153,6 +1164,7 @@ def gerar_documento(
         with open(abs_path, "wb") as f:
             f.write(pdf_bytes)
 
+        _registrar_verificacao(session, doc, codigo, pdf_bytes=pdf_bytes)
         session.commit()
         session.refresh(doc)
         return {
@@ -1238,8 +1250,50 @@ def download_documento(
         filename=filename,
     )
 
+def _registrar_verificacao(
+    session: Session,
+    doc: DocumentoEmitido,
+    codigo: str,
+    pdf_bytes: Optional[bytes] = None,
+) -> DocumentoVerificacao:
+    mun = _get_municipio(session, int(doc.municipio_id)) if getattr(doc, "municipio_id", None) else None
+    municipio_label = f"{mun.nome}/{mun.uf}" if mun else (str(doc.municipio_id) if doc.municipio_id is not None else "-")
+    return documento_verificacao.registrar(
+        session,
+        doc,
+        codigo=codigo,
+        versao=documento_verificacao.segredo_versao(_verif_secret()),
+        tipo_label=DEFAULT_TITULOS_POR_TIPO.get((doc.tipo or "").strip().lower(), doc.tipo),
+        municipio_label=municipio_label,
+        pdf_bytes=pdf_bytes,
+        abs_path=_to_abspath(doc.arquivo_path) if doc.arquivo_path else None,
+    )
+
+
+def _verificar_sync(documento_id: int, codigo: str, html: bool, base: str) -> documento_verificacao.Resposta:
+    """Cache miss da verificação pública (roda no limitador de threads próprio)."""
+    with Session(engine) as session:
+        reg = session.get(DocumentoVerificacao, documento_id)
+        if reg is None or reg.segredo_versao != documento_verificacao.segredo_versao(_verif_secret()):
+            # documento anterior à tabela (ou segredo trocado): materializa uma vez
+            doc = session.get(DocumentoEmitido, documento_id)
+            if not doc:
+                return documento_verificacao.nao_encontrado()
+            reg = _registrar_verificacao(session, doc, _calc_verif_code(doc))
+            try:
+                session.commit()
+            except IntegrityError:
+                # outra leitura simultânea do mesmo QR materializou primeiro
+                session.rollback()
+                reg = session.get(DocumentoVerificacao, documento_id)
+                if reg is None:
+                    return documento_verificacao.nao_encontrado()
+        abs_path = _to_abspath(reg.arquivo_path) if reg.arquivo_path else ""
+        return documento_verificacao.verificar(session, reg, abs_path, codigo=codigo, html=html, base=base)
+
+
 @router.get("/{documento_id}/verificar")
-def verificar_documento(
+async def verificar_documento(
     documento_id: int,
     request: Request,
     c: str = Query(..., min_length=6, max_length=128),
@@ -1247,7 +1301,6 @@ def verificar_documento(
         None,
         description="Formato de retorno: json|html. Se omitido, escolhe HTML quando o navegador pedir (Accept: text/html).",
     ),
-    session: Session = Depends(get_session),
 ):
     """Verificação pública de documento (QR/código).
 
@@ -1255,177 +1308,39 @@ def verificar_documento(
     - Retorna apenas metadados mínimos (não expõe destinatário/corpo).
     - Se o código estiver incorreto, não revela dados do documento.
     - Para QR em celular: retorna HTML automaticamente (Accept: text/html).
+    - Limite por IP (429 + Retry-After); resposta com ETag/Cache-Control
+      (If-None-Match => 304). Ver app/services/documento_verificacao.py.
     """
-
-    def want_html() -> bool:
-        if format:
-            f = (format or "").strip().lower()
-            if f == "html":
-                return True
-            if f == "json":
-                return False
-        accept = (request.headers.get("accept") or "").lower()
-        return "text/html" in accept
-
-    def page_html(*, valido: bool, payload: Optional[Dict[str, Any]] = None) -> HTMLResponse:
-        ok = bool(valido)
-        title = "Verificação de documento"
-        badge = "✅ Documento válido" if ok else "❌ Documento inválido"
-        subtitle = (
-            "Este portal confirma a autenticidade do documento emitido pelo sistema."
-            if ok
-            else "O código informado não corresponde ao documento."
+    ok, espera = documento_verificacao.limite_ip.permitir(ip_cliente(request))
+    if not ok:
+        return JSONResponse(
+            status_code=429,
+            content={"detail": "Muitas verificações a partir deste endereço. Tente novamente em instantes."},
+            headers={"Retry-After": str(espera)},
         )
 
-        # Links úteis
-        code = (c or "").strip()
-        base = _verif_base_url() or str(request.base_url).rstrip("/")
-        ver_path = f"/documentos/{int(documento_id)}/verificar?c={code}"
-        ver_json = f"{base}{ver_path}" if base else ver_path
-        ver_json = f"{ver_json}&format=json" if "?" in ver_json else f"{ver_json}?format=json"
-
-        download_path = f"/documentos/{int(documento_id)}/download"
-        download_url = f"{base}{download_path}" if base else download_path
-
-        # Campos visíveis (sem conteúdo sensível)
-        rows = ""
-        if payload:
-            def _row(k: str, v: Any) -> str:
-                return f"<tr><th>{html_lib.escape(str(k))}</th><td>{html_lib.escape(str(v))}</td></tr>"
-
-            rows_list = [
-                _row("Número", payload.get("numero")),
-                _row("Tipo", payload.get("tipo_label") or payload.get("tipo")),
-                _row("Emissor", payload.get("emissor_label") or payload.get("emissor") or "-"),
-                _row("Município", payload.get("municipio_label") or payload.get("municipio_id")),
-                _row("Ano", payload.get("ano")),
-                _row("Emitido em", payload.get("criado_em_fmt") or payload.get("criado_em")),
-                _row("Arquivo existe", "Sim" if payload.get("arquivo_existe") else "Não"),
-                _row("SHA-256", payload.get("arquivo_sha256") or "-"),
-                _row("Tamanho (bytes)", payload.get("tamanho_bytes") or "-"),
-            ]
-            rows = "\n".join(rows_list)
-
-        html = f"""<!doctype html>
-<html lang="pt-br">
-<head>
-  <meta charset="utf-8"/>
-  <meta name="viewport" content="width=device-width,initial-scale=1"/>
-  <title>{title}</title>
-  <style>
-    body{{margin:0;background:#0b1220;color:#e5e7eb;font-family:system-ui,-apple-system,Segoe UI,Roboto,Arial;}}
-    .wrap{{max-width:920px;margin:0 auto;padding:24px;}}
-    .card{{background:rgba(255,255,255,.06);border:1px solid rgba(255,255,255,.12);border-radius:14px;padding:18px;}}
-    .badge{{display:inline-block;padding:8px 12px;border-radius:999px;font-weight:800;}}
-    .ok{{background:rgba(34,197,94,.18);border:1px solid rgba(34,197,94,.35);}}
-    .bad{{background:rgba(239,68,68,.16);border:1px solid rgba(239,68,68,.35);}}
-    h1{{margin:10px 0 6px;font-size:20px;}}
-    p{{margin:6px 0 0;color:rgba(229,231,235,.8)}}
-    table{{width:100%;border-collapse:collapse;margin-top:14px;}}
-    th,td{{padding:10px 8px;border-top:1px solid rgba(255,255,255,.10);font-size:14px;text-align:left;vertical-align:top;}}
-    th{{width:220px;color:rgba(229,231,235,.85);font-weight:700;}}
-    a{{color:#93c5fd;text-decoration:none}}
-    a:hover{{text-decoration:underline}}
-    .actions{{display:flex;gap:10px;flex-wrap:wrap;margin-top:14px}}
-    .btn{{display:inline-block;padding:10px 12px;border-radius:10px;border:1px solid rgba(255,255,255,.15);background:rgba(255,255,255,.06)}}
-    .small{{font-size:12px;color:rgba(229,231,235,.7);margin-top:10px;line-height:1.35}}
-    code{{background:rgba(255,255,255,.06);padding:2px 6px;border-radius:6px}}
-  </style>
-</head>
-<body>
-  <div class="wrap">
-    <div class="card">
-      <div class="badge {'ok' if ok else 'bad'}">{badge}</div>
-      <h1>{title}</h1>
-      <p>{subtitle}</p>
-
-      {'<table>'+rows+'</table>' if rows else ''}
-
-      <div class="actions">
-        <a class="btn" href="{html_lib.escape(ver_json)}">Ver JSON</a>
-        <a class="btn" href="{html_lib.escape(download_url)}">Baixar PDF (requer login)</a>
-      </div>
-
-      <div class="small">
-        Código consultado: <code>{html_lib.escape(code)}</code><br/>
-        Observação: esta página não exibe o conteúdo do documento, apenas metadados mínimos para verificação.
-      </div>
-    </div>
-  </div>
-</body>
-</html>
-"""
-        return HTMLResponse(content=html, status_code=200)
-
-    doc = session.get(DocumentoEmitido, documento_id)
-    if not doc:
-        raise HTTPException(status_code=404, detail="Documento não encontrado.")
-
-    expected = _calc_verif_code(doc)
-    provided = (c or "").strip()
-    valido = bool(expected) and hmac.compare_digest(expected.lower(), provided.lower())
-
-    if not valido:
-        if want_html():
-            return page_html(valido=False)
-        return {"id": documento_id, "valido": False}
-
-    abs_path = _to_abspath(doc.arquivo_path)
-    existe = bool(abs_path) and os.path.exists(abs_path)
-
-    sha256 = None
-    tamanho = None
-    if existe:
-        try:
-            tamanho = os.path.getsize(abs_path)
-            sha256 = _sha256_file(abs_path)
-        except Exception:
-            sha256 = None
-
-    emissor = None
-    try:
-        # storage/documentos/<mid>/<ano>/<tipo>/<emissor>/...
-        parts = (doc.arquivo_path or "").split("/")
-        if len(parts) >= 6 and parts[0] == "storage" and parts[1] == "documentos":
-            emissor = parts[5]  # 0 storage,1 documentos,2 mid,3 ano,4 tipo,5 emissor
-    except Exception:
-        emissor = None
-
-    mun = _get_municipio(session, int(doc.municipio_id)) if getattr(doc, "municipio_id", None) else None
-    municipio_label = f"{mun.nome}/{mun.uf}" if mun else (str(doc.municipio_id) if doc.municipio_id is not None else "-")
-    tipo_label = DEFAULT_TITULOS_POR_TIPO.get((doc.tipo or "").strip().lower(), doc.tipo)
-    emissor_label = (emissor or "").upper() if emissor else None
-    criado_em_fmt = None
-    try:
-        if isinstance(doc.criado_em, datetime):
-            criado_em_fmt = doc.criado_em.strftime("%d/%m/%Y %H:%M:%S")
-        else:
-            criado_em_fmt = str(doc.criado_em)
-    except Exception:
-        criado_em_fmt = None
-
-    payload = {
-        "id": doc.id,
-        "valido": True,
-        "tipo": doc.tipo,
-        "numero": doc.numero,
-        "ano": doc.ano,
-        "municipio_id": doc.municipio_id,
-        "emissor": emissor,
-        "emissor_label": emissor_label,
-        "tipo_label": tipo_label,
-        "municipio_label": municipio_label,
-        "criado_em_fmt": criado_em_fmt,
-        "criado_em": doc.criado_em,
-        "arquivo_existe": existe,
-        "arquivo_sha256": sha256,
-        "tamanho_bytes": tamanho,
-    }
-
-    if want_html():
-        return page_html(valido=True, payload=payload)
-
-    return payload
+    f = (format or "").strip().lower()
+    if f in ("html", "json"):
+        html = f == "html"
+    else:
+        html = "text/html" in (request.headers.get("accept") or "").lower()
+
+    codigo = (c or "").strip()
+    base = (_verif_base_url() or str(request.base_url).rstrip("/")) if html else ""
+    chave = (int(documento_id), codigo, html, base)
+
+    resp = documento_verificacao.cache_get(chave)
+    if resp is None:
+        resp = await anyio.to_thread.run_sync(
+            _verificar_sync,
+            int(documento_id),
+            codigo,
+            html,
+            base,
+            limiter=documento_verificacao.limitador_threads(),
+        )
+        documento_verificacao.cache_set(chave, resp)
+    return documento_verificacao.responder(resp, request.headers.get("if-none-match"))
 
 
 
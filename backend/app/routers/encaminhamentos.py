@@ -2,7 +2,7 @@
 from datetime import datetime
 from typing import Optional, List
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from fastapi.security import OAuth2PasswordBearer
 from sqlmodel import Session, select
 from sqlalchemy import or_
@@ -364,41 +364,127 @@ def _add_evento(session: Session, enc_id: int, tipo: str, detalhe: Optional[str]
 # =========================================================
 # Endpoints
 # =========================================================
+# Lista: projeção leve (fila/seleção). Registro completo + linha do metrô no detalhe.
+_CAMPOS_LISTA = (
+    EncaminhamentoIntermunicipal.id,
+    EncaminhamentoIntermunicipal.pessoa_id,
+    EncaminhamentoIntermunicipal.caso_id,
+    EncaminhamentoIntermunicipal.municipio_origem_id,
+    EncaminhamentoIntermunicipal.municipio_destino_id,
+    EncaminhamentoIntermunicipal.motivo,
+    EncaminhamentoIntermunicipal.status,
+    EncaminhamentoIntermunicipal.criado_em,
+    EncaminhamentoIntermunicipal.atualizado_em,
+)
+
+
+_LIMITE_PADRAO = 200  # página quando só `cursor` vem
+
+
+def _item_completo(x: EncaminhamentoIntermunicipal) -> dict:
+    d = _to_dict(x, eventos=[])
+    d["linha_metro"] = _montar_linha_metro(x, eventos=[])
+    return d
+
+
+def _item_lista(r) -> dict:
+    return {
+        "id": r.id,
+        "pessoa_id": r.pessoa_id,
+        "caso_id": r.caso_id,
+        "municipio_origem_id": r.municipio_origem_id,
+        "municipio_destino_id": r.municipio_destino_id,
+        "motivo": r.motivo,
+        "status": r.status,
+        "criado_em": r.criado_em.isoformat() if r.criado_em else None,
+        "atualizado_em": r.atualizado_em.isoformat() if r.atualizado_em else None,
+    }
+
+
 @router.get("/")
 def listar(
+    response: Response,
     status_filtro: Optional[str] = None,
     caso_id: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Paginação por cursor (máx 500). Sem limit/cursor: lista inteira."),
+    cursor: Optional[int] = Query(None, ge=1, description="Próxima página: valor do header X-Next-Cursor."),
+    expand: Optional[str] = Query(None, description="linha_metro: registro completo + linha do metrô; leve: itens essenciais."),
     session: Session = Depends(get_session),
     usuario: Usuario = Depends(get_current_user),
 ):
-    stmt = select(EncaminhamentoIntermunicipal).order_by(EncaminhamentoIntermunicipal.id.desc())
+    """Lista de encaminhamentos intermunicipais.
+
+    - Ordem: id desc.
+    - Sem `limit`/`cursor`: lista inteira, cada item com registro completo e
+      linha do metrô (contrato antigo: TelaEncaminhamentos, LinhaMetro, App).
+    - Com `limit` ou `cursor`: página LEVE (campos essenciais; linha do metrô
+      só no detalhe GET /{id} ou com expand=linha_metro); a próxima no header
+      X-Next-Cursor (ausente na última).
+    - Municipal: origem OU destino — uma leitura por lado, cada uma pelo índice
+      (municipio, id) — migração 0010 — e parando em limit+1; o merge é feito aqui.
+    """
+    paginado = limit is not None or cursor is not None
+    expandir = {x.strip().lower() for x in (expand or "").split(",") if x.strip()}
+    completo = "linha_metro" in expandir or (not paginado and "leve" not in expandir)
 
+    conds = []
     if status_filtro:
-        stmt = stmt.where(EncaminhamentoIntermunicipal.status == status_filtro)
-
+        conds.append(EncaminhamentoIntermunicipal.status == status_filtro)
     if caso_id is not None:
-        stmt = stmt.where(EncaminhamentoIntermunicipal.caso_id == int(caso_id))
+        conds.append(EncaminhamentoIntermunicipal.caso_id == int(caso_id))
+    if cursor is not None:
+        conds.append(EncaminhamentoIntermunicipal.id < int(cursor))
 
     # Municipal: origem OU destino
+    lados = [None]
     if not _is_admin_or_consorcio(usuario):
         muni_user = getattr(usuario, "municipio_id", None)
         if not muni_user:
             raise HTTPException(status_code=403, detail="Usuário sem município vinculado.")
-
-        stmt = stmt.where(
-            or_(
-                EncaminhamentoIntermunicipal.municipio_origem_id == int(muni_user),
-                EncaminhamentoIntermunicipal.municipio_destino_id == int(muni_user),
-            )
-        )
-
-    itens = session.exec(stmt).all()
-    out = []
-    for x in itens:
-        d = _to_dict(x, eventos=[])
-        d["linha_metro"] = _montar_linha_metro(x, eventos=[])
-        out.append(d)
-    return out
+        lados = [
+            EncaminhamentoIntermunicipal.municipio_origem_id == int(muni_user),
+            EncaminhamentoIntermunicipal.municipio_destino_id == int(muni_user),
+        ]
+
+    if not paginado and completo:
+        stmt = select(EncaminhamentoIntermunicipal).order_by(EncaminhamentoIntermunicipal.id.desc())
+        for c in conds:
+            stmt = stmt.where(c)
+        if lados[0] is not None:
+            stmt = stmt.where(or_(*lados))
+        return [_item_completo(x) for x in session.exec(stmt).all()]
+
+    limit = int(limit or _LIMITE_PADRAO)
+    por_id = {}
+    for lado in lados:
+        stmt = select(*_CAMPOS_LISTA)
+        for c in conds + ([lado] if lado is not None else []):
+            stmt = stmt.where(c)
+        stmt = stmt.order_by(EncaminhamentoIntermunicipal.id.desc())
+        if paginado:
+            stmt = stmt.limit(limit + 1)
+        for r in session.exec(stmt).all():
+            por_id[r.id] = r
+
+    linhas = sorted(por_id.values(), key=lambda r: r.id, reverse=True)
+    if not paginado:
+        return [_item_lista(r) for r in linhas]
+    pagina = linhas[:limit]
+
+    if response is not None:
+        if len(linhas) > limit:
+            response.headers["X-Next-Cursor"] = str(pagina[-1].id)
+        # permite ler no browser (CORS)
+        prev = response.headers.get("Access-Control-Expose-Headers")
+        expose = "X-Next-Cursor" if not prev else f"{prev}, X-Next-Cursor"
+        response.headers["Access-Control-Expose-Headers"] = expose
+
+    if not completo:
+        return [_item_lista(r) for r in pagina]
+
+    ids = [r.id for r in pagina]
+    encs = session.exec(select(EncaminhamentoIntermunicipal).where(EncaminhamentoIntermunicipal.id.in_(ids))).all() if ids else []
+    return [_item_completo(x) for x in sorted(encs, key=lambda x: x.id, reverse=True)]
 
 
 @router.get("/{enc_id}")
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from app.core import concorrencia
+from app.core.auth import exigir_minimo_perfil, get_current_user, pode_acesso_global
+from app.core.leitura import engine_leitura
+from app.models.usuario import Usuario
+from app.services import exportacao
+
+router = APIRouter(prefix="/exportacao", tags=["exportacao"])
+
+
+def _municipio_escopo(usuario: Usuario, municipio_id: Optional[int]) -> Optional[int]:
+    """Global escolhe (ou exporta todos); demais só o próprio município."""
+    if pode_acesso_global(usuario):
+        return municipio_id
+    mid = getattr(usuario, "municipio_id", None)
+    if mid is None:
+        raise HTTPException(status_code=403, detail="Usuário sem município.")
+    if municipio_id is not None and int(municipio_id) != int(mid):
+        raise HTTPException(status_code=403, detail="Acesso negado (município).")
+    return int(mid)
+
+
+@router.get("/conjuntos", dependencies=[Depends(exigir_minimo_perfil("coord_municipal"))])
+def listar_conjuntos() -> Dict[str, Any]:
+    """Tabelas/visões exportáveis, colunas (tipo, se é sensível) e coluna da marca d'água."""
+    return {
+        "formatos": exportacao.formatos_disponiveis(),
+        "conjuntos": [exportacao.descrever(c) for c in exportacao.CONJUNTOS.values()],
+    }
+
+
+@router.get("/{conjunto}", dependencies=[Depends(exigir_minimo_perfil("coord_municipal")), Depends(concorrencia.vaga("exportacao"))])
+def exportar_conjunto(
+    conjunto: str,
+    formato: str = Query("parquet", description="parquet|arrow|csv"),
+    desde: Optional[str] = Query(None, description="Marca d'água (exclusiva): valor de X-Export-Watermark da exportação anterior."),
+    municipio_id: Optional[int] = Query(None),
+    chunk: int = Query(exportacao.CHUNK_PADRAO, ge=100, le=50000, description="Linhas por bloco (row group / record batch)."),
+    sensiveis: bool = Query(False, description="Inclui identificação e textos livres (somente admin)."),
+    usuario: Usuario = Depends(get_current_user),
+):
+    """Exporta um conjunto em streaming (Parquet/Arrow/CSV), completo ou incremental.
+
+    - Headers: X-Export-Desde, X-Export-Watermark (próximo `desde`), X-Export-Conjunto.
+    - Ver app/services/exportacao.py.
+    """
+    formato = (formato or "").strip().lower()
+    if formato not in exportacao.formatos_disponiveis():
+        raise HTTPException(status_code=400, detail=f"formato indisponível (use {', '.join(exportacao.formatos_disponiveis())}).")
+    if conjunto not in exportacao.CONJUNTOS:
+        raise HTTPException(status_code=404, detail="Conjunto não encontrado.")
+    if sensiveis and (getattr(usuario, "perfil", "") or "").strip().lower() != "admin":
+        raise HTTPException(status_code=403, detail="Somente admin exporta colunas sensíveis.")
+
+    mid = _municipio_escopo(usuario, municipio_id)
+    # cópia/réplica de até 5 min: a marca d'água sai da mesma fonte que os dados
+    engine, origem, idade = engine_leitura(300)
+    try:
+        with engine.connect() as conn:
+            plano = exportacao.planejar(conn, conjunto, municipio_id=mid, desde=desde, incluir_sensiveis=sensiveis)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    sufixo = f"_municipio_{mid}" if mid is not None else ""
+    filename = f"{conjunto}{sufixo}.{exportacao.EXTENSOES[formato]}"
+    headers = {
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "X-Export-Conjunto": conjunto,
+        "X-Export-Desde": exportacao.texto_marca(plano.desde) or "",
+        "X-Export-Watermark": exportacao.texto_marca(plano.ate) or "",
+        "Access-Control-Expose-Headers": "X-Export-Conjunto, X-Export-Desde, X-Export-Watermark",
+        "X-Leitura": origem if idade is None else f"{origem}; idade={int(idade)}s",
+    }
+    return StreamingResponse(
+        exportacao.gerar(engine, plano, formato, chunk),
+        media_type=exportacao.MEDIA_TYPES[formato],
+        headers=headers,
+    )
@@ -2,15 +2,18 @@ from __future__ import annotations
 
 from datetime import date, datetime, time, timedelta
 from typing import Any, Dict, List, Optional, Tuple
-import time
+import time as _time
 
 from fastapi import APIRouter, Depends, Query
-from sqlalchemy import or_  # type: ignore
+from sqlalchemy import and_, false, func, or_  # type: ignore
 from sqlmodel import Session, select
 
 from app.core.auth import exigir_minimo_perfil, get_current_user, pode_acesso_global
 from app.core.db import get_session
+from app.core.leitura import sessao_leitura
 from app.models.usuario import Usuario
+from app.services import rede_metricas
+from app.services.sla_resolver import SLA_PADRAO, resolvedor as resolvedor_sla
 
 # =========================
 # Imports opcionais (não travam o app se algum módulo ainda não existir)
@@ -31,12 +34,6 @@ try:
 except Exception:  # pragma: no cover
     PessoaSUAS = None
 
-try:
-    from app.models.sla_regra import SlaRegra  # type: ignore
-except Exception:  # pragma: no cover
-    SlaRegra = None
-
-
 try:
     from app.models.cadunico_precadastro import CadunicoPreCadastro  # type: ignore
 except Exception:  # pragma: no cover
@@ -118,7 +115,7 @@ def _cache_get(key: str, ttl_s: int) -> object | None:
         if not ts_val:
             return None
         ts, val = ts_val
-        if (time.time() - ts) <= ttl_s:
+        if (_time.time() - ts) <= ttl_s:
             return val
         _CACHE_TTL.pop(key, None)
         return None
@@ -126,7 +123,7 @@ def _cache_get(key: str, ttl_s: int) -> object | None:
         return None
 
 def _cache_set(key: str, val: object) -> None:
-    _CACHE_TTL[key] = (time.time(), val)
+    _CACHE_TTL[key] = (_time.time(), val)
 
 def _users_cached(session: Session, ttl_s: int = 60) -> dict[int, str]:
     """Cache simples do mapa id->nome de usuários."""
@@ -470,14 +467,8 @@ _CRAS_ENC_NEXT = {
     "devolutiva": "concluido",
 }
 
-# SLA (dias) por etapa do encaminhamento CRAS (pode ser calibrado depois)
-_CRAS_ENC_SLA = {
-    "enviado": 2,        # prazo para acusar recebimento
-    "recebido": 5,       # prazo para agendar
-    "agendado": 7,       # prazo para atender
-    "atendido": 2,       # prazo para registrar devolutiva
-    "devolutiva": 2,     # prazo para concluir após devolutiva
-}
+# SLA (dias) por etapa do encaminhamento CRAS (padrões em services/sla_resolver.py)
+_CRAS_ENC_SLA = SLA_PADRAO["cras_encaminhamento"]
 
 _INTER_NEXT = {
     "solicitado": "contato",
@@ -488,113 +479,11 @@ _INTER_NEXT = {
     "contrarreferencia": "concluido",
 }
 
-# SLA (dias) por etapa do encaminhamento intermunicipal (pode ser calibrado depois)
-_INTER_SLA = {
-    "solicitado": 2,
-    "contato": 2,
-    "aceito": 7,
-    "agendado": 7,
-    "passagem": 3,
-    "contrarreferencia": 3,
-}
-
-# =========================
-# SLA configurável (Config -> sla_regra)
-# =========================
-
-def _prefetch_sla_regras(session: Session, municipio_id: Optional[int]) -> List[Any]:
-    """Carrega regras ativas de SLA (municipal + globais) para evitar N+1."""
-    if SlaRegra is None:
-        return []
-    try:
-        stmt = select(SlaRegra).where(SlaRegra.ativo == True)  # noqa: E712
-        if municipio_id is not None:
-            stmt = stmt.where(or_(SlaRegra.municipio_id == int(municipio_id), SlaRegra.municipio_id == None))  # noqa: E711
-        return list(session.exec(stmt).all())
-    except Exception:
-        return []
-
-
-def _resolver_sla_dias(
-    regras: List[Any],
-    municipio_id: Optional[int],
-    unidade_tipo: Optional[str],
-    unidade_id: Optional[int],
-    modulo: str,
-    etapa: str,
-    default_dias: int,
-) -> int:
-    """Resolve SLA (dias) pela regra mais específica disponível.
-
-    Prioridade (mais específico ganha):
-      1) municipio + unidade_tipo + unidade_id
-      2) municipio + unidade_tipo
-      3) municipio
-      4) global (municipio_id=None)
-    """
-    mod = (modulo or "").strip().lower()
-    st = (etapa or "").strip().lower()
-    ut = (unidade_tipo or "").strip().lower() or None
-    uid = int(unidade_id) if unidade_id is not None else None
-
-    best = None
-    best_score = -1
-
-    for r in regras:
-        if not getattr(r, "ativo", True):
-            continue
-        if str(getattr(r, "modulo", "") or "").strip().lower() != mod:
-            continue
-        if str(getattr(r, "etapa", "") or "").strip().lower() != st:
-            continue
-
-        r_mid = getattr(r, "municipio_id", None)
-        if r_mid is not None:
-            if municipio_id is None:
-                continue
-            try:
-                if int(r_mid) != int(municipio_id):
-                    continue
-            except Exception:
-                continue
-
-        r_ut = (str(getattr(r, "unidade_tipo", "") or "").strip().lower() or None)
-        r_uid = getattr(r, "unidade_id", None)
-        r_uid = int(r_uid) if r_uid is not None else None
-
-        if r_ut is not None:
-            if ut is None or r_ut != ut:
-                continue
-        if r_uid is not None:
-            if uid is None:
-                continue
-            try:
-                if int(r_uid) != int(uid):
-                    continue
-            except Exception:
-                continue
-
-        score = 0
-        score += 4 if r_mid is not None else 0
-        score += 2 if r_ut is not None else 0
-        score += 1 if r_uid is not None else 0
-
-        if score > best_score:
-            best = r
-            best_score = score
-        elif score == best_score and best is not None:
-            # desempate: mais recente
-            b_upd = getattr(best, "atualizado_em", None)
-            r_upd = getattr(r, "atualizado_em", None)
-            if isinstance(r_upd, datetime) and isinstance(b_upd, datetime) and r_upd > b_upd:
-                best = r
-
-    try:
-        return int(getattr(best, "sla_dias")) if best is not None else int(default_dias)
-    except Exception:
-        return int(default_dias)
-
+# SLA (dias) por etapa do encaminhamento intermunicipal
+_INTER_SLA = SLA_PADRAO["rede_intermunicipal"]
 
+# SLA configurável (Config -> sla_regra): as rotas usam `resolvedor_sla(session).dias`
+# como sla_lookup (matriz pré-computada por município, services/sla_resolver.py)
 
 
 def _cras_enc_status(enc: Any) -> str:
@@ -796,7 +685,7 @@ def gestao_dashboard_resumo(
     dias_pia: int = Query(default=15, ge=1, le=365, description="Prazo (dias) para considerar PIA pendente/atrasado (MVP)."),
     janela_risco_horas: int = Query(default=24, ge=1, le=168, description="Janela (horas) para considerar SLA em risco (vence em breve)."),
     nocache: bool = Query(default=False, description="Ignora cache TTL (debug/perf)."),
-    session: Session = Depends(get_session),
+    session: Session = Depends(sessao_leitura(60)),
     usuario: Usuario = Depends(get_current_user),
 ):
     """Resumo consolidado (Gestao SUAS) - CRAS + PopRua + Rede (MVP+)."""
@@ -820,10 +709,7 @@ def gestao_dashboard_resumo(
         pass
 
 
-    sla_rules = _prefetch_sla_regras(session, mid)
-
-    def sla_lookup(municipio_id: Optional[int], unidade_tipo: Optional[str], unidade_id: Optional[int], modulo: str, etapa: str, default: int) -> int:
-        return _resolver_sla_dias(sla_rules, municipio_id, unidade_tipo, unidade_id, modulo, etapa, default)
+    sla_lookup = resolvedor_sla(session).dias
 
     dt_de = _dt(de)
     dt_ate = _dt(ate)
@@ -1404,68 +1290,661 @@ def gestao_dashboard_resumo(
 
 
 
-@router.get("/fila")
+# =========================
+# Fila: montagem de item (mesmas regras para a lista e para o item único)
+# =========================
 
-def gestao_fila(
-    municipio_id: Optional[int] = Query(default=None, description="Filtro opcional por municipio (gestor/admin)."),
-    unidade_id: Optional[int] = Query(default=None, description="Filtro opcional por unidade CRAS."),
-    territorio: Optional[str] = Query(default=None, description="Filtro opcional por territorio/bairro (CRAS)."),
-    dias_cadunico: int = Query(default=30, ge=1, le=365, description="Janela (dias) para considerar CadUnico atrasado."),
-    dias_pia: int = Query(default=15, ge=1, le=365, description="Prazo (dias) para considerar PIA pendente/atrasado (MVP)."),
-    janela_risco_horas: int = Query(default=24, ge=1, le=168, description="Janela (horas) para considerar SLA em risco (vence em breve)."),
-    nocache: bool = Query(default=False, description="Ignora cache TTL (debug/perf)."),
-    modulo: Optional[str] = Query(default=None, description="Filtro opcional (cras|creas|poprua|rede|osc)."),
-    somente_atrasos: bool = Query(default=False, description="Se true, retorna somente itens em atraso."),
-    somente_em_risco: bool = Query(default=False, description="Se true, retorna somente itens com SLA em risco (vence em breve)."),
-    limit: int = Query(default=100, ge=1, le=500),
-    offset: int = Query(default=0, ge=0),
-    session: Session = Depends(get_session),
-    usuario: Usuario = Depends(get_current_user),
-):
-    """Fila do secretario: itens acionaveis consolidados (MVP+)."""
+class _FilaCtx:
+    """Parâmetros/lookups comuns aos montadores de item da fila.
 
-    agora = datetime.utcnow()
-    risk_window = timedelta(hours=int(janela_risco_horas))
-    mid = _resolver_municipio_id(usuario, municipio_id)
+    A fila monta centenas de itens com prefetch em lote; o inspector
+    (/gestao/fila/item) monta UM item lendo só o registro de origem.
+    Os dois passam pelos mesmos montadores abaixo.
+    """
 
-    sla_rules = _prefetch_sla_regras(session, mid)
+    def __init__(
+        self,
+        agora: datetime,
+        somente_atrasos: bool = False,
+        dias_cadunico: int = 30,
+        dias_pia: int = 15,
+        user_map: Optional[Dict[int, str]] = None,
+        sla_lookup: Optional[Any] = None,
+    ) -> None:
+        self.agora = agora
+        self.somente_atrasos = bool(somente_atrasos)
+        self.dias_cadunico = int(dias_cadunico)
+        self.dias_pia = int(dias_pia)
+        self.user_map = user_map or {}
+        self.sla_lookup = sla_lookup
+
+
+def _item_caso_cras(c: Any, ctx: _FilaCtx, terr_key: str, pia_missing: bool) -> Optional[Dict[str, Any]]:
+    agora = ctx.agora
+    due = _cras_case_due_at(c)
+    dias = _dias_atraso(agora, due)
+
+    estagn = bool(getattr(c, "estagnado", False))
+    motivo_estagn = getattr(c, "motivo_estagnacao", None)
+
+    # validacao pendente (48h)
+    valid_pendente = False
+    if bool(getattr(c, "aguardando_validacao", False)):
+        desde = getattr(c, "pendente_validacao_desde", None) or getattr(c, "atualizado_em", None)
+        if isinstance(desde, datetime) and (agora - desde) > timedelta(hours=48):
+            valid_pendente = True
+
+    # PIA faltando
+    pia_dias = 0
+    try:
+        abertura = getattr(c, "data_abertura", None)
+        due_pia = (abertura + timedelta(days=int(ctx.dias_pia))) if isinstance(abertura, datetime) else None
+        pia_dias = _dias_atraso(agora, due_pia)
+    except Exception:
+        pia_dias = 0
 
-    def sla_lookup(municipio_id: Optional[int], unidade_tipo: Optional[str], unidade_id: Optional[int], modulo: str, etapa: str, default: int) -> int:
-        return _resolver_sla_dias(sla_rules, municipio_id, unidade_tipo, unidade_id, modulo, etapa, default)
+    em_atraso = (dias > 0) or estagn or valid_pendente or (pia_missing and pia_dias > 0)
 
-    modulo_norm = (modulo or "").strip().lower() or None
-    terr_filtro = (territorio or "").strip().lower() or None
+    if ctx.somente_atrasos and not em_atraso:
+        return None
 
-    # cache TTL curto (evita recomputar em refresh/filtragem repetida)
+    rid = getattr(c, "tecnico_responsavel_id", None)
+    rnome = ctx.user_map.get(int(rid)) if rid is not None else None
+
+    flags = {
+        "estagnado": bool(estagn),
+        "validacao_pendente": bool(valid_pendente),
+        "pia_faltando": bool(pia_missing),
+    }
+
+    return {
+        "modulo": "CRAS",
+        "tipo": "caso",
+        "referencia_id": getattr(c, "id", None),
+        "titulo": f"Caso CRAS #{getattr(c, 'id', '')} - {getattr(c, 'etapa_atual', '')}",
+        "descricao": (
+            "Aguardando validacao" if valid_pendente else (f"Estagnado: {motivo_estagn}" if estagn and motivo_estagn else ("Estagnado" if estagn else None))
+        ),
+        "municipio_id": getattr(c, "municipio_id", None),
+        "unidade_id": getattr(c, "unidade_id", None),
+        "territorio": terr_key,
+        "responsavel_id": rid,
+        "responsavel_nome": rnome,
+        "etapa_atual": getattr(c, "etapa_atual", None),
+        "status": getattr(c, "status", None),
+        "ultima_movimentacao_em": (
+            getattr(c, "atualizado_em", None) or getattr(c, "data_inicio_etapa_atual", None) or getattr(c, "data_abertura", None)
+        ),
+        "sla_due_at": due.isoformat() if isinstance(due, datetime) else None,
+        "dias_em_atraso": int(dias),
+        "dias_na_etapa": _dias_passados(agora, getattr(c, "data_inicio_etapa_atual", None) or getattr(c, "data_abertura", None)),
+        "sla_dias": int(getattr(c, "prazo_etapa_dias", None) or 7),
+        "prioridade": getattr(c, "prioridade", None),
+        "flags": flags,
+        "pia_dias_em_atraso": int(pia_dias) if pia_missing else 0,
+    }
+
+
+def _item_tarefa_cras(t: Any, ctx: _FilaCtx) -> Optional[Dict[str, Any]]:
+    venc = getattr(t, "data_vencimento", None)
+    if not venc:
+        return None
+    due = datetime.combine(venc, time.min)
+    dias = _dias_atraso(ctx.agora, due)
+    # se nao for somente_atrasos, mostramos todas as tarefas em aberto com vencimento (mesmo futuras)
+    if ctx.somente_atrasos and dias <= 0:
+        return None
+    return {
+        "modulo": "CRAS",
+        "tipo": "tarefa",
+        "referencia_id": getattr(t, "id", None),
+        "titulo": getattr(t, "titulo", None),
+        "descricao": getattr(t, "descricao", None),
+        "municipio_id": getattr(t, "municipio_id", None),
+        "unidade_id": getattr(t, "unidade_id", None),
+        "territorio": None,
+        "responsavel_id": getattr(t, "responsavel_id", None),
+        "responsavel_nome": getattr(t, "responsavel_nome", None),
+        "etapa_atual": None,
+        "status": getattr(t, "status", None),
+        "ultima_movimentacao_em": getattr(t, "atualizado_em", None) or getattr(t, "criado_em", None),
+        "sla_due_at": due.isoformat(),
+        "dias_em_atraso": int(dias),
+        "prioridade": getattr(t, "prioridade", None),
+    }
+
+
+def _item_cadunico(x: Any, ctx: _FilaCtx, terr_key: str) -> Optional[Dict[str, Any]]:
+    criado = getattr(x, "criado_em", None)
+    if not isinstance(criado, datetime):
+        return None
+
+    # consideramos atraso se passou do cut
+    cut = ctx.agora - timedelta(days=int(ctx.dias_cadunico))
+    if ctx.somente_atrasos and (criado > cut):
+        return None
+
+    # SLA: cut (criado + dias_cadunico)
+    due = criado + timedelta(days=int(ctx.dias_cadunico))
+    ag = getattr(x, "data_agendada", None)
+    if isinstance(ag, datetime) and ag < due:
+        due = ag
+    dias = _dias_atraso(ctx.agora, due)
+
+    return {
+        "modulo": "CRAS",
+        "tipo": "cadunico",
+        "referencia_id": getattr(x, "id", None),
+        "titulo": f"CadUnico - {getattr(x, 'status', '')} - pre-cadastro #{getattr(x, 'id', '')}",
+        "descricao": None,
+        "municipio_id": getattr(x, "municipio_id", None),
+        "unidade_id": getattr(x, "unidade_id", None),
+        "territorio": terr_key,
+        "responsavel_id": None,
+        "responsavel_nome": None,
+        "etapa_atual": None,
+        "status": getattr(x, "status", None),
+        "ultima_movimentacao_em": getattr(x, "atualizado_em", None) or getattr(x, "criado_em", None),
+        "sla_due_at": due.isoformat() if isinstance(due, datetime) else None,
+        "dias_em_atraso": int(dias),
+        "prioridade": "alta" if dias > 0 else "media",
+        "caso_id": getattr(x, "caso_id", None),
+        "pessoa_id": getattr(x, "pessoa_id", None),
+        "familia_id": getattr(x, "familia_id", None),
+    }
+
+
+def _item_caso_creas(c: Any, ctx: _FilaCtx, terr_key: str) -> Optional[Dict[str, Any]]:
+    agora = ctx.agora
+    due = _creas_case_due_at(c)
+    dias = _dias_atraso(agora, due)
+    estagn = bool(getattr(c, "estagnado", False))
+    motivo_estagn = getattr(c, "motivo_estagnacao", None)
+
+    valid_pendente = False
+    if bool(getattr(c, "aguardando_validacao", False)):
+        desde = getattr(c, "pendente_validacao_desde", None) or getattr(c, "atualizado_em", None) or getattr(c, "data_inicio_etapa_atual", None)
+        if isinstance(desde, datetime) and (agora - desde) > timedelta(hours=48):
+            valid_pendente = True
+
+    em_atraso = (dias > 0) or estagn or valid_pendente
+    if ctx.somente_atrasos and not em_atraso:
+        return None
+
+    rid = getattr(c, "tecnico_responsavel_id", None)
+    rnome = ctx.user_map.get(int(rid)) if rid is not None else None
+
+    flags = {
+        "estagnado": bool(estagn),
+        "validacao_pendente": bool(valid_pendente),
+    }
+
+    return {
+        "modulo": "CREAS",
+        "tipo": "caso",
+        "referencia_id": getattr(c, "id", None),
+        "titulo": f"Caso CREAS #{getattr(c, 'id', '')} - {getattr(c, 'etapa_atual', '')}",
+        "descricao": (
+            "Aguardando validacao" if valid_pendente else (f"Estagnado: {motivo_estagn}" if estagn and motivo_estagn else ("Estagnado" if estagn else None))
+        ),
+        "municipio_id": getattr(c, "municipio_id", None),
+        "unidade_id": getattr(c, "unidade_id", None),
+        "territorio": terr_key,
+        "responsavel_id": rid,
+        "responsavel_nome": rnome,
+        "etapa_atual": getattr(c, "etapa_atual", None),
+        "status": getattr(c, "status", None),
+        "ultima_movimentacao_em": (
+            getattr(c, "atualizado_em", None) or getattr(c, "data_inicio_etapa_atual", None) or getattr(c, "data_abertura", None)
+        ),
+        "sla_due_at": due.isoformat() if isinstance(due, datetime) else None,
+        "dias_em_atraso": int(dias),
+        "dias_na_etapa": _dias_passados(agora, getattr(c, "data_inicio_etapa_atual", None) or getattr(c, "data_abertura", None)),
+        "sla_dias": int(getattr(c, "prazo_etapa_dias", None) or 7),
+        "prioridade": getattr(c, "prioridade", None),
+        "flags": flags,
+    }
+
+
+def _item_caso_poprua(c: Any, ctx: _FilaCtx) -> Optional[Dict[str, Any]]:
+    due = _poprua_case_due_at(c)
+    dias = _dias_atraso(ctx.agora, due)
+    estagn = bool(getattr(c, "estagnado", False)) or bool(getattr(c, "flag_estagnado", False))
+    if ctx.somente_atrasos and dias <= 0 and not estagn:
+        return None
+    motivo = getattr(c, "motivo_estagnacao", None) or getattr(c, "tipo_estagnacao", None)
+
+    # melhor estimativa de "dias na etapa" (prioriza data_inicio_etapa_atual)
+    inicio_etapa = (
+        getattr(c, "data_inicio_etapa_atual", None)
+        or getattr(c, "data_abertura", None)
+        or getattr(c, "data_ultima_atualizacao", None)
+        or getattr(c, "data_ultima_acao", None)
+    )
+
+    return {
+        "modulo": "POPRUA",
+        "tipo": "caso",
+        "referencia_id": getattr(c, "id", None),
+        "titulo": f"Caso PopRua #{getattr(c, 'id', '')} - {getattr(c, 'etapa_atual', '')}",
+        "descricao": (f"Estagnado: {motivo}" if estagn and motivo else ("Estagnado" if estagn else None)),
+        "municipio_id": getattr(c, "municipio_id", None),
+        "unidade_id": None,
+        "territorio": None,
+        "responsavel_id": None,
+        "responsavel_nome": None,
+        "etapa_atual": getattr(c, "etapa_atual", None),
+        "status": getattr(c, "status", None),
+        "ultima_movimentacao_em": getattr(c, "data_ultima_atualizacao", None) or getattr(c, "data_ultima_acao", None),
+        "sla_due_at": due.isoformat() if isinstance(due, datetime) else None,
+        "dias_em_atraso": int(dias),
+        "dias_na_etapa": _dias_passados(ctx.agora, inicio_etapa),
+        "sla_dias": int(getattr(c, "prazo_etapa_dias", None) or 7),
+        "prioridade": getattr(c, "prioridade", None),
+        "flags": {"estagnado": bool(estagn)},
+    }
+
+
+_ENC_FINAIS = {"concluido", "cancelado"}
+
+
+def _motivo_trava_enc(dias: int, next_step: Optional[str]) -> str:
+    if dias > 0:
+        return f"Etapa {next_step or 'seguinte'} em atraso"
+    return f"Aguardando {next_step}" if next_step else "Aguardando conclusão"
+
+
+def _item_enc_cras(e: Any, ctx: _FilaCtx) -> Optional[Dict[str, Any]]:
+    st = _cras_enc_status(e)
+    if st in _ENC_FINAIS:
+        return None
+
+    due = _enc_due_at(e, ctx.sla_lookup)
+    dias = _dias_atraso(ctx.agora, due)
+    if ctx.somente_atrasos and dias <= 0:
+        return None
+
+    ref_dt = _cras_enc_ref_dt(e)
+    sla_dias = _cras_enc_sla_dias(e, ctx.sla_lookup)
+
+    return {
+        "modulo": "REDE",
+        "tipo": "encaminhamento",
+        "referencia_id": getattr(e, "id", None),
+        "titulo": f"Encaminhamento #{getattr(e, 'id', '')} - {str(getattr(e, 'destino_tipo', '')).upper()} - {getattr(e, 'destino_nome', '')}",
+        "descricao": None,
+        "municipio_id": getattr(e, "municipio_id", None),
+        "unidade_id": getattr(e, "unidade_id", None),
+        "territorio": None,
+        "responsavel_id": None,
+        "responsavel_nome": getattr(e, "criado_por_nome", None),
+        "etapa_atual": st,
+        "status": getattr(e, "status", None),
+        "ultima_movimentacao_em": getattr(e, "atualizado_em", None) or ref_dt or getattr(e, "enviado_em", None) or getattr(e, "criado_em", None),
+        "sla_due_at": due.isoformat() if isinstance(due, datetime) else None,
+        "dias_em_atraso": int(dias),
+        "dias_na_etapa": _dias_passados(ctx.agora, ref_dt),
+        "sla_dias": int(sla_dias),
+        "prioridade": None,
+        "motivo_trava": _motivo_trava_enc(dias, _CRAS_ENC_NEXT.get(st)),
+        "destino_tipo": getattr(e, "destino_tipo", None),
+        "destino_nome": getattr(e, "destino_nome", None),
+    }
+
+
+def _item_enc_inter(e: Any, ctx: _FilaCtx) -> Optional[Dict[str, Any]]:
+    st = _inter_status(e)
+    if st in _ENC_FINAIS:
+        return None
+
+    due = _inter_due_at(e, ctx.sla_lookup)
+    dias = _dias_atraso(ctx.agora, due)
+    if ctx.somente_atrasos and dias <= 0:
+        return None
+
+    ref_dt = _inter_ref_dt(e)
+    sla_dias = _inter_sla_dias(e, ctx.sla_lookup)
+
+    return {
+        "modulo": "REDE",
+        "tipo": "encaminhamento_intermunicipal",
+        "referencia_id": getattr(e, "id", None),
+        "titulo": f"Intermunicipal #{getattr(e, 'id', '')} - {getattr(e, 'status', '')}",
+        "descricao": None,
+        "municipio_id": getattr(e, "municipio_origem_id", None),
+        "unidade_id": None,
+        "territorio": None,
+        "responsavel_id": None,
+        "responsavel_nome": getattr(e, "autorizado_por_nome", None),
+        "etapa_atual": st,
+        "status": getattr(e, "status", None),
+        "ultima_movimentacao_em": getattr(e, "atualizado_em", None) or ref_dt or getattr(e, "criado_em", None),
+        "sla_due_at": due.isoformat() if isinstance(due, datetime) else None,
+        "dias_em_atraso": int(dias),
+        "dias_na_etapa": _dias_passados(ctx.agora, ref_dt),
+        "sla_dias": int(sla_dias),
+        "prioridade": None,
+        "motivo_trava": _motivo_trava_enc(dias, _INTER_NEXT.get(st)),
+        "municipio_origem_id": getattr(e, "municipio_origem_id", None),
+        "municipio_destino_id": getattr(e, "municipio_destino_id", None),
+    }
+
+
+def _item_prestacao_osc(pc: Any, ctx: _FilaCtx) -> Optional[Dict[str, Any]]:
+    prazo = getattr(pc, "prazo_entrega", None)
+    due = datetime.combine(prazo, time.min) if isinstance(prazo, date) else None
+    dias = _dias_atraso(ctx.agora, due)
+    if ctx.somente_atrasos and dias <= 0:
+        return None
+
+    rid = getattr(pc, "responsavel_id", None)
+    rnome = ctx.user_map.get(int(rid)) if rid is not None else getattr(pc, "responsavel_nome", None)
+    comp = getattr(pc, "competencia", None)
+    titulo = f"Prestação de contas #{getattr(pc, 'id', '')}" + (f" · {comp}" if comp else "")
+
+    return {
+        "modulo": "OSC",
+        "tipo": "prestacao_contas",
+        "referencia_id": getattr(pc, "id", None),
+        "titulo": titulo,
+        "descricao": getattr(pc, "observacao", None),
+        "municipio_id": getattr(pc, "municipio_id", None),
+        "unidade_id": None,
+        "territorio": None,
+        "responsavel_id": rid,
+        "responsavel_nome": rnome,
+        "etapa_atual": None,
+        "status": getattr(pc, "status", None),
+        "ultima_movimentacao_em": getattr(pc, "atualizado_em", None) or getattr(pc, "criado_em", None),
+        "sla_due_at": due.isoformat() if isinstance(due, datetime) else None,
+        "dias_em_atraso": int(dias),
+        "prioridade": "alta" if dias > 0 else "media",
+    }
+
+
+def _prefetch_territorio_familias(session: Session, familia_ids: List[int]) -> Dict[int, Dict[str, Optional[str]]]:
+    """Mapa familia_id -> {territorio,bairro} (casos CREAS sem pessoa)."""
+    out: Dict[int, Dict[str, Optional[str]]] = {}
+    if not familia_ids or FamiliaSUAS is None:
+        return out
     try:
-        cache_key = (
-            f"fila:{mid}:{unidade_id}:{terr_filtro}:{dias_cadunico}:{dias_pia}:"
-            f"{janela_risco_horas}:{modulo_norm}:{int(somente_atrasos)}:{int(somente_em_risco)}:"
-            f"{limit}:{offset}"
-        )
-        cached = None if nocache else _cache_get(cache_key, 8)
-        if isinstance(cached, dict):
-            out = dict(cached)
-            out["_cached"] = True
-            return out
+        fams = session.exec(select(FamiliaSUAS).where(FamiliaSUAS.id.in_(familia_ids))).all()  # type: ignore
+        for f in fams:
+            fid = getattr(f, "id", None)
+            if fid is None:
+                continue
+            out[int(fid)] = {"territorio": getattr(f, "territorio", None), "bairro": getattr(f, "bairro", None)}
     except Exception:
-        pass
+        return {}
+    return out
+
+
+def _territorio_caso_creas(c: Any, terr_map: Dict[int, Dict[str, Optional[str]]], fam_map: Dict[int, Dict[str, Optional[str]]]) -> str:
+    pid = getattr(c, "pessoa_id", None)
+    if pid is not None:
+        t = terr_map.get(int(pid), {})
+        return _norm_territorio(t.get("territorio"), t.get("bairro"))
+    fid = getattr(c, "familia_id", None)
+    if fid is not None:
+        t = fam_map.get(int(fid), {})
+        return _norm_territorio(t.get("territorio"), t.get("bairro"))
+    return "Sem territorio"
+
+
+# =========================
+# Fila: filtros declarativos (regras de automação / lote)
+# =========================
 
+# fontes da fila: (modulo, tipo)
+FONTES_FILA: Tuple[Tuple[str, str], ...] = (
+    ("cras", "caso"),
+    ("cras", "tarefa"),
+    ("cras", "cadunico"),
+    ("creas", "caso"),
+    ("poprua", "caso"),
+    ("rede", "encaminhamento"),
+    ("rede", "encaminhamento_intermunicipal"),
+    ("osc", "prestacao_contas"),
+)
+
+# pendente_de (intermunicipal): de quem é a próxima ação em cada etapa
+_PENDENTE_DE_ETAPAS: Dict[str, Tuple[str, ...]] = {
+    "destino": ("contato", "aceito", "passagem"),
+    "origem": ("solicitado", "agendado", "contrarreferencia"),
+}
+
+
+class FiltroFila:
+    """Filtros extras da fila (além de município/unidade/território/módulo).
+
+    Spec declarativa usada pelas regras de automação (filtros JSON) e pelo lote:
+      {"tipo": "encaminhamento" | [...], "dias_atraso_min": 3, "dias_atraso_max": 30,
+       "pendente_de": "origem" | "destino"}
+
+    O motor (`montar_fila`) usa a spec na seleção de candidatos:
+    - tipo / pendente_de: fontes que não podem casar nem são lidas
+    - dias_atraso_min/max: viram condição no prazo (colunas) nas fontes em que o
+      prazo vem do próprio registro; nas demais (rede, SLA configurável) o item é
+      descartado logo após montado
+    - pendente_de: etapa do intermunicipal (status IN ...)
+    `aceita(item)` é o predicado exato, aplicado sempre no final.
+    """
+
+    def __init__(
+        self,
+        tipos: Optional[List[str]] = None,
+        dias_atraso_min: Optional[int] = None,
+        dias_atraso_max: Optional[int] = None,
+        pendente_de: Optional[str] = None,
+    ) -> None:
+        self.tipos = {str(t).strip().lower() for t in tipos if str(t).strip()} if tipos else None
+        self.dias_atraso_min = int(dias_atraso_min) if dias_atraso_min is not None else None
+        self.dias_atraso_max = int(dias_atraso_max) if dias_atraso_max is not None else None
+        pd = (pendente_de or "").strip().lower()
+        self.pendente_de = pd or None
+
+    @classmethod
+    def de_dict(cls, filtros: Optional[Dict[str, Any]]) -> "FiltroFila":
+        f = filtros or {}
+        tipo = f.get("tipo")
+        tipos: Optional[List[str]] = None
+        if isinstance(tipo, str) and tipo.strip():
+            tipos = [tipo]
+        elif isinstance(tipo, list) and tipo:
+            tipos = [str(x) for x in tipo]
+        dmin = f.get("dias_atraso_min")
+        dmax = f.get("dias_atraso_max")
+        pend = f.get("pendente_de")
+        return cls(
+            tipos=tipos,
+            dias_atraso_min=dmin if isinstance(dmin, int) and not isinstance(dmin, bool) else None,
+            dias_atraso_max=dmax if isinstance(dmax, int) and not isinstance(dmax, bool) else None,
+            pendente_de=pend if isinstance(pend, str) else None,
+        )
+
+    def chave(self) -> Tuple[Any, ...]:
+        return (tuple(sorted(self.tipos)) if self.tipos else None, self.dias_atraso_min, self.dias_atraso_max, self.pendente_de)
+
+    def fonte_ativa(self, modulo: str, tipo: str) -> bool:
+        if self.tipos is not None and tipo not in self.tipos:
+            return False
+        if self.pendente_de is not None:
+            # só o intermunicipal tem pendente_de (inferido pela etapa)
+            return tipo == "encaminhamento_intermunicipal" and self.pendente_de in _PENDENTE_DE_ETAPAS
+        if self.dias_atraso_max is not None and self.dias_atraso_max < 0:
+            return False
+        return True
+
+    def limites_prazo(self, agora: datetime) -> Tuple[Optional[datetime], Optional[datetime]]:
+        """(ate, desde): dias_em_atraso >= min  <=>  prazo <= ate;
+        dias_em_atraso <= max  <=>  prazo vazio OU prazo > desde."""
+        ate = agora - timedelta(days=self.dias_atraso_min) if (self.dias_atraso_min or 0) > 0 else None
+        desde = agora - timedelta(days=self.dias_atraso_max + 1) if self.dias_atraso_max is not None else None
+        return ate, desde
+
+    def aceita(self, it: Dict[str, Any]) -> bool:
+        if self.tipos is not None and str(it.get("tipo") or "").lower() not in self.tipos:
+            return False
+        dias = int(it.get("dias_em_atraso") or 0)
+        if self.dias_atraso_min is not None and dias < self.dias_atraso_min:
+            return False
+        if self.dias_atraso_max is not None and dias > self.dias_atraso_max:
+            return False
+        if self.pendente_de is not None and _inferir_pendente_de(it) != self.pendente_de:
+            return False
+        return True
+
+    def filtrar(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [it for it in items if self.aceita(it)]
+
+
+def _inferir_pendente_de(it: Dict[str, Any]) -> str:
+    """pendente_de do item: usa o campo se vier; senão infere pela etapa (intermunicipal)."""
+    got = str(it.get("pendente_de") or "").strip().lower()
+    if got:
+        return got
+    if str(it.get("tipo") or "").strip().lower() == "encaminhamento_intermunicipal":
+        st = str(it.get("etapa_atual") or it.get("status") or "").strip().lower()
+        for quem, etapas in _PENDENTE_DE_ETAPAS.items():
+            if st in etapas:
+                return quem
+    return ""
+
+
+def _where_prazo_etapa(session: Session, stmt: Any, model: Any, filtro: Optional[FiltroFila], agora: datetime) -> Any:
+    """Casos (CRAS/CREAS/PopRua): prazo = data_inicio_etapa_atual + coalesce(prazo_etapa_dias, 7).
+
+    Um ramo por prazo distinto (poucos valores) para a condição ficar só na coluna de data.
+    """
+    if filtro is None:
+        return stmt
+    ate, desde = filtro.limites_prazo(agora)
+    if ate is None and desde is None:
+        return stmt
+    prazo_col = func.coalesce(model.prazo_etapa_dias, 7)
+    inicio = model.data_inicio_etapa_atual
+    prazos = [int(p) for p in session.exec(select(prazo_col).distinct()).all() if p is not None]  # type: ignore
+    ramos = []
+    for p in prazos:
+        conds = [prazo_col == p]
+        if ate is not None:
+            conds.append(inicio <= ate - timedelta(days=p))
+        if desde is not None:
+            conds.append(or_(inicio.is_(None), inicio > desde - timedelta(days=p)))
+        ramos.append(and_(*conds))
+    return stmt.where(or_(*ramos)) if ramos else stmt.where(false())
+
+
+def _where_prazo_data(stmt: Any, col: Any, filtro: Optional[FiltroFila], agora: datetime) -> Any:
+    """Prazo = coluna date (meia-noite): tarefas CRAS / prestação de contas OSC."""
+    if filtro is None:
+        return stmt
+    ate, desde = filtro.limites_prazo(agora)
+    if ate is not None:
+        stmt = stmt.where(col.is_not(None), col <= ate.date())
+    if desde is not None:
+        stmt = stmt.where(or_(col.is_(None), col > desde.date()))
+    return stmt
+
+
+def _where_prazo_cadunico(stmt: Any, filtro: Optional[FiltroFila], agora: datetime, dias_cadunico: int) -> Any:
+    """Prazo = min(criado_em + dias_cadunico, data_agendada)."""
+    if filtro is None:
+        return stmt
+    ate, desde = filtro.limites_prazo(agora)
+    criado = CadunicoPreCadastro.criado_em  # type: ignore
+    agendada = CadunicoPreCadastro.data_agendada  # type: ignore
+    janela = timedelta(days=int(dias_cadunico))
+    if ate is not None:
+        stmt = stmt.where(or_(criado <= ate - janela, agendada <= ate))
+    if desde is not None:
+        stmt = stmt.where(criado > desde - janela, or_(agendada.is_(None), agendada > desde))
+    return stmt
+
+
+def _where_pendente_inter(stmt: Any, filtro: Optional[FiltroFila]) -> Any:
+    if filtro is None or filtro.pendente_de is None:
+        return stmt
+    etapas = _PENDENTE_DE_ETAPAS.get(filtro.pendente_de) or ()
+    st = func.lower(func.coalesce(func.nullif(func.trim(EncaminhamentoIntermunicipal.status), ""), "solicitado"))  # type: ignore
+    return stmt.where(st.in_(etapas))
+
+
+def montar_fila(
+    session: Session,
+    usuario: Usuario,
+    municipio_id: Optional[int] = None,
+    unidade_id: Optional[int] = None,
+    territorio: Optional[str] = None,
+    dias_cadunico: int = 30,
+    dias_pia: int = 15,
+    janela_risco_horas: int = 24,
+    modulo: Optional[str] = None,
+    somente_atrasos: bool = False,
+    somente_em_risco: bool = False,
+    filtro: Optional[FiltroFila] = None,
+    limite: Optional[int] = 100,
+    info: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """Motor da fila do secretario: itens normalizados e ordenados (sem paginação).
+
+    `limite` dimensiona a leitura por fonte (a rota passa o `limit` da página):
+    cada fonte lê no máximo 60x/30x isso (teto 8000/3000), as mais antigas/urgentes
+    primeiro. `limite=None` lê tudo (lotes, automações: a fila tem de estar
+    completa). Se `info` vier, recebe `truncada` e `fontes_truncadas` (fontes
+    que tinham mais linhas que o teto).
+    `filtro` (FiltroFila) é avaliado na seleção de candidatos: só as fontes/linhas
+    que podem casar são lidas e montadas.
+    """
+    agora = datetime.utcnow()
+    risk_window = timedelta(hours=int(janela_risco_horas))
+    mid = _resolver_municipio_id(usuario, municipio_id)
+
+    sla_lookup = resolvedor_sla(session).dias
+
+    modulo_norm = (modulo or "").strip().lower() or None
+    terr_filtro = (territorio or "").strip().lower() or None
 
     user_map = _users_cached(session)
+    ctx = _FilaCtx(
+        agora,
+        somente_atrasos=somente_atrasos,
+        dias_cadunico=dias_cadunico,
+        dias_pia=dias_pia,
+        user_map=user_map,
+        sla_lookup=sla_lookup,
+    )
 
     items: List[Dict[str, Any]] = []
 
+    def _ativa(mod: str, tipo: str) -> bool:
+        return filtro is None or filtro.fonte_ativa(mod, tipo)
+
+    def _add(it: Optional[Dict[str, Any]]) -> None:
+        if it is not None and (filtro is None or filtro.aceita(it)):
+            items.append(it)
+
     # Performance: evita varrer o banco inteiro quando a tela pede poucos itens
-    cap_fetch_base = int(min(8000, max(400, limit * 60)))
-    cap_fetch_small = int(min(3000, max(200, limit * 30)))
+    cap_fetch_base = int(min(8000, max(400, limite * 60))) if limite is not None else None
+    cap_fetch_small = int(min(3000, max(200, limite * 30))) if limite is not None else None
+    truncadas: List[str] = []
+
+    def _ler(stmt: Any, cap: Optional[int], fonte: str) -> List[Any]:
+        if cap is None:
+            return list(session.exec(stmt).all())
+        rows = list(session.exec(stmt.limit(cap + 1)).all())
+        if len(rows) > cap:
+            truncadas.append(fonte)
+            del rows[cap:]
+        return rows
 
     # -----------------
     # CRAS - casos
     # -----------------
     missing_pia_ids: set[int] = set()
-    if (modulo_norm in (None, "cras")) and CasoCras is not None:
+    if (modulo_norm in (None, "cras")) and CasoCras is not None and _ativa("cras", "caso"):
         stmt = select(CasoCras).where(CasoCras.status == "em_andamento")  # type: ignore
+        stmt = _where_prazo_etapa(session, stmt, CasoCras, filtro, agora)
         if mid is not None:
             stmt = stmt.where(CasoCras.municipio_id == int(mid))  # type: ignore
         if unidade_id is not None:
@@ -1475,8 +1954,7 @@ def gestao_fila(
             stmt = stmt.order_by(CasoCras.data_inicio_etapa_atual.asc())  # type: ignore
         except Exception:
             pass
-        stmt = stmt.limit(cap_fetch_base)
-        casos = list(session.exec(stmt).all())
+        casos = _ler(stmt, cap_fetch_base, "cras.caso")
 
         pessoa_ids = [int(getattr(c, "pessoa_id")) for c in casos if getattr(c, "pessoa_id", None) is not None]
         terr_map = _prefetch_territorio_cras(session, pessoa_ids)
@@ -1495,79 +1973,15 @@ def gestao_fila(
             terr_key = _norm_territorio(terr.get("territorio"), terr.get("bairro"))
             if terr_filtro and terr_filtro not in terr_key.lower():
                 continue
-
-            due = _cras_case_due_at(c)
-            dias = _dias_atraso(agora, due)
-
-            estagn = bool(getattr(c, "estagnado", False))
-            motivo_estagn = getattr(c, "motivo_estagnacao", None)
-
-            # validacao pendente (48h)
-            valid_pendente = False
-            if bool(getattr(c, "aguardando_validacao", False)):
-                desde = getattr(c, "pendente_validacao_desde", None) or getattr(c, "atualizado_em", None)
-                if isinstance(desde, datetime) and (agora - desde) > timedelta(hours=48):
-                    valid_pendente = True
-
-            # PIA faltando
             cid = getattr(c, "id", None)
-            pia_missing = (cid is not None) and (int(cid) in missing_pia_ids)
-            pia_dias = 0
-            try:
-                abertura = getattr(c, "data_abertura", None)
-                due_pia = (abertura + timedelta(days=int(dias_pia))) if isinstance(abertura, datetime) else None
-                pia_dias = _dias_atraso(agora, due_pia)
-            except Exception:
-                pia_dias = 0
-
-            em_atraso = (dias > 0) or estagn or valid_pendente or (pia_missing and pia_dias > 0)
-
-            if somente_atrasos and not em_atraso:
-                continue
-
-            rid = getattr(c, "tecnico_responsavel_id", None)
-            rnome = user_map.get(int(rid)) if rid is not None else None
-
-            flags = {
-                "estagnado": bool(estagn),
-                "validacao_pendente": bool(valid_pendente),
-                "pia_faltando": bool(pia_missing),
-            }
-
-            items.append(
-                {
-                    "modulo": "CRAS",
-                    "tipo": "caso",
-                    "referencia_id": getattr(c, "id", None),
-                    "titulo": f"Caso CRAS #{getattr(c, 'id', '')} - {getattr(c, 'etapa_atual', '')}",
-                    "descricao": (
-                        "Aguardando validacao" if valid_pendente else (f"Estagnado: {motivo_estagn}" if estagn and motivo_estagn else ("Estagnado" if estagn else None))
-                    ),
-                    "municipio_id": getattr(c, "municipio_id", None),
-                    "unidade_id": getattr(c, "unidade_id", None),
-                    "territorio": terr_key,
-                    "responsavel_id": rid,
-                    "responsavel_nome": rnome,
-                    "etapa_atual": getattr(c, "etapa_atual", None),
-                    "status": getattr(c, "status", None),
-                    "ultima_movimentacao_em": (
-                        getattr(c, "atualizado_em", None) or getattr(c, "data_inicio_etapa_atual", None) or getattr(c, "data_abertura", None)
-                    ),
-                    "sla_due_at": due.isoformat() if isinstance(due, datetime) else None,
-                    "dias_em_atraso": int(dias),
-                    "dias_na_etapa": _dias_passados(agora, getattr(c, "data_inicio_etapa_atual", None) or getattr(c, "data_abertura", None)),
-                    "sla_dias": int(getattr(c, "prazo_etapa_dias", None) or 7),
-                    "prioridade": getattr(c, "prioridade", None),
-                    "flags": flags,
-                    "pia_dias_em_atraso": int(pia_dias) if pia_missing else 0,
-                }
-            )
+            _add(_item_caso_cras(c, ctx, terr_key, (cid is not None) and (int(cid) in missing_pia_ids)))
 
     # -----------------
     # CRAS - tarefas
     # -----------------
-    if (modulo_norm in (None, "cras")) and CrasTarefa is not None:
+    if (modulo_norm in (None, "cras")) and CrasTarefa is not None and _ativa("cras", "tarefa"):
         stmt = select(CrasTarefa).where(CrasTarefa.status != "concluida")  # type: ignore
+        stmt = _where_prazo_data(stmt, CrasTarefa.data_vencimento, filtro, agora)  # type: ignore
         if mid is not None:
             stmt = stmt.where(or_(CrasTarefa.municipio_id == int(mid), CrasTarefa.municipio_id.is_(None)))  # type: ignore
         if unidade_id is not None:
@@ -1577,47 +1991,15 @@ def gestao_fila(
             stmt = stmt.order_by(CrasTarefa.data_vencimento.asc())  # type: ignore
         except Exception:
             pass
-        stmt = stmt.limit(cap_fetch_small)
-        tarefas = list(session.exec(stmt).all())
-        hoje = date.today()
-        for t in tarefas:
-            venc = getattr(t, "data_vencimento", None)
-            if not venc:
-                continue
-            due = datetime.combine(venc, time.min)
-            dias = _dias_atraso(agora, due)
-            if somente_atrasos and dias <= 0:
-                continue
-            # se nao for somente_atrasos, mostramos todas as tarefas em aberto com vencimento (mesmo futuras)
-            if (not somente_atrasos) and isinstance(venc, date) and venc >= hoje:
-                # ainda assim pode ser util; mantemos
-                pass
-            items.append(
-                {
-                    "modulo": "CRAS",
-                    "tipo": "tarefa",
-                    "referencia_id": getattr(t, "id", None),
-                    "titulo": getattr(t, "titulo", None),
-                    "descricao": getattr(t, "descricao", None),
-                    "municipio_id": getattr(t, "municipio_id", None),
-                    "unidade_id": getattr(t, "unidade_id", None),
-                    "territorio": None,
-                    "responsavel_id": getattr(t, "responsavel_id", None),
-                    "responsavel_nome": getattr(t, "responsavel_nome", None),
-                    "etapa_atual": None,
-                    "status": getattr(t, "status", None),
-                    "ultima_movimentacao_em": getattr(t, "atualizado_em", None) or getattr(t, "criado_em", None),
-                    "sla_due_at": due.isoformat(),
-                    "dias_em_atraso": int(dias),
-                    "prioridade": getattr(t, "prioridade", None),
-                }
-            )
+        for t in _ler(stmt, cap_fetch_small, "cras.tarefa"):
+            _add(_item_tarefa_cras(t, ctx))
 
     # -----------------
     # CRAS - CadUnico atrasado
     # -----------------
-    if (modulo_norm in (None, "cras")) and CadunicoPreCadastro is not None:
+    if (modulo_norm in (None, "cras")) and CadunicoPreCadastro is not None and _ativa("cras", "cadunico"):
         stmt = select(CadunicoPreCadastro).where(CadunicoPreCadastro.status.in_(["pendente", "agendado"]))  # type: ignore
+        stmt = _where_prazo_cadunico(stmt, filtro, agora, dias_cadunico)
         if mid is not None:
             stmt = stmt.where(CadunicoPreCadastro.municipio_id == int(mid))  # type: ignore
         if unidade_id is not None:
@@ -1627,65 +2009,26 @@ def gestao_fila(
             stmt = stmt.order_by(CadunicoPreCadastro.criado_em.asc())  # type: ignore
         except Exception:
             pass
-        stmt = stmt.limit(cap_fetch_small)
-        rows = list(session.exec(stmt).all())
-        cut = agora - timedelta(days=int(dias_cadunico))
+        rows = _ler(stmt, cap_fetch_small, "cras.cadunico")
 
         # territorio para filtro
         pids = [int(getattr(x, "pessoa_id")) for x in rows if getattr(x, "pessoa_id", None) is not None]
         terr_map2 = _prefetch_territorio_cras(session, pids)
 
         for x in rows:
-            criado = getattr(x, "criado_em", None)
-            if not isinstance(criado, datetime):
-                continue
-
             pid = getattr(x, "pessoa_id", None)
             terr2 = terr_map2.get(int(pid), {}) if pid is not None else {}
             terr_key = _norm_territorio(terr2.get("territorio"), terr2.get("bairro"))
             if terr_filtro and terr_filtro not in terr_key.lower():
                 continue
-
-            # consideramos atraso se passou do cut
-            if somente_atrasos and (criado > cut):
-                continue
-
-            # SLA: cut (criado + dias_cadunico)
-            due = criado + timedelta(days=int(dias_cadunico))
-            ag = getattr(x, "data_agendada", None)
-            if isinstance(ag, datetime) and ag < due:
-                due = ag
-            dias = _dias_atraso(agora, due)
-
-            items.append(
-                {
-                    "modulo": "CRAS",
-                    "tipo": "cadunico",
-                    "referencia_id": getattr(x, "id", None),
-                    "titulo": f"CadUnico - {getattr(x, 'status', '')} - pre-cadastro #{getattr(x, 'id', '')}",
-                    "descricao": None,
-                    "municipio_id": getattr(x, "municipio_id", None),
-                    "unidade_id": getattr(x, "unidade_id", None),
-                    "territorio": terr_key,
-                    "responsavel_id": None,
-                    "responsavel_nome": None,
-                    "etapa_atual": None,
-                    "status": getattr(x, "status", None),
-                    "ultima_movimentacao_em": getattr(x, "atualizado_em", None) or getattr(x, "criado_em", None),
-                    "sla_due_at": due.isoformat() if isinstance(due, datetime) else None,
-                    "dias_em_atraso": int(dias),
-                    "prioridade": "alta" if dias > 0 else "media",
-                    "caso_id": getattr(x, "caso_id", None),
-                    "pessoa_id": getattr(x, "pessoa_id", None),
-                    "familia_id": getattr(x, "familia_id", None),
-                }
-            )
+            _add(_item_cadunico(x, ctx, terr_key))
 
     # -----------------
     # CREAS - casos
     # -----------------
-    if (modulo_norm in (None, "creas")) and CreasCaso is not None:
+    if (modulo_norm in (None, "creas")) and CreasCaso is not None and _ativa("creas", "caso"):
         stmt = select(CreasCaso).where(CreasCaso.status == "em_andamento")  # type: ignore
+        stmt = _where_prazo_etapa(session, stmt, CreasCaso, filtro, agora)
         if mid is not None:
             stmt = stmt.where(CreasCaso.municipio_id == int(mid))  # type: ignore
         # otimização: lê só os casos mais antigos/urgentes (reduz custo em escala)
@@ -1693,98 +2036,26 @@ def gestao_fila(
             stmt = stmt.order_by(CreasCaso.data_inicio_etapa_atual.asc())  # type: ignore
         except Exception:
             pass
-        stmt = stmt.limit(cap_fetch_base)
-        casos = list(session.exec(stmt).all())
+        casos = _ler(stmt, cap_fetch_base, "creas.caso")
 
         pessoa_ids = [int(getattr(c, "pessoa_id")) for c in casos if getattr(c, "pessoa_id", None) is not None]
         terr_map = _prefetch_territorio_cras(session, pessoa_ids)
-
-        fam_map: Dict[int, Dict[str, Optional[str]]] = {}
-        if FamiliaSUAS is not None:
-            fam_ids = [int(getattr(c, "familia_id")) for c in casos if getattr(c, "familia_id", None) is not None]
-            if fam_ids:
-                try:
-                    fams = session.exec(select(FamiliaSUAS).where(FamiliaSUAS.id.in_(fam_ids))).all()  # type: ignore
-                    for f in fams:
-                        fid = getattr(f, "id", None)
-                        if fid is None:
-                            continue
-                        fam_map[int(fid)] = {"territorio": getattr(f, "territorio", None), "bairro": getattr(f, "bairro", None)}
-                except Exception:
-                    fam_map = {}
+        fam_ids = [int(getattr(c, "familia_id")) for c in casos if getattr(c, "familia_id", None) is not None]
+        fam_map = _prefetch_territorio_familias(session, fam_ids)
 
         for c in casos:
-            terr_key = "Sem territorio"
-            pid = getattr(c, "pessoa_id", None)
-            if pid is not None:
-                t = terr_map.get(int(pid), {})
-                terr_key = _norm_territorio(t.get("territorio"), t.get("bairro"))
-            else:
-                fid = getattr(c, "familia_id", None)
-                if fid is not None:
-                    t = fam_map.get(int(fid), {})
-                    terr_key = _norm_territorio(t.get("territorio"), t.get("bairro"))
-
+            terr_key = _territorio_caso_creas(c, terr_map, fam_map)
             if terr_filtro and terr_filtro not in terr_key.lower():
                 continue
-
-            due = _creas_case_due_at(c)
-            dias = _dias_atraso(agora, due)
-            estagn = bool(getattr(c, "estagnado", False))
-            motivo_estagn = getattr(c, "motivo_estagnacao", None)
-
-            valid_pendente = False
-            if bool(getattr(c, "aguardando_validacao", False)):
-                desde = getattr(c, "pendente_validacao_desde", None) or getattr(c, "atualizado_em", None) or getattr(c, "data_inicio_etapa_atual", None)
-                if isinstance(desde, datetime) and (agora - desde) > timedelta(hours=48):
-                    valid_pendente = True
-
-            em_atraso = (dias > 0) or estagn or valid_pendente
-            if somente_atrasos and not em_atraso:
-                continue
-
-            rid = getattr(c, "tecnico_responsavel_id", None)
-            rnome = user_map.get(int(rid)) if rid is not None else None
-
-            flags = {
-                "estagnado": bool(estagn),
-                "validacao_pendente": bool(valid_pendente),
-            }
-
-            items.append(
-                {
-                    "modulo": "CREAS",
-                    "tipo": "caso",
-                    "referencia_id": getattr(c, "id", None),
-                    "titulo": f"Caso CREAS #{getattr(c, 'id', '')} - {getattr(c, 'etapa_atual', '')}",
-                    "descricao": (
-                        "Aguardando validacao" if valid_pendente else (f"Estagnado: {motivo_estagn}" if estagn and motivo_estagn else ("Estagnado" if estagn else None))
-                    ),
-                    "municipio_id": getattr(c, "municipio_id", None),
-                    "unidade_id": getattr(c, "unidade_id", None),
-                    "territorio": terr_key,
-                    "responsavel_id": rid,
-                    "responsavel_nome": rnome,
-                    "etapa_atual": getattr(c, "etapa_atual", None),
-                    "status": getattr(c, "status", None),
-                    "ultima_movimentacao_em": (
-                        getattr(c, "atualizado_em", None) or getattr(c, "data_inicio_etapa_atual", None) or getattr(c, "data_abertura", None)
-                    ),
-                    "sla_due_at": due.isoformat() if isinstance(due, datetime) else None,
-                    "dias_em_atraso": int(dias),
-                    "dias_na_etapa": _dias_passados(agora, getattr(c, "data_inicio_etapa_atual", None) or getattr(c, "data_abertura", None)),
-                    "sla_dias": int(getattr(c, "prazo_etapa_dias", None) or 7),
-                    "prioridade": getattr(c, "prioridade", None),
-                    "flags": flags,
-                }
-            )
+            _add(_item_caso_creas(c, ctx, terr_key))
 
     # -----------------
     # PopRua - casos
     # -----------------
-    if (modulo_norm in (None, "poprua")) and CasoPopRua is not None:
+    if (modulo_norm in (None, "poprua")) and CasoPopRua is not None and _ativa("poprua", "caso"):
         stmt = select(CasoPopRua).where(CasoPopRua.ativo == True)  # type: ignore
         stmt = stmt.where(CasoPopRua.status != "encerrado")  # type: ignore
+        stmt = _where_prazo_etapa(session, stmt, CasoPopRua, filtro, agora)
         if mid is not None:
             stmt = stmt.where(CasoPopRua.municipio_id == int(mid))  # type: ignore
         # otimização: lê só os casos mais antigos/urgentes (reduz custo em escala)
@@ -1792,52 +2063,13 @@ def gestao_fila(
             stmt = stmt.order_by(CasoPopRua.data_inicio_etapa_atual.asc())  # type: ignore
         except Exception:
             pass
-        stmt = stmt.limit(cap_fetch_base)
-        casos = list(session.exec(stmt).all())
-        for c in casos:
-            due = _poprua_case_due_at(c)
-            dias = _dias_atraso(agora, due)
-            estagn = bool(getattr(c, "estagnado", False)) or bool(getattr(c, "flag_estagnado", False))
-            if somente_atrasos and dias <= 0 and not estagn:
-                continue
-            motivo = getattr(c, "motivo_estagnacao", None) or getattr(c, "tipo_estagnacao", None)
-
-            # melhor estimativa de "dias na etapa" (prioriza data_inicio_etapa_atual)
-            inicio_etapa = (
-                getattr(c, "data_inicio_etapa_atual", None)
-                or getattr(c, "data_abertura", None)
-                or getattr(c, "data_ultima_atualizacao", None)
-                or getattr(c, "data_ultima_acao", None)
-            )
-
-            items.append(
-                {
-                    "modulo": "POPRUA",
-                    "tipo": "caso",
-                    "referencia_id": getattr(c, "id", None),
-                    "titulo": f"Caso PopRua #{getattr(c, 'id', '')} - {getattr(c, 'etapa_atual', '')}",
-                    "descricao": (f"Estagnado: {motivo}" if estagn and motivo else ("Estagnado" if estagn else None)),
-                    "municipio_id": getattr(c, "municipio_id", None),
-                    "unidade_id": None,
-                    "territorio": None,
-                    "responsavel_id": None,
-                    "responsavel_nome": None,
-                    "etapa_atual": getattr(c, "etapa_atual", None),
-                    "status": getattr(c, "status", None),
-                    "ultima_movimentacao_em": getattr(c, "data_ultima_atualizacao", None) or getattr(c, "data_ultima_acao", None),
-                    "sla_due_at": due.isoformat() if isinstance(due, datetime) else None,
-                    "dias_em_atraso": int(dias),
-                    "dias_na_etapa": _dias_passados(agora, inicio_etapa),
-                    "sla_dias": int(getattr(c, "prazo_etapa_dias", None) or 7),
-                    "prioridade": getattr(c, "prioridade", None),
-                    "flags": {"estagnado": bool(estagn)},
-                }
-            )
+        for c in _ler(stmt, cap_fetch_base, "poprua.caso"):
+            _add(_item_caso_poprua(c, ctx))
 
         # -----------------
     # Rede - encaminhamentos CRAS (devolutiva obrigatória + SLA por etapa)
     # -----------------
-    if (modulo_norm in (None, "rede")) and CrasEncaminhamento is not None:
+    if (modulo_norm in (None, "rede")) and CrasEncaminhamento is not None and _ativa("rede", "encaminhamento"):
         stmt = select(CrasEncaminhamento)
         if mid is not None:
             stmt = stmt.where(CrasEncaminhamento.municipio_id == int(mid))  # type: ignore
@@ -1848,60 +2080,14 @@ def gestao_fila(
             stmt = stmt.order_by(CrasEncaminhamento.criado_em.asc())  # type: ignore
         except Exception:
             pass
-        stmt = stmt.limit(cap_fetch_base)
-        encs = list(session.exec(stmt).all())
-        finais = {"concluido", "cancelado"}
-        for e in encs:
-            st = _cras_enc_status(e)
-            if st in finais:
-                continue
-
-            due = _enc_due_at(e, sla_lookup)
-            dias = _dias_atraso(agora, due)
-            if somente_atrasos and dias <= 0:
-                continue
-
-            ref_dt = _cras_enc_ref_dt(e)
-            sla_dias = _cras_enc_sla_dias(e, sla_lookup)
-
-            next_step = _CRAS_ENC_NEXT.get(st)
-            motivo_trava = None
-            if dias > 0:
-                motivo_trava = f"Etapa {next_step or 'seguinte'} em atraso"
-            else:
-                motivo_trava = f"Aguardando {next_step}" if next_step else "Aguardando conclusão"
-
-            items.append(
-                {
-                    "modulo": "REDE",
-                    "tipo": "encaminhamento",
-                    "referencia_id": getattr(e, "id", None),
-                    "titulo": f"Encaminhamento #{getattr(e, 'id', '')} - {str(getattr(e, 'destino_tipo', '')).upper()} - {getattr(e, 'destino_nome', '')}",
-                    "descricao": None,
-                    "municipio_id": getattr(e, "municipio_id", None),
-                    "unidade_id": getattr(e, "unidade_id", None),
-                    "territorio": None,
-                    "responsavel_id": None,
-                    "responsavel_nome": getattr(e, "criado_por_nome", None),
-                    "etapa_atual": st,
-                    "status": getattr(e, "status", None),
-                    "ultima_movimentacao_em": getattr(e, "atualizado_em", None) or ref_dt or getattr(e, "enviado_em", None) or getattr(e, "criado_em", None),
-                    "sla_due_at": due.isoformat() if isinstance(due, datetime) else None,
-                    "dias_em_atraso": int(dias),
-                    "dias_na_etapa": _dias_passados(agora, ref_dt),
-                    "sla_dias": int(sla_dias),
-                    "prioridade": None,
-                    "motivo_trava": motivo_trava,
-                    "destino_tipo": getattr(e, "destino_tipo", None),
-                    "destino_nome": getattr(e, "destino_nome", None),
-                }
-            )
+        for e in _ler(stmt, cap_fetch_base, "rede.encaminhamento"):
+            _add(_item_enc_cras(e, ctx))
 
         # -----------------
     # Rede - intermunicipal (SLA por etapa)
     # -----------------
-    if (modulo_norm in (None, "rede")) and EncaminhamentoIntermunicipal is not None:
-        stmt = select(EncaminhamentoIntermunicipal)
+    if (modulo_norm in (None, "rede")) and EncaminhamentoIntermunicipal is not None and _ativa("rede", "encaminhamento_intermunicipal"):
+        stmt = _where_pendente_inter(select(EncaminhamentoIntermunicipal), filtro)
         if mid is not None:
             stmt = stmt.where(
                 or_(
@@ -1914,60 +2100,15 @@ def gestao_fila(
             stmt = stmt.order_by(EncaminhamentoIntermunicipal.criado_em.asc())  # type: ignore
         except Exception:
             pass
-        stmt = stmt.limit(cap_fetch_base)
-        encs = list(session.exec(stmt).all())
-        finais = {"concluido", "cancelado"}
-        for e in encs:
-            st = _inter_status(e)
-            if st in finais:
-                continue
-
-            due = _inter_due_at(e, sla_lookup)
-            dias = _dias_atraso(agora, due)
-            if somente_atrasos and dias <= 0:
-                continue
-
-            ref_dt = _inter_ref_dt(e)
-            sla_dias = _inter_sla_dias(e, sla_lookup)
-
-            next_step = _INTER_NEXT.get(st)
-            motivo_trava = None
-            if dias > 0:
-                motivo_trava = f"Etapa {next_step or 'seguinte'} em atraso"
-            else:
-                motivo_trava = f"Aguardando {next_step}" if next_step else "Aguardando conclusão"
-
-            items.append(
-                {
-                    "modulo": "REDE",
-                    "tipo": "encaminhamento_intermunicipal",
-                    "referencia_id": getattr(e, "id", None),
-                    "titulo": f"Intermunicipal #{getattr(e, 'id', '')} - {getattr(e, 'status', '')}",
-                    "descricao": None,
-                    "municipio_id": getattr(e, "municipio_origem_id", None),
-                    "unidade_id": None,
-                    "territorio": None,
-                    "responsavel_id": None,
-                    "responsavel_nome": getattr(e, "autorizado_por_nome", None),
-                    "etapa_atual": st,
-                    "status": getattr(e, "status", None),
-                    "ultima_movimentacao_em": getattr(e, "atualizado_em", None) or ref_dt or getattr(e, "criado_em", None),
-                    "sla_due_at": due.isoformat() if isinstance(due, datetime) else None,
-                    "dias_em_atraso": int(dias),
-                    "dias_na_etapa": _dias_passados(agora, ref_dt),
-                    "sla_dias": int(sla_dias),
-                    "prioridade": None,
-                    "motivo_trava": motivo_trava,
-                    "municipio_origem_id": getattr(e, "municipio_origem_id", None),
-                    "municipio_destino_id": getattr(e, "municipio_destino_id", None),
-                }
-            )
+        for e in _ler(stmt, cap_fetch_base, "rede.encaminhamento_intermunicipal"):
+            _add(_item_enc_inter(e, ctx))
 
     # -----------------
     # Terceiro Setor (OSC) - prestações pendentes
     # -----------------
-    if (modulo_norm in (None, "osc")) and OscPrestacaoContas is not None:
+    if (modulo_norm in (None, "osc")) and OscPrestacaoContas is not None and _ativa("osc", "prestacao_contas"):
         stmt = select(OscPrestacaoContas).where(OscPrestacaoContas.status.notin_(["aprovado", "reprovado"]))  # type: ignore
+        stmt = _where_prazo_data(stmt, OscPrestacaoContas.prazo_entrega, filtro, agora)  # type: ignore
         if mid is not None:
             stmt = stmt.where(OscPrestacaoContas.municipio_id == int(mid))  # type: ignore
         # otimização: pega as prestações com prazo mais próximo/antigo
@@ -1975,40 +2116,8 @@ def gestao_fila(
             stmt = stmt.order_by(OscPrestacaoContas.prazo_entrega.asc())  # type: ignore
         except Exception:
             pass
-        stmt = stmt.limit(cap_fetch_small)
-        prests = list(session.exec(stmt).all())
-        for pc in prests:
-            prazo = getattr(pc, "prazo_entrega", None)
-            due = datetime.combine(prazo, time.min) if isinstance(prazo, date) else None
-            dias = _dias_atraso(agora, due)
-            if somente_atrasos and dias <= 0:
-                continue
-
-            rid = getattr(pc, "responsavel_id", None)
-            rnome = user_map.get(int(rid)) if rid is not None else getattr(pc, "responsavel_nome", None)
-            comp = getattr(pc, "competencia", None)
-            titulo = f"Prestação de contas #{getattr(pc, 'id', '')}" + (f" · {comp}" if comp else "")
-
-            items.append(
-                {
-                    "modulo": "OSC",
-                    "tipo": "prestacao_contas",
-                    "referencia_id": getattr(pc, "id", None),
-                    "titulo": titulo,
-                    "descricao": getattr(pc, "observacao", None),
-                    "municipio_id": getattr(pc, "municipio_id", None),
-                    "unidade_id": None,
-                    "territorio": None,
-                    "responsavel_id": rid,
-                    "responsavel_nome": rnome,
-                    "etapa_atual": None,
-                    "status": getattr(pc, "status", None),
-                    "ultima_movimentacao_em": getattr(pc, "atualizado_em", None) or getattr(pc, "criado_em", None),
-                    "sla_due_at": due.isoformat() if isinstance(due, datetime) else None,
-                    "dias_em_atraso": int(dias),
-                    "prioridade": "alta" if dias > 0 else "media",
-                }
-            )
+        for pc in _ler(stmt, cap_fetch_small, "osc.prestacao_contas"):
+            _add(_item_prestacao_osc(pc, ctx))
 
     # Padroniza campos extras (SLA em risco, motivo, etc.)
     _normalize_workitems(items, agora, risk_window=risk_window)
@@ -2020,8 +2129,74 @@ def gestao_fila(
         else:
             items = [it for it in items if bool(it.get("sla_em_risco"))]
 
-    # Ordena + pagina
+    # Ordena
     items.sort(key=_sort_key_item)
+    if info is not None:
+        info["truncada"] = bool(truncadas)
+        info["fontes_truncadas"] = truncadas
+    return items
+
+
+@router.get("/fila")
+
+def gestao_fila(
+    municipio_id: Optional[int] = Query(default=None, description="Filtro opcional por municipio (gestor/admin)."),
+    unidade_id: Optional[int] = Query(default=None, description="Filtro opcional por unidade CRAS."),
+    territorio: Optional[str] = Query(default=None, description="Filtro opcional por territorio/bairro (CRAS)."),
+    dias_cadunico: int = Query(default=30, ge=1, le=365, description="Janela (dias) para considerar CadUnico atrasado."),
+    dias_pia: int = Query(default=15, ge=1, le=365, description="Prazo (dias) para considerar PIA pendente/atrasado (MVP)."),
+    janela_risco_horas: int = Query(default=24, ge=1, le=168, description="Janela (horas) para considerar SLA em risco (vence em breve)."),
+    nocache: bool = Query(default=False, description="Ignora cache TTL (debug/perf)."),
+    modulo: Optional[str] = Query(default=None, description="Filtro opcional (cras|creas|poprua|rede|osc)."),
+    somente_atrasos: bool = Query(default=False, description="Se true, retorna somente itens em atraso."),
+    somente_em_risco: bool = Query(default=False, description="Se true, retorna somente itens com SLA em risco (vence em breve)."),
+    limit: int = Query(default=100, ge=1, le=500),
+    offset: int = Query(default=0, ge=0),
+    session: Session = Depends(get_session),
+    usuario: Usuario = Depends(get_current_user),
+):
+    """Fila do secretario: itens acionaveis consolidados (MVP+)."""
+
+    mid = _resolver_municipio_id(usuario, municipio_id)
+
+    modulo_norm = (modulo or "").strip().lower() or None
+    terr_filtro = (territorio or "").strip().lower() or None
+
+    # cache TTL curto (evita recomputar em refresh/filtragem repetida)
+    try:
+        cache_key = (
+            f"fila:{mid}:{unidade_id}:{terr_filtro}:{dias_cadunico}:{dias_pia}:"
+            f"{janela_risco_horas}:{modulo_norm}:{int(somente_atrasos)}:{int(somente_em_risco)}:"
+            f"{limit}:{offset}"
+        )
+        cached = None if nocache else _cache_get(cache_key, 8)
+        if isinstance(cached, dict):
+            out = dict(cached)
+            out["_cached"] = True
+            return out
+    except Exception:
+        pass
+
+    # fila lida com teto por fonte (proporcional à página): `truncada` avisa que
+    # alguma fonte tinha mais linhas e `total` é um piso
+    info: Dict[str, Any] = {}
+    items = montar_fila(
+        session,
+        usuario,
+        municipio_id=municipio_id,
+        unidade_id=unidade_id,
+        territorio=territorio,
+        dias_cadunico=dias_cadunico,
+        dias_pia=dias_pia,
+        janela_risco_horas=janela_risco_horas,
+        modulo=modulo,
+        somente_atrasos=somente_atrasos,
+        somente_em_risco=somente_em_risco,
+        limite=limit,
+        info=info,
+    )
+
+    # Pagina
     total = len(items)
     paged = items[offset : offset + limit]
 
@@ -2039,6 +2214,8 @@ def gestao_fila(
             "janela_risco_horas": janela_risco_horas,
         },
         "total": total,
+        "truncada": info.get("truncada", False),
+        "fontes_truncadas": info.get("fontes_truncadas", []),
         "limit": limit,
         "offset": offset,
         "items": paged,
@@ -2052,12 +2229,133 @@ def gestao_fila(
     return out
 
 
+def _mesmo_municipio(mid: Optional[int], *valores: Any) -> bool:
+    if mid is None:
+        return True
+    return any(v is not None and int(v) == int(mid) for v in valores)
+
+
+def montar_item_fila(
+    session: Session,
+    usuario: Usuario,
+    modulo: str,
+    tipo: str,
+    referencia_id: int,
+    municipio_id: Optional[int] = None,
+    dias_cadunico: int = 30,
+    dias_pia: int = 15,
+    janela_risco_horas: int = 24,
+) -> Optional[Dict[str, Any]]:
+    """Monta UM item da fila direto do registro de origem.
+
+    Mesmo formato/regras de `gestao_fila` (montadores `_item_*` + `_normalize_workitems`),
+    mas lê só o registro pedido e o que ele precisa (território, PIA, responsável, SLA).
+
+    Retorna None quando o registro não existe, está fora do município do usuário
+    ou não está (mais) na fila (ex.: caso encerrado, encaminhamento concluído).
+    """
+    agora = datetime.utcnow()
+    mid = _resolver_municipio_id(usuario, municipio_id)
+    mod = (modulo or "").strip().upper()
+    tp = (tipo or "").strip().lower()
+    rid = int(referencia_id)
+
+    ctx = _FilaCtx(agora, dias_cadunico=dias_cadunico, dias_pia=dias_pia)
+
+    def _nome(uid: Any) -> None:
+        if uid is None:
+            return
+        try:
+            u = session.get(Usuario, int(uid))
+        except Exception:
+            u = None
+        if u is not None and getattr(u, "nome", None) is not None:
+            ctx.user_map = {int(uid): str(u.nome)}
+
+    def _territorio_pessoa(pid: Any) -> str:
+        m = _prefetch_territorio_cras(session, [int(pid)]) if pid is not None else {}
+        t = m.get(int(pid), {}) if pid is not None else {}
+        return _norm_territorio(t.get("territorio"), t.get("bairro"))
+
+    item: Optional[Dict[str, Any]] = None
+
+    if mod == "CRAS" and tp == "caso" and CasoCras is not None:
+        c = session.get(CasoCras, rid)
+        if c is None or getattr(c, "status", None) != "em_andamento" or not _mesmo_municipio(mid, c.municipio_id):
+            return None
+        pia_missing = False
+        if CrasPiaPlano is not None:
+            tem_pia = session.exec(select(CrasPiaPlano.id).where(CrasPiaPlano.caso_id == rid).limit(1)).first()  # type: ignore
+            pia_missing = tem_pia is None
+        _nome(getattr(c, "tecnico_responsavel_id", None))
+        item = _item_caso_cras(c, ctx, _territorio_pessoa(getattr(c, "pessoa_id", None)), pia_missing)
+
+    elif mod == "CRAS" and tp == "tarefa" and CrasTarefa is not None:
+        t = session.get(CrasTarefa, rid)
+        if t is None or getattr(t, "status", None) == "concluida":
+            return None
+        if mid is not None and t.municipio_id is not None and int(t.municipio_id) != int(mid):
+            return None
+        item = _item_tarefa_cras(t, ctx)
+
+    elif mod == "CRAS" and tp == "cadunico" and CadunicoPreCadastro is not None:
+        x = session.get(CadunicoPreCadastro, rid)
+        if x is None or getattr(x, "status", None) not in ("pendente", "agendado") or not _mesmo_municipio(mid, x.municipio_id):
+            return None
+        item = _item_cadunico(x, ctx, _territorio_pessoa(getattr(x, "pessoa_id", None)))
+
+    elif mod == "CREAS" and tp == "caso" and CreasCaso is not None:
+        c = session.get(CreasCaso, rid)
+        if c is None or getattr(c, "status", None) != "em_andamento" or not _mesmo_municipio(mid, c.municipio_id):
+            return None
+        pid = getattr(c, "pessoa_id", None)
+        fid = getattr(c, "familia_id", None)
+        terr_map = _prefetch_territorio_cras(session, [int(pid)]) if pid is not None else {}
+        fam_map = _prefetch_territorio_familias(session, [int(fid)]) if (pid is None and fid is not None) else {}
+        _nome(getattr(c, "tecnico_responsavel_id", None))
+        item = _item_caso_creas(c, ctx, _territorio_caso_creas(c, terr_map, fam_map))
+
+    elif mod == "POPRUA" and tp == "caso" and CasoPopRua is not None:
+        c = session.get(CasoPopRua, rid)
+        if c is None or not bool(getattr(c, "ativo", False)) or getattr(c, "status", None) == "encerrado":
+            return None
+        if not _mesmo_municipio(mid, c.municipio_id):
+            return None
+        item = _item_caso_poprua(c, ctx)
+
+    elif mod == "REDE" and tp == "encaminhamento" and CrasEncaminhamento is not None:
+        e = session.get(CrasEncaminhamento, rid)
+        if e is None or not _mesmo_municipio(mid, e.municipio_id):
+            return None
+        ctx.sla_lookup = resolvedor_sla(session).dias
+        item = _item_enc_cras(e, ctx)
+
+    elif mod == "REDE" and tp == "encaminhamento_intermunicipal" and EncaminhamentoIntermunicipal is not None:
+        e = session.get(EncaminhamentoIntermunicipal, rid)
+        if e is None or not _mesmo_municipio(mid, e.municipio_origem_id, e.municipio_destino_id):
+            return None
+        ctx.sla_lookup = resolvedor_sla(session).dias
+        item = _item_enc_inter(e, ctx)
+
+    elif mod == "OSC" and tp == "prestacao_contas" and OscPrestacaoContas is not None:
+        pc = session.get(OscPrestacaoContas, rid)
+        if pc is None or getattr(pc, "status", None) in ("aprovado", "reprovado") or not _mesmo_municipio(mid, pc.municipio_id):
+            return None
+        _nome(getattr(pc, "responsavel_id", None))
+        item = _item_prestacao_osc(pc, ctx)
+
+    if item is None:
+        return None
+    _normalize_workitems([item], agora, risk_window=timedelta(hours=int(janela_risco_horas)))
+    return item
+
+
 @router.get("/dashboard/sla")
 def gestao_dashboard_sla(
     municipio_id: Optional[int] = Query(default=None, description="Filtro opcional por município (gestor/admin)."),
     group_by: str = Query(default="modulo", description="modulo|unidade|territorio|etapa|responsavel|destino"),
     janela_risco_horas: int = Query(default=24, ge=1, le=168, description="Janela (horas) para considerar SLA em risco (vence em breve) — usado em group_by=destino."),
-    session: Session = Depends(get_session),
+    session: Session = Depends(sessao_leitura(60)),
     usuario: Usuario = Depends(get_current_user),
 ):
     """Ranking de gargalos (SLA).
@@ -2279,10 +2577,7 @@ def gestao_rede_encaminhamentos(
     risk_window = timedelta(hours=int(janela_risco_horas))
     mid = _resolver_municipio_id(usuario, municipio_id)
 
-    sla_rules = _prefetch_sla_regras(session, mid)
-
-    def sla_lookup(municipio_id: Optional[int], unidade_tipo: Optional[str], unidade_id: Optional[int], modulo: str, etapa: str, default: int) -> int:
-        return _resolver_sla_dias(sla_rules, municipio_id, unidade_tipo, unidade_id, modulo, etapa, default)
+    sla_lookup = resolvedor_sla(session).dias
 
     out: Dict[str, Any] = {"municipio_id": mid, "cras": {}, "intermunicipal": {}}
 
@@ -2518,6 +2813,9 @@ def gestao_rede_metricas(
     Foco: tempo médio de devolutiva e compliance por destino.
     Não altera o front; serve para o dashboard do secretário.
 
+    Contagens, médias e % no prazo vêm dos agregados incrementais
+    (services/rede_metricas.py); atrasados/em risco, dos pendentes.
+
     Retorna:
       - CRAS: métricas por destino (tipo+nome)
       - Intermunicipal: métricas por município destino
@@ -2527,15 +2825,7 @@ def gestao_rede_metricas(
     risk_window = timedelta(hours=int(janela_risco_horas))
     mid = _resolver_municipio_id(usuario, municipio_id)
 
-    sla_rules = _prefetch_sla_regras(session, mid)
-
-    def sla_lookup(municipio_id: Optional[int], unidade_tipo: Optional[str], unidade_id: Optional[int], modulo: str, etapa: str, default: int) -> int:
-        return _resolver_sla_dias(sla_rules, municipio_id, unidade_tipo, unidade_id, modulo, etapa, default)
-
-    def _mean(values: List[float]) -> Optional[float]:
-        if not values:
-            return None
-        return round(sum(values) / max(len(values), 1), 2)
+    sla_lookup = resolvedor_sla(session).dias
 
     def _pct(num: int, den: int) -> float:
         if den <= 0:
@@ -2560,25 +2850,22 @@ def gestao_rede_metricas(
         "intermunicipal": {"por_municipio_destino": []},
     }
 
+    def _media(soma: Any, n: Any) -> Optional[float]:
+        if not n:
+            return None
+        return round(float(soma or 0.0) / float(n), 2)
+
     # =========================
     # CRAS encaminhamentos
     # =========================
+    # contagens/tempos/"no prazo": agregados incrementais (services/rede_metricas.py);
+    # atrasados/em risco: só os pendentes, com o relógio de agora
     if CrasEncaminhamento is not None:
-        stmt = select(CrasEncaminhamento)
-        if mid is not None:
-            stmt = stmt.where(CrasEncaminhamento.municipio_id == int(mid))  # type: ignore
-        encs = list(session.exec(stmt).all())
-
-        finais = {"concluido", "cancelado"}
-
         buckets: Dict[Tuple[str, str], Dict[str, Any]] = {}
-        for e in encs:
-            st = _cras_enc_status(e)
-            dest_tipo = str(getattr(e, "destino_tipo", "") or "outro").strip().lower()
-            dest_nome = str(getattr(e, "destino_nome", "") or "Sem destino").strip()
-            key = (dest_tipo, dest_nome)
-            b = buckets.setdefault(
-                key,
+
+        def _bucket_cras(dest_tipo: str, dest_nome: str) -> Dict[str, Any]:
+            return buckets.setdefault(
+                (dest_tipo, dest_nome),
                 {
                     "destino_tipo": dest_tipo,
                     "destino_nome": dest_nome,
@@ -2600,69 +2887,41 @@ def gestao_rede_metricas(
                 },
             )
 
-            b["total"] += 1
-
-            # Situação atual (para atrasos/em_risco)
-            if st in finais:
-                if st == "concluido":
-                    b["concluidos"] += 1
-                if st == "cancelado":
-                    b["cancelados"] += 1
-            else:
-                b["pendentes"] += 1
-                due = _cras_enc_due_at(e, sla_lookup)
-                dias = _dias_atraso(agora, due)
-                if dias > 0:
-                    b["atrasados"] += 1
-                elif due and agora < due and (due - agora) <= risk_window:
-                    b["em_risco"] += 1
-
-            # Tempo até recebido (SLA de etapa "enviado")
-            enviado_em = getattr(e, "enviado_em", None)
-            recebido_em = getattr(e, "recebido_em", None)
-            if isinstance(enviado_em, datetime) and isinstance(recebido_em, datetime):
-                b["recebidos"] += 1
-                horas = max(0.0, (recebido_em - enviado_em).total_seconds() / 3600.0)
-                b.setdefault("_recv_h", []).append(horas)
-                # no prazo: recebido <= enviado + SLA(enviado)
-                if recebido_em <= (enviado_em + timedelta(days=int(sla_lookup(getattr(e, "municipio_id", None), "cras", getattr(e, "unidade_id", None), "cras_encaminhamento", "enviado", int(_CRAS_ENC_SLA.get("enviado", 2)))))):
-                    b["recebidos_no_prazo"] += 1
-
-            # Tempo até devolutiva (SLA de etapa "atendido")
-            atendido_em = getattr(e, "atendido_em", None)
-            devolutiva_em = getattr(e, "devolutiva_em", None)
-            if isinstance(devolutiva_em, datetime):
-                b["devolutivas"] += 1
-                # preferimos medir do "atendido" ao "devolutiva"; fallback no enviado
-                base = atendido_em if isinstance(atendido_em, datetime) else enviado_em
-                if isinstance(base, datetime):
-                    horas = max(0.0, (devolutiva_em - base).total_seconds() / 3600.0)
-                    b.setdefault("_dev_h", []).append(horas)
-                # no prazo: devolutiva <= atendido + SLA(atendido)
-                if isinstance(atendido_em, datetime):
-                    if devolutiva_em <= (atendido_em + timedelta(days=int(sla_lookup(getattr(e, "municipio_id", None), "cras", getattr(e, "unidade_id", None), "cras_encaminhamento", "atendido", int(_CRAS_ENC_SLA.get("atendido", 2)))))):
-                        b["devolutivas_no_prazo"] += 1
+        for a in rede_metricas.por_destino(session, "cras", mid):
+            b = _bucket_cras(str(a["destino_tipo"]), str(a["destino_nome"]))
+            for k in (
+                "total",
+                "pendentes",
+                "concluidos",
+                "cancelados",
+                "recebidos",
+                "recebidos_no_prazo",
+                "devolutivas",
+                "devolutivas_no_prazo",
+                "conclusoes",
+                "conclusoes_no_prazo",
+            ):
+                b[k] = int(a[k] or 0)
+            b["avg_horas_ate_recebido"] = _media(a["soma_horas_recebido"], a["recebidos"])
+            b["avg_horas_ate_devolutiva"] = _media(a["soma_horas_devolutiva"], a["devolutivas_medidas"])
+            b["avg_dias_ate_conclusao"] = _media(a["soma_dias_conclusao"], a["conclusoes_medidas"])
 
-            # Conclusão (SLA de etapa "devolutiva")
-            concluido_em = getattr(e, "concluido_em", None)
-            if isinstance(concluido_em, datetime):
-                b["conclusoes"] += 1
-                if isinstance(enviado_em, datetime):
-                    dias_tot = max(0.0, (concluido_em - enviado_em).total_seconds() / 86400.0)
-                    b.setdefault("_conc_d", []).append(dias_tot)
-                # no prazo: concluido <= devolutiva + SLA(devolutiva)
-                if isinstance(devolutiva_em, datetime):
-                    if concluido_em <= (devolutiva_em + timedelta(days=int(sla_lookup(getattr(e, "municipio_id", None), "cras", getattr(e, "unidade_id", None), "cras_encaminhamento", "devolutiva", int(_CRAS_ENC_SLA.get("devolutiva", 2)))))):
-                        b["conclusoes_no_prazo"] += 1
+        finais = {"concluido", "cancelado"}
+        for e in rede_metricas.pendentes_cras(session, mid):
+            if _cras_enc_status(e) in finais:
+                continue
+            dest_tipo = str(getattr(e, "destino_tipo", "") or "outro").strip().lower()
+            dest_nome = str(getattr(e, "destino_nome", "") or "Sem destino").strip()
+            b = _bucket_cras(dest_tipo, dest_nome)
+            due = _cras_enc_due_at(e, sla_lookup)
+            dias = _dias_atraso(agora, due)
+            if dias > 0:
+                b["atrasados"] += 1
+            elif due and agora < due and (due - agora) <= risk_window:
+                b["em_risco"] += 1
 
         rows: List[Dict[str, Any]] = []
         for b in buckets.values():
-            recv_h = b.pop("_recv_h", []) if "_recv_h" in b else []
-            dev_h = b.pop("_dev_h", []) if "_dev_h" in b else []
-            conc_d = b.pop("_conc_d", []) if "_conc_d" in b else []
-            b["avg_horas_ate_recebido"] = _mean([float(x) for x in recv_h])
-            b["avg_horas_ate_devolutiva"] = _mean([float(x) for x in dev_h])
-            b["avg_dias_ate_conclusao"] = _mean([float(x) for x in conc_d])
             b["pct_recebido_no_prazo"] = _pct(int(b.get("recebidos_no_prazo") or 0), int(b.get("recebidos") or 0))
             b["pct_devolutiva_no_prazo"] = _pct(int(b.get("devolutivas_no_prazo") or 0), int(b.get("devolutivas") or 0))
             b["pct_conclusao_no_prazo"] = _pct(int(b.get("conclusoes_no_prazo") or 0), int(b.get("conclusoes") or 0))
@@ -2687,26 +2946,10 @@ def gestao_rede_metricas(
     # Intermunicipal
     # =========================
     if EncaminhamentoIntermunicipal is not None:
-        stmt = select(EncaminhamentoIntermunicipal)
-        if mid is not None:
-            stmt = stmt.where(
-                or_(
-                    EncaminhamentoIntermunicipal.municipio_origem_id == int(mid),  # type: ignore
-                    EncaminhamentoIntermunicipal.municipio_destino_id == int(mid),  # type: ignore
-                )
-            )
-        encs = list(session.exec(stmt).all())
-
-        finais = {"concluido", "cancelado"}
-
         buckets2: Dict[int, Dict[str, Any]] = {}
-        for e in encs:
-            dest_id = getattr(e, "municipio_destino_id", None)
-            if dest_id is None:
-                continue
-            did = int(dest_id)
-            st = _inter_status(e)
-            b = buckets2.setdefault(
+
+        def _bucket_inter(did: int) -> Dict[str, Any]:
+            return buckets2.setdefault(
                 did,
                 {
                     "municipio_destino_id": did,
@@ -2723,35 +2966,27 @@ def gestao_rede_metricas(
                 },
             )
 
-            b["total"] += 1
+        for a in rede_metricas.por_destino(session, "intermunicipal", mid):
+            b = _bucket_inter(int(a["municipio_destino_id"]))
+            for k in ("total", "pendentes", "concluidos", "cancelados", "contatos", "contatos_no_prazo"):
+                b[k] = int(a[k] or 0)
+            b["avg_horas_ate_contato"] = _media(a["soma_horas_contato"], a["contatos"])
 
-            if st in finais:
-                if st == "concluido":
-                    b["concluidos"] += 1
-                if st == "cancelado":
-                    b["cancelados"] += 1
-            else:
-                b["pendentes"] += 1
-                due = _inter_due_at(e, sla_lookup)
-                dias = _dias_atraso(agora, due)
-                if dias > 0:
-                    b["atrasados"] += 1
-                elif due and agora < due and (due - agora) <= risk_window:
-                    b["em_risco"] += 1
-
-            criado_em = getattr(e, "criado_em", None)
-            contato_em = getattr(e, "contato_em", None)
-            if isinstance(criado_em, datetime) and isinstance(contato_em, datetime):
-                b["contatos"] += 1
-                horas = max(0.0, (contato_em - criado_em).total_seconds() / 3600.0)
-                b.setdefault("_cont_h", []).append(horas)
-                if contato_em <= (criado_em + timedelta(days=int(sla_lookup((getattr(e, "municipio_destino_id", None) or getattr(e, "municipio_origem_id", None)), None, None, "rede_intermunicipal", "solicitado", int(_INTER_SLA.get("solicitado", 2)))))):
-                    b["contatos_no_prazo"] += 1
+        finais = {"concluido", "cancelado"}
+        for e in rede_metricas.pendentes_inter(session, mid):
+            dest_id = getattr(e, "municipio_destino_id", None)
+            if dest_id is None or _inter_status(e) in finais:
+                continue
+            b = _bucket_inter(int(dest_id))
+            due = _inter_due_at(e, sla_lookup)
+            dias = _dias_atraso(agora, due)
+            if dias > 0:
+                b["atrasados"] += 1
+            elif due and agora < due and (due - agora) <= risk_window:
+                b["em_risco"] += 1
 
         rows2: List[Dict[str, Any]] = []
         for b in buckets2.values():
-            cont_h = b.pop("_cont_h", []) if "_cont_h" in b else []
-            b["avg_horas_ate_contato"] = _mean([float(x) for x in cont_h])
             b["pct_contato_no_prazo"] = _pct(int(b.get("contatos_no_prazo") or 0), int(b.get("contatos") or 0))
             b["score"] = _score_inter(b)
             b["faixa"] = _faixa(float(b["score"]))
@@ -2764,6 +2999,85 @@ def gestao_rede_metricas(
     return out
 
 
+@router.get("/rede/metricas/serie")
+def gestao_rede_metricas_serie(
+    rede: str = Query(default="cras", description="cras|intermunicipal"),
+    municipio_id: Optional[int] = Query(default=None, description="Filtro opcional por município (gestor/admin)."),
+    meses: int = Query(default=12, ge=1, le=60, description="Meses (do atual para trás)."),
+    destino_tipo: Optional[str] = Query(default=None, description="CRAS: tipo do destino (creas, osc, saude...)."),
+    destino_nome: Optional[str] = Query(default=None, description="CRAS: nome do destino."),
+    municipio_destino_id: Optional[int] = Query(default=None, description="Intermunicipal: município destino."),
+    session: Session = Depends(sessao_leitura(300)),
+    usuario: Usuario = Depends(get_current_user),
+):
+    """Série mensal da rede (gráfico de tendência), dos agregados por destino e mês.
+
+    Cada mês conta os marcos ocorridos nele: enviados (total), recebidos,
+    devolutivas, conclusões, contatos, cancelados. Sem filtro de destino = rede toda.
+    """
+
+    r = (rede or "").strip().lower()
+    if r not in rede_metricas.REDES:
+        r = "cras"
+    mid = _resolver_municipio_id(usuario, municipio_id)
+
+    def _media(soma: Any, n: Any) -> Optional[float]:
+        return round(float(soma or 0.0) / float(n), 2) if n else None
+
+    def _pct(num: Any, den: Any) -> Optional[float]:
+        return round(100.0 * float(num or 0) / float(den), 1) if den else None
+
+    itens: List[Dict[str, Any]] = []
+    for p in rede_metricas.serie(
+        session,
+        r,
+        municipio_id=mid,
+        meses=int(meses),
+        destino_tipo=destino_tipo if r == "cras" else None,
+        destino_nome=destino_nome if r == "cras" else None,
+        municipio_destino_id=municipio_destino_id if r == "intermunicipal" else None,
+    ):
+        periodo = int(p["periodo"])
+        item: Dict[str, Any] = {
+            "mes": f"{periodo // 100:04d}-{periodo % 100:02d}",
+            "total": int(p["total"] or 0),
+            "concluidos": int(p["concluidos"] or 0),
+            "cancelados": int(p["cancelados"] or 0),
+        }
+        if r == "cras":
+            item.update(
+                {
+                    "recebidos": int(p["recebidos"] or 0),
+                    "devolutivas": int(p["devolutivas"] or 0),
+                    "conclusoes": int(p["conclusoes"] or 0),
+                    "avg_horas_ate_recebido": _media(p["soma_horas_recebido"], p["recebidos"]),
+                    "avg_horas_ate_devolutiva": _media(p["soma_horas_devolutiva"], p["devolutivas_medidas"]),
+                    "avg_dias_ate_conclusao": _media(p["soma_dias_conclusao"], p["conclusoes_medidas"]),
+                    "pct_recebido_no_prazo": _pct(p["recebidos_no_prazo"], p["recebidos"]),
+                    "pct_devolutiva_no_prazo": _pct(p["devolutivas_no_prazo"], p["devolutivas"]),
+                    "pct_conclusao_no_prazo": _pct(p["conclusoes_no_prazo"], p["conclusoes"]),
+                }
+            )
+        else:
+            item.update(
+                {
+                    "contatos": int(p["contatos"] or 0),
+                    "avg_horas_ate_contato": _media(p["soma_horas_contato"], p["contatos"]),
+                    "pct_contato_no_prazo": _pct(p["contatos_no_prazo"], p["contatos"]),
+                }
+            )
+        itens.append(item)
+
+    return {
+        "rede": r,
+        "municipio_id": mid,
+        "destino_tipo": destino_tipo if r == "cras" else None,
+        "destino_nome": destino_nome if r == "cras" else None,
+        "municipio_destino_id": municipio_destino_id if r == "intermunicipal" else None,
+        "meses": itens,
+    }
+
+
 @router.get("/rede/timeline")
 def gestao_rede_timeline(
     tipo: str = Query(..., description="cras|intermunicipal"),
@@ -4,7 +4,7 @@ import json
 from datetime import datetime, time, timedelta, timezone
 from typing import Any, Dict, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, status
 from pydantic import BaseModel, Field as PField
 from sqlmodel import Session, select
 
@@ -73,93 +73,119 @@ def _json_loads(s: str) -> Dict[str, Any]:
         return {}
 
 
-def _due_now(rule: GestaoLoteRegra) -> bool:
+def _proxima_execucao(rule: GestaoLoteRegra, agora: Optional[datetime] = None) -> Optional[datetime]:
+    """Próximo horário (UTC, sem tz) em que a regra fica devida.
+
+    Mesma semântica de sempre: conta o horário de hoje (se o dia da semana
+    permitir) e, se ele já rodou, o próximo dia permitido. Dias anteriores não
+    são "recuperados". Retorna None se a regra não tem agenda válida.
+    """
     sch = rule.schedule()
     if not sch or not isinstance(sch, dict):
-        return False
+        return None
     if not rule.ativo:
-        return False
+        return None
 
     tz_name = str(sch.get("tz") or "America/Sao_Paulo")
     freq = str(sch.get("freq") or "").lower().strip()
     hhmm = str(sch.get("time") or "").strip()
 
     if freq not in ("daily", "weekly"):
-        return False
+        return None
     if not hhmm or ":" not in hhmm:
-        return False
+        return None
 
     try:
         hh, mm = hhmm.split(":", 1)
         hh_i = int(hh)
         mm_i = int(mm)
     except Exception:
-        return False
+        return None
 
-    now_local = _to_local(_now_utc(), tz_name)
+    agora_utc = (agora or datetime.utcnow()).replace(tzinfo=timezone.utc)
+    now_local = _to_local(agora_utc, tz_name)
     if not now_local:
-        return False
+        return None
 
     # weekdays: 0=Mon..6=Sun
+    wds_ok: Optional[set] = None
     wds = sch.get("weekdays")
     if isinstance(wds, list) and wds:
         try:
-            wd = int(now_local.weekday())
-            if wd not in {int(x) for x in wds}:
-                return False
+            wds_ok = {int(x) for x in wds}
         except Exception:
-            pass
-
-    today_run_local = now_local.replace(hour=hh_i, minute=mm_i, second=0, microsecond=0)
-    if now_local < today_run_local:
-        return False
+            wds_ok = None
 
     last = rule.last_run_at
     last_local = _to_local(last.replace(tzinfo=timezone.utc) if (last and last.tzinfo is None) else last, tz_name)
-    if last_local and last_local >= today_run_local:
-        return False
-
-    return True
-
-
-def _filtrar_itens(items: List[Dict[str, Any]], filtros: Dict[str, Any]) -> List[Dict[str, Any]]:
-    """Filtros adicionais além da própria /gestao/fila."""
-    tipo = filtros.get("tipo")
-    if isinstance(tipo, str) and tipo.strip():
-        t = tipo.strip().lower()
-        items = [x for x in items if str(x.get("tipo") or "").lower() == t]
-    elif isinstance(tipo, list) and tipo:
-        ts = {str(x).lower() for x in tipo}
-        items = [x for x in items if str(x.get("tipo") or "").lower() in ts]
-
-    dias_min = filtros.get("dias_atraso_min")
-    dias_max = filtros.get("dias_atraso_max")
-    if isinstance(dias_min, int):
-        items = [x for x in items if int(x.get("dias_em_atraso") or 0) >= int(dias_min)]
-    if isinstance(dias_max, int):
-        items = [x for x in items if int(x.get("dias_em_atraso") or 0) <= int(dias_max)]
-
-    # pendente_de: se o item já vier com pendente_de, usa. Se não, tenta inferir (intermunicipal)
-    pendente_de = filtros.get("pendente_de")
-    if isinstance(pendente_de, str) and pendente_de.strip():
-        pd = pendente_de.strip().lower()
-
-        def _infer(it: Dict[str, Any]) -> str:
-            got = str(it.get("pendente_de") or "").strip().lower()
-            if got:
-                return got
-            # inferência mínima para intermunicipal
-            if str(it.get("tipo") or "").strip().lower() == "encaminhamento_intermunicipal":
-                st = str(it.get("etapa_atual") or it.get("status") or "").strip().lower()
-                if st in ("contato", "aceito", "passagem"):
-                    return "destino"
-                if st in ("solicitado", "agendado", "contrarreferencia"):
-                    return "origem"
-            return ""
-
-        items = [x for x in items if _infer(x) == pd]
 
-    return items
+    try:
+        dia = now_local.replace(hour=hh_i, minute=mm_i, second=0, microsecond=0)
+    except ValueError:
+        return None
+    for _ in range(8):
+        if (wds_ok is None or dia.weekday() in wds_ok) and not (last_local and last_local >= dia):
+            return dia.astimezone(timezone.utc).replace(tzinfo=None)
+        dia = dia + timedelta(days=1)
+    return None
+
+
+def _due_now(rule: GestaoLoteRegra) -> bool:
+    prox = _proxima_execucao(rule)
+    return prox is not None and prox <= datetime.utcnow()
+
+
+class FilaSnapshot:
+    """Fila de pendências montada uma vez por conjunto de filtros e reaproveitada.
+
+    Os filtros da regra (tipo, dias_atraso_min/max, pendente_de) vão como
+    FiltroFila para o motor da fila (`montar_fila`), que só lê e monta os
+    candidatos que casam — lendo cada fonte inteira (`limite=None`): sem o teto
+    de 500 itens da rota /gestao/fila nem o teto de leitura por fonte.
+    No agendador/executar-devidas as regras com os mesmos filtros compartilham
+    a montagem (chave = parâmetros da fila + spec) até alguma regra agir sobre
+    itens: aí `invalidar()` — a próxima regra escolhe da fila já alterada
+    (ofício/cobrança gerados, itens reatribuídos), não da foto antiga.
+    """
+
+    def __init__(self, session: Session, usuario: Usuario) -> None:
+        self.session = session
+        self.usuario = usuario
+        self.montagens = 0
+        self._filas: Dict[Any, List[Dict[str, Any]]] = {}
+
+    def itens(self, municipio_id: Optional[int], filtros: Dict[str, Any]) -> List[Dict[str, Any]]:
+        from app.routers.gestao import FiltroFila, montar_fila  # type: ignore
+
+        spec = FiltroFila.de_dict(filtros)
+        params = dict(
+            municipio_id=municipio_id,
+            unidade_id=filtros.get("unidade_id"),
+            territorio=filtros.get("territorio"),
+            dias_cadunico=int(filtros.get("dias_cadunico") or 30),
+            dias_pia=int(filtros.get("dias_pia") or 15),
+            janela_risco_horas=int(filtros.get("janela_risco_horas") or 24),
+            modulo=(str(filtros.get("modulo") or "").strip().lower()) or None,
+            somente_atrasos=bool(filtros.get("somente_atrasos") or False),
+            somente_em_risco=bool(filtros.get("somente_em_risco") or False),
+        )
+        chave = (tuple(sorted(params.items())), spec.chave())
+        items = self._filas.get(chave)
+        if items is None:
+            items = montar_fila(
+                self.session,
+                self.usuario,
+                **params,
+                filtro=spec,
+                limite=None,
+            )
+            self._filas[chave] = items
+            self.montagens += 1
+        return list(items)
+
+    def invalidar(self) -> None:
+        """Descarta as filas montadas (uma regra executou itens)."""
+        self._filas.clear()
 
 
 # =========================
@@ -205,7 +231,7 @@ class ExecucaoOut(BaseModel):
 # Templates (receitas prontas)
 # =========================
 
-# Observação: os filtros aqui são compatíveis com /gestao/fila + _filtrar_itens.
+# Observação: os filtros aqui são compatíveis com /gestao/fila + FiltroFila.
 # Você pode aplicar e depois ajustar via PATCH /gestao/automacoes/regras/{id}.
 
 TEMPLATES: List[Dict[str, Any]] = [
@@ -521,32 +547,8 @@ def preview_regra(
     if not r:
         raise HTTPException(status_code=404, detail="Regra não encontrada")
 
-    filtros = r.filtros()
-
-    # Reusa /gestao/fila para seleção base
     try:
-        from app.routers.gestao import gestao_fila as _gestao_fila  # type: ignore
-
-        fila = _gestao_fila(
-            municipio_id=r.municipio_id,
-            unidade_id=filtros.get("unidade_id"),
-            territorio=filtros.get("territorio"),
-            dias_cadunico=int(filtros.get("dias_cadunico") or 30),
-            dias_pia=int(filtros.get("dias_pia") or 15),
-            janela_risco_horas=int(filtros.get("janela_risco_horas") or 24),
-            modulo=filtros.get("modulo"),
-            somente_atrasos=bool(filtros.get("somente_atrasos") or False),
-            somente_em_risco=bool(filtros.get("somente_em_risco") or False),
-            limit=500,
-            offset=0,
-            session=session,
-            usuario=usuario,
-        )
-        items = list((fila or {}).get("items") or [])
-        items = _filtrar_itens(items, filtros)
-        max_it = filtros.get("max_itens")
-        if isinstance(max_it, int) and max_it > 0:
-            items = items[: int(max_it)]
+        items = _selecionar_itens_regra(r, session, usuario)
         return {"total": len(items), "items": items[: int(limit)]}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Falha ao gerar preview: {e}")
@@ -720,53 +722,31 @@ def _executar_acao_em_lote(
     return {"total": len(items), "ok": ok, "falhas": falhas, "resultados": resultados}
 
 
-@router.post("/regras/{regra_id}/executar")
-def executar_regra(
-    regra_id: int,
-    request: Request,
-    dry_run: bool = Query(default=False, description="Se true, não gera documentos, apenas lista seleção"),
-    session: Session = Depends(get_session),
-    usuario: Usuario = Depends(get_current_user),
-):
-    r = session.get(GestaoLoteRegra, int(regra_id))
-    if not r:
-        raise HTTPException(status_code=404, detail="Regra não encontrada")
-
-    if not pode_acesso_global(usuario):
-        if getattr(usuario, "municipio_id", None) is None or int(getattr(usuario, "municipio_id")) != int(r.municipio_id or 0):
-            raise HTTPException(status_code=403, detail="Sem permissão")
-
+def _selecionar_itens_regra(
+    r: GestaoLoteRegra,
+    session: Session,
+    usuario: Usuario,
+    snapshot: Optional[FilaSnapshot] = None,
+) -> List[Dict[str, Any]]:
+    """Itens da fila que a regra pegaria agora (fila + filtros extras + max_itens)."""
     filtros = r.filtros()
+    snap = snapshot or FilaSnapshot(session, usuario)
+    items = snap.itens(r.municipio_id, filtros)
+    max_it = filtros.get("max_itens")
+    if isinstance(max_it, int) and max_it > 0:
+        items = items[: int(max_it)]
+    return items
 
-    # Seleção
-    try:
-        from app.routers.gestao import gestao_fila as _gestao_fila  # type: ignore
-
-        fila = _gestao_fila(
-            municipio_id=r.municipio_id,
-            unidade_id=filtros.get("unidade_id"),
-            territorio=filtros.get("territorio"),
-            dias_cadunico=int(filtros.get("dias_cadunico") or 30),
-            dias_pia=int(filtros.get("dias_pia") or 15),
-            janela_risco_horas=int(filtros.get("janela_risco_horas") or 24),
-            modulo=filtros.get("modulo"),
-            somente_atrasos=bool(filtros.get("somente_atrasos") or False),
-            somente_em_risco=bool(filtros.get("somente_em_risco") or False),
-            limit=500,
-            offset=0,
-            session=session,
-            usuario=usuario,
-        )
-        items = list((fila or {}).get("items") or [])
-        items = _filtrar_itens(items, filtros)
-        max_it = filtros.get("max_itens")
-        if isinstance(max_it, int) and max_it > 0:
-            items = items[: int(max_it)]
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Falha ao selecionar itens: {e}")
 
-    if dry_run:
-        return {"acao": r.acao, "total": len(items), "items": items[:200]}
+def _executar_regra_itens(
+    r: GestaoLoteRegra,
+    items: List[Dict[str, Any]],
+    request: Request,
+    session: Session,
+    usuario: Usuario,
+) -> Dict[str, Any]:
+    """Executa a ação da regra sobre os itens já selecionados e registra a execução."""
+    filtros = r.filtros()
 
     exec_row = GestaoLoteExecucao(
         regra_id=r.id,
@@ -830,53 +810,120 @@ def executar_regra(
     session.commit()
 
     return {
-        "execucao": {
-            "id": exec_row.id,
-            "regra_id": exec_row.regra_id,
-            "acao": exec_row.acao,
-            "status": exec_row.status,
-            "total": exec_row.total,
-            "ok": exec_row.ok,
-            "falhas": exec_row.falhas,
-            "iniciado_em": exec_row.iniciado_em,
-            "finalizado_em": exec_row.finalizado_em,
-            "resumo": exec_row.resumo(),
-        }
+        "id": exec_row.id,
+        "regra_id": exec_row.regra_id,
+        "acao": exec_row.acao,
+        "status": exec_row.status,
+        "total": exec_row.total,
+        "ok": exec_row.ok,
+        "falhas": exec_row.falhas,
+        "iniciado_em": exec_row.iniciado_em,
+        "finalizado_em": exec_row.finalizado_em,
+        "resumo": exec_row.resumo(),
     }
 
 
+@router.post("/regras/{regra_id}/executar")
+def executar_regra(
+    regra_id: int,
+    request: Request,
+    dry_run: bool = Query(default=False, description="Se true, não gera documentos, apenas lista seleção"),
+    session: Session = Depends(get_session),
+    usuario: Usuario = Depends(get_current_user),
+):
+    r = session.get(GestaoLoteRegra, int(regra_id))
+    if not r:
+        raise HTTPException(status_code=404, detail="Regra não encontrada")
+
+    if not pode_acesso_global(usuario):
+        if getattr(usuario, "municipio_id", None) is None or int(getattr(usuario, "municipio_id")) != int(r.municipio_id or 0):
+            raise HTTPException(status_code=403, detail="Sem permissão")
+
+    # Seleção
+    try:
+        items = _selecionar_itens_regra(r, session, usuario)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Falha ao selecionar itens: {e}")
+
+    if dry_run:
+        return {"acao": r.acao, "total": len(items), "items": items[:200]}
+
+    return {"execucao": _executar_regra_itens(r, items, request, session, usuario)}
+
+
 @router.post("/executar-devidas")
 def executar_regras_devidas(
     request: Request,
+    background_tasks: BackgroundTasks,
     limite: int = Query(default=20, ge=1, le=100),
     dry_run: bool = Query(default=False),
+    em_background: bool = Query(default=False, description="Se true, responde na hora e executa em background (agendador)."),
     session: Session = Depends(get_session),
     usuario: Usuario = Depends(get_current_user),
 ):
     """Executa todas as regras ativas que estão devidas agora.
 
     Use isso para agendamento externo (cron/job) sem precisar editar código.
+    Com POPRUA_AGENDADOR=1 o próprio backend roda as regras (ver
+    app/services/automacoes_agendador.py); esta rota continua valendo para
+    disparo manual e usa o mesmo lease, então nunca roda junto com o agendador.
     """
     if not pode_acesso_global(usuario):
         # por segurança: somente gestor/admin dispara varredura geral.
         raise HTTPException(status_code=403, detail="Somente gestor/admin pode executar regras devidas")
 
+    from app.services import automacoes_agendador as agendador
+
     regras = list(session.exec(select(GestaoLoteRegra).where(GestaoLoteRegra.ativo == True)).all())  # noqa: E712
     devidas = [r for r in regras if _due_now(r)]
 
+    if em_background and not dry_run:
+        background_tasks.add_task(agendador.executar_tick, escopos=(agendador.ESCOPO_GESTAO,), limite=int(limite))
+        return {
+            "total_devidas": len(devidas),
+            "executadas": 0,
+            "em_background": True,
+            "items": [{"regra_id": r.id, "nome": r.nome, "acao": r.acao, "due": True} for r in devidas[: int(limite)]],
+        }
+
+    # fila compartilhada pelas regras até uma delas executar itens
+    snapshot = FilaSnapshot(session, usuario)
+    dono = agendador.dono_lease("http")
+
     out: List[Dict[str, Any]] = []
     for r in devidas[: int(limite)]:
         if dry_run:
             out.append({"regra_id": r.id, "nome": r.nome, "acao": r.acao, "due": True})
-        else:
-            # executa como o usuário atual (gestor/admin)
-            try:
-                res = executar_regra(r.id, request, dry_run=False, session=session, usuario=usuario)  # type: ignore
-                out.append({"regra_id": r.id, "nome": r.nome, "resultado": res.get("execucao")})
-            except Exception as e:
-                out.append({"regra_id": r.id, "nome": r.nome, "erro": str(e)})
-
-    return {"total_devidas": len(devidas), "executadas": len(out), "items": out}
+            continue
+        if not agendador.adquirir_lease(session, agendador.ESCOPO_GESTAO, int(r.id), dono, municipio_id=r.municipio_id, exigir_devida=False):
+            out.append({"regra_id": r.id, "nome": r.nome, "erro": "Regra já em execução (lease ativo)"})
+            continue
+        # executa como o usuário atual (gestor/admin)
+        status_exec, erro = "ok", None
+        items: List[Dict[str, Any]] = []
+        try:
+            items = _selecionar_itens_regra(r, session, usuario, snapshot=snapshot)
+            res = _executar_regra_itens(r, items, request, session, usuario)
+            status_exec = str(res.get("status") or "ok")
+            out.append({"regra_id": r.id, "nome": r.nome, "resultado": res})
+        except Exception as e:
+            session.rollback()
+            status_exec, erro = "error", str(e)
+            out.append({"regra_id": r.id, "nome": r.nome, "erro": str(e)})
+        finally:
+            if items:
+                snapshot.invalidar()
+            agendador.liberar_lease(
+                session,
+                agendador.ESCOPO_GESTAO,
+                int(r.id),
+                dono,
+                status=status_exec,
+                erro=erro,
+                proxima=_proxima_execucao(r),
+            )
+
+    return {"total_devidas": len(devidas), "executadas": len(out), "fila_montagens": snapshot.montagens, "items": out}
 
 
 @router.get("/execucoes")
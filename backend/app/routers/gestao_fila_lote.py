@@ -7,6 +7,7 @@ from fastapi import APIRouter, Depends, HTTPException, Request
 from pydantic import BaseModel, Field as PField
 from sqlmodel import Session, select
 
+from app.core import concorrencia
 from app.core.auth import exigir_minimo_perfil, get_current_user, pode_acesso_global
 from app.core.db import get_session
 from app.models.usuario import Usuario
@@ -52,6 +53,10 @@ def _fmt_data_br(dt: Optional[datetime]) -> Optional[str]:
         return None
 
 
+# teto de itens por lote (antes: 500, o limite da rota /gestao/fila)
+_LOTE_MAX_ITENS = 5000
+
+
 class FilaFiltro(BaseModel):
     municipio_id: Optional[int] = None
     unidade_id: Optional[int] = None
@@ -65,6 +70,7 @@ class FilaFiltro(BaseModel):
 
     dias_atraso_min: Optional[int] = None
     dias_atraso_max: Optional[int] = None
+    pendente_de: Optional[str] = PField(default=None, description="origem|destino (intermunicipal)")
 
     limit: int = 200
 
@@ -101,48 +107,41 @@ def _selecionar_itens_da_fila(
     session: Session,
     usuario: Usuario,
 ) -> Tuple[List[Dict[str, Any]], int]:
-    """Reusa /gestao/fila (mesmo motor) e aplica filtros adicionais."""
+    """Reusa o motor de /gestao/fila com os filtros extras avaliados na seleção.
+
+    Retorna (itens até `limit`, total de itens que casam com o filtro). A fila é
+    montada inteira (`limite=None`): o lote pega os `limit` primeiros da fila
+    completa e `total_fila` conta todos.
+    """
 
-    from app.routers.gestao import gestao_fila as _gestao_fila  # import local
+    from app.routers.gestao import FiltroFila, montar_fila  # import local
+
+    spec = FiltroFila(
+        tipos=[filtro.tipo] if filtro.tipo else None,
+        dias_atraso_min=filtro.dias_atraso_min,
+        dias_atraso_max=filtro.dias_atraso_max,
+        pendente_de=filtro.pendente_de,
+    )
+
+    lim = int(filtro.limit or 200)
+    if lim < 1:
+        lim = 1
+    if lim > _LOTE_MAX_ITENS:
+        lim = _LOTE_MAX_ITENS
 
-    out = _gestao_fila(
+    items = montar_fila(
+        session,
+        usuario,
         municipio_id=filtro.municipio_id,
         unidade_id=filtro.unidade_id,
         territorio=filtro.territorio,
         modulo=filtro.modulo,
         somente_atrasos=filtro.somente_atrasos,
         somente_em_risco=filtro.somente_em_risco,
-        limit=500,
-        offset=0,
-        session=session,
-        usuario=usuario,
+        filtro=spec,
+        limite=None,
     )
-
-    items = list((out or {}).get("items") or [])
-    total_sem_filtro_extra = len(items)
-
-    # filtro por tipo (mais usado)
-    if filtro.tipo:
-        t = str(filtro.tipo).strip().lower()
-        items = [it for it in items if str(it.get("tipo") or "").strip().lower() == t]
-
-    # filtro por faixa de atraso
-    if filtro.dias_atraso_min is not None:
-        minv = int(filtro.dias_atraso_min)
-        items = [it for it in items if int(it.get("dias_em_atraso") or 0) >= minv]
-
-    if filtro.dias_atraso_max is not None:
-        maxv = int(filtro.dias_atraso_max)
-        items = [it for it in items if int(it.get("dias_em_atraso") or 0) <= maxv]
-
-    lim = int(filtro.limit or 200)
-    if lim < 1:
-        lim = 1
-    if lim > 500:
-        lim = 500
-
-    items = items[:lim]
-    return items, total_sem_filtro_extra
+    return items[:lim], len(items)
 
 
 @router.get("/preview")
@@ -156,6 +155,7 @@ def preview(
     somente_em_risco: bool = False,
     dias_atraso_min: Optional[int] = None,
     dias_atraso_max: Optional[int] = None,
+    pendente_de: Optional[str] = None,
     limit: int = 200,
     session: Session = Depends(get_session),
     usuario: Usuario = Depends(get_current_user),
@@ -170,6 +170,7 @@ def preview(
         somente_em_risco=somente_em_risco,
         dias_atraso_min=dias_atraso_min,
         dias_atraso_max=dias_atraso_max,
+        pendente_de=pendente_de,
         limit=limit,
     )
 
@@ -177,7 +178,7 @@ def preview(
     return {"total_fila": total, "selecionados": len(items), "items": items}
 
 
-@router.post("/documentos")
+@router.post("/documentos", dependencies=[Depends(concorrencia.vaga("pdf"))])
 def executar_lote_documentos(
     payload: LoteDocumentosPayload,
     request: Request,
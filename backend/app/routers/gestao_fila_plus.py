@@ -7,6 +7,7 @@ from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from pydantic import BaseModel, Field as PField
 from sqlmodel import Session, select
 
+from app.core import concorrencia
 from app.core.auth import exigir_minimo_perfil, get_current_user
 from app.core.db import get_session
 from app.models.usuario import Usuario
@@ -104,24 +105,13 @@ def fila_item_detalhe(
     tp = (tipo or "").strip().lower()
     rid = int(referencia_id)
 
-    # tenta pegar o item no MESMO formato da fila atual (reusa gestao_fila)
+    # item no MESMO formato da fila, montado só a partir do registro de origem
+    # (antes montava a fila inteira com limit=500 e procurava o item nela)
     item_obj: Optional[Dict[str, Any]] = None
     try:
-        from app.routers.gestao import gestao_fila as _gestao_fila  # type: ignore
-
-        fila = _gestao_fila(  # type: ignore
-            municipio_id=municipio_id,
-            modulo=mod.lower(),
-            limit=500,
-            offset=0,
-            session=session,
-            usuario=usuario,
-        )
-        items = list((fila or {}).get("items") or [])
-        for it in items:
-            if str(it.get("tipo") or "").lower() == tp and int(it.get("referencia_id") or 0) == rid:
-                item_obj = it
-                break
+        from app.routers.gestao import montar_item_fila  # type: ignore
+
+        item_obj = montar_item_fila(session, usuario, mod, tp, rid, municipio_id=municipio_id)
     except Exception:
         item_obj = None
 
@@ -324,7 +314,7 @@ def _modelo_relatorio(modulo: str) -> str:
     return "relatorio_padrao"
 
 
-@router.post("/fila/lote/documentos")
+@router.post("/fila/lote/documentos", dependencies=[Depends(concorrencia.vaga("pdf"))])
 def fila_lote_documentos(
     payload: LoteDocumentosPayload,
     request: Request,
@@ -6,11 +6,13 @@ from typing import Any, Dict, Optional
 
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel, Field as PField
+from starlette.concurrency import run_in_threadpool
 
 from app.core.auth import exigir_minimo_perfil, get_current_user, pode_acesso_global
 from app.core.db import get_session
 from app.models.usuario import Usuario
-from app.services.ai_service import AIError, generate_text
+from app.services.ai_gateway import gateway, generate_text_async
+from app.services.ai_service import AIError
 
 
 router = APIRouter(prefix="/ia", tags=["ia"])
@@ -98,6 +100,52 @@ def _pick_modelo(modelo: Optional[str], tipo: Optional[str]):
     return m
 
 
+def _carregar_encaminhamento(
+    session,
+    usuario: Usuario,
+    encaminhamento_id: int,
+    municipio_id: Optional[int],
+    n_eventos: int,
+):
+    """Carrega encaminhamento CRAS + linha do tempo redigida (roda no threadpool).
+
+    Retorna (enc, mid, timeline_txt).
+    """
+    from sqlmodel import select
+    from app.models.cras_encaminhamento import CrasEncaminhamento, CrasEncaminhamentoEvento
+
+    enc = session.get(CrasEncaminhamento, encaminhamento_id)
+    if not enc:
+        raise HTTPException(status_code=404, detail="Encaminhamento não encontrado")
+
+    if pode_acesso_global(usuario):
+        mid = int(municipio_id or getattr(enc, "municipio_id", 0) or 0)
+        if not mid:
+            raise HTTPException(status_code=400, detail="municipio_id é obrigatório para acesso global")
+    else:
+        mid = int(getattr(usuario, "municipio_id", 0) or 0)
+        if not mid or int(getattr(enc, "municipio_id", 0) or 0) != mid:
+            raise HTTPException(status_code=403, detail="Sem permissão para esse município")
+
+    eventos = session.exec(
+        select(CrasEncaminhamentoEvento)
+        .where(CrasEncaminhamentoEvento.encaminhamento_id == encaminhamento_id)
+        .order_by(CrasEncaminhamentoEvento.em)
+    ).all()
+    eventos = list(eventos or [])
+    tl_lines = []
+    for ev in eventos[-n_eventos:]:
+        try:
+            dt = ev.em.strftime("%d/%m/%Y %H:%M") if getattr(ev, "em", None) else ""
+        except Exception:
+            dt = ""
+        det = _redact(getattr(ev, "detalhe", None))
+        tl_lines.append(f"- {dt} {getattr(ev, 'tipo', '')}: {det}".strip())
+    timeline_txt = "\n".join([l for l in tl_lines if l and l != "-"])
+
+    return enc, mid, timeline_txt
+
+
 # =====================================================
 # Endpoints base (3.3.0)
 # =====================================================
@@ -167,11 +215,12 @@ def ia_health():
         "key_len": len(key),
         "key_prefix": key[:3] if key else "",
         "key_last4": key[-4:] if key else "",
+        "gateway": gateway.resumo(),
     }
 
 
 @router.post("/text", dependencies=[Depends(exigir_minimo_perfil("operador"))])
-def ia_text(
+async def ia_text(
     payload: AITextRequest,
     usuario: Usuario = Depends(get_current_user),
 ):
@@ -180,7 +229,7 @@ def ia_text(
     Observação: retorna apenas texto por padrão. `return_raw=true` adiciona metadados da resposta.
     """
     try:
-        res = generate_text(
+        res = await generate_text_async(
             input_text=payload.input,
             instructions=payload.instructions,
             model=payload.model,
@@ -229,7 +278,7 @@ class IARascunhoDocumentoRequest(BaseModel):
 
 
 @router.post("/rascunho/documento", dependencies=[Depends(exigir_minimo_perfil("operador"))])
-def ia_rascunho_documento(
+async def ia_rascunho_documento(
     payload: IARascunhoDocumentoRequest,
     usuario: Usuario = Depends(get_current_user),
 ):
@@ -276,7 +325,7 @@ def ia_rascunho_documento(
     warnings: list[str] = []
 
     try:
-        res = generate_text(
+        res = await generate_text_async(
             input_text=prompt,
             instructions=instr,
             model=payload.model,
@@ -375,7 +424,7 @@ class IARascunhoEncaminhamentoRequest(BaseModel):
 
 
 @router.post("/rascunho/encaminhamento", dependencies=[Depends(exigir_minimo_perfil("operador"))])
-def ia_rascunho_encaminhamento(
+async def ia_rascunho_encaminhamento(
     payload: IARascunhoEncaminhamentoRequest,
     session=Depends(get_session),
     usuario: Usuario = Depends(get_current_user),
@@ -385,22 +434,10 @@ def ia_rascunho_encaminhamento(
     Retorna `documento_payload` pronto para enviar em /documentos/gerar.
     """
 
-    # imports locais (não quebram a inclusão do router se algo faltar)
-    from sqlmodel import select
-    from app.models.cras_encaminhamento import CrasEncaminhamento, CrasEncaminhamentoEvento
-
-    enc = session.get(CrasEncaminhamento, payload.encaminhamento_id)
-    if not enc:
-        raise HTTPException(status_code=404, detail="Encaminhamento não encontrado")
-
-    if pode_acesso_global(usuario):
-        mid = int(payload.municipio_id or getattr(enc, "municipio_id", 0) or 0)
-        if not mid:
-            raise HTTPException(status_code=400, detail="municipio_id é obrigatório para acesso global")
-    else:
-        mid = int(getattr(usuario, "municipio_id", 0) or 0)
-        if not mid or int(getattr(enc, "municipio_id", 0) or 0) != mid:
-            raise HTTPException(status_code=403, detail="Sem permissão para esse município")
+    # DB no threadpool; a chamada de IA (lenta) fica no event loop sem prender worker
+    enc, mid, timeline_txt = await run_in_threadpool(
+        _carregar_encaminhamento, session, usuario, payload.encaminhamento_id, payload.municipio_id, 8
+    )
 
     modelo = _pick_modelo(payload.modelo, "oficio")
 
@@ -410,23 +447,6 @@ def ia_rascunho_encaminhamento(
 
     prazo_default = payload.prazo or f"{getattr(enc, 'prazo_devolutiva_dias', 7)} dias"
 
-    # timeline (últimos eventos)
-    eventos = session.exec(
-        select(CrasEncaminhamentoEvento)
-        .where(CrasEncaminhamentoEvento.encaminhamento_id == payload.encaminhamento_id)
-        .order_by(CrasEncaminhamentoEvento.em)
-    ).all()
-    eventos = list(eventos or [])
-    tl_lines = []
-    for ev in eventos[-8:]:
-        try:
-            dt = ev.em.strftime("%d/%m/%Y %H:%M") if getattr(ev, "em", None) else ""
-        except Exception:
-            dt = ""
-        det = _redact(getattr(ev, "detalhe", None))
-        tl_lines.append(f"- {dt} {getattr(ev, 'tipo', '')}: {det}".strip())
-    timeline_txt = "\n".join([l for l in tl_lines if l and l != "-"])
-
     motivo_original = _redact(getattr(enc, "motivo", None))
     obs_original = _redact(getattr(enc, "observacao_operacional", None))
     prefs = (payload.preferencias or "").strip()
@@ -458,7 +478,7 @@ def ia_rascunho_encaminhamento(
     )
 
     try:
-        res = generate_text(
+        res = await generate_text_async(
             input_text=prompt,
             instructions=instr,
             model=payload.model,
@@ -521,51 +541,22 @@ class IAResumoEncaminhamentoRequest(BaseModel):
 
 
 @router.post("/resumo/encaminhamento", dependencies=[Depends(exigir_minimo_perfil("operador"))])
-def ia_resumo_encaminhamento(
+async def ia_resumo_encaminhamento(
     payload: IAResumoEncaminhamentoRequest,
     session=Depends(get_session),
     usuario: Usuario = Depends(get_current_user),
 ):
     """Resumo do encaminhamento (gestão) sem dados pessoais."""
 
-    from sqlmodel import select
-    from app.models.cras_encaminhamento import CrasEncaminhamento, CrasEncaminhamentoEvento
-
-    enc = session.get(CrasEncaminhamento, payload.encaminhamento_id)
-    if not enc:
-        raise HTTPException(status_code=404, detail="Encaminhamento não encontrado")
-
-    if pode_acesso_global(usuario):
-        mid = int(payload.municipio_id or getattr(enc, "municipio_id", 0) or 0)
-        if not mid:
-            raise HTTPException(status_code=400, detail="municipio_id é obrigatório para acesso global")
-    else:
-        mid = int(getattr(usuario, "municipio_id", 0) or 0)
-        if not mid or int(getattr(enc, "municipio_id", 0) or 0) != mid:
-            raise HTTPException(status_code=403, detail="Sem permissão para esse município")
+    enc, mid, timeline_txt = await run_in_threadpool(
+        _carregar_encaminhamento, session, usuario, payload.encaminhamento_id, payload.municipio_id, 10
+    )
 
     destino_tipo = (getattr(enc, "destino_tipo", "") or "").strip()
     destino_nome = (getattr(enc, "destino_nome", "") or "").strip()
     status_atual = (getattr(enc, "status", "") or "").strip()
     prazo_ref = f"{getattr(enc, 'prazo_devolutiva_dias', 7)} dias"
 
-    eventos = session.exec(
-        select(CrasEncaminhamentoEvento)
-        .where(CrasEncaminhamentoEvento.encaminhamento_id == payload.encaminhamento_id)
-        .order_by(CrasEncaminhamentoEvento.em)
-    ).all()
-    eventos = list(eventos or [])
-
-    tl_lines = []
-    for ev in eventos[-10:]:
-        try:
-            dt = ev.em.strftime("%d/%m/%Y %H:%M") if getattr(ev, "em", None) else ""
-        except Exception:
-            dt = ""
-        det = _redact(getattr(ev, "detalhe", None))
-        tl_lines.append(f"- {dt} {getattr(ev, 'tipo', '')}: {det}".strip())
-    timeline_txt = "\n".join([l for l in tl_lines if l and l != "-"])
-
     tamanho = (payload.tamanho or "curto").strip().lower()
     if tamanho not in ("curto", "medio"):
         tamanho = "curto"
@@ -583,7 +574,7 @@ def ia_resumo_encaminhamento(
     )
 
     try:
-        res = generate_text(
+        res = await generate_text_async(
             input_text=prompt,
             instructions=instr,
             model=payload.model,
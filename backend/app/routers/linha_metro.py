@@ -7,6 +7,7 @@ from typing import Any, Dict, List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlmodel import Session, select
 
+from app.core import versoes
 from app.core.db import get_session
 from app.core.auth import get_current_user, pode_acesso_global, nivel_perfil
 from app.core.poprua_fluxo import (
@@ -20,7 +21,9 @@ from app.core.poprua_fluxo import (
 from app.models.usuario import Usuario
 from app.models.caso_pop_rua import CasoPopRua, CasoPopRuaEtapaHistorico
 from app.models.linha_metro_registro import CasoEtapaRegistro, CasoEtapaRegistroVinculo
+from app.services.arquivo import com_arquivo, obter
 from app.models.encaminhamentos import EncaminhamentoIntermunicipal
+from app.services.usuarios_diretorio import DiretorioUsuarios, get_diretorio_usuarios
 
 
 router = APIRouter(prefix="/casos", tags=["linha_metro"])
@@ -53,7 +56,7 @@ def _status_etapa(idx: int, idx_atual: int, caso_status: str) -> str:
     return "nao_iniciada"
 
 
-@router.get("/linha-metro/etapas")
+@router.get("/linha-metro/etapas", dependencies=[Depends(versoes.condicional(max_age=300))])
 def listar_etapas(
     usuario: Usuario = Depends(get_current_user),
 ):
@@ -76,10 +79,11 @@ def linha_metro_do_caso(
     caso_id: int,
     session: Session = Depends(get_session),
     usuario: Usuario = Depends(get_current_user),
+    diretorio: DiretorioUsuarios = Depends(get_diretorio_usuarios),
 ):
     _exigir_nivel(usuario, NIVEL_VER, acao="visualizar linha do metrô")
 
-    caso = session.get(CasoPopRua, caso_id)
+    caso = obter(session, CasoPopRua, caso_id)  # encerrado há tempo: vem do arquivo
     if not caso:
         raise HTTPException(status_code=404, detail="Caso não encontrado.")
 
@@ -101,28 +105,24 @@ def linha_metro_do_caso(
     # ---------------------------------------------
     # Registros auditáveis (B1.5)
     # ---------------------------------------------
+    R = com_arquivo(CasoEtapaRegistro)
     stmt_reg = (
-        select(CasoEtapaRegistro)
-        .where(CasoEtapaRegistro.caso_id == caso_id)
-        .order_by(CasoEtapaRegistro.data_hora.desc())
+        select(R)
+        .where(R.caso_id == caso_id)
+        .order_by(R.data_hora.desc())
     )
     registros = list(session.exec(stmt_reg).all())
 
-    # Mapa de usuários (id -> nome)
-    user_ids = {r.responsavel_usuario_id for r in registros}
-    user_map = {}
-    if user_ids:
-        for uid in user_ids:
-            u = session.get(Usuario, int(uid))
-            if u:
-                user_map[int(uid)] = getattr(u, "nome", None) or getattr(u, "email", None) or f"Usuário {uid}"
+    # Mapa de usuários (id -> nome), resolvido em lote
+    user_map = diretorio.resolve(r.responsavel_usuario_id for r in registros)
 
     # Vínculos por registro
     vinc_map = {}
     if registros:
         reg_ids = [r.id for r in registros if r.id]
         if reg_ids:
-            stmt_v = select(CasoEtapaRegistroVinculo).where(CasoEtapaRegistroVinculo.registro_id.in_(reg_ids))
+            V = com_arquivo(CasoEtapaRegistroVinculo)
+            stmt_v = select(V).where(V.registro_id.in_(reg_ids))
             vincs = list(session.exec(stmt_v).all())
             for v in vincs:
                 vinc_map.setdefault(int(v.registro_id), []).append(v)
@@ -4,7 +4,9 @@ from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from sqlmodel import Session, select
 
+from app.core import versoes
 from app.core.db import get_session
+from app.core.db_async import LeituraAssincrona, get_leitura
 from app.models.municipio import Municipio
 
 
@@ -40,24 +42,27 @@ def criar_municipio(
     return municipio
 
 
-@router.get("/", response_model=List[Municipio])
-def listar_municipios(session: Session = Depends(get_session)):
+@router.get("/", response_model=List[Municipio], dependencies=[Depends(versoes.condicional("municipio", publico=True))])
+async def listar_municipios(leitura: LeituraAssincrona = Depends(get_leitura)):
     """
     Lista todos os municípios.
+
+    Chamada por quase toda tela: leitura assíncrona (app/core/db_async.py),
+    fora do threadpool das rotas síncronas.
     """
     stmt = select(Municipio).order_by(Municipio.nome)
-    return list(session.exec(stmt))
+    return await leitura.todos(stmt)
 
 
-@router.get("/{municipio_id}", response_model=Municipio)
-def obter_municipio(
+@router.get("/{municipio_id}", response_model=Municipio, dependencies=[Depends(versoes.condicional("municipio", publico=True))])
+async def obter_municipio(
     municipio_id: int,
-    session: Session = Depends(get_session),
+    leitura: LeituraAssincrona = Depends(get_leitura),
 ):
     """
     Busca um município pelo ID.
     """
-    municipio = session.get(Municipio, municipio_id)
+    municipio = await leitura.obter(Municipio, municipio_id)
     if not municipio:
         raise HTTPException(status_code=404, detail="Município não encontrado")
     return municipio
\ No newline at end of file
@@ -10,6 +10,7 @@ from app.core.auth import get_current_user
 from app.models.usuario import Usuario
 from app.models.municipio import Municipio
 from app.models.pessoa import PessoaRua, PessoaRuaBase
+from app.services.arquivo import com_arquivo
 
 try:
     from app.models.caso_pop_rua import CasoPopRua  # type: ignore
@@ -156,7 +157,9 @@ def _stmt_pessoas_visiveis_para_usuario(session: Session, usuario: Usuario):
     condicoes = [PessoaRua.municipio_origem_id == user_mun]
 
     if CasoPopRua is not None and hasattr(CasoPopRua, "municipio_id"):
-        sub_casos = select(CasoPopRua.pessoa_id).where(CasoPopRua.municipio_id == user_mun)
+        # inclui casos encerrados arquivados: a pessoa continua visível ao município
+        C = com_arquivo(CasoPopRua)
+        sub_casos = select(C.pessoa_id).where(C.municipio_id == user_mun)
         condicoes.append(PessoaRua.id.in_(sub_casos))
 
     if Atendimento is not None and hasattr(Atendimento, "municipio_id"):
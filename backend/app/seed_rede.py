@@ -9,6 +9,7 @@ from app.core.db import engine, init_db
 from app.models.cras_encaminhamento import CrasEncaminhamento, CrasEncaminhamentoEvento
 from app.models.cras_unidade import CrasUnidade
 from app.models.encaminhamentos import EncaminhamentoEvento, EncaminhamentoIntermunicipal
+from app.services.rede_metricas import invalidar as invalidar_rede_metricas
 
 
 def seed_rede(municipio_id: int = 1) -> None:
@@ -177,6 +178,10 @@ def seed_rede(municipio_id: int = 1) -> None:
             session.commit()
             print(f"Criados encaminhamentos intermunicipais: ids={i1.id},{i2.id}")
 
+        # gravados direto: agregados da /gestao/rede/metricas recalculam na próxima leitura
+        invalidar_rede_metricas(session)
+        session.commit()
+
     print("Seed Rede finalizado.")
 
 
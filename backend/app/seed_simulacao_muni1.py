@@ -90,18 +90,23 @@ def _sla_start_for(rng: random.Random, sla_dias: int) -> Tuple[datetime, bool, b
     return now - timedelta(days=delta), False, False
 
 
-def main() -> None:
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
     ap = argparse.ArgumentParser(description="Seed de simulação (Município 1)")
     ap.add_argument("--municipio-id", type=int, default=1)
     ap.add_argument("--users-per-module", type=int, default=100)
     ap.add_argument("--cases-cras", type=int, default=200)
     ap.add_argument("--cases-creas", type=int, default=200)
     ap.add_argument("--cases-poprua", type=int, default=200)
+    ap.add_argument("--enc-cras", type=int, default=40)
+    ap.add_argument("--enc-inter", type=int, default=30)
     ap.add_argument("--seed", type=int, default=42)
     ap.add_argument("--senha", type=str, default="demo123")
     ap.add_argument("--reset-db", action="store_true", help="Se DB for sqlite file, apaga o arquivo antes de criar.")
-    args = ap.parse_args()
+    return ap.parse_args(argv)
+
 
+def executar(args: argparse.Namespace) -> None:
+    """Roda o seed com os argumentos já resolvidos (usado também por scripts/benchmark_carga.py)."""
     rng = random.Random(args.seed)
 
     # DB URL (se não vier de fora, usa poprua_sim.db)
@@ -132,7 +137,9 @@ def main() -> None:
     from app.models.cras_pia import CrasPiaPlano, CrasPiaAcao  # type: ignore
     from app.models.cadunico_precadastro import CadunicoPreCadastro  # type: ignore
     from app.models.cras_tarefas import CrasTarefa  # type: ignore
+    from app.services.cras_tarefas_contadores import invalidar as invalidar_contadores_tarefas  # type: ignore
     from app.models.cras_encaminhamento import CrasEncaminhamento  # type: ignore
+    from app.services.rede_metricas import invalidar as invalidar_rede_metricas  # type: ignore
 
     from app.models.creas_caso import CreasCaso, CreasCasoHistorico  # type: ignore
 
@@ -205,7 +212,8 @@ def main() -> None:
                     if len(users) >= target:
                         break
                     idx = len(users) + 1
-                    email = f"sim_{mod}_{perfil}_{idx:03d}@sim.local"
+                    # município 1 mantém os e-mails originais; demais ganham prefixo próprio
+                    email = f"sim_{mod}_{perfil}_{idx:03d}@sim.local" if mid == 1 else f"sim_m{mid}_{mod}_{perfil}_{idx:03d}@sim.local"
                     nome = f"Sim {mod.upper()} {perfil.title()} {idx:03d}"
                     exists = session.exec(select(Usuario).where(Usuario.email == email)).first()
                     if exists:
@@ -231,7 +239,7 @@ def main() -> None:
 
         # cria também 1 "financeiro" e 1 "beneficios" (gestão interna) para testar
         for perfil in ["financeiro", "beneficios"]:
-            email = f"sim_gestao_{perfil}@sim.local"
+            email = f"sim_gestao_{perfil}@sim.local" if mid == 1 else f"sim_m{mid}_gestao_{perfil}@sim.local"
             ex = session.exec(select(Usuario).where(Usuario.email == email)).first()
             if not ex:
                 u = Usuario(
@@ -258,8 +266,8 @@ def main() -> None:
                 for u in (users_cras + users_creas + users_poprua)
             ]
             + [
-                {"email": "sim_gestao_financeiro@sim.local", "perfil": "financeiro", "nome": "Sim Gestão Financeiro", "municipio_id": mid},
-                {"email": "sim_gestao_beneficios@sim.local", "perfil": "beneficios", "nome": "Sim Gestão Beneficios", "municipio_id": mid},
+                {"email": (f"sim_gestao_{perfil}@sim.local" if mid == 1 else f"sim_m{mid}_gestao_{perfil}@sim.local"), "perfil": perfil, "nome": f"Sim Gestão {perfil.title()}", "municipio_id": mid}
+                for perfil in ("financeiro", "beneficios")
             ],
         }
         with open(cred_path, "w", encoding="utf-8") as f:
@@ -430,6 +438,10 @@ def main() -> None:
         session.commit()
         print(f"[SIM] CRAS: {args.cases_cras} casos criados.")
 
+        # tarefas gravadas direto: contadores do /cras/tarefas/resumo recalculam na próxima leitura
+        invalidar_contadores_tarefas(session, mid)
+        session.commit()
+
         # -------------------
         # CREAS: casos
         # -------------------
@@ -567,7 +579,7 @@ def main() -> None:
         # -------------------
         # Rede: Encaminhamentos CRAS (com devolutiva faltando)
         # -------------------
-        for _ in range(40):
+        for _ in range(args.enc_cras):
             unidade_id = rng.choice(cras_unit_ids)
             session.add(
                 CrasEncaminhamento(
@@ -587,13 +599,13 @@ def main() -> None:
             )
 
         session.commit()
-        print("[SIM] Rede: 40 encaminhamentos CRAS criados.")
+        print(f"[SIM] Rede: {args.enc_cras} encaminhamentos CRAS criados.")
 
         # -------------------
-        # Rede intermunicipal (origem município 1)
+        # Rede intermunicipal (origem = município alvo)
         # -------------------
-        destinos = [2, 3, 4]  # ids já existem pelo seed_municipios
-        for _ in range(30):
+        destinos = [d for d in (1, 2, 3, 4) if d != mid][:3]  # ids já existem pelo seed_municipios
+        for _ in range(args.enc_inter):
             pessoa = rng.choice(poprua_pessoas)
             st = rng.choice(["solicitado", "solicitado", "contato", "aceito", "agendado", "passagem"])
             criado = datetime.utcnow() - timedelta(days=rng.randint(3, 50))
@@ -626,8 +638,10 @@ def main() -> None:
                 )
             )
 
+        # encaminhamentos gravados direto: agregados da /gestao/rede/metricas recalculam na próxima leitura
+        invalidar_rede_metricas(session)
         session.commit()
-        print("[SIM] Rede: 30 intermunicipais criados.")
+        print(f"[SIM] Rede: {args.enc_inter} intermunicipais criados.")
 
         # -------------------
         # OSC + prestação de contas
@@ -695,5 +709,9 @@ def main() -> None:
     print("[SIM] Finalizado.")
 
 
+def main() -> None:
+    executar(parse_args())
+
+
 if __name__ == "__main__":
     main()
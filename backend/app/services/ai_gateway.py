@@ -0,0 +1,260 @@
+# app/services/ai_gateway.py
+"""
+Gateway assíncrono de IA para as rotas /ia.
+
+Chamadas de LLM são lentas (segundos). Nas rotas sync elas prendiam um worker
+do threadpool durante toda a chamada — poucas chamadas simultâneas travavam
+telas do CRAS que nada tinham a ver com IA. Aqui:
+
+- pool de conexões HTTP (httpx.AsyncClient) reaproveitado entre chamadas
+- a vaga "ia" (app/core/concorrencia.py) limita quantas chamadas ao provedor
+  rodam ao mesmo tempo; a espera e as recusas aparecem em /admin/perf
+- coalescência: prompts idênticos em voo aguardam a MESMA chamada
+- cache por hash do conteúdo (provider+modelo+instruções+prompt) com TTL
+- providers plugáveis: "openai" (padrão) e "local" (determinístico, sem rede)
+
+Config (env):
+- POPRUA_AI_PROVIDER           openai | local | <registrado>
+- POPRUA_VAGAS_IA              chamadas simultâneas ao provedor (padrão 4; aceita
+                               também o antigo POPRUA_AI_MAX_CONCORRENCIA)
+- POPRUA_AI_CACHE_TTL_S        TTL do cache de respostas (padrão 600; 0 desliga)
+- POPRUA_AI_TIMEOUT_S          timeout por chamada HTTP (padrão 40)
+
+Testes podem registrar um provider próprio:
+    registrar_provider("fake", MeuProvider())
+    os.environ["POPRUA_AI_PROVIDER"] = "fake"
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import weakref
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Protocol
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core import concorrencia
+from app.core.cache import TTLCache
+from app.services.ai_service import (
+    AIError,
+    AIResult,
+    _auditar,
+    _env,
+    local_generate,
+    openai_responses_generate,
+    openai_responses_generate_async,
+)
+
+
+async def _auditar_async(res: AIResult, input_text: str, user_id: Optional[int], municipio_id: Optional[int], cache_hit: bool = False) -> None:
+    """`_auditar` (append em arquivo) no threadpool: não bloqueia o event loop."""
+    await run_in_threadpool(_auditar, res, input_text, user_id, municipio_id, cache_hit)
+
+
+def _httpx() -> Any:
+    """`httpx` só quando o primeiro loop usa o gateway (não pesa no boot do worker)."""
+    try:
+        import httpx  # type: ignore
+    except Exception:  # pragma: no cover
+        return None
+    return httpx
+
+
+@dataclass(frozen=True)
+class AIRequest:
+    input_text: str
+    instructions: Optional[str] = None
+    model: Optional[str] = None
+    reasoning_effort: Optional[str] = None
+    return_raw: bool = False
+
+
+class AIProvider(Protocol):
+    nome: str
+
+    async def gerar(self, req: AIRequest, http: Any) -> AIResult: ...
+
+
+class OpenAIProvider:
+    nome = "openai"
+
+    async def gerar(self, req: AIRequest, http: Any) -> AIResult:
+        timeout_s = int(_env("POPRUA_AI_TIMEOUT_S", default="40") or 40)
+        if http is None:
+            # sem httpx: usa o cliente sync em thread (ainda limitado pelo semáforo)
+            return await run_in_threadpool(
+                openai_responses_generate,
+                input_text=req.input_text,
+                instructions=req.instructions,
+                model=req.model,
+                reasoning_effort=req.reasoning_effort,
+                timeout_s=timeout_s,
+                return_raw=req.return_raw,
+            )
+        return await openai_responses_generate_async(
+            http,
+            input_text=req.input_text,
+            instructions=req.instructions,
+            model=req.model,
+            reasoning_effort=req.reasoning_effort,
+            timeout_s=timeout_s,
+            return_raw=req.return_raw,
+        )
+
+
+class LocalProvider:
+    nome = "local"
+
+    async def gerar(self, req: AIRequest, http: Any) -> AIResult:
+        return local_generate(input_text=req.input_text, instructions=req.instructions, model=req.model)
+
+
+_PROVIDERS: Dict[str, AIProvider] = {
+    "openai": OpenAIProvider(),
+    "local": LocalProvider(),
+}
+
+
+def registrar_provider(nome: str, provider: AIProvider) -> None:
+    _PROVIDERS[(nome or "").strip().lower()] = provider
+
+
+def _provider_atual() -> AIProvider:
+    nome = _env("POPRUA_AI_PROVIDER", default="openai").lower().strip() or "openai"
+    p = _PROVIDERS.get(nome)
+    if p is None:
+        raise AIError(f"Provider não suportado: {nome}")
+    return p
+
+
+def _chave_conteudo(provider: str, req: AIRequest) -> str:
+    bruto = json.dumps(
+        [provider, req.model, req.reasoning_effort, req.instructions, req.input_text, req.return_raw],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(bruto.encode("utf-8")).hexdigest()
+
+
+class _EstadoLoop:
+    """Primitivas asyncio ficam presas ao event loop em que foram criadas."""
+
+    def __init__(self) -> None:
+        self.em_voo: Dict[str, "asyncio.Future[AIResult]"] = {}
+        self.http: Any = None
+
+
+class AIGateway:
+    def __init__(self) -> None:
+        self.vaga = concorrencia.VAGAS["ia"]
+        self.max_concorrencia = self.vaga.limite
+        self.cache = TTLCache(ttl_s=float(_env("POPRUA_AI_CACHE_TTL_S", default="600") or 600), max_itens=1000)
+        self._estados: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _EstadoLoop]" = weakref.WeakKeyDictionary()
+        self.stats: Dict[str, int] = {"chamadas": 0, "cache_hits": 0, "coalescidas": 0, "erros": 0}
+
+    def _estado(self) -> _EstadoLoop:
+        loop = asyncio.get_running_loop()
+        st = self._estados.get(loop)
+        if st is None:
+            st = _EstadoLoop()
+            httpx = _httpx()
+            if httpx is not None:
+                st.http = httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=self.max_concorrencia * 2,
+                        max_keepalive_connections=self.max_concorrencia,
+                    ),
+                )
+            self._estados[loop] = st
+        return st
+
+    async def gerar(
+        self,
+        req: AIRequest,
+        user_id: Optional[int] = None,
+        municipio_id: Optional[int] = None,
+    ) -> AIResult:
+        provider = _provider_atual()
+        chave = _chave_conteudo(provider.nome, req)
+
+        if self.cache.ttl_s > 0:
+            hit = self.cache.get(chave)
+            if isinstance(hit, AIResult):
+                self.stats["cache_hits"] += 1
+                await _auditar_async(hit, req.input_text, user_id, municipio_id, cache_hit=True)
+                return hit
+
+        st = self._estado()
+        fut = st.em_voo.get(chave)
+        if fut is not None:
+            self.stats["coalescidas"] += 1
+            res = await asyncio.shield(fut)
+            await _auditar_async(res, req.input_text, user_id, municipio_id, cache_hit=True)
+            return res
+
+        task = asyncio.ensure_future(self._executar(provider, req, st))
+        st.em_voo[chave] = task
+        task.add_done_callback(lambda _t: st.em_voo.pop(chave, None))
+
+        # shield: se este request for cancelado, a chamada continua para os demais
+        res = await asyncio.shield(task)
+        if self.cache.ttl_s > 0:
+            self.cache.set(chave, res)
+        await _auditar_async(res, req.input_text, user_id, municipio_id)
+        return res
+
+    async def _executar(self, provider: AIProvider, req: AIRequest, st: _EstadoLoop) -> AIResult:
+        async with self.vaga.ocupar():
+            self.stats["chamadas"] += 1
+            try:
+                return await provider.gerar(req, st.http)
+            except AIError:
+                self.stats["erros"] += 1
+                raise
+            except Exception as e:
+                self.stats["erros"] += 1
+                raise AIError(str(e)) from e
+
+    def resumo(self) -> Dict[str, Any]:
+        em_voo = sum(len(st.em_voo) for st in list(self._estados.values()))
+        return {
+            "max_concorrencia": self.max_concorrencia,
+            "cache_ttl_s": self.cache.ttl_s,
+            "cache_itens": len(self.cache),
+            "em_voo": em_voo,
+            **self.stats,
+        }
+
+    async def fechar(self) -> None:
+        try:
+            st = self._estados.get(asyncio.get_running_loop())
+        except RuntimeError:
+            st = None
+        if st is not None and st.http is not None:
+            await st.http.aclose()
+            st.http = None
+
+
+gateway = AIGateway()
+
+
+async def generate_text_async(
+    input_text: str,
+    instructions: Optional[str] = None,
+    model: Optional[str] = None,
+    reasoning_effort: Optional[str] = None,
+    user_id: Optional[int] = None,
+    municipio_id: Optional[int] = None,
+    return_raw: bool = False,
+) -> AIResult:
+    """Equivalente assíncrono de `ai_service.generate_text` (com pool/cache/coalescência)."""
+    req = AIRequest(
+        input_text=input_text,
+        instructions=instructions,
+        model=model,
+        reasoning_effort=reasoning_effort,
+        return_raw=return_raw,
+    )
+    return await gateway.gerar(req, user_id=user_id, municipio_id=municipio_id)
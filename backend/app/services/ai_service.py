@@ -8,10 +8,14 @@ from dataclasses import dataclass
 from datetime import datetime, timezone
 from typing import Any, Dict, Optional, Tuple
 
-try:
-    import requests  # type: ignore
-except Exception:  # pragma: no cover
-    requests = None  # type: ignore
+
+def _requests() -> Any:
+    """`requests` só na primeira chamada real à IA (não pesa no boot do worker)."""
+    try:
+        import requests  # type: ignore
+    except Exception:  # pragma: no cover
+        return None
+    return requests
 
 
 @dataclass
@@ -108,21 +112,8 @@ def _extract_output_text(resp: Dict[str, Any]) -> str:
     return "\n".join([t for t in texts if t]).strip()
 
 
-def openai_responses_generate(
-    input_text: str,
-    instructions: Optional[str] = None,
-    model: Optional[str] = None,
-    reasoning_effort: Optional[str] = None,
-    timeout_s: int = 40,
-    return_raw: bool = False,
-) -> AIResult:
-    """Gera texto usando o OpenAI Responses API.
-
-    Requer `OPENAI_API_KEY` (ou `POPRUA_OPENAI_API_KEY`) no ambiente.
-    """
-    if requests is None:
-        raise AIError("Dependência 'requests' não disponível no ambiente.")
-
+def _chaves_candidatas() -> list[tuple[str, str]]:
+    """Chaves a tentar, em ordem: (variável de origem, chave)."""
     api_key_poprua = _env("POPRUA_OPENAI_API_KEY")
     api_key_openai = _env("OPENAI_API_KEY")
 
@@ -143,7 +134,16 @@ def openai_responses_generate(
 
     if not candidates:
         raise AIError("OPENAI_API_KEY não configurado (use OPENAI_API_KEY ou POPRUA_OPENAI_API_KEY).")
+    return candidates
+
 
+def _montar_requisicao(
+    input_text: str,
+    instructions: Optional[str],
+    model: Optional[str],
+    reasoning_effort: Optional[str],
+) -> Tuple[str, str, Dict[str, Any]]:
+    """Retorna (url, modelo, body) do Responses API."""
     base_url = _env("POPRUA_OPENAI_BASE_URL", default="https://api.openai.com/v1").rstrip("/")
     model_name = model or _env("POPRUA_OPENAI_MODEL", default="gpt-5.2")
     effort = reasoning_effort or _env("POPRUA_OPENAI_REASONING_EFFORT", default="")
@@ -154,7 +154,41 @@ def openai_responses_generate(
     if effort:
         body["reasoning"] = {"effort": effort}
 
-    url = f"{base_url}/responses"
+    return f"{base_url}/responses", model_name, body
+
+
+def _erro_da_resposta(status_code: int, text: str, parse_json) -> Tuple[Any, str]:
+    """Decodifica o corpo (JSON ou texto) e extrai a mensagem de erro, se houver."""
+    try:
+        data = parse_json()
+    except Exception:
+        data = {"error": {"message": text, "status_code": status_code}}
+
+    if isinstance(data, dict):
+        msg = (data.get("error") or {}).get("message") or data.get("message") or text
+    else:
+        msg = text
+    return data, msg
+
+
+def openai_responses_generate(
+    input_text: str,
+    instructions: Optional[str] = None,
+    model: Optional[str] = None,
+    reasoning_effort: Optional[str] = None,
+    timeout_s: int = 40,
+    return_raw: bool = False,
+) -> AIResult:
+    """Gera texto usando o OpenAI Responses API.
+
+    Requer `OPENAI_API_KEY` (ou `POPRUA_OPENAI_API_KEY`) no ambiente.
+    """
+    requests = _requests()
+    if requests is None:
+        raise AIError("Dependência 'requests' não disponível no ambiente.")
+
+    candidates = _chaves_candidatas()
+    url, model_name, body = _montar_requisicao(input_text, instructions, model, reasoning_effort)
 
     used_key_source = None
     last_401_msg = None
@@ -174,16 +208,7 @@ def openai_responses_generate(
             )
             dt_ms = int((time.time() - t0) * 1000)
 
-            try:
-                data = r.json()
-            except Exception:
-                data = {"error": {"message": r.text, "status_code": r.status_code}}
-
-            msg = ""
-            if isinstance(data, dict):
-                msg = (data.get("error") or {}).get("message") or data.get("message") or r.text
-            else:
-                msg = r.text
+            data, msg = _erro_da_resposta(r.status_code, r.text, r.json)
 
             # Retry sem reasoning se o modelo não suporta (ex.: gpt-4)
             if (
@@ -227,6 +252,123 @@ def openai_responses_generate(
     )
 
 
+async def openai_responses_generate_async(
+    http: Any,
+    input_text: str,
+    instructions: Optional[str] = None,
+    model: Optional[str] = None,
+    reasoning_effort: Optional[str] = None,
+    timeout_s: int = 40,
+    return_raw: bool = False,
+) -> AIResult:
+    """Versão assíncrona de `openai_responses_generate` (mesmas regras de chave/retry).
+
+    `http` é um `httpx.AsyncClient` compartilhado (pool de conexões), gerido pelo gateway.
+    """
+    candidates = _chaves_candidatas()
+    url, model_name, body = _montar_requisicao(input_text, instructions, model, reasoning_effort)
+
+    used_key_source = None
+    last_401_msg = None
+    data: Any = None
+
+    for key_source, api_key in candidates:
+        retried_without_reasoning = False
+
+        while True:
+            r = await http.post(
+                url,
+                headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
+                json=body,
+                timeout=timeout_s,
+            )
+            data, msg = _erro_da_resposta(r.status_code, r.text, r.json)
+
+            if (
+                r.status_code == 400
+                and (not retried_without_reasoning)
+                and body.get("reasoning") is not None
+                and _should_retry_without_reasoning_param(msg)
+            ):
+                body.pop("reasoning", None)
+                retried_without_reasoning = True
+                continue
+
+            if r.status_code == 401 and len(candidates) > 1:
+                last_401_msg = msg
+                break
+
+            if r.status_code >= 400:
+                raise AIError(f"OpenAI error ({r.status_code}): {msg}")
+
+            used_key_source = key_source
+            break
+
+        if used_key_source:
+            break
+    else:
+        raise AIError(f"OpenAI error (401): {last_401_msg or 'Incorrect API key provided.'}")
+
+    if return_raw and isinstance(data, dict) and used_key_source:
+        data["_key_source"] = used_key_source
+
+    text = _extract_output_text(data) if isinstance(data, dict) else ""
+    return AIResult(
+        text=text,
+        raw=data if (return_raw and isinstance(data, dict)) else None,
+        provider="openai",
+        model=model_name,
+    )
+
+
+def local_generate(
+    input_text: str,
+    instructions: Optional[str] = None,
+    model: Optional[str] = None,
+) -> AIResult:
+    """Provider local determinístico (sem rede) — para testes, DEV e demonstrações.
+
+    Ative com POPRUA_AI_PROVIDER=local. Se o prompt pede JSON, devolve "{}" (as rotas
+    preenchem placeholders); caso contrário, devolve tópicos curtos a partir do prompt.
+    """
+    pede_json = "json" in f"{instructions or ''} {input_text}".lower()
+    if pede_json:
+        text = "{}"
+    else:
+        linhas = [l.strip() for l in (input_text or "").splitlines() if l.strip()]
+        text = "\n".join(f"- {l[:160]}" for l in linhas[:6])
+    return AIResult(text=text, raw=None, provider="local", model=model or "local")
+
+
+def _auditar(
+    res: AIResult,
+    input_text: str,
+    user_id: Optional[int],
+    municipio_id: Optional[int],
+    cache_hit: bool = False,
+) -> None:
+    """Auditoria: hashes e metadados (nunca o conteúdo)."""
+    try:
+        inp_hash = hashlib.sha256(input_text.encode("utf-8")).hexdigest()
+        out_hash = hashlib.sha256((res.text or "").encode("utf-8")).hexdigest()
+        event: Dict[str, Any] = {
+            "ts": datetime.now(timezone.utc).isoformat(),
+            "provider": res.provider,
+            "model": res.model,
+            "municipio_id": municipio_id,
+            "user_id": user_id,
+            "input_len": len(input_text),
+            "output_len": len(res.text or ""),
+            "input_sha256": inp_hash,
+            "output_sha256": out_hash,
+        }
+        if cache_hit:
+            event["cache_hit"] = True
+        _audit_log(event)
+    except Exception:
+        pass
+
+
 def generate_text(
     input_text: str,
     instructions: Optional[str] = None,
@@ -245,27 +387,10 @@ def generate_text(
             reasoning_effort=reasoning_effort,
             return_raw=return_raw,
         )
+    elif provider == "local":
+        res = local_generate(input_text=input_text, instructions=instructions, model=model)
     else:
         raise AIError(f"Provider não suportado: {provider}")
 
-    # auditoria: hashes e metadados
-    try:
-        inp_hash = hashlib.sha256(input_text.encode("utf-8")).hexdigest()
-        out_hash = hashlib.sha256((res.text or "").encode("utf-8")).hexdigest()
-        _audit_log(
-            {
-                "ts": datetime.now(timezone.utc).isoformat(),
-                "provider": res.provider,
-                "model": res.model,
-                "municipio_id": municipio_id,
-                "user_id": user_id,
-                "input_len": len(input_text),
-                "output_len": len(res.text or ""),
-                "input_sha256": inp_hash,
-                "output_sha256": out_hash,
-            }
-        )
-    except Exception:
-        pass
-
+    _auditar(res, input_text, user_id, municipio_id)
     return res
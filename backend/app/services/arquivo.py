@@ -0,0 +1,483 @@
+# app/services/arquivo.py
+"""
+Arquivamento de casos encerrados e eventos antigos (tabelas arq_*).
+
+Casos encerrados e eventos de anos atrás ficavam para sempre nas tabelas
+quentes: filtrados na consulta (status/ativo), mas pesando em todo índice e
+varredura. Aqui eles vão para tabelas de arquivo no mesmo banco (arq_<tabela>,
+app/models/arquivo.py), com o mesmo id:
+
+- grupo = raiz + dependentes que andam juntos (caso + histórico + registros da
+  linha do metrô e seus vínculos); move em lotes, uma transação por lote
+  (INSERT ... SELECT no arquivo, DELETE na quente)
+- não arquiva a raiz que ainda é referenciada (FK) por tabela fora do grupo
+  (PIA, protocolo, saúde, triagem...): continua quente, entra na contagem
+  `retidos`
+- nunca move a linha de maior id de cada tabela: no SQLite o próximo id é
+  max(id)+1, e o id arquivado seria reutilizado
+- leituras de histórico (ficha, prontuário, caso por id, linha do metrô, RMA)
+  usam `com_arquivo(Model)` / `obter(...)`: UNION ALL quente + arquivo, mesmo
+  resultado de antes; escrita continua só na quente (caso arquivado é leitura).
+  Também leem a união: listas de casos que podem trazer encerrados, série e
+  cruzamentos do CRAS, overview do CREAS, dashboard e a visibilidade municipal
+  de pessoas (caso arquivado continua vinculando a pessoa ao município). Só
+  dispensa o arquivo a leitura restrita a casos abertos (fila, automações)
+
+Como rodar:
+- python scripts/arquivar.py [--simular] [--grupo caso_cras ...]
+- agendado: POPRUA_ARQUIVO=1 com o agendador (POPRUA_AGENDADOR=1 ou
+  scripts/worker_automacoes.py); roda uma vez por dia, com lease no banco
+
+Config (env):
+  POPRUA_ARQUIVO=1                   liga o arquivamento agendado (padrão: desligado)
+  POPRUA_ARQUIVO_DIAS=365            casos encerrados há mais que isso
+  POPRUA_ARQUIVO_DIAS_EVENTOS=730    eventos (RMA, ficha) mais antigos que isso
+  POPRUA_ARQUIVO_LOTE=500            raízes por transação
+  POPRUA_ARQUIVO_HORA=3              hora (UTC) da execução diária
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import and_, delete, func, insert, literal, or_, select, union_all
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import aliased
+from sqlmodel import SQLModel
+
+from app.models.arquivo import ARQUIVO, PREFIXO
+from app.models.caso_cras import CasoCras, CasoCrasHistorico
+from app.models.caso_pop_rua import CasoPopRua, CasoPopRuaEtapaHistorico
+from app.models.creas_caso import CreasCaso, CreasCasoHistorico
+from app.models.ficha_evento import FichaEvento
+from app.models.linha_metro_registro import CasoEtapaRegistro, CasoEtapaRegistroVinculo
+from app.models.rma_evento import RmaEvento
+
+ESCOPO_AGENDA = "sistema"
+REGRA_AGENDA = 1  # automacao_agenda (escopo "sistema"): arquivamento diário
+
+
+def _cfg_int(nome: str, padrao: int) -> int:
+    try:
+        return int(str(os.getenv(nome, "")).strip() or padrao)
+    except Exception:
+        return padrao
+
+
+def habilitado() -> bool:
+    return str(os.getenv("POPRUA_ARQUIVO", "")).strip().lower() in ("1", "true", "yes", "on")
+
+
+# ============================
+# Grupos
+# ============================
+@dataclass(frozen=True)
+class Dependente:
+    modelo: Any
+    fk: str  # coluna que aponta para o pai
+    pai: Any = None  # None = raiz do grupo
+
+
+@dataclass(frozen=True)
+class Grupo:
+    nome: str
+    raiz: Any
+    elegivel: Callable[[datetime], Any]  # condição sobre a raiz (corte = agora - dias)
+    dependentes: Tuple[Dependente, ...] = ()
+    env_dias: str = "POPRUA_ARQUIVO_DIAS"
+    dias_padrao: int = 365
+
+    def dias(self) -> int:
+        return max(1, _cfg_int(self.env_dias, self.dias_padrao))
+
+    def modelos(self) -> List[Any]:
+        return [self.raiz] + [d.modelo for d in self.dependentes]
+
+
+GRUPOS: Dict[str, Grupo] = {
+    g.nome: g
+    for g in (
+        Grupo(
+            "casopoprua",
+            CasoPopRua,
+            lambda corte: and_(
+                or_(CasoPopRua.status == "encerrado", CasoPopRua.ativo == False),  # noqa: E712
+                func.coalesce(CasoPopRua.data_encerramento, CasoPopRua.data_ultima_atualizacao) < corte,
+            ),
+            (
+                Dependente(CasoPopRuaEtapaHistorico, "caso_id"),
+                Dependente(CasoEtapaRegistro, "caso_id"),
+                Dependente(CasoEtapaRegistroVinculo, "registro_id", CasoEtapaRegistro),
+            ),
+        ),
+        Grupo(
+            "caso_cras",
+            CasoCras,
+            lambda corte: and_(
+                CasoCras.status == "encerrado",
+                func.coalesce(CasoCras.data_encerramento, CasoCras.atualizado_em) < corte,
+            ),
+            (Dependente(CasoCrasHistorico, "caso_id"),),
+        ),
+        Grupo(
+            "creas_caso",
+            CreasCaso,
+            lambda corte: and_(
+                CreasCaso.status == "encerrado",
+                func.coalesce(CreasCaso.data_encerramento, CreasCaso.atualizado_em) < corte,
+            ),
+            (Dependente(CreasCasoHistorico, "caso_id"),),
+        ),
+        Grupo(
+            "rma_evento",
+            RmaEvento,
+            lambda corte: RmaEvento.data_evento < corte.date(),
+            env_dias="POPRUA_ARQUIVO_DIAS_EVENTOS",
+            dias_padrao=730,
+        ),
+        Grupo(
+            "ficha_evento",
+            FichaEvento,
+            lambda corte: FichaEvento.criado_em < corte,
+            env_dias="POPRUA_ARQUIVO_DIAS_EVENTOS",
+            dias_padrao=730,
+        ),
+    )
+}
+
+
+def _tabela(modelo: Any) -> Any:
+    return modelo.__table__
+
+
+def _referencias_externas(grupo: Grupo) -> Dict[str, List[Tuple[Any, Any]]]:
+    """{tabela do grupo: [(tabela externa, coluna fk)]} a partir das FKs do metadata."""
+    from app.core import db
+
+    if not db._models_importados:  # boot rápido não importa todos os models
+        db._importar_models()
+    nomes = {_tabela(m).name for m in grupo.modelos()}
+    out: Dict[str, List[Tuple[Any, Any]]] = {n: [] for n in nomes}
+    for t in SQLModel.metadata.tables.values():
+        if t.name in nomes or t.name.startswith(PREFIXO):
+            continue
+        for fk in t.foreign_keys:
+            alvo = fk.column.table.name
+            if alvo in out:
+                out[alvo].append((t, fk.parent))
+    return out
+
+
+# ============================
+# Colunas do arquivo
+# ============================
+def sincronizar_colunas(conn: Connection) -> List[str]:
+    """ADD COLUMN no arq_* para colunas novas da tabela quente (migração que
+    esqueceu o arquivo). Chamado no init_db (esquema mudou) e antes de arquivar."""
+    from app.core.migracoes import adicionar_colunas, colunas
+
+    feitas: List[str] = []
+    for origem, arq in ARQUIVO.items():
+        existentes = colunas(conn, arq.name)
+        if not existentes:
+            continue
+        faltam = {c.name: c.type.compile(dialect=conn.dialect) for c in arq.columns if c.name not in existentes}
+        for nome in adicionar_colunas(conn, arq.name, faltam):
+            feitas.append(f"{arq.name}.{nome}")
+    return feitas
+
+
+# ============================
+# Leitura transparente
+# ============================
+_ENTIDADES: Dict[Any, Any] = {}
+_UNIOES: Dict[str, Any] = {}
+
+
+def tabela_com_arquivo(t: Any) -> Any:
+    """FROM (Core) com as linhas quentes + arquivadas de `t`; mesmas colunas.
+    Tabela sem arquivo volta como está (ex.: exportação de BI)."""
+    arq = ARQUIVO.get(t.name)
+    if arq is None:
+        return t
+    todos = _UNIOES.get(t.name)
+    if todos is None:
+        todos = union_all(select(*t.c), select(*[arq.c[c.name] for c in t.c])).subquery(f"{t.name}_todos")
+        _UNIOES[t.name] = todos
+    return todos
+
+
+def com_arquivo(modelo: Any) -> Any:
+    """Entidade para select(): linhas quentes + arquivadas (UNION ALL).
+
+        H = arquivo.com_arquivo(CasoCrasHistorico)
+        session.exec(select(H).where(H.caso_id == caso_id)).all()
+
+    Devolve instâncias do próprio model. Só leitura.
+    """
+    ent = _ENTIDADES.get(modelo)
+    if ent is None:
+        ent = aliased(modelo, tabela_com_arquivo(_tabela(modelo)))
+        _ENTIDADES[modelo] = ent
+    return ent
+
+
+def obter(session: Any, modelo: Any, id_: int) -> Any:
+    """session.get(modelo, id) e, se não estiver na quente, no arquivo."""
+    obj = session.get(modelo, id_)
+    if obj is not None:
+        return obj
+    t = _tabela(modelo)
+    a = aliased(modelo, ARQUIVO[t.name], adapt_on_names=True)
+    return session.execute(select(a).where(a.id == int(id_))).scalars().first()
+
+
+# ============================
+# Movimentação
+# ============================
+@dataclass
+class Resultado:
+    grupo: str
+    dias: int
+    corte: str
+    raizes: int = 0
+    linhas: Dict[str, int] = field(default_factory=dict)
+    retidos: int = 0
+    lotes: int = 0
+    segundos: float = 0.0
+    simular: bool = False
+
+    def como_dict(self) -> Dict[str, Any]:
+        return {
+            "grupo": self.grupo,
+            "dias": self.dias,
+            "corte": self.corte,
+            "raizes": self.raizes,
+            "linhas": self.linhas,
+            "retidos": self.retidos,
+            "lotes": self.lotes,
+            "segundos": round(self.segundos, 2),
+            "simular": self.simular,
+        }
+
+
+def _em_partes(ids: Sequence[int], n: int = 500) -> List[Sequence[int]]:
+    return [ids[i : i + n] for i in range(0, len(ids), n)]
+
+
+def _ids_por_fk(conn: Connection, tabela: Any, fk: str, pais: Sequence[int]) -> Dict[int, int]:
+    """{id do dependente: id do pai}."""
+    out: Dict[int, int] = {}
+    for parte in _em_partes(list(pais)):
+        for i, p in conn.execute(select(tabela.c.id, tabela.c[fk]).where(tabela.c[fk].in_(parte))):
+            out[int(i)] = int(p)
+    return out
+
+
+def _bloqueados(conn: Connection, grupo: Grupo, refs: Dict[str, List[Tuple[Any, Any]]], raizes: Sequence[int]) -> Tuple[Set[int], Dict[Any, Dict[int, int]]]:
+    """Raízes que não podem sair (referência externa ou maior id) + mapa dos dependentes
+    {modelo: {id: id da raiz}} das que podem."""
+    bloq: Set[int] = set()
+    donos: Dict[Any, Dict[int, int]] = {}
+
+    def _checar(tabela: Any, ids_raiz: Dict[int, int]) -> None:
+        if not ids_raiz:
+            return
+        maior = conn.execute(select(func.max(tabela.c.id))).scalar()
+        if maior is not None and int(maior) in ids_raiz:
+            bloq.add(ids_raiz[int(maior)])
+        for ext, col in refs.get(tabela.name, []):
+            for parte in _em_partes(list(ids_raiz)):
+                for (ref,) in conn.execute(select(col).where(col.in_(parte)).distinct()):
+                    bloq.add(ids_raiz[int(ref)])
+
+    raiz_t = _tabela(grupo.raiz)
+    _checar(raiz_t, {int(i): int(i) for i in raizes})
+    for dep in grupo.dependentes:
+        t = _tabela(dep.modelo)
+        if dep.pai is None:
+            mapa = _ids_por_fk(conn, t, dep.fk, raizes)
+        else:
+            pais = donos[dep.pai]
+            mapa = {i: pais[p] for i, p in _ids_por_fk(conn, t, dep.fk, list(pais)).items()}
+        donos[dep.modelo] = mapa
+        _checar(t, mapa)
+    return bloq, donos
+
+
+def _candidatas(conn: Connection, grupo: Grupo, corte: datetime, depois_de: int, lote: int) -> List[int]:
+    raiz = _tabela(grupo.raiz)
+    maior = select(func.max(raiz.c.id)).scalar_subquery()
+    stmt = (
+        select(raiz.c.id)
+        .where(grupo.elegivel(corte), raiz.c.id > depois_de, raiz.c.id < maior)
+        .order_by(raiz.c.id)
+        .limit(lote)
+    )
+    return [int(i) for (i,) in conn.execute(stmt)]
+
+
+def _mover(conn: Connection, modelo: Any, ids: Sequence[int], agora: datetime) -> int:
+    t = _tabela(modelo)
+    arq = ARQUIVO[t.name]
+    nomes = [c.name for c in t.c]
+    n = 0
+    for parte in _em_partes(list(ids)):
+        conn.execute(
+            insert(arq).from_select(
+                nomes + ["arquivado_em"],
+                select(*[t.c[c] for c in nomes], literal(agora, type_=arq.c.arquivado_em.type)).where(t.c.id.in_(parte)),
+            )
+        )
+        n += int(conn.execute(delete(t).where(t.c.id.in_(parte))).rowcount or 0)
+    return n
+
+
+def arquivar_grupo(
+    engine: Any,
+    nome: str,
+    *,
+    dias: Optional[int] = None,
+    lote: Optional[int] = None,
+    simular: bool = False,
+    agora: Optional[datetime] = None,
+    ao_progresso: Optional[Callable[[Resultado], None]] = None,
+) -> Resultado:
+    grupo = GRUPOS[nome]
+    agora = agora or datetime.utcnow()
+    dias = int(dias or grupo.dias())
+    corte = agora - timedelta(days=dias)
+    lote = max(1, int(lote or _cfg_int("POPRUA_ARQUIVO_LOTE", 500)))
+    res = Resultado(grupo=nome, dias=dias, corte=corte.isoformat(timespec="seconds"), simular=simular)
+    res.linhas = {_tabela(m).name: 0 for m in grupo.modelos()}
+    refs = _referencias_externas(grupo)
+    t0 = time.perf_counter()
+
+    depois_de = 0
+    while True:
+        with engine.begin() as conn:
+            raizes = _candidatas(conn, grupo, corte, depois_de, lote)
+            if not raizes:
+                break
+            depois_de = raizes[-1]
+            bloq, donos = _bloqueados(conn, grupo, refs, raizes)
+            livres = [i for i in raizes if i not in bloq]
+            res.retidos += len(bloq)
+            if not livres:
+                continue
+            ok = set(livres)
+            if simular:
+                res.raizes += len(livres)
+                res.linhas[_tabela(grupo.raiz).name] += len(livres)
+                for dep in grupo.dependentes:
+                    res.linhas[_tabela(dep.modelo).name] += sum(1 for r in donos[dep.modelo].values() if r in ok)
+                continue
+            # raiz primeiro (no SQLite pega o lock de escrita); dependentes na
+            # mesma transação, pelo mapa levantado acima
+            movidos: Dict[Any, List[int]] = {grupo.raiz: livres}
+            res.linhas[_tabela(grupo.raiz).name] += _mover(conn, grupo.raiz, livres, agora)
+            for dep in grupo.dependentes:
+                movidos[dep.modelo] = [i for i, r in donos[dep.modelo].items() if r in ok]
+                res.linhas[_tabela(dep.modelo).name] += _mover(conn, dep.modelo, movidos[dep.modelo], agora)
+            # dependente criado entre o levantamento e o lock: volta tudo e refaz
+            for dep in grupo.dependentes:
+                if _ids_por_fk(conn, _tabela(dep.modelo), dep.fk, movidos[dep.pai or grupo.raiz]):
+                    raise _Refazer()
+            res.raizes += len(livres)
+        res.lotes += 1
+        if ao_progresso is not None:
+            ao_progresso(res)
+
+    res.segundos = time.perf_counter() - t0
+    return res
+
+
+class _Refazer(Exception):
+    pass
+
+
+def arquivar(
+    engine: Any,
+    grupos: Optional[Sequence[str]] = None,
+    *,
+    dias: Optional[int] = None,
+    simular: bool = False,
+    lote: Optional[int] = None,
+    ao_progresso: Optional[Callable[[Resultado], None]] = None,
+) -> List[Resultado]:
+    with engine.begin() as conn:
+        sincronizar_colunas(conn)
+    out: List[Resultado] = []
+    for nome in grupos or list(GRUPOS):
+        for tentativa in range(3):
+            try:
+                out.append(arquivar_grupo(engine, nome, dias=dias, simular=simular, lote=lote, ao_progresso=ao_progresso))
+                break
+            except _Refazer:
+                print(f"WARN: arquivo: {nome}: dependente novo durante o lote; refazendo ({tentativa + 1}/3)")
+        else:
+            print(f"WARN: arquivo: {nome}: desistiu após 3 tentativas (escrita concorrente)")
+    return out
+
+
+def contagens(conn: Connection) -> Dict[str, Dict[str, int]]:
+    """Linhas quentes x arquivadas por tabela."""
+    out: Dict[str, Dict[str, int]] = {}
+    for origem, arq in ARQUIVO.items():
+        try:
+            q = conn.execute(select(func.count()).select_from(SQLModel.metadata.tables[origem])).scalar()
+            a = conn.execute(select(func.count()).select_from(arq)).scalar()
+        except Exception:
+            continue
+        out[origem] = {"quente": int(q or 0), "arquivo": int(a or 0)}
+    return out
+
+
+# ============================
+# Execução agendada (agendador das automações)
+# ============================
+def _proxima(agora: datetime) -> datetime:
+    hora = min(23, max(0, _cfg_int("POPRUA_ARQUIVO_HORA", 3)))
+    alvo = agora.replace(hour=hora, minute=0, second=0, microsecond=0)
+    return alvo if alvo > agora else alvo + timedelta(days=1)
+
+
+def tick(session: Any, dono: str, engine: Any = None) -> Optional[Dict[str, Any]]:
+    """Executa o arquivamento se estiver na hora (lease em automacao_agenda). None = não era a vez."""
+    from app.models.automacao_agenda import AutomacaoAgenda
+    from app.services.automacoes_agendador import _garantir_linha, adquirir_lease, liberar_lease
+
+    if engine is None:
+        from app.core.db import engine as _engine
+
+        engine = _engine
+
+    agora = datetime.utcnow()
+    _garantir_linha(session, ESCOPO_AGENDA, REGRA_AGENDA, None)
+    row = session.execute(
+        select(AutomacaoAgenda).where(AutomacaoAgenda.escopo == ESCOPO_AGENDA, AutomacaoAgenda.regra_id == REGRA_AGENDA)
+    ).scalars().first()
+    if row is not None and row.proxima_execucao_em is None:
+        row.base_em = row.proxima_execucao_em = _proxima(agora)
+        session.add(row)
+        session.commit()
+        return None
+    if not adquirir_lease(session, ESCOPO_AGENDA, REGRA_AGENDA, dono):
+        return None
+
+    t0 = time.perf_counter()
+    status, erro, itens = "ok", None, []
+    try:
+        itens = [r.como_dict() for r in arquivar(engine)]
+    except Exception as e:
+        status, erro = "error", f"{type(e).__name__}: {e}"
+        print("WARN: arquivo: execução agendada falhou:", erro)
+    duracao_ms = int((time.perf_counter() - t0) * 1000)
+    liberar_lease(session, ESCOPO_AGENDA, REGRA_AGENDA, dono, status=status, erro=erro, proxima=_proxima(datetime.utcnow()), duracao_ms=duracao_ms)
+    movidas = sum(i["raizes"] for i in itens)
+    print(f"INFO: arquivo: {movidas} registros arquivados em {duracao_ms}ms")
+    return {"status": status, "erro": erro, "grupos": itens, "duracao_ms": duracao_ms}
@@ -0,0 +1,474 @@
+# app/services/automacoes_agendador.py
+"""
+Agendador das regras de automação (Gestão e CRAS).
+
+Antes as regras só rodavam quando alguém chamava /executar-devidas, e rodavam
+dentro do request: cada regra remontava a fila inteira e um clique podia prender
+a API por minutos. Aqui:
+
+- cada regra tem uma linha em automacao_agenda com o próximo horário (nominal +
+  jitter, para não disparar tudo no mesmo segundo)
+- lease por regra (UPDATE condicional no banco): com várias instâncias/workers,
+  só um executa a regra; lease vencido (worker morto) é retomado sozinho
+- a cada tick a fila da Gestão é montada uma vez por conjunto de filtros
+  (FilaSnapshot) e compartilhada pelas regras devidas até uma delas executar
+  itens; depois dela a fila é remontada (as ações mudam a fila)
+- falha reagenda com backoff (não fica tentando a cada tick)
+
+Como rodar:
+- dentro da API: POPRUA_AGENDADOR=1 (thread em background, iniciada no startup)
+- processo separado: python scripts/worker_automacoes.py  (ou --uma-vez no cron)
+
+Config (env):
+- POPRUA_AGENDADOR              1/true liga o agendador no startup da API
+- POPRUA_AGENDADOR_INTERVALO_S  intervalo entre ticks (padrão 60)
+- POPRUA_AGENDADOR_JITTER_S     jitter máximo somado ao horário nominal (padrão 120)
+- POPRUA_AGENDADOR_LEASE_S      validade do lease de uma regra (padrão 1800)
+- POPRUA_AGENDADOR_BACKOFF_S    espera após erro (padrão 900)
+- POPRUA_AGENDADOR_USUARIO_ID   usuário "de sistema" das regras da Gestão
+                                (padrão: primeiro admin/gestor_consorcio ativo)
+- POPRUA_AGENDADOR_BASE_URL     base usada nos links dos documentos gerados
+- POPRUA_ARQUIVO                1 inclui o arquivamento diário (app/services/arquivo.py)
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from sqlalchemy import or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+from app.models.automacao_agenda import AutomacaoAgenda
+
+log = logging.getLogger("poprua.agendador")
+
+ESCOPO_GESTAO = "gestao"
+ESCOPO_CRAS = "cras"
+ESCOPOS = (ESCOPO_GESTAO, ESCOPO_CRAS)
+
+_STATUS_ERRO = ("error", "erro")
+
+
+def _cfg_int(nome: str, padrao: int) -> int:
+    try:
+        return int(str(os.getenv(nome, "")).strip() or padrao)
+    except Exception:
+        return padrao
+
+
+def habilitado() -> bool:
+    return str(os.getenv("POPRUA_AGENDADOR", "")).strip().lower() in ("1", "true", "yes", "on")
+
+
+def dono_lease(tag: str = "agendador") -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{tag}"[:120]
+
+
+def _com_jitter(base: Optional[datetime]) -> Optional[datetime]:
+    if base is None:
+        return None
+    jitter_s = max(0, _cfg_int("POPRUA_AGENDADOR_JITTER_S", 120))
+    return base + timedelta(seconds=random.uniform(0, jitter_s)) if jitter_s else base
+
+
+# =========================
+# Lease
+# =========================
+
+def _garantir_linha(session: Session, escopo: str, regra_id: int, municipio_id: Optional[int]) -> None:
+    existe = session.exec(
+        select(AutomacaoAgenda.id).where(AutomacaoAgenda.escopo == escopo, AutomacaoAgenda.regra_id == int(regra_id))
+    ).first()
+    if existe is not None:
+        return
+    session.add(AutomacaoAgenda(escopo=escopo, regra_id=int(regra_id), municipio_id=municipio_id))
+    try:
+        session.commit()
+    except IntegrityError:
+        # outro worker criou a linha ao mesmo tempo
+        session.rollback()
+
+
+def adquirir_lease(
+    session: Session,
+    escopo: str,
+    regra_id: int,
+    dono: str,
+    municipio_id: Optional[int] = None,
+    exigir_devida: bool = True,
+    agora: Optional[datetime] = None,
+) -> bool:
+    """Tenta pegar o lease da regra. True = este dono pode executar.
+
+    exigir_devida=True (agendador): só pega se proxima_execucao_em já passou.
+    exigir_devida=False (disparo manual): só respeita lease de outro worker.
+    agora: só para testes; o padrão é o relógio na hora do UPDATE (o lease vale
+    POPRUA_AGENDADOR_LEASE_S a partir de quando foi pego, não do início do tick).
+    """
+    agora = agora or datetime.utcnow()
+    _garantir_linha(session, escopo, regra_id, municipio_id)
+
+    stmt = update(AutomacaoAgenda).where(
+        AutomacaoAgenda.escopo == escopo,
+        AutomacaoAgenda.regra_id == int(regra_id),
+        or_(AutomacaoAgenda.lease_ate.is_(None), AutomacaoAgenda.lease_ate < agora),
+    )
+    if exigir_devida:
+        stmt = stmt.where(AutomacaoAgenda.proxima_execucao_em.is_not(None), AutomacaoAgenda.proxima_execucao_em <= agora)
+    res = session.execute(
+        stmt.values(
+            lease_dono=dono,
+            lease_ate=agora + timedelta(seconds=max(60, _cfg_int("POPRUA_AGENDADOR_LEASE_S", 1800))),
+            atualizado_em=agora,
+        )
+    )
+    session.commit()
+    return int(res.rowcount or 0) == 1
+
+
+def liberar_lease(
+    session: Session,
+    escopo: str,
+    regra_id: int,
+    dono: str,
+    status: str = "ok",
+    erro: Optional[str] = None,
+    proxima: Optional[datetime] = None,
+    duracao_ms: Optional[int] = None,
+) -> None:
+    """Solta o lease e grava o próximo horário (nominal `proxima` + jitter; backoff se erro)."""
+    agora = datetime.utcnow()
+    prox = _com_jitter(proxima)
+    if status in _STATUS_ERRO:
+        backoff = agora + timedelta(seconds=max(60, _cfg_int("POPRUA_AGENDADOR_BACKOFF_S", 900)))
+        prox = max(prox, backoff) if prox is not None else backoff
+    try:
+        session.execute(
+            update(AutomacaoAgenda)
+            .where(
+                AutomacaoAgenda.escopo == escopo,
+                AutomacaoAgenda.regra_id == int(regra_id),
+                AutomacaoAgenda.lease_dono == dono,
+            )
+            .values(
+                lease_dono=None,
+                lease_ate=None,
+                base_em=proxima,
+                proxima_execucao_em=prox,
+                ultima_execucao_em=agora,
+                ultimo_status=(status or "")[:20] or None,
+                ultimo_erro=(erro[:2000] if erro else None),
+                ultima_duracao_ms=duracao_ms,
+                atualizado_em=agora,
+            )
+        )
+        session.commit()
+    except Exception:
+        # lease expira sozinho (lease_ate); não derruba quem chamou
+        session.rollback()
+        log.exception("agendador: falha ao liberar lease %s/%s", escopo, regra_id)
+
+
+# =========================
+# Agenda
+# =========================
+
+def _regras_ativas(session: Session, escopo: str, municipio_id: Optional[int]) -> List[Any]:
+    if escopo == ESCOPO_GESTAO:
+        from app.models.gestao_automacoes import GestaoLoteRegra
+
+        stmt = select(GestaoLoteRegra).where(GestaoLoteRegra.ativo == True)  # noqa: E712
+        if municipio_id is not None:
+            stmt = stmt.where(GestaoLoteRegra.municipio_id == int(municipio_id))
+        return list(session.exec(stmt).all())
+
+    from app.models.cras_automacoes import CrasAutomacaoRegra
+
+    stmt = select(CrasAutomacaoRegra).where(CrasAutomacaoRegra.ativo == True)  # noqa: E712
+    if municipio_id is not None:
+        stmt = stmt.where(CrasAutomacaoRegra.municipio_id == int(municipio_id))
+    return list(session.exec(stmt).all())
+
+
+def _proxima_nominal(escopo: str, regra: Any, agora: datetime) -> Optional[datetime]:
+    if escopo == ESCOPO_GESTAO:
+        from app.routers.gestao_automacoes import _proxima_execucao
+
+        return _proxima_execucao(regra, agora)
+
+    from app.routers.cras_automacoes import _proxima_execucao as _proxima_cras
+
+    return _proxima_cras(regra)
+
+
+def sincronizar_agenda(
+    session: Session,
+    escopos: Iterable[str] = ESCOPOS,
+    municipio_id: Optional[int] = None,
+    agora: Optional[datetime] = None,
+) -> Dict[Tuple[str, int], Any]:
+    """Recalcula o horário nominal de cada regra ativa e ajusta a agenda.
+
+    Só mexe em proxima_execucao_em quando o nominal muda (regra editada ou
+    executada por outro caminho) — assim o jitter e o backoff ficam estáveis.
+    Retorna {(escopo, regra_id): regra}.
+    """
+    agora = agora or datetime.utcnow()
+    escopos = tuple(escopos)
+
+    stmt = select(AutomacaoAgenda).where(AutomacaoAgenda.escopo.in_(escopos))
+    if municipio_id is not None:
+        stmt = stmt.where(AutomacaoAgenda.municipio_id == int(municipio_id))
+    agenda = {(a.escopo, int(a.regra_id)): a for a in session.exec(stmt).all()}
+
+    regras: Dict[Tuple[str, int], Any] = {}
+    for escopo in escopos:
+        for r in _regras_ativas(session, escopo, municipio_id):
+            chave = (escopo, int(r.id))
+            regras[chave] = r
+            base = _proxima_nominal(escopo, r, agora)
+            row = agenda.get(chave)
+            if row is None:
+                row = AutomacaoAgenda(escopo=escopo, regra_id=int(r.id), municipio_id=r.municipio_id)
+            elif row.base_em == base:
+                continue
+            row.base_em = base
+            row.proxima_execucao_em = _com_jitter(base)
+            row.atualizado_em = agora
+            session.add(row)
+
+    # regra desativada/removida: sai da agenda
+    for chave, row in agenda.items():
+        if chave not in regras and row.proxima_execucao_em is not None:
+            row.base_em = None
+            row.proxima_execucao_em = None
+            session.add(row)
+
+    try:
+        session.commit()
+    except IntegrityError:
+        # outro worker sincronizou junto; o próximo tick acerta
+        session.rollback()
+    return regras
+
+
+def _agenda_devida(session: Session, escopos: Iterable[str], municipio_id: Optional[int], agora: datetime, limite: int) -> List[AutomacaoAgenda]:
+    stmt = (
+        select(AutomacaoAgenda)
+        .where(AutomacaoAgenda.escopo.in_(tuple(escopos)))
+        .where(AutomacaoAgenda.proxima_execucao_em.is_not(None), AutomacaoAgenda.proxima_execucao_em <= agora)
+        .where(or_(AutomacaoAgenda.lease_ate.is_(None), AutomacaoAgenda.lease_ate < agora))
+    )
+    if municipio_id is not None:
+        stmt = stmt.where(AutomacaoAgenda.municipio_id == int(municipio_id))
+    return list(session.exec(stmt.order_by(AutomacaoAgenda.proxima_execucao_em.asc()).limit(int(limite))).all())
+
+
+# =========================
+# Tick
+# =========================
+
+def _usuario_sistema(session: Session) -> Any:
+    from app.models.usuario import Usuario
+
+    uid = _cfg_int("POPRUA_AGENDADOR_USUARIO_ID", 0)
+    if uid:
+        return session.get(Usuario, uid)
+    return session.exec(
+        select(Usuario)
+        .where(Usuario.perfil.in_(["admin", "gestor_consorcio"]), Usuario.ativo == True)  # noqa: E712
+        .order_by(Usuario.id.asc())
+    ).first()
+
+
+def _request_sistema() -> Any:
+    """Request mínimo para as rotas de documentos (usam request.base_url nos links)."""
+    from starlette.requests import Request
+
+    base = (os.getenv("POPRUA_AGENDADOR_BASE_URL") or os.getenv("POPRUA_DOC_VERIF_BASE_URL") or "http://localhost:8000").rstrip("/")
+    u = urlsplit(base)
+    scheme = u.scheme or "http"
+    porta = u.port or (443 if scheme == "https" else 80)
+    return Request(
+        {
+            "type": "http",
+            "method": "POST",
+            "scheme": scheme,
+            "server": (u.hostname or "localhost", porta),
+            "path": "/",
+            "root_path": "",
+            "query_string": b"",
+            "headers": [(b"host", (u.netloc or "localhost").encode("latin-1"))],
+        }
+    )
+
+
+def executar_tick(
+    escopos: Iterable[str] = ESCOPOS,
+    municipio_id: Optional[int] = None,
+    limite: Optional[int] = None,
+    engine: Any = None,
+) -> Dict[str, Any]:
+    """Uma rodada: sincroniza a agenda e executa as regras devidas (com lease)."""
+    if engine is None:
+        from app.core.db import engine as _engine
+
+        engine = _engine
+
+    t0 = time.perf_counter()
+    agora = datetime.utcnow()
+    escopos = tuple(e for e in escopos if e in ESCOPOS)
+    dono = dono_lease()
+    limite = int(limite or _cfg_int("POPRUA_AGENDADOR_LIMITE", 50))
+
+    out: Dict[str, Any] = {"dono": dono, "devidas": 0, "executadas": 0, "puladas": 0, "erros": 0, "fila_montagens": 0, "itens": []}
+
+    with Session(engine) as session:
+        regras = sincronizar_agenda(session, escopos, municipio_id, agora)
+        devidas = _agenda_devida(session, escopos, municipio_id, agora, limite)
+        out["devidas"] = len(devidas)
+
+        # contexto das regras da Gestão neste tick; a fila (snapshot) é
+        # descartada depois de cada regra que agiu sobre itens
+        usuario = None
+        snapshot = None
+        request = None
+
+        for row in devidas:
+            chave = (row.escopo, int(row.regra_id))
+            regra = regras.get(chave)
+            if regra is None:
+                continue
+            # relógio de agora, não o do início do tick: as regras anteriores podem ter levado minutos
+            if not adquirir_lease(session, row.escopo, int(row.regra_id), dono):
+                out["puladas"] += 1  # outro worker pegou
+                continue
+
+            t_regra = time.perf_counter()
+            status, erro = "ok", None
+            items: List[Dict[str, Any]] = []
+            try:
+                if row.escopo == ESCOPO_GESTAO:
+                    from app.routers.gestao_automacoes import (
+                        FilaSnapshot,
+                        _executar_regra_itens,
+                        _selecionar_itens_regra,
+                    )
+
+                    if usuario is None:
+                        usuario = _usuario_sistema(session)
+                        if usuario is None:
+                            raise RuntimeError("Sem usuário de sistema (POPRUA_AGENDADOR_USUARIO_ID)")
+                        snapshot = FilaSnapshot(session, usuario)
+                        request = _request_sistema()
+                    items = _selecionar_itens_regra(regra, session, usuario, snapshot=snapshot)
+                    res = _executar_regra_itens(regra, items, request, session, usuario)
+                    status = str(res.get("status") or "ok")
+                else:
+                    from app.routers.cras_automacoes import _executar_regras
+
+                    res = _executar_regras(session, [regra], int(regra.municipio_id), regra.unidade_id, False)[0]
+                    status = str(res.get("status") or "ok")
+                    erro = (res.get("resumo") or {}).get("erro")
+            except Exception as e:
+                session.rollback()
+                status, erro = "error", f"{type(e).__name__}: {e}"
+                log.exception("agendador: regra %s/%s falhou", row.escopo, row.regra_id)
+            finally:
+                if items and snapshot is not None:
+                    snapshot.invalidar()
+                duracao_ms = int((time.perf_counter() - t_regra) * 1000)
+                try:
+                    session.refresh(regra)
+                    proxima = _proxima_nominal(row.escopo, regra, datetime.utcnow())
+                except Exception:
+                    session.rollback()
+                    proxima = None
+                liberar_lease(session, row.escopo, int(row.regra_id), dono, status=status, erro=erro, proxima=proxima, duracao_ms=duracao_ms)
+
+            out["executadas"] += 1
+            if status in _STATUS_ERRO:
+                out["erros"] += 1
+            out["itens"].append({"escopo": row.escopo, "regra_id": row.regra_id, "status": status, "erro": erro, "duracao_ms": duracao_ms})
+
+        out["fila_montagens"] = snapshot.montagens if snapshot is not None else 0
+
+        # arquivamento diário (app/services/arquivo.py): só no tick geral, com lease próprio
+        if municipio_id is None:
+            from app.services import arquivo
+
+            if arquivo.habilitado():
+                try:
+                    res_arq = arquivo.tick(session, dono, engine=engine)
+                    if res_arq is not None:
+                        out["arquivamento"] = res_arq
+                except Exception:
+                    session.rollback()
+                    log.exception("agendador: arquivamento falhou")
+
+    out["duracao_ms"] = int((time.perf_counter() - t0) * 1000)
+    if out["executadas"]:
+        log.info(
+            "agendador: devidas=%s executadas=%s erros=%s fila_montagens=%s em %sms",
+            out["devidas"], out["executadas"], out["erros"], out["fila_montagens"], out["duracao_ms"],
+        )
+    return out
+
+
+# =========================
+# Thread em background
+# =========================
+
+class Agendador:
+    """Loop de ticks numa thread daemon (uma por processo)."""
+
+    def __init__(self) -> None:
+        self._thread: Optional[threading.Thread] = None
+        self._parar = threading.Event()
+        self._acordar = threading.Event()
+        self.ultimo_tick: Optional[Dict[str, Any]] = None
+
+    @property
+    def rodando(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def iniciar(self) -> None:
+        if self.rodando:
+            return
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._loop, name="poprua-agendador", daemon=True)
+        self._thread.start()
+
+    def parar(self, timeout: float = 5.0) -> None:
+        self._parar.set()
+        self._acordar.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def acordar(self) -> None:
+        self._acordar.set()
+
+    def _loop(self) -> None:
+        # primeiro tick com atraso aleatório: instâncias que sobem juntas não colidem
+        self._acordar.wait(timeout=random.uniform(1, 10))
+        while not self._parar.is_set():
+            self._acordar.clear()
+            try:
+                self.ultimo_tick = executar_tick()
+            except Exception:
+                log.exception("agendador: tick falhou")
+            intervalo = max(5, _cfg_int("POPRUA_AGENDADOR_INTERVALO_S", 60))
+            self._acordar.wait(timeout=intervalo)
+
+
+agendador = Agendador()
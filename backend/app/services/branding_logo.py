@@ -0,0 +1,164 @@
+# app/services/branding_logo.py
+"""
+Variantes pré-renderizadas do logo do município.
+
+Antes cada PDF emitido carregava o logo original (do jeito que foi enviado, às
+vezes 3000px+) no reportlab — o PDF ficava pesado e cada render decodificava a
+imagem inteira. No upload geramos variantes com tamanho limitado:
+
+- pdf:   cabeçalho dos documentos (28mm a ~300dpi, com folga para logos maiores)
+- web:   cabeçalho das telas (2x a altura do header)
+- thumb: miniaturas/listas
+
+Cada variante é um PNG otimizado com o hash do conteúdo no nome
+(logo_<variante>_<hash>.png), então pode ser servida com cache longo
+(immutable): trocar o logo gera outro nome. O manifesto logo_variantes.json
+fica na mesma pasta do logo.png; logos enviados antes disso ganham as variantes
+na primeira leitura (`garantir_variantes`).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from io import BytesIO
+from typing import Any, Dict, Optional, Tuple
+
+# nome -> caixa máxima (largura, altura) em px; a proporção é mantida
+VARIANTES: Dict[str, Tuple[int, int]] = {
+    "pdf": (640, 640),
+    "web": (384, 96),
+    "thumb": (64, 64),
+}
+
+MANIFESTO = "logo_variantes.json"
+ARQUIVO_RE = re.compile(r"^logo_(pdf|web|thumb)_[0-9a-f]{16}\.png$")
+
+# manifesto lido por pasta, invalidado pelo mtime do arquivo
+_cache: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+_lock = threading.Lock()
+
+
+def _assinatura_origem(abs_logo: str) -> Optional[str]:
+    try:
+        st = os.stat(abs_logo)
+    except OSError:
+        return None
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+
+def _escrever_atomico(path: str, data: bytes) -> None:
+    # nome temporário único: duas threads do mesmo worker podem gerar a mesma variante
+    pasta, nome = os.path.split(path)
+    with tempfile.NamedTemporaryFile(dir=pasta or ".", prefix=f".{nome}.", suffix=".tmp", delete=False) as f:
+        tmp = f.name
+        try:
+            f.write(data)
+        except BaseException:
+            f.close()
+            os.unlink(tmp)
+            raise
+    try:
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _renderizar(img: Any, caixa: Tuple[int, int]) -> Tuple[bytes, int, int]:
+    from PIL import Image  # type: ignore
+
+    v = img.copy()
+    v.thumbnail(caixa, Image.LANCZOS)
+    # alpha totalmente opaco não precisa de canal extra (PNG menor)
+    if v.mode == "RGBA" and v.getchannel("A").getextrema() == (255, 255):
+        v = v.convert("RGB")
+    buf = BytesIO()
+    v.save(buf, format="PNG", optimize=True)
+    return buf.getvalue(), v.width, v.height
+
+
+def gerar_variantes(abs_logo: str) -> Dict[str, Any]:
+    """Gera as variantes a partir do logo.png salvo e grava o manifesto."""
+    from PIL import Image  # type: ignore
+
+    pasta = os.path.dirname(abs_logo)
+    with Image.open(abs_logo) as im:
+        im.load()
+        img = im if im.mode in ("RGB", "RGBA") else im.convert("RGBA")
+
+        variantes: Dict[str, Any] = {}
+        for nome, caixa in VARIANTES.items():
+            data, w, h = _renderizar(img, caixa)
+            hsh = hashlib.sha256(data).hexdigest()[:16]
+            arquivo = f"logo_{nome}_{hsh}.png"
+            destino = os.path.join(pasta, arquivo)
+            if not os.path.exists(destino):
+                _escrever_atomico(destino, data)
+            variantes[nome] = {"arquivo": arquivo, "hash": hsh, "largura": w, "altura": h, "bytes": len(data)}
+
+    manifesto = {"origem": _assinatura_origem(abs_logo), "variantes": variantes}
+    _escrever_atomico(os.path.join(pasta, MANIFESTO), json.dumps(manifesto).encode("utf-8"))
+
+    # remove variantes de logos anteriores
+    atuais = {v["arquivo"] for v in variantes.values()}
+    for nome in os.listdir(pasta):
+        if ARQUIVO_RE.match(nome) and nome not in atuais:
+            try:
+                os.remove(os.path.join(pasta, nome))
+            except OSError:
+                pass
+    return manifesto
+
+
+def carregar_manifesto(pasta: str) -> Optional[Dict[str, Any]]:
+    path = os.path.join(pasta, MANIFESTO)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    with _lock:
+        hit = _cache.get(pasta)
+        if hit and hit[0] == mtime:
+            return hit[1]
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception:
+        return None
+    with _lock:
+        _cache[pasta] = (mtime, data)
+    return data
+
+
+def garantir_variantes(abs_logo: str) -> Optional[Dict[str, Any]]:
+    """Manifesto atual do logo; (re)gera se faltar ou se o logo.png mudou por fora."""
+    origem = _assinatura_origem(abs_logo)
+    if origem is None:
+        return None
+    pasta = os.path.dirname(abs_logo)
+    man = carregar_manifesto(pasta)
+    if man and man.get("origem") == origem:
+        arquivos = [v.get("arquivo") for v in (man.get("variantes") or {}).values()]
+        if arquivos and all(a and os.path.exists(os.path.join(pasta, a)) for a in arquivos):
+            return man
+    try:
+        return gerar_variantes(abs_logo)
+    except Exception:
+        return None
+
+
+def variante(abs_logo: str, nome: str) -> Optional[Tuple[str, int, int]]:
+    """(caminho absoluto, largura px, altura px) da variante, ou None (usar o original)."""
+    man = garantir_variantes(abs_logo)
+    v = ((man or {}).get("variantes") or {}).get(nome)
+    if not v:
+        return None
+    return os.path.join(os.path.dirname(abs_logo), v["arquivo"]), int(v["largura"]), int(v["altura"])
@@ -0,0 +1,159 @@
+# app/services/cadastro_busca.py
+"""
+Chave de busca normalizada dos cadastros SUAS (pessoa_suas / familia_suas).
+
+Antes /cras/cadastros/pessoas lia o cadastro inteiro do município e, com `q`,
+fazia lower() da concatenação de seis campos em Python para cada linha. Agora
+cada registro guarda a coluna `busca`, já normalizada:
+
+- minúsculas, sem acento, pontuação vira espaço ("José D'Ávila" -> "jose d avila")
+- CPF/NIS só com dígitos (o termo "123.456.789" também vira "123456789")
+
+A coluna é preenchida pelos eventos before_insert/before_update dos models (e
+por backfill nas linhas antigas, migrações 0006 e 0007). A busca roda no SQL:
+
+- termo com 3+ caracteres: substring via índice FTS5 trigram
+  (pessoa_suas_fts / familia_suas_fts, mantidos por trigger)
+- termo com 1-2 caracteres (trigram não indexa), PostgreSQL ou SQLite sem
+  FTS5: LIKE '%termo%' na coluna normalizada, dentro do município e parando
+  em limit+1 (sem lower()/concatenação por linha)
+"""
+
+from __future__ import annotations
+
+import re
+import unicodedata
+from typing import Any, Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.sql import ColumnElement
+
+# (tabela, tabela FTS)
+FTS_PESSOA = ("pessoa_suas", "pessoa_suas_fts")
+FTS_FAMILIA = ("familia_suas", "familia_suas_fts")
+
+_NAO_ALNUM = re.compile(r"[^a-z0-9]+")
+_SO_DIGITOS = re.compile(r"^[0-9 ]+$")
+
+_fts_ok: Dict[str, bool] = {}
+
+
+def normalizar(texto: Any) -> str:
+    s = unicodedata.normalize("NFKD", str(texto or "")).lower()
+    s = "".join(c for c in s if not unicodedata.combining(c))
+    return _NAO_ALNUM.sub(" ", s).strip()
+
+
+def _digitos(v: Any) -> str:
+    return re.sub(r"\D", "", str(v or ""))
+
+
+def _get(obj: Any, campo: str) -> Any:
+    return obj.get(campo) if isinstance(obj, dict) else getattr(obj, campo, None)
+
+
+def _juntar(*partes: str) -> Optional[str]:
+    s = " ".join(p for p in partes if p)
+    return s[:1000] or None
+
+
+def chave_pessoa(p: Any) -> Optional[str]:
+    """nome, nome social, CPF, NIS, bairro, território (os campos da busca antiga)."""
+    return _juntar(
+        normalizar(_get(p, "nome")),
+        normalizar(_get(p, "nome_social")),
+        _digitos(_get(p, "cpf")),
+        _digitos(_get(p, "nis")),
+        normalizar(_get(p, "bairro")),
+        normalizar(_get(p, "territorio")),
+    )
+
+
+def chave_familia(f: Any) -> Optional[str]:
+    """NIS da família, bairro, território, endereço."""
+    return _juntar(
+        _digitos(_get(f, "nis_familia")),
+        normalizar(_get(f, "bairro")),
+        normalizar(_get(f, "territorio")),
+        normalizar(_get(f, "endereco")),
+    )
+
+
+def termo(q: Optional[str]) -> str:
+    """Termo da consulta na mesma forma da chave ("" = sem filtro)."""
+    t = normalizar(q)
+    if t and _SO_DIGITOS.match(t):
+        return t.replace(" ", "")
+    return t
+
+
+def fts_disponivel(session: Any, tabela_fts: str) -> bool:
+    bind = session.get_bind()
+    chave = f"{bind.url}|{tabela_fts}"
+    ok = _fts_ok.get(chave)
+    if ok is None:
+        ok = False
+        if bind.dialect.name == "sqlite":
+            try:
+                ok = session.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :n"), {"n": tabela_fts}
+                ).first() is not None
+            except Exception:
+                ok = False
+        _fts_ok[chave] = ok
+    return ok
+
+
+def filtro(session: Any, model: Any, tabelas: tuple, q: Optional[str]) -> Optional[ColumnElement]:
+    """Condição SQL da busca `q` para `model` (None = sem filtro)."""
+    t = termo(q)
+    if not t:
+        return None
+    tabela_fts = tabelas[1]
+    if len(t) >= 3 and fts_disponivel(session, tabela_fts):
+        # trigram: "frase" entre aspas = substring (t só tem [a-z0-9 ])
+        sub = text(f"SELECT rowid FROM {tabela_fts} WHERE {tabela_fts} MATCH :m").bindparams(m=f'"{t}"')
+        return model.id.in_(sub.columns(model.id))
+    return model.busca.like(f"%{t}%")
+
+
+# ============================
+# DDL (migrações 0006 e 0007)
+# ============================
+def criar_fts(conn: Any, tabela: str, tabela_fts: str) -> bool:
+    """Tabela FTS5 trigram espelhando `busca` (rowid = id) + triggers. Só SQLite."""
+    if conn.dialect.name != "sqlite":
+        return False
+    try:
+        conn.execute(text(f"CREATE VIRTUAL TABLE IF NOT EXISTS {tabela_fts} USING fts5(busca, tokenize='trigram')"))
+    except Exception:
+        # SQLite sem FTS5/trigram (< 3.34): a busca usa LIKE na coluna normalizada
+        return False
+    conn.execute(
+        text(
+            f"CREATE TRIGGER IF NOT EXISTS {tabela_fts}_ai AFTER INSERT ON {tabela} "
+            f"WHEN new.busca IS NOT NULL BEGIN "
+            f"INSERT INTO {tabela_fts}(rowid, busca) VALUES (new.id, new.busca); END"
+        )
+    )
+    conn.execute(
+        text(
+            f"CREATE TRIGGER IF NOT EXISTS {tabela_fts}_au AFTER UPDATE OF busca ON {tabela} BEGIN "
+            f"DELETE FROM {tabela_fts} WHERE rowid = old.id; "
+            f"INSERT INTO {tabela_fts}(rowid, busca) SELECT new.id, new.busca WHERE new.busca IS NOT NULL; END"
+        )
+    )
+    conn.execute(
+        text(
+            f"CREATE TRIGGER IF NOT EXISTS {tabela_fts}_ad AFTER DELETE ON {tabela} BEGIN "
+            f"DELETE FROM {tabela_fts} WHERE rowid = old.id; END"
+        )
+    )
+    # linhas que já tinham chave (banco novo não tem nenhuma; backfill cobre o resto)
+    conn.execute(
+        text(
+            f"INSERT INTO {tabela_fts}(rowid, busca) SELECT id, busca FROM {tabela} "
+            f"WHERE busca IS NOT NULL AND id NOT IN (SELECT rowid FROM {tabela_fts})"
+        )
+    )
+    return True
@@ -0,0 +1,744 @@
+# app/services/cadastro_importacao.py
+"""
+Importação em lote do cadastro SUAS (PessoaSUAS, FamiliaSUAS, FamiliaMembro e,
+opcionalmente, CadunicoPreCadastro) a partir de CSV ou do extrato do CadÚnico.
+
+Implantar um município = dezenas de milhares de famílias; por POST, um a um,
+levava dias. Aqui o arquivo é lido em streaming (linha a linha, sem carregar o
+arquivo inteiro) e gravado em lotes, uma transação por lote:
+
+- CPF/NIS/NIS da família normalizados só com dígitos (mesma regra de
+  `_norm_doc` em cras_identidade e `_normalizar_numero` em pessoas)
+- upsert por CPF (depois NIS) dentro do município: o índice CPF/NIS -> id das
+  pessoas já cadastradas é carregado uma vez (só ids e documentos); famílias
+  por `nis_familia`. Reimportar o mesmo arquivo não duplica nada e só grava
+  o que mudou (campo vazio no arquivo não apaga dado existente)
+- INSERT/UPDATE em lote (Core, executemany). Eventos de mapper não disparam
+  em Core, então a chave `busca` (app/services/cadastro_busca.py) é calculada
+  aqui; o FTS acompanha pelos triggers
+- progresso (bytes/linhas/contadores) a cada lote e lista de erros por linha
+  (limitada a MAX_ERROS); lote que falha no banco é desfeito e reportado, o
+  resto segue
+- simular=True: lê, normaliza e conta o que seria inserido/atualizado, sem gravar
+
+Layouts:
+  csv       cabeçalho com os nomes dos campos (nome, nome_social, cpf, nis,
+            data_nascimento, sexo, telefone, email, endereco, bairro,
+            territorio, observacoes, nis_familia, parentesco, responsavel);
+            aceita acento/maiúsculas e alguns sinônimos (ver _COLUNAS_CSV)
+  cadunico  extrato do CadÚnico (colunas p.* / d.*, ex.: p.nom_pessoa,
+            p.num_nis_pessoa_atual, d.cod_familiar_fam). O código familiar
+            vira `nis_familia` (é a chave da família no extrato)
+
+Separador (; , tab |) detectado pelo cabeçalho; encoding UTF-8 ou, se o
+primeiro 1 MB não for UTF-8 válido, cp1252 (padrão dos extratos). Cada linha
+é decodificada sem tolerância: linha com bytes inválidos para o encoding
+escolhido (arquivo com encoding misto) vira erro da linha, nada é gravado com
+caractere trocado. O nº da linha nos erros é a linha física do arquivo (campo
+entre aspas com quebra de linha ocupa mais de uma).
+
+Importação interrompida (worker reiniciado no meio): o progresso grava um
+batimento (`atualizado_em`) a cada lote; sem batimento há mais de
+POPRUA_IMPORTACAO_PARADA_S (padrão 900) ela é marcada como erro no boot e ao
+consultar o status (`marcar_interrompidas`). O arquivo temporário já se foi:
+é preciso reenviar.
+
+Uso: POST /cras/cadastros/importar (em background, progresso em
+GET /cras/cadastros/importar/{id}) ou scripts/importar_cadastros.py.
+"""
+
+from __future__ import annotations
+
+import codecs
+import csv
+import itertools
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import bindparam, func, insert, select, update
+from sqlmodel import Session
+
+from app.models.cadastro_importacao import CadastroImportacao
+from app.models.cadunico_precadastro import CadunicoPreCadastro
+from app.models.familia_suas import FamiliaMembro, FamiliaSUAS
+from app.models.pessoa_suas import PessoaSUAS
+from app.services import cadastro_busca
+
+LAYOUTS = ("csv", "cadunico")
+LOTE_PADRAO = 1000
+MAX_ERROS = 500
+STATUS_EM_ANDAMENTO = ("na_fila", "processando")
+
+CAMPOS_PESSOA = (
+    "nome",
+    "nome_social",
+    "cpf",
+    "nis",
+    "data_nascimento",
+    "sexo",
+    "telefone",
+    "email",
+    "endereco",
+    "bairro",
+    "territorio",
+    "observacoes",
+)
+CAMPOS_FAMILIA = ("nis_familia", "endereco", "bairro", "territorio")
+_DOCS = ("cpf", "nis", "nis_familia")
+
+_T_PESSOA = PessoaSUAS.__table__
+_T_FAMILIA = FamiliaSUAS.__table__
+_T_MEMBRO = FamiliaMembro.__table__
+_T_PRECADASTRO = CadunicoPreCadastro.__table__
+
+# cabeçalho normalizado (cadastro_busca.normalizar, espaços -> "_") -> campo
+_COLUNAS_CSV: Dict[str, str] = {
+    "nome": "nome",
+    "nome_completo": "nome",
+    "nome_social": "nome_social",
+    "cpf": "cpf",
+    "nis": "nis",
+    "nis_pessoa": "nis",
+    "data_nascimento": "data_nascimento",
+    "data_de_nascimento": "data_nascimento",
+    "dt_nascimento": "data_nascimento",
+    "nascimento": "data_nascimento",
+    "sexo": "sexo",
+    "telefone": "telefone",
+    "celular": "telefone",
+    "email": "email",
+    "e_mail": "email",
+    "endereco": "endereco",
+    "bairro": "bairro",
+    "territorio": "territorio",
+    "observacoes": "observacoes",
+    "nis_familia": "nis_familia",
+    "codigo_familiar": "nis_familia",
+    "cod_familiar": "nis_familia",
+    "parentesco": "parentesco",
+    "responsavel": "responsavel",
+}
+
+# extrato CadÚnico (sem o prefixo p./d.)
+_COLUNAS_CADUNICO = (
+    "nom_pessoa",
+    "num_nis_pessoa_atual",
+    "num_cpf_pessoa",
+    "dta_nasc_pessoa",
+    "cod_sexo_pessoa",
+    "cod_parentesco_rf_pessoa",
+    "cod_familiar_fam",
+    "nom_localidade_fam",
+    "nom_tip_logradouro_fam",
+    "nom_titulo_logradouro_fam",
+    "nom_logradouro_fam",
+    "num_logradouro_fam",
+    "des_complemento_fam",
+    "num_ddd_contato_1_fam",
+    "num_tel_contato_1_fam",
+)
+
+_SEXO_CADUNICO = {"1": "Masculino", "2": "Feminino"}
+_PARENTESCO_CADUNICO = {
+    "1": "Responsável familiar",
+    "2": "Cônjuge ou companheiro(a)",
+    "3": "Filho(a)",
+    "4": "Enteado(a)",
+    "5": "Neto(a) ou bisneto(a)",
+    "6": "Pai ou mãe",
+    "7": "Sogro(a)",
+    "8": "Irmão ou irmã",
+    "9": "Genro ou nora",
+    "10": "Outro parente",
+    "11": "Não parente",
+}
+_SIM = {"1", "s", "sim", "x", "true", "verdadeiro", "responsavel"}
+
+
+def normalizar_doc(v: Any) -> Optional[str]:
+    """CPF/NIS só com dígitos (None se vazio) — regra de `_norm_doc`/`_normalizar_numero`."""
+    if not v:
+        return None
+    s = "".join(ch for ch in str(v) if ch.isdigit())
+    return s or None
+
+
+def _data(v: str) -> date:
+    s = v.strip()
+    for fmt in ("%d/%m/%Y", "%Y-%m-%d", "%d%m%Y", "%d-%m-%Y"):
+        try:
+            return datetime.strptime(s, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(s)
+
+
+# ============================
+# Progresso
+# ============================
+@dataclass
+class Progresso:
+    bytes_total: Optional[int] = None
+    bytes_lidos: int = 0
+    linhas_lidas: int = 0
+    linhas_com_erro: int = 0
+    avisos: int = 0
+    pessoas_inseridas: int = 0
+    pessoas_atualizadas: int = 0
+    familias_inseridas: int = 0
+    familias_atualizadas: int = 0
+    membros_inseridos: int = 0
+    precadastros_inseridos: int = 0
+    erros: List[Dict[str, Any]] = field(default_factory=list)
+
+    def erro(self, linha: Any, msg: str, aviso: bool = False) -> None:
+        if aviso:
+            self.avisos += 1
+        else:
+            self.linhas_com_erro += 1
+        if len(self.erros) < MAX_ERROS:
+            item: Dict[str, Any] = {"linha": linha, "erro": msg}
+            if aviso:
+                item["aviso"] = True
+            self.erros.append(item)
+
+    def contadores(self) -> Dict[str, Any]:
+        return {k: v for k, v in self.__dict__.items() if k != "erros"}
+
+
+# ============================
+# Leitura (streaming)
+# ============================
+@dataclass
+class _Linha:
+    numero: int
+    pessoa: Dict[str, Any]
+    familia: Dict[str, Any]
+    parentesco: Optional[str] = None
+    responsavel: bool = False
+
+
+def _detectar_encoding(arquivo: BinaryIO) -> str:
+    pos = arquivo.tell()
+    amostra = arquivo.read(1 << 20)
+    arquivo.seek(pos)
+    try:
+        amostra.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # amostra cortada no meio de um caractere multibyte ainda é UTF-8
+        if e.start < len(amostra) - 3:
+            return "cp1252"
+    return "utf-8-sig"
+
+
+def _chave_coluna(nome: str, layout: str) -> str:
+    s = cadastro_busca.normalizar(nome).replace(" ", "_")
+    if layout == "cadunico" and s[:2] in ("p_", "d_"):
+        s = s[2:]
+    return s
+
+
+def _texto(v: Any) -> Optional[str]:
+    s = (v or "").strip()
+    return s or None
+
+
+def _converter(numero: int, bruto: Dict[str, str], layout: str, avisos: List[str]) -> _Linha:
+    if layout == "cadunico":
+        g = lambda k: _texto(bruto.get(k))  # noqa: E731
+        logradouro = " ".join(x for x in (g("nom_tip_logradouro_fam"), g("nom_titulo_logradouro_fam"), g("nom_logradouro_fam")) if x)
+        endereco = ", ".join(x for x in (logradouro, g("num_logradouro_fam")) if x)
+        if g("des_complemento_fam"):
+            endereco = f"{endereco} - {g('des_complemento_fam')}" if endereco else g("des_complemento_fam")
+        telefone = "".join(x for x in (g("num_ddd_contato_1_fam"), g("num_tel_contato_1_fam")) if x)
+        cod_sexo = normalizar_doc(g("cod_sexo_pessoa"))
+        cod_par = str(int(normalizar_doc(g("cod_parentesco_rf_pessoa")) or 0) or "")
+        campos: Dict[str, Optional[str]] = {
+            "nome": g("nom_pessoa"),
+            "nis": g("num_nis_pessoa_atual"),
+            "cpf": g("num_cpf_pessoa"),
+            "data_nascimento": g("dta_nasc_pessoa"),
+            "sexo": _SEXO_CADUNICO.get(cod_sexo or "", g("cod_sexo_pessoa")),
+            "telefone": telefone or None,
+            "endereco": endereco or None,
+            "bairro": g("nom_localidade_fam"),
+            "nis_familia": g("cod_familiar_fam"),
+            "parentesco": _PARENTESCO_CADUNICO.get(cod_par, g("cod_parentesco_rf_pessoa")),
+            "responsavel": "1" if cod_par == "1" else None,
+        }
+    else:
+        campos = {campo: _texto(v) for campo, v in bruto.items()}
+
+    for k in _DOCS:
+        campos[k] = normalizar_doc(campos.get(k))
+    if not campos.get("cpf") and not campos.get("nis"):
+        raise ValueError("sem CPF nem NIS (chave do upsert)")
+
+    pessoa: Dict[str, Any] = {k: campos[k] for k in CAMPOS_PESSOA if campos.get(k)}
+    if "data_nascimento" in pessoa:
+        try:
+            pessoa["data_nascimento"] = _data(pessoa["data_nascimento"])
+        except ValueError:
+            avisos.append(f"data_nascimento inválida ({pessoa.pop('data_nascimento')!r}), ignorada")
+    if "observacoes" in pessoa:
+        pessoa["observacoes"] = pessoa["observacoes"][:1000]
+
+    familia: Dict[str, Any] = {}
+    if campos.get("nis_familia"):
+        familia = {k: campos[k] for k in CAMPOS_FAMILIA if campos.get(k)}
+    responsavel = cadastro_busca.normalizar(campos.get("responsavel")).replace(" ", "") in _SIM
+    return _Linha(numero, pessoa, familia, campos.get("parentesco"), responsavel)
+
+
+def _linhas_fisicas(arquivo: BinaryIO, encoding: str, invalidas: set) -> Iterator[str]:
+    """Linhas do arquivo (com o fim de linha), decodificadas uma a uma. Linha com
+    bytes inválidos sai com "\ufffd" e o número vai para `invalidas`."""
+    for numero, bruta in enumerate(arquivo, start=1):
+        try:
+            yield bruta.decode(encoding)
+        except UnicodeDecodeError:
+            invalidas.add(numero)
+            yield bruta.decode(encoding, errors="replace")
+
+
+def ler_linhas(
+    arquivo: BinaryIO,
+    layout: str = "csv",
+    encoding: Optional[str] = None,
+    progresso: Optional[Progresso] = None,
+) -> Iterator[Tuple[int, Optional[_Linha], Optional[str], List[str]]]:
+    """(nº da linha física, linha convertida | None, erro, avisos), uma de cada vez."""
+    if layout not in LAYOUTS:
+        raise ValueError(f"layout inválido: {layout!r} (use {', '.join(LAYOUTS)})")
+    encoding = encoding or _detectar_encoding(arquivo)
+    try:
+        codecs.lookup(encoding)
+    except LookupError:
+        raise ValueError(f"encoding desconhecido: {encoding!r}")
+    invalidas: set = set()
+    fisicas = _linhas_fisicas(arquivo, encoding, invalidas)
+    cabecalho = next(fisicas, "")
+    if not cabecalho.strip():
+        return
+    if invalidas:
+        raise ValueError(f"cabeçalho não é {encoding} válido (informe o encoding do arquivo)")
+    separador = max((";", ",", "\t", "|"), key=cabecalho.count)
+    leitor = csv.reader(itertools.chain([cabecalho], fisicas), delimiter=separador)
+    nomes = [_chave_coluna(c, layout) for c in next(leitor)]
+    if layout == "cadunico":
+        conhecidas = set(_COLUNAS_CADUNICO)
+        colunas = [(i, n) for i, n in enumerate(nomes) if n in conhecidas]
+    else:
+        colunas = [(i, _COLUNAS_CSV[n]) for i, n in enumerate(nomes) if n in _COLUNAS_CSV]
+    if not colunas:
+        raise ValueError("cabeçalho sem nenhuma coluna reconhecida para o layout " + layout)
+
+    while True:
+        numero = leitor.line_num + 1  # primeira linha física do registro
+        valores = next(leitor, None)
+        if valores is None:
+            break
+        if not any(v.strip() for v in valores):
+            continue
+        if progresso is not None:
+            progresso.linhas_lidas += 1
+            try:
+                progresso.bytes_lidos = arquivo.tell()
+            except Exception:
+                pass
+        if invalidas and any(n in invalidas for n in range(numero, leitor.line_num + 1)):
+            yield numero, None, f"bytes inválidos para {encoding.replace('-sig', '')} (arquivo com encoding misto?); linha não importada", []
+            continue
+        bruto = {campo: valores[i] for i, campo in colunas if i < len(valores)}
+        avisos: List[str] = []
+        try:
+            yield numero, _converter(numero, bruto, layout, avisos), None, avisos
+        except ValueError as e:
+            yield numero, None, str(e), avisos
+
+
+# ============================
+# Gravação em lote
+# ============================
+def _engine() -> Any:
+    from app.core.db import engine
+
+    return engine
+
+
+def _igual(campo: str, atual: Any, novo: Any) -> bool:
+    if campo in _DOCS:
+        return normalizar_doc(atual) == novo
+    return atual == novo
+
+
+class _Importador:
+    def __init__(self, engine: Any, municipio_id: int, unidade_id: Optional[int], simular: bool, progresso: Progresso) -> None:
+        self.engine = engine
+        self.municipio_id = int(municipio_id)
+        self.unidade_id = int(unidade_id) if unidade_id else None
+        self.simular = simular
+        self.p = progresso
+        self.idx_cpf: Dict[str, int] = {}
+        self.idx_nis: Dict[str, int] = {}
+        self.idx_fam: Dict[str, int] = {}
+        self._falso = 0
+
+    def carregar_indices(self) -> None:
+        """CPF/NIS -> id das pessoas (e NIS -> id das famílias) do município; o menor id vence."""
+        with self.engine.connect() as conn:
+            q = select(_T_PESSOA.c.id, _T_PESSOA.c.cpf, _T_PESSOA.c.nis).where(_T_PESSOA.c.municipio_id == self.municipio_id)
+            for pid, cpf, nis in conn.execute(q.order_by(_T_PESSOA.c.id)):
+                if normalizar_doc(cpf):
+                    self.idx_cpf.setdefault(normalizar_doc(cpf), pid)
+                if normalizar_doc(nis):
+                    self.idx_nis.setdefault(normalizar_doc(nis), pid)
+            q = select(_T_FAMILIA.c.id, _T_FAMILIA.c.nis_familia).where(_T_FAMILIA.c.municipio_id == self.municipio_id)
+            for fid, nis in conn.execute(q.order_by(_T_FAMILIA.c.id)):
+                if normalizar_doc(nis):
+                    self.idx_fam.setdefault(normalizar_doc(nis), fid)
+
+    def _inserir(self, session: Session, tabela: Any, linhas: List[Dict[str, Any]]) -> List[int]:
+        if not linhas:
+            return []
+        if self.simular:
+            ids = list(range(self._falso - 1, self._falso - 1 - len(linhas), -1))
+            self._falso -= len(linhas)
+            return ids
+        res = session.execute(insert(tabela).returning(tabela.c.id, sort_by_parameter_order=True), linhas)
+        return [r[0] for r in res]
+
+    def _atualizar(
+        self,
+        session: Session,
+        tabela: Any,
+        campos: Tuple[str, ...],
+        novos: Dict[int, Dict[str, Any]],
+        chave: Callable[[Any], Optional[str]],
+        agora: datetime,
+    ) -> int:
+        """UPDATE só das linhas com algum campo diferente (vazio no arquivo não apaga)."""
+        if not novos:
+            return 0
+        cols = [tabela.c[c] for c in campos]
+        atuais = {r[0]: dict(r._mapping) for r in session.execute(select(tabela.c.id, *cols).where(tabela.c.id.in_(list(novos))))}
+        linhas: List[Dict[str, Any]] = []
+        for id_, valores in novos.items():
+            atual = atuais.get(id_)
+            if atual is None:
+                continue
+            mud = {c: v for c, v in valores.items() if c in campos and v is not None and not _igual(c, atual.get(c), v)}
+            if not mud:
+                continue
+            atual.update(mud)
+            linha = {f"v_{c}": atual[c] for c in campos}
+            linha.update(b_id=id_, v_busca=chave(atual), v_atualizado_em=agora)
+            linhas.append(linha)
+        if linhas and not self.simular:
+            valores_set = {c: bindparam(f"v_{c}") for c in (*campos, "busca", "atualizado_em")}
+            session.execute(update(tabela).where(tabela.c.id == bindparam("b_id")).values(valores_set), linhas)
+        return len(linhas)
+
+    def gravar(self, linhas: List[_Linha]) -> None:
+        agora = datetime.utcnow()
+        novas_p: List[Dict[str, Any]] = []
+        pend_cpf: Dict[str, int] = {}
+        pend_nis: Dict[str, int] = {}
+        upd_p: Dict[int, Dict[str, Any]] = {}
+        novas_f: List[Dict[str, Any]] = []
+        pend_fam: Dict[str, int] = {}
+        upd_f: Dict[int, Dict[str, Any]] = {}
+        vinculos: List[Tuple[Tuple[str, int], Tuple[str, int], Optional[str], bool]] = []
+
+        for ln in linhas:
+            p = ln.pessoa
+            cpf, nis = p.get("cpf"), p.get("nis")
+            pid = (self.idx_cpf.get(cpf) if cpf else None) or (self.idx_nis.get(nis) if nis else None)
+            if pid is not None:
+                upd_p.setdefault(pid, {}).update(p)
+                ref_p = ("id", pid)
+            else:
+                i = pend_cpf.get(cpf) if cpf else None
+                if i is None and nis:
+                    i = pend_nis.get(nis)
+                if i is None:
+                    if not p.get("nome"):
+                        self.p.erro(ln.numero, "nome obrigatório para pessoa nova")
+                        continue
+                    i = len(novas_p)
+                    novas_p.append(dict(p))
+                else:
+                    novas_p[i].update(p)
+                for k, pend in (("cpf", pend_cpf), ("nis", pend_nis)):
+                    if novas_p[i].get(k):
+                        pend[novas_p[i][k]] = i
+                ref_p = ("novo", i)
+
+            f = ln.familia
+            if not f:
+                continue
+            nf = f["nis_familia"]
+            fid = self.idx_fam.get(nf)
+            if fid is not None:
+                upd_f.setdefault(fid, {}).update(f)
+                ref_f = ("id", fid)
+            else:
+                j = pend_fam.get(nf)
+                if j is None:
+                    j = pend_fam[nf] = len(novas_f)
+                    novas_f.append(dict(f))
+                else:
+                    novas_f[j].update(f)
+                ref_f = ("novo", j)
+            vinculos.append((ref_p, ref_f, ln.parentesco, ln.responsavel))
+
+        base_p = {c: None for c in CAMPOS_PESSOA}
+        base_f = {c: None for c in CAMPOS_FAMILIA}
+        with Session(self.engine) as session:
+            ids_p = self._inserir(
+                session,
+                _T_PESSOA,
+                [
+                    {**base_p, **v, "municipio_id": self.municipio_id, "busca": cadastro_busca.chave_pessoa(v), "criado_em": agora, "atualizado_em": agora}
+                    for v in novas_p
+                ],
+            )
+            ids_f = self._inserir(
+                session,
+                _T_FAMILIA,
+                [
+                    {**base_f, **v, "municipio_id": self.municipio_id, "referencia_pessoa_id": None, "observacoes": None, "busca": cadastro_busca.chave_familia(v), "criado_em": agora, "atualizado_em": agora}
+                    for v in novas_f
+                ],
+            )
+            n_upd_p = self._atualizar(session, _T_PESSOA, CAMPOS_PESSOA, upd_p, cadastro_busca.chave_pessoa, agora)
+            n_upd_f = self._atualizar(session, _T_FAMILIA, CAMPOS_FAMILIA, upd_f, cadastro_busca.chave_familia, agora)
+
+            def _id(ref: Tuple[str, int], novos: List[int]) -> int:
+                return ref[1] if ref[0] == "id" else novos[ref[1]]
+
+            pares: Dict[Tuple[int, int], Tuple[Optional[str], bool]] = {}
+            for ref_p, ref_f, parentesco, responsavel in vinculos:
+                pares[(_id(ref_f, ids_f), _id(ref_p, ids_p))] = (parentesco, responsavel)
+            fids = sorted({fid for fid, _ in pares})
+            reais = [fid for fid in fids if fid > 0]
+
+            existentes = set()
+            if reais:
+                q = select(_T_MEMBRO.c.familia_id, _T_MEMBRO.c.pessoa_id).where(_T_MEMBRO.c.familia_id.in_(reais))
+                existentes = {(r[0], r[1]) for r in session.execute(q)}
+            membros = [
+                {"familia_id": fid, "pessoa_id": pid, "parentesco": par, "responsavel_bool": bool(resp), "criado_em": agora}
+                for (fid, pid), (par, resp) in pares.items()
+                if (fid, pid) not in existentes
+            ]
+            referencias = [{"b_f": fid, "b_p": pid} for (fid, pid), (_, resp) in pares.items() if resp]
+            if not self.simular:
+                if membros:
+                    session.execute(insert(_T_MEMBRO), membros)
+                if referencias:
+                    t = _T_FAMILIA
+                    session.execute(
+                        update(t)
+                        .where(t.c.id == bindparam("b_f"))
+                        .where((t.c.referencia_pessoa_id.is_(None)) | (t.c.referencia_pessoa_id != bindparam("b_p")))
+                        .values(referencia_pessoa_id=bindparam("b_p")),
+                        referencias,
+                    )
+
+            precadastros: List[Dict[str, Any]] = []
+            if self.unidade_id and fids:
+                com_pc = set()
+                if reais:
+                    q = select(_T_PRECADASTRO.c.familia_id).where(_T_PRECADASTRO.c.familia_id.in_(reais))
+                    com_pc = {r[0] for r in session.execute(q)}
+                ref_por_familia = {fid: pid for (fid, pid), (_, resp) in pares.items() if resp}
+                precadastros = [
+                    {
+                        "municipio_id": self.municipio_id,
+                        "unidade_id": self.unidade_id,
+                        "pessoa_id": ref_por_familia.get(fid),
+                        "familia_id": fid,
+                        "caso_id": None,
+                        "status": "pendente",
+                        "data_agendada": None,
+                        "observacoes": "Importado em lote (cadastro SUAS).",
+                        "criado_em": agora,
+                        "atualizado_em": agora,
+                    }
+                    for fid in fids
+                    if fid not in com_pc
+                ]
+                if precadastros and not self.simular:
+                    session.execute(insert(_T_PRECADASTRO), precadastros)
+
+            if not self.simular:
+                session.commit()
+
+        # só depois do commit: índices passam a enxergar os novos ids
+        for v, pid in zip(novas_p, ids_p):
+            if v.get("cpf"):
+                self.idx_cpf.setdefault(v["cpf"], pid)
+            if v.get("nis"):
+                self.idx_nis.setdefault(v["nis"], pid)
+        for pid, v in upd_p.items():
+            if v.get("cpf"):
+                self.idx_cpf.setdefault(v["cpf"], pid)
+            if v.get("nis"):
+                self.idx_nis.setdefault(v["nis"], pid)
+        for v, fid in zip(novas_f, ids_f):
+            self.idx_fam.setdefault(v["nis_familia"], fid)
+
+        self.p.pessoas_inseridas += len(ids_p)
+        self.p.pessoas_atualizadas += n_upd_p
+        self.p.familias_inseridas += len(ids_f)
+        self.p.familias_atualizadas += n_upd_f
+        self.p.membros_inseridos += len(membros)
+        self.p.precadastros_inseridos += len(precadastros)
+
+
+def importar(
+    arquivo: BinaryIO,
+    *,
+    municipio_id: int,
+    layout: str = "csv",
+    unidade_id: Optional[int] = None,
+    lote: int = LOTE_PADRAO,
+    simular: bool = False,
+    encoding: Optional[str] = None,
+    engine: Any = None,
+    ao_progresso: Optional[Callable[[Progresso], None]] = None,
+    pausa_s: float = 0.0,
+) -> Progresso:
+    """Importa `arquivo` (binário, com seek) em lotes de `lote` linhas."""
+    progresso = Progresso()
+    try:
+        progresso.bytes_total = os.fstat(arquivo.fileno()).st_size
+    except Exception:
+        progresso.bytes_total = None
+
+    imp = _Importador(engine or _engine(), municipio_id, unidade_id, simular, progresso)
+    imp.carregar_indices()
+
+    def _descarregar(buf: List[_Linha]) -> None:
+        if not buf:
+            return
+        try:
+            imp.gravar(buf)
+        except Exception as e:
+            # lote desfeito (rollback no fim do `with Session`); os demais seguem
+            progresso.linhas_com_erro += len(buf)
+            if len(progresso.erros) < MAX_ERROS:
+                progresso.erros.append({"linha": f"{buf[0].numero}-{buf[-1].numero}", "erro": f"lote não gravado: {type(e).__name__}: {e}"[:500]})
+        if ao_progresso is not None:
+            ao_progresso(progresso)
+        if pausa_s > 0:
+            time.sleep(pausa_s)
+
+    buf: List[_Linha] = []
+    for numero, linha, erro, avisos in ler_linhas(arquivo, layout, encoding, progresso):
+        for a in avisos:
+            progresso.erro(numero, a, aviso=True)
+        if erro:
+            progresso.erro(numero, erro)
+            continue
+        buf.append(linha)
+        if len(buf) >= max(1, int(lote)):
+            _descarregar(buf)
+            buf = []
+    _descarregar(buf)
+    return progresso
+
+
+# ============================
+# Execução em background (POST /cras/cadastros/importar)
+# ============================
+def como_dict(imp: CadastroImportacao) -> Dict[str, Any]:
+    out = imp.model_dump(exclude={"erros_json"})
+    try:
+        out["erros"] = json.loads(imp.erros_json) if imp.erros_json else []
+    except Exception:
+        out["erros"] = []
+    return out
+
+
+def _salvar(engine: Any, importacao_id: int, **valores: Any) -> None:
+    with Session(engine) as session:
+        imp = session.get(CadastroImportacao, importacao_id)
+        if imp is None:
+            return
+        for k, v in valores.items():
+            setattr(imp, k, v)
+        imp.atualizado_em = datetime.utcnow()
+        session.add(imp)
+        session.commit()
+
+
+def marcar_interrompidas(session: Session, importacao_id: Optional[int] = None) -> int:
+    """Marca como erro as importações em andamento sem batimento há mais de
+    POPRUA_IMPORTACAO_PARADA_S (o worker que rodava morreu). Commita; devolve quantas."""
+    try:
+        parada_s = int((os.getenv("POPRUA_IMPORTACAO_PARADA_S") or "").strip() or 900)
+    except ValueError:
+        parada_s = 900
+    agora = datetime.utcnow()
+    parada_s = max(60, parada_s)
+    limite = agora - timedelta(seconds=parada_s)
+    ultimo = func.coalesce(CadastroImportacao.atualizado_em, CadastroImportacao.iniciado_em, CadastroImportacao.criado_em)
+    stmt = update(CadastroImportacao).where(CadastroImportacao.status.in_(STATUS_EM_ANDAMENTO), ultimo < limite)
+    if importacao_id is not None:
+        stmt = stmt.where(CadastroImportacao.id == int(importacao_id))
+    res = session.execute(
+        stmt.values(
+            status="erro",
+            mensagem=f"interrompida: sem progresso há mais de {parada_s}s (servidor reiniciado?); reenvie o arquivo",
+            concluido_em=agora,
+            atualizado_em=agora,
+        )
+    )
+    session.commit()
+    return int(res.rowcount or 0)
+
+
+def executar(importacao_id: int, caminho: str, *, apagar_arquivo: bool = True, engine: Any = None) -> None:
+    """Roda a importação registrada em `cadastro_importacao` (atualiza o progresso a cada lote)."""
+    engine = engine or _engine()
+    with Session(engine) as session:
+        imp = session.get(CadastroImportacao, importacao_id)
+        if imp is None:
+            return
+        params = dict(municipio_id=imp.municipio_id, layout=imp.layout, unidade_id=imp.unidade_id, simular=bool(imp.simular))
+
+    def _persistir(p: Progresso) -> None:
+        _salvar(engine, importacao_id, erros_json=json.dumps(p.erros, ensure_ascii=False, default=str), **p.contadores())
+
+    _salvar(engine, importacao_id, status="processando", iniciado_em=datetime.utcnow())
+    try:
+        with open(caminho, "rb") as arquivo:
+            p = importar(arquivo, engine=engine, ao_progresso=_persistir, pausa_s=0.01, **params)
+        _persistir(p)
+        _salvar(engine, importacao_id, status="concluido", concluido_em=datetime.utcnow())
+        print(
+            f"INFO: importação {importacao_id}: {p.linhas_lidas} linhas, pessoas +{p.pessoas_inseridas}/~{p.pessoas_atualizadas}, "
+            f"famílias +{p.familias_inseridas}/~{p.familias_atualizadas}, erros {p.linhas_com_erro}"
+        )
+    except Exception as e:
+        print(f"WARN: importação {importacao_id} falhou: {type(e).__name__}: {e}")
+        _salvar(engine, importacao_id, status="erro", mensagem=f"{type(e).__name__}: {e}"[:1000], concluido_em=datetime.utcnow())
+    finally:
+        if apagar_arquivo:
+            try:
+                os.remove(caminho)
+            except OSError:
+                pass
+
+
+def executar_em_background(importacao_id: int, caminho: str) -> threading.Thread:
+    t = threading.Thread(target=executar, args=(importacao_id, caminho), name=f"poprua-importacao-{importacao_id}", daemon=True)
+    t.start()
+    return t
@@ -0,0 +1,74 @@
+# app/services/cras_relatorios_cache.py
+"""
+Cache do /cras/relatorios/overview (tela inicial da coordenação).
+
+O overview é caro (PIA, CadÚnico, SCFV, tarefas) e é aberto por todo mundo
+ao mesmo tempo no começo do expediente: fica em cache por 30s por
+(município, unidade, mês, parâmetros).
+
+Para o cache não esconder um caso recém-aberto/encerrado, escritas em
+caso_cras e cras_pia_plano descartam as entradas do município (e as dos
+usuários globais, que veem todos): projeção assíncrona "cras_overview_cache"
+(app/core/projecoes.py), aplicada depois do commit — descartar antes dele
+deixaria um request concorrente recolocar o estado antigo no cache.
+
+Limites (documentados no endpoint):
+- o cache é por processo: os outros workers seguem com o que têm por até 30s
+- SCFV, CadÚnico e tarefas não invalidam (o TTL cobre)
+- o overview lê do banco principal, não de sessao_leitura: numa cópia de
+  leitura (até minutos de atraso) o recálculo depois do descarte traria de
+  volta o estado antigo
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Set
+
+from app.core import projecoes
+from app.core.cache import TTLCache
+
+# chave: ("overview", municipio_id | None, unidade_id, ano, mes, ...parâmetros)
+OVERVIEW = TTLCache(ttl_s=30, max_itens=256)
+
+TABELAS = ("caso_cras", "cras_pia_plano")
+
+
+def descartar(municipio_id: Optional[int] = None) -> int:
+    """Descarta o overview de um município (e o dos globais); sem id, tudo."""
+    if municipio_id is None:
+        n = len(OVERVIEW)
+        OVERVIEW.clear()
+        return n
+    mid = int(municipio_id)
+    return OVERVIEW.pop_where(lambda k: isinstance(k, tuple) and len(k) > 1 and k[1] in (None, mid))
+
+
+def aplicar_eventos(session: Any, eventos: List[projecoes.Evento]) -> None:
+    mids: Set[Optional[int]] = set()
+    for ev in eventos:
+        for estado in (ev.antes, ev.depois):
+            if estado is not None:
+                mid = estado.get("municipio_id")
+                mids.add(int(mid) if mid is not None else None)
+    if None in mids:
+        descartar(None)
+        return
+    for mid in mids:
+        descartar(mid)
+
+
+def reconstruir(session: Any, municipio_id: Optional[int] = None) -> Dict[str, Any]:
+    return {"descartadas": descartar(municipio_id)}
+
+
+projecoes.registrar(
+    projecoes.Projecao(
+        nome="cras_overview_cache",
+        tabelas=TABELAS,
+        aplicar=aplicar_eventos,
+        reconstruir=reconstruir,
+        descricao="Descarta o cache do /cras/relatorios/overview do município",
+        assincrona=True,
+        invalidar=lambda session: descartar(None),
+    )
+)
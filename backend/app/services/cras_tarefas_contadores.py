@@ -0,0 +1,363 @@
+# app/services/cras_tarefas_contadores.py
+"""
+Contadores de tarefas CRAS para /cras/tarefas/resumo (widget da home do CRAS).
+
+Antes o resumo lia TODAS as tarefas do município (inclusive as concluídas, que
+só crescem) para contar abertas/vencidas/concluídas por técnico. Aqui:
+
+- abertas/concluídas ficam em cras_tarefa_contador, por
+  (municipio, unidade, responsavel), atualizadas por delta a cada tarefa
+  criada/alterada/excluída: projeção "cras_tarefas_contadores"
+  (app/core/projecoes.py), no mesmo commit da tarefa; o insert em lote das
+  automações emite os eventos com `projecoes.emitir`. O delta é um upsert
+  atômico (INSERT ... ON CONFLICT DO UPDATE): duas primeiras tarefas do mesmo
+  técnico em paralelo não colidem na unique
+- vencidas continuam vindo de crastarefa, mas só das abertas: índice parcial
+  (status != 'concluida') por município + vencimento
+- o nome do técnico vem de Usuario (diretório em lote,
+  app/services/usuarios_diretorio.py), não do texto gravado na tarefa
+- quem grava tarefas "por fora" (seed, import direto) chama `invalidar`. O
+  município sem marca em cras_tarefa_contador_municipio é recalculado por
+  GROUP BY numa thread de fundo (`recalcular_em_background`, no startup e
+  quando o resumo encontra município sem marca); até lá o resumo conta direto
+  de crastarefa, sem escrever nada
+
+Nenhuma função aqui faz commit, exceto `recalcular` (thread de fundo e
+`scripts/projecoes.py cras_tarefas_contadores`).
+"""
+
+from __future__ import annotations
+
+import threading
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import case, delete, func, literal_column, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlmodel import Session, select
+
+from app.core import projecoes
+from app.models.cras_tarefas import CrasTarefa, CrasTarefaContador, CrasTarefaContadorMunicipio
+from app.services.usuarios_diretorio import DiretorioUsuarios
+
+# (municipio_id, unidade_id, responsavel_id, concluida)
+EstadoTarefa = Tuple[int, int, int, bool]
+
+# literal (não bind param): o SQLite só usa o índice parcial se o WHERE bater com o dele
+_ABERTA = CrasTarefa.status != literal_column("'concluida'")
+
+
+def _k(v: Any) -> int:
+    return int(v) if v is not None else 0
+
+
+def estado_tarefa(t: Any) -> Optional[EstadoTarefa]:
+    """Como a tarefa conta nos contadores (None = não conta: sem município)."""
+    get = t.get if isinstance(t, dict) else (lambda k: getattr(t, k, None))
+    mid = get("municipio_id")
+    if mid is None:
+        return None
+    return (int(mid), _k(get("unidade_id")), _k(get("responsavel_id")), get("status") == "concluida")
+
+
+def _insert(session: Session, tabela: Any) -> Any:
+    """INSERT com ON CONFLICT do dialeto (SQLite e PostgreSQL têm o mesmo)."""
+    dialeto = session.get_bind().dialect.name
+    return (postgresql if dialeto == "postgresql" else sqlite).insert(tabela)
+
+
+def _aplicar(session: Session, deltas: Dict[Tuple[int, int, int], List[int]]) -> None:
+    agora = datetime.utcnow()
+    t = CrasTarefaContador.__table__
+    for (mid, uid, rid), (d_abertas, d_concluidas) in deltas.items():
+        if not d_abertas and not d_concluidas:
+            continue
+        ins = _insert(session, t).values(
+            municipio_id=mid,
+            unidade_id=uid,
+            responsavel_id=rid,
+            abertas=d_abertas,
+            concluidas=d_concluidas,
+            atualizado_em=agora,
+        )
+        session.execute(
+            ins.on_conflict_do_update(
+                index_elements=[t.c.municipio_id, t.c.unidade_id, t.c.responsavel_id],
+                set_={
+                    "abertas": t.c.abertas + d_abertas,
+                    "concluidas": t.c.concluidas + d_concluidas,
+                    "atualizado_em": agora,
+                },
+            )
+        )
+
+
+def _somar(deltas: Dict[Tuple[int, int, int], List[int]], est: EstadoTarefa, sinal: int) -> None:
+    mid, uid, rid, concluida = est
+    d = deltas.setdefault((mid, uid, rid), [0, 0])
+    d[1 if concluida else 0] += sinal
+
+
+def aplicar_eventos(session: Session, eventos: Iterable[projecoes.Evento]) -> None:
+    """Projeção: eventos de crastarefa do commit (um upsert por contador tocado)."""
+    deltas: Dict[Tuple[int, int, int], List[int]] = {}
+    for ev in eventos:
+        antes = estado_tarefa(ev.antes) if ev.antes is not None else None
+        depois = estado_tarefa(ev.depois) if ev.depois is not None else None
+        if antes == depois:
+            continue
+        if antes is not None:
+            _somar(deltas, antes, -1)
+        if depois is not None:
+            _somar(deltas, depois, +1)
+    _aplicar(session, deltas)
+
+
+def invalidar(session: Session, municipio_id: Optional[int] = None) -> None:
+    """Força recálculo (thread de fundo); até lá o resumo conta direto de crastarefa."""
+    stmt = delete(CrasTarefaContadorMunicipio)
+    if municipio_id is not None:
+        stmt = stmt.where(CrasTarefaContadorMunicipio.municipio_id == int(municipio_id))
+    session.execute(stmt)
+
+
+def _contagem(session: Session, mid: int, unidade_id: Optional[int] = None) -> List[Tuple[int, int, int, int]]:
+    """(unidade, responsavel, abertas, concluidas) direto de crastarefa (GROUP BY)."""
+    uid = func.coalesce(CrasTarefa.unidade_id, 0)
+    rid = func.coalesce(CrasTarefa.responsavel_id, 0)
+    q = (
+        select(
+            uid,
+            rid,
+            func.sum(case((_ABERTA, 1), else_=0)),
+            func.sum(case((_ABERTA, 0), else_=1)),
+        )
+        .where(CrasTarefa.municipio_id == mid)
+        .group_by(uid, rid)
+    )
+    if unidade_id is not None:
+        q = q.where(CrasTarefa.unidade_id == int(unidade_id))
+    return [(int(u or 0), int(r or 0), int(a or 0), int(c or 0)) for u, r, a, c in session.exec(q).all()]
+
+
+def _travar_escrita(session: Session) -> None:
+    """Trava de escrita antes do GROUP BY do recálculo.
+
+    Sem ela, uma tarefa commitada entre a contagem e o reinsert perde o delta
+    (o DELETE apaga o upsert dela e o INSERT grava a contagem velha), e a marca
+    do município congela o desvio.
+
+    - SQLite: BEGIN IMMEDIATE (se a transação ainda não escreveu nada); quem
+      grava tarefa espera o commit do recálculo (busy_timeout)
+    - PostgreSQL: LOCK TABLE cras_tarefa_contador em SHARE ROW EXCLUSIVE — o
+      upsert da projeção (ROW EXCLUSIVE) espera; a tarefa que já fez o upsert
+      termina antes da trava sair e entra na contagem
+    """
+    dialeto = session.get_bind().dialect.name
+    if dialeto == "sqlite":
+        if not session.connection().connection.dbapi_connection.in_transaction:
+            session.execute(text("BEGIN IMMEDIATE"))
+    elif dialeto == "postgresql":
+        session.execute(text(f"LOCK TABLE {CrasTarefaContador.__tablename__} IN SHARE ROW EXCLUSIVE MODE"))
+
+
+def recalcular(session: Session, municipio_id: int) -> None:
+    """Reconstrói os contadores do município a partir de crastarefa (GROUP BY) e commita.
+
+    Contagem e reinsert na mesma transação de escrita (`_travar_escrita`).
+    """
+    mid = int(municipio_id)
+    _travar_escrita(session)
+    rows = _contagem(session, mid)
+
+    agora = datetime.utcnow()
+    session.execute(delete(CrasTarefaContador).where(CrasTarefaContador.municipio_id == mid))
+    for u, r, abertas, concluidas in rows:
+        session.add(
+            CrasTarefaContador(
+                municipio_id=mid,
+                unidade_id=u,
+                responsavel_id=r,
+                abertas=abertas,
+                concluidas=concluidas,
+                atualizado_em=agora,
+            )
+        )
+    session.flush()
+    t = CrasTarefaContadorMunicipio.__table__
+    session.execute(
+        _insert(session, t)
+        .values(municipio_id=mid, recalculado_em=agora)
+        .on_conflict_do_update(index_elements=[t.c.municipio_id], set_={"recalculado_em": agora})
+    )
+    session.commit()
+
+
+def pendentes(session: Session) -> List[int]:
+    """Municípios com tarefa e sem marca de recálculo."""
+    marcados = select(CrasTarefaContadorMunicipio.municipio_id)
+    return [
+        int(m)
+        for m in session.exec(
+            select(CrasTarefa.municipio_id)
+            .where(CrasTarefa.municipio_id.is_not(None), CrasTarefa.municipio_id.not_in(marcados))
+            .distinct()
+        ).all()
+    ]
+
+
+def recalcular_pendentes(engine: Any) -> int:
+    """Recalcula cada município pendente numa transação própria."""
+    with Session(engine) as session:
+        mids = pendentes(session)
+    feitos = 0
+    for mid in mids:
+        with Session(engine) as session:
+            try:
+                recalcular(session, mid)
+                feitos += 1
+            except (IntegrityError, OperationalError) as e:
+                # outro worker recalculando o mesmo município: o dele vale
+                session.rollback()
+                print(f"WARN: cras_tarefas_contadores: município {mid} não recalculado agora:", e)
+    return feitos
+
+
+_thread: Optional[threading.Thread] = None
+_thread_lock = threading.Lock()
+
+
+def recalcular_em_background(engine: Any) -> bool:
+    """Dispara `recalcular_pendentes` numa thread daemon (uma por processo)."""
+    global _thread
+    with _thread_lock:
+        if _thread is not None and _thread.is_alive():
+            return False
+
+        def _rodar() -> None:
+            try:
+                n = recalcular_pendentes(engine)
+                if n:
+                    print(f"INFO: cras_tarefas_contadores: {n} município(s) recalculado(s)")
+            except Exception as e:
+                print("WARN: cras_tarefas_contadores: recálculo falhou:", e)
+
+        _thread = threading.Thread(target=_rodar, name="poprua-tarefas-contadores", daemon=True)
+        _thread.start()
+    return True
+
+
+def _nomes(session: Session, mid: int, rids: Iterable[int]) -> Dict[int, str]:
+    """Nome do técnico pelo Usuario; id sem usuário cai no nome gravado nas tarefas."""
+    rids = [r for r in rids if r]
+    nomes = DiretorioUsuarios(session).resolve(rids)
+    sem = [r for r in rids if r not in nomes]
+    if sem:
+        for rid, nome in session.exec(
+            select(CrasTarefa.responsavel_id, func.max(CrasTarefa.responsavel_nome))
+            .where(CrasTarefa.municipio_id == mid, CrasTarefa.responsavel_id.in_(sem))
+            .group_by(CrasTarefa.responsavel_id)
+        ).all():
+            if nome:
+                nomes[int(rid)] = nome
+    return nomes
+
+
+def resumo(session: Session, municipio_id: int, unidade_id: Optional[int] = None, hoje: Optional[date] = None) -> Dict[str, Any]:
+    """Mesmo formato do resumo antigo: totais + por técnico (vencidas desc, abertas desc).
+
+    Só lê. Município ainda sem contadores: conta direto de crastarefa e agenda
+    o recálculo em background.
+    """
+    mid = int(municipio_id)
+    hoje = hoje or date.today()
+
+    if session.get(CrasTarefaContadorMunicipio, mid) is None:
+        from app.core.db import engine
+
+        contagem = _contagem(session, mid, unidade_id)
+        recalcular_em_background(engine)
+    else:
+        q = select(
+            CrasTarefaContador.unidade_id,
+            CrasTarefaContador.responsavel_id,
+            CrasTarefaContador.abertas,
+            CrasTarefaContador.concluidas,
+        ).where(CrasTarefaContador.municipio_id == mid)
+        if unidade_id is not None:
+            q = q.where(CrasTarefaContador.unidade_id == int(unidade_id))
+        contagem = [(int(u or 0), int(r or 0), int(a or 0), int(c or 0)) for u, r, a, c in session.exec(q).all()]
+
+    por: Dict[int, Dict[str, Any]] = {}
+    for _uid, rid, abertas, concluidas in contagem:
+        abertas = max(0, abertas)
+        concluidas = max(0, concluidas)
+        if not abertas and not concluidas:
+            continue
+        item = por.get(rid)
+        if item is None:
+            item = por[rid] = {
+                "responsavel_id": rid or None,
+                "responsavel_nome": "—",
+                "abertas": 0,
+                "vencidas": 0,
+                "concluidas": 0,
+            }
+        item["abertas"] += abertas
+        item["concluidas"] += concluidas
+
+    for rid, nome in _nomes(session, mid, por).items():
+        por[rid]["responsavel_nome"] = nome
+
+    # vencidas: só tarefas abertas com vencimento passado (índice parcial)
+    rid_col = func.coalesce(CrasTarefa.responsavel_id, 0)
+    vq = (
+        select(rid_col, func.count())
+        .where(CrasTarefa.municipio_id == mid, _ABERTA, CrasTarefa.data_vencimento < hoje)
+        .group_by(rid_col)
+    )
+    if unidade_id is not None:
+        vq = vq.where(CrasTarefa.unidade_id == int(unidade_id))
+
+    total_vencidas = 0
+    for rid, n in session.exec(vq).all():
+        item = por.get(int(rid or 0))
+        if item is not None:
+            item["vencidas"] = int(n or 0)
+        total_vencidas += int(n or 0)
+
+    lista = list(por.values())
+    lista.sort(key=lambda x: (x["vencidas"], x["abertas"]), reverse=True)
+
+    return {
+        "total_abertas": sum(x["abertas"] for x in lista),
+        "total_vencidas": total_vencidas,
+        "por_tecnico": lista,
+    }
+
+
+def reconstruir(session: Session, municipio_id: Optional[int] = None) -> Dict[str, Any]:
+    """Recalcula um município (ou todos os que têm tarefa; contadores órfãos saem)."""
+    if municipio_id is not None:
+        mids = [int(municipio_id)]
+    else:
+        session.execute(delete(CrasTarefaContador))
+        session.execute(delete(CrasTarefaContadorMunicipio))
+        mids = [int(m) for m in session.exec(select(CrasTarefa.municipio_id).where(CrasTarefa.municipio_id.is_not(None)).distinct()).all()]
+    for mid in mids:
+        recalcular(session, mid)
+    session.commit()
+    return {"municipios": len(mids)}
+
+
+projecoes.registrar(
+    projecoes.Projecao(
+        nome="cras_tarefas_contadores",
+        tabelas=(CrasTarefa.__tablename__,),
+        aplicar=aplicar_eventos,
+        reconstruir=reconstruir,
+        descricao="Abertas/concluídas por técnico do /cras/tarefas/resumo",
+        invalidar=invalidar,
+    )
+)
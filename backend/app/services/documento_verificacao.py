@@ -0,0 +1,366 @@
+# app/services/documento_verificacao.py
+"""
+Verificação pública de documentos (QR) — caminho rápido.
+
+GET /documentos/{id}/verificar não exige token e é aberto por QR em papel: um
+ofício enviado em massa gera rajadas de leituras. Antes cada leitura carregava
+o documento, recalculava o HMAC, lia o PDF inteiro para o SHA-256, buscava o
+município e montava o HTML, disputando o threadpool com a equipe.
+
+Agora:
+- tabela `documento_verificacao` (1 linha por documento): hash do código,
+  rótulos e SHA-256/tamanho do PDF, gravados na emissão. Documento antigo é
+  materializado na 1ª verificação (o PDF é lido uma vez só)
+- LRU em memória das respostas prontas (JSON/HTML) por (id, código, formato,
+  base): leitura repetida do mesmo QR não toca no banco nem no threadpool.
+  Respostas negativas (código errado / 404) ficam menos tempo
+- ETag + Cache-Control: celular/proxy revalida com If-None-Match e recebe 304
+- o trabalho de banco roda num limitador de threads próprio (poucas vagas):
+  rajada de QR espera na fila dela, sem ocupar as threads das rotas internas
+
+Config (env):
+  POPRUA_VERIF_CACHE_S=300          validade das respostas válidas (e max-age)
+  POPRUA_VERIF_CACHE_NEG_S=30       validade de código inválido / 404
+  POPRUA_VERIF_CACHE_MAX=5000       respostas guardadas (por worker)
+  POPRUA_VERIF_CONCORRENCIA=4       threads simultâneas para cache miss
+  POPRUA_VERIF_POR_MIN=60           limite por IP (fichas/min; ver app/core/limites.py)
+  POPRUA_VERIF_RAJADA=30            rajada por IP
+"""
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+import html as html_lib
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+from app.core.cache import TTLCache
+from app.core.limites import LimiteTaxa
+from app.models.documento_verificacao import DocumentoVerificacao
+
+
+def _env_int(nome: str, default: int) -> int:
+    try:
+        return int(os.getenv(nome, str(default)))
+    except Exception:
+        return default
+
+
+CACHE_S = _env_int("POPRUA_VERIF_CACHE_S", 300)
+CACHE_NEG_S = _env_int("POPRUA_VERIF_CACHE_NEG_S", 30)
+
+_respostas = TTLCache(ttl_s=CACHE_S, max_itens=_env_int("POPRUA_VERIF_CACHE_MAX", 5000))
+_negativas = TTLCache(ttl_s=CACHE_NEG_S, max_itens=_env_int("POPRUA_VERIF_CACHE_MAX", 5000))
+
+limite_ip = LimiteTaxa(
+    por_minuto=_env_int("POPRUA_VERIF_POR_MIN", 60),
+    rajada=_env_int("POPRUA_VERIF_RAJADA", 30),
+)
+
+_limitador_threads: Any = None
+
+
+def limitador_threads() -> Any:
+    """CapacityLimiter (anyio) exclusivo da verificação; criado dentro do event loop."""
+    global _limitador_threads
+    if _limitador_threads is None:
+        import anyio
+
+        _limitador_threads = anyio.CapacityLimiter(max(1, _env_int("POPRUA_VERIF_CONCORRENCIA", 4)))
+    return _limitador_threads
+
+
+# ============================
+# Registro (emissão / 1ª verificação)
+# ============================
+def hash_codigo(codigo: str) -> str:
+    return hashlib.sha256((codigo or "").strip().upper().encode("utf-8")).hexdigest()
+
+
+def segredo_versao(segredo: bytes) -> str:
+    return hashlib.sha256(b"poprua-verif|" + (segredo or b"")).hexdigest()[:16]
+
+
+def emissor_do_caminho(arquivo_path: Optional[str]) -> Optional[str]:
+    # storage/documentos/<mid>/<ano>/<tipo>/<emissor>/...
+    parts = (arquivo_path or "").split("/")
+    if len(parts) >= 6 and parts[0] == "storage" and parts[1] == "documentos":
+        return parts[5]
+    return None
+
+
+def _sha256_arquivo(abs_path: str) -> Tuple[Optional[str], Optional[int]]:
+    try:
+        h = hashlib.sha256()
+        with open(abs_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+        return h.hexdigest(), os.path.getsize(abs_path)
+    except Exception:
+        return None, None
+
+
+def registrar(
+    session: Any,
+    doc: Any,
+    *,
+    codigo: str,
+    versao: str,
+    tipo_label: Optional[str],
+    municipio_label: Optional[str],
+    pdf_bytes: Optional[bytes] = None,
+    abs_path: Optional[str] = None,
+) -> DocumentoVerificacao:
+    """Cria/atualiza a linha de verificação do documento (sem commit)."""
+    if pdf_bytes is not None:
+        sha256, tamanho = hashlib.sha256(pdf_bytes).hexdigest(), len(pdf_bytes)
+    elif abs_path and os.path.exists(abs_path):
+        sha256, tamanho = _sha256_arquivo(abs_path)
+    else:
+        sha256, tamanho = None, None
+
+    reg = session.get(DocumentoVerificacao, int(doc.id))
+    if reg is None:
+        reg = DocumentoVerificacao(documento_id=int(doc.id), codigo_hash="", segredo_versao="")
+    reg.municipio_id = doc.municipio_id
+    reg.codigo_hash = hash_codigo(codigo)
+    reg.segredo_versao = versao
+    reg.tipo = doc.tipo
+    reg.tipo_label = tipo_label
+    reg.numero = doc.numero
+    reg.ano = doc.ano
+    reg.emissor = emissor_do_caminho(doc.arquivo_path)
+    reg.municipio_label = municipio_label
+    reg.criado_em = doc.criado_em
+    reg.arquivo_path = doc.arquivo_path
+    reg.arquivo_sha256 = sha256
+    reg.tamanho_bytes = tamanho
+    reg.atualizado_em = datetime.utcnow()
+    session.add(reg)
+    # documento novo: pode haver 404 negativo em cache para este id
+    _negativas.clear()
+    return reg
+
+
+def conferir_arquivo(session: Any, reg: DocumentoVerificacao, abs_path: str) -> Tuple[bool, Optional[str], Optional[int]]:
+    """(existe, sha256, tamanho). Só relê o PDF se o tamanho mudou desde o registro."""
+    try:
+        tamanho = os.path.getsize(abs_path) if abs_path else None
+    except OSError:
+        tamanho = None
+    if tamanho is None:
+        return False, None, None
+    if reg.arquivo_sha256 and reg.tamanho_bytes == tamanho:
+        return True, reg.arquivo_sha256, tamanho
+    sha256, tamanho = _sha256_arquivo(abs_path)
+    if sha256:
+        reg.arquivo_sha256, reg.tamanho_bytes, reg.atualizado_em = sha256, tamanho, datetime.utcnow()
+        session.add(reg)
+        session.commit()
+    return True, sha256, tamanho
+
+
+# ============================
+# Respostas
+# ============================
+@dataclass(frozen=True)
+class Resposta:
+    status: int
+    corpo: bytes
+    media_type: str
+    etag: str
+    max_age: int
+
+
+def _resposta(status: int, corpo: bytes, media_type: str, max_age: int) -> Resposta:
+    etag = '"' + hashlib.sha256(corpo).hexdigest()[:32] + '"'
+    return Resposta(status=status, corpo=corpo, media_type=media_type, etag=etag, max_age=max_age)
+
+
+def _json(status: int, conteudo: Any, max_age: int) -> Resposta:
+    corpo = JSONResponse(content=jsonable_encoder(conteudo)).body
+    return _resposta(status, corpo, "application/json", max_age)
+
+
+def _html(conteudo: str, max_age: int) -> Resposta:
+    return _resposta(200, conteudo.encode("utf-8"), "text/html", max_age)
+
+
+def nao_encontrado() -> Resposta:
+    return _json(404, {"detail": "Documento não encontrado."}, CACHE_NEG_S)
+
+
+def verificar(
+    session: Any,
+    reg: DocumentoVerificacao,
+    abs_path: str,
+    *,
+    codigo: str,
+    html: bool,
+    base: str,
+) -> Resposta:
+    valido = bool(reg.codigo_hash) and hmac.compare_digest(hash_codigo(codigo), reg.codigo_hash)
+    documento_id = int(reg.documento_id)
+    if not valido:
+        if html:
+            return _html(pagina_html(documento_id, codigo, base, valido=False), CACHE_NEG_S)
+        return _json(200, {"id": documento_id, "valido": False}, CACHE_NEG_S)
+
+    existe, sha256, tamanho = conferir_arquivo(session, reg, abs_path)
+    criado_em_fmt = None
+    try:
+        if isinstance(reg.criado_em, datetime):
+            criado_em_fmt = reg.criado_em.strftime("%d/%m/%Y %H:%M:%S")
+        else:
+            criado_em_fmt = str(reg.criado_em)
+    except Exception:
+        criado_em_fmt = None
+
+    payload = {
+        "id": documento_id,
+        "valido": True,
+        "tipo": reg.tipo,
+        "numero": reg.numero,
+        "ano": reg.ano,
+        "municipio_id": reg.municipio_id,
+        "emissor": reg.emissor,
+        "emissor_label": (reg.emissor or "").upper() if reg.emissor else None,
+        "tipo_label": reg.tipo_label,
+        "municipio_label": reg.municipio_label,
+        "criado_em_fmt": criado_em_fmt,
+        "criado_em": reg.criado_em,
+        "arquivo_existe": existe,
+        "arquivo_sha256": sha256,
+        "tamanho_bytes": tamanho,
+    }
+    if html:
+        return _html(pagina_html(documento_id, codigo, base, valido=True, payload=payload), CACHE_S)
+    return _json(200, payload, CACHE_S)
+
+
+def cache_get(chave: Tuple[Any, ...]) -> Optional[Resposta]:
+    return _respostas.get(chave) or _negativas.get(chave)
+
+
+def cache_set(chave: Tuple[Any, ...], resp: Resposta) -> None:
+    (_respostas if resp.max_age >= CACHE_S else _negativas).set(chave, resp)
+
+
+def _etag_casa(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def responder(resp: Resposta, if_none_match: Optional[str] = None) -> Response:
+    headers = {
+        "ETag": resp.etag,
+        "Cache-Control": f"public, max-age={int(resp.max_age)}",
+        "Vary": "Accept",
+    }
+    if resp.status == 200 and _etag_casa(if_none_match, resp.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=resp.corpo, status_code=resp.status, media_type=resp.media_type, headers=headers)
+
+
+def pagina_html(
+    documento_id: int,
+    codigo: str,
+    base: str,
+    *,
+    valido: bool,
+    payload: Optional[Dict[str, Any]] = None,
+) -> str:
+    ok = bool(valido)
+    title = "Verificação de documento"
+    badge = "✅ Documento válido" if ok else "❌ Documento inválido"
+    subtitle = (
+        "Este portal confirma a autenticidade do documento emitido pelo sistema."
+        if ok
+        else "O código informado não corresponde ao documento."
+    )
+
+    # Links úteis
+    code = (codigo or "").strip()
+    ver_path = f"/documentos/{int(documento_id)}/verificar?c={code}"
+    ver_json = f"{base}{ver_path}" if base else ver_path
+    ver_json = f"{ver_json}&format=json" if "?" in ver_json else f"{ver_json}?format=json"
+
+    download_path = f"/documentos/{int(documento_id)}/download"
+    download_url = f"{base}{download_path}" if base else download_path
+
+    # Campos visíveis (sem conteúdo sensível)
+    rows = ""
+    if payload:
+        def _row(k: str, v: Any) -> str:
+            return f"<tr><th>{html_lib.escape(str(k))}</th><td>{html_lib.escape(str(v))}</td></tr>"
+
+        rows_list = [
+            _row("Número", payload.get("numero")),
+            _row("Tipo", payload.get("tipo_label") or payload.get("tipo")),
+            _row("Emissor", payload.get("emissor_label") or payload.get("emissor") or "-"),
+            _row("Município", payload.get("municipio_label") or payload.get("municipio_id")),
+            _row("Ano", payload.get("ano")),
+            _row("Emitido em", payload.get("criado_em_fmt") or payload.get("criado_em")),
+            _row("Arquivo existe", "Sim" if payload.get("arquivo_existe") else "Não"),
+            _row("SHA-256", payload.get("arquivo_sha256") or "-"),
+            _row("Tamanho (bytes)", payload.get("tamanho_bytes") or "-"),
+        ]
+        rows = "\n".join(rows_list)
+
+    return f"""<!doctype html>
+<html lang="pt-br">
+<head>
+  <meta charset="utf-8"/>
+  <meta name="viewport" content="width=device-width,initial-scale=1"/>
+  <title>{title}</title>
+  <style>
+    body{{margin:0;background:#0b1220;color:#e5e7eb;font-family:system-ui,-apple-system,Segoe UI,Roboto,Arial;}}
+    .wrap{{max-width:920px;margin:0 auto;padding:24px;}}
+    .card{{background:rgba(255,255,255,.06);border:1px solid rgba(255,255,255,.12);border-radius:14px;padding:18px;}}
+    .badge{{display:inline-block;padding:8px 12px;border-radius:999px;font-weight:800;}}
+    .ok{{background:rgba(34,197,94,.18);border:1px solid rgba(34,197,94,.35);}}
+    .bad{{background:rgba(239,68,68,.16);border:1px solid rgba(239,68,68,.35);}}
+    h1{{margin:10px 0 6px;font-size:20px;}}
+    p{{margin:6px 0 0;color:rgba(229,231,235,.8)}}
+    table{{width:100%;border-collapse:collapse;margin-top:14px;}}
+    th,td{{padding:10px 8px;border-top:1px solid rgba(255,255,255,.10);font-size:14px;text-align:left;vertical-align:top;}}
+    th{{width:220px;color:rgba(229,231,235,.85);font-weight:700;}}
+    a{{color:#93c5fd;text-decoration:none}}
+    a:hover{{text-decoration:underline}}
+    .actions{{display:flex;gap:10px;flex-wrap:wrap;margin-top:14px}}
+    .btn{{display:inline-block;padding:10px 12px;border-radius:10px;border:1px solid rgba(255,255,255,.15);background:rgba(255,255,255,.06)}}
+    .small{{font-size:12px;color:rgba(229,231,235,.7);margin-top:10px;line-height:1.35}}
+    code{{background:rgba(255,255,255,.06);padding:2px 6px;border-radius:6px}}
+  </style>
+</head>
+<body>
+  <div class="wrap">
+    <div class="card">
+      <div class="badge {'ok' if ok else 'bad'}">{badge}</div>
+      <h1>{title}</h1>
+      <p>{subtitle}</p>
+
+      {'<table>'+rows+'</table>' if rows else ''}
+
+      <div class="actions">
+        <a class="btn" href="{html_lib.escape(ver_json)}">Ver JSON</a>
+        <a class="btn" href="{html_lib.escape(download_url)}">Baixar PDF (requer login)</a>
+      </div>
+
+      <div class="small">
+        Código consultado: <code>{html_lib.escape(code)}</code><br/>
+        Observação: esta página não exibe o conteúdo do documento, apenas metadados mínimos para verificação.
+      </div>
+    </div>
+  </div>
+</body>
+</html>
+"""
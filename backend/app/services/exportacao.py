@@ -0,0 +1,579 @@
+# app/services/exportacao.py
+"""
+Exportação analítica (BI) em streaming: Parquet, Arrow (IPC stream) e CSV.
+
+O time de BI raspava endpoints JSON da API de produção (paginação, LGPD por
+tela, serialização pydantic...). Aqui cada "conjunto" é uma tabela ou uma
+visão desnormalizada (join com unidade/município) lida direto no banco:
+
+- lida em blocos (`chunk` linhas, cursor único ordenado pela marca d'água)
+  e escrita bloco a bloco: 1 row group Parquet / 1 record batch Arrow /
+  N linhas CSV por bloco; nada é montado inteiro em memória
+- incremental por marca d'água: `desde` (exclusivo) até `ate`, a maior marca
+  no início da exportação (com POPRUA_EXPORT_ATRASO_S de folga para
+  transações ainda abertas). O próximo `desde` é o `ate` devolvido
+  (header X-Export-Watermark / tabela exportacao_marca na CLI).
+  Exclusões não aparecem no incremental; faça uma carga completa periódica
+- CSV com csv.writer (aspas/escape corretos), UTF-8, cabeçalho na 1ª linha
+- colunas de identificação/texto livre (nome, CPF, NIS, observações...)
+  ficam fora por padrão; `incluir_sensiveis=True` só para admin
+- município: filtro opcional (obrigatório para quem não é global, no router)
+
+Parquet/Arrow precisam de `pyarrow` (opcional: pip install pyarrow); sem ele
+só CSV fica disponível.
+
+Uso: GET /exportacao/{conjunto}?formato=parquet&desde=... (app/routers/exportacao.py)
+ou scripts/exportar_bi.py (grava arquivos e guarda a marca por destino).
+"""
+
+from __future__ import annotations
+
+import csv
+import importlib
+import io
+import os
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import Boolean, Date, DateTime, Float, Integer, Numeric, and_, func, or_, select
+
+try:
+    import pyarrow as pa  # type: ignore
+    import pyarrow.parquet as pq  # type: ignore
+except Exception:  # pragma: no cover
+    pa = None  # type: ignore
+    pq = None  # type: ignore
+
+
+FORMATOS = ("parquet", "arrow", "csv")
+CHUNK_PADRAO = 5000
+
+MEDIA_TYPES = {
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "csv": "text/csv; charset=utf-8",
+}
+EXTENSOES = {"parquet": "parquet", "arrow": "arrows", "csv": "csv"}
+
+
+def _atraso_s() -> int:
+    try:
+        return max(0, int(os.getenv("POPRUA_EXPORT_ATRASO_S", "30")))
+    except Exception:
+        return 30
+
+
+def formatos_disponiveis() -> List[str]:
+    return [f for f in FORMATOS if f == "csv" or pa is not None]
+
+
+# ============================
+# Conjuntos (tabelas e visões)
+# ============================
+@dataclass
+class Fonte:
+    colunas: List[Any]  # colunas/labels do SELECT, na ordem do arquivo
+    de: Any  # FROM (tabela ou join)
+    marca: Any  # coluna da marca d'água (data/hora ou id)
+    chave: Any  # id (desempate da ordem)
+    municipio: Any = None
+
+
+@dataclass(frozen=True)
+class Conjunto:
+    nome: str
+    descricao: str
+    fonte: Callable[[], Fonte]
+    sensiveis: Tuple[str, ...] = ()
+
+
+def _model(caminho: str) -> Any:
+    modulo, classe = caminho.rsplit(".", 1)
+    return getattr(importlib.import_module(modulo), classe)
+
+
+def _com_arquivo(t: Any) -> Any:
+    """Casos encerrados/eventos antigos movidos para arq_* continuam na exportação."""
+    from app.services import arquivo
+
+    return arquivo.tabela_com_arquivo(t)
+
+
+def _tabela(
+    caminho: str,
+    marca: str,
+    omitir: Tuple[str, ...] = (),
+    via: Optional[Tuple[str, str]] = None,
+) -> Callable[[], Fonte]:
+    """Tabela inteira. `via=(model pai, fk)`: município vem do pai (tabela sem municipio_id)."""
+
+    def _fonte() -> Fonte:
+        t = _com_arquivo(_model(caminho).__table__)
+        colunas = [c for c in t.c if c.name not in omitir]
+        if via is None:
+            return Fonte(colunas, t, t.c[marca], t.c.id, t.c.get("municipio_id"))
+        pai = _com_arquivo(_model(via[0]).__table__)
+        return Fonte(colunas, t.join(pai, pai.c.id == t.c[via[1]]), t.c[marca], t.c.id, pai.c.municipio_id)
+
+    return _fonte
+
+
+def _casos_cras() -> Fonte:
+    c = _com_arquivo(_model("app.models.caso_cras.CasoCras").__table__)
+    u = _model("app.models.cras_unidade.CrasUnidade").__table__
+    m = _model("app.models.municipio.Municipio").__table__
+    p = _model("app.models.pessoa_suas.PessoaSUAS").__table__
+    de = c.outerjoin(u, u.c.id == c.c.unidade_id).outerjoin(m, m.c.id == c.c.municipio_id).outerjoin(p, p.c.id == c.c.pessoa_id)
+    colunas = [
+        c.c.id,
+        c.c.municipio_id,
+        m.c.nome.label("municipio_nome"),
+        m.c.uf.label("municipio_uf"),
+        c.c.unidade_id,
+        u.c.nome.label("unidade_nome"),
+        c.c.tipo_caso,
+        c.c.status,
+        c.c.etapa_atual,
+        c.c.prioridade,
+        c.c.tecnico_responsavel_id,
+        c.c.pessoa_id,
+        c.c.familia_id,
+        p.c.sexo.label("pessoa_sexo"),
+        p.c.data_nascimento.label("pessoa_data_nascimento"),
+        p.c.bairro.label("pessoa_bairro"),
+        p.c.territorio.label("pessoa_territorio"),
+        c.c.data_abertura,
+        c.c.data_encerramento,
+        c.c.data_inicio_etapa_atual,
+        c.c.prazo_etapa_dias,
+        c.c.estagnado,
+        c.c.aguardando_validacao,
+        c.c.atualizado_em,
+    ]
+    return Fonte(colunas, de, c.c.atualizado_em, c.c.id, c.c.municipio_id)
+
+
+def _rma_eventos() -> Fonte:
+    r = _com_arquivo(_model("app.models.rma_evento.RmaEvento").__table__)
+    u = _model("app.models.cras_unidade.CrasUnidade").__table__
+    m = _model("app.models.municipio.Municipio").__table__
+    de = r.outerjoin(u, u.c.id == r.c.unidade_id).outerjoin(m, m.c.id == r.c.municipio_id)
+    colunas = [
+        r.c.id,
+        r.c.municipio_id,
+        m.c.nome.label("municipio_nome"),
+        m.c.uf.label("municipio_uf"),
+        r.c.unidade_id,
+        u.c.nome.label("unidade_nome"),
+        r.c.servico,
+        r.c.acao,
+        r.c.alvo_tipo,
+        r.c.alvo_id,
+        r.c.pessoa_id,
+        r.c.familia_id,
+        r.c.caso_id,
+        r.c.data_evento,
+        r.c.meta_json,
+        r.c.criado_em,
+        r.c.criado_por_usuario_id,
+        r.c.criado_por_nome,
+    ]
+    return Fonte(colunas, de, r.c.criado_em, r.c.id, r.c.municipio_id)
+
+
+def _encaminhamentos_suas() -> Fonte:
+    e = _model("app.models.suas_encaminhamento.SuasEncaminhamento").__table__
+    m = _model("app.models.municipio.Municipio").__table__
+    de = e.outerjoin(m, m.c.id == e.c.municipio_id)
+    colunas = [m.c.nome.label("municipio_nome"), m.c.uf.label("municipio_uf")]
+    colunas = [e.c.id, e.c.municipio_id, *colunas, *[c for c in e.c if c.name not in ("id", "municipio_id")]]
+    return Fonte(colunas, de, e.c.atualizado_em, e.c.id, e.c.municipio_id)
+
+
+_TEXTO_ENC_SUAS = (
+    "motivo",
+    "retorno_texto",
+    "retorno_detalhe",
+    "retorno_modelo_json",
+    "cobranca_ultimo_texto",
+    "origem_caso_label",
+    "criado_por_nome",
+    "atualizado_por_nome",
+)
+
+CONJUNTOS: Dict[str, Conjunto] = {
+    c.nome: c
+    for c in (
+        # tabelas
+        Conjunto(
+            "pessoa_suas",
+            "Cadastro SUAS (pessoas)",
+            _tabela("app.models.pessoa_suas.PessoaSUAS", "atualizado_em", omitir=("busca",)),
+            ("nome", "nome_social", "cpf", "nis", "telefone", "email", "endereco", "observacoes"),
+        ),
+        Conjunto(
+            "familia_suas",
+            "Cadastro SUAS (famílias)",
+            _tabela("app.models.familia_suas.FamiliaSUAS", "atualizado_em", omitir=("busca",)),
+            ("nis_familia", "endereco", "observacoes"),
+        ),
+        Conjunto(
+            "familia_membro",
+            "Composição familiar",
+            _tabela("app.models.familia_suas.FamiliaMembro", "criado_em", via=("app.models.familia_suas.FamiliaSUAS", "familia_id")),
+        ),
+        Conjunto(
+            "caso_cras",
+            "Casos CRAS",
+            _tabela("app.models.caso_cras.CasoCras", "atualizado_em"),
+            ("observacoes_iniciais", "observacoes_gerais", "motivo_estagnacao"),
+        ),
+        Conjunto(
+            "caso_cras_historico",
+            "Histórico de etapas dos casos CRAS",
+            _tabela("app.models.caso_cras.CasoCrasHistorico", "criado_em", via=("app.models.caso_cras.CasoCras", "caso_id")),
+            ("usuario_nome", "observacoes", "motivo_estagnacao"),
+        ),
+        Conjunto(
+            "creas_caso",
+            "Casos CREAS",
+            _tabela("app.models.creas_caso.CreasCaso", "atualizado_em"),
+            ("titulo", "observacoes_iniciais", "observacoes_gerais", "motivo_encerramento", "motivo_estagnacao"),
+        ),
+        Conjunto(
+            "casopoprua",
+            "Casos População de Rua",
+            _tabela("app.models.caso_pop_rua.CasoPopRua", "data_ultima_atualizacao"),
+            ("observacoes_iniciais", "observacoes_gerais", "motivo_encerramento", "motivo_estagnacao"),
+        ),
+        Conjunto("rma_evento", "Eventos do RMA", _tabela("app.models.rma_evento.RmaEvento", "criado_em"), ("meta_json", "criado_por_nome")),
+        Conjunto(
+            "cras_encaminhamento",
+            "Encaminhamentos CRAS (rede)",
+            _tabela("app.models.cras_encaminhamento.CrasEncaminhamento", "atualizado_em"),
+            ("motivo", "observacao_operacional", "criado_por_nome", "atualizado_por_nome"),
+        ),
+        Conjunto(
+            "suas_encaminhamento",
+            "Encaminhamentos SUAS (CRAS/CREAS)",
+            _tabela("app.models.suas_encaminhamento.SuasEncaminhamento", "atualizado_em"),
+            _TEXTO_ENC_SUAS,
+        ),
+        Conjunto(
+            "cadunico_precadastro",
+            "Pré-cadastros CadÚnico",
+            _tabela("app.models.cadunico_precadastro.CadunicoPreCadastro", "atualizado_em"),
+            ("observacoes",),
+        ),
+        # visões desnormalizadas
+        Conjunto("casos_cras_bi", "Casos CRAS + unidade, município e perfil da pessoa", _casos_cras),
+        Conjunto("rma_eventos_bi", "Eventos do RMA + unidade e município", _rma_eventos, ("meta_json", "criado_por_nome")),
+        Conjunto("encaminhamentos_suas_bi", "Encaminhamentos SUAS + município", _encaminhamentos_suas, _TEXTO_ENC_SUAS),
+    )
+}
+
+
+# ============================
+# Plano (colunas, filtros, marca)
+# ============================
+def _tipo(col: Any) -> str:
+    t = getattr(col, "type", None)
+    if isinstance(t, Boolean):
+        return "bool"
+    if isinstance(t, Integer):
+        return "int"
+    if isinstance(t, (Float, Numeric)):
+        return "float"
+    if isinstance(t, DateTime):
+        return "datetime"
+    if isinstance(t, Date):
+        return "date"
+    return "str"
+
+
+def _nome(col: Any) -> str:
+    return getattr(col, "name", None) or getattr(col, "key", "")
+
+
+def ler_marca(valor: Optional[str], tipo: str) -> Any:
+    """Texto (query string / tabela) -> valor da marca no tipo da coluna."""
+    if valor is None or str(valor).strip() == "":
+        return None
+    s = str(valor).strip()
+    if tipo == "int":
+        return int(s)
+    if tipo == "date":
+        return date.fromisoformat(s[:10])
+    return datetime.fromisoformat(s.replace("Z", ""))
+
+
+def texto_marca(valor: Any) -> Optional[str]:
+    if valor is None:
+        return None
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    return str(valor)
+
+
+@dataclass
+class Plano:
+    conjunto: str
+    colunas: List[Any]
+    nomes: List[str]
+    tipos: List[str]
+    consulta: Any
+    desde: Any
+    ate: Any
+    marca_tipo: str
+
+
+def descrever(conjunto: Conjunto) -> Dict[str, Any]:
+    fonte = conjunto.fonte()
+    return {
+        "nome": conjunto.nome,
+        "descricao": conjunto.descricao,
+        "marca": _nome(fonte.marca),
+        "colunas": [{"nome": _nome(c), "tipo": _tipo(c), "sensivel": _nome(c) in conjunto.sensiveis} for c in fonte.colunas],
+    }
+
+
+def planejar(
+    conn: Any,
+    nome: str,
+    *,
+    municipio_id: Optional[int] = None,
+    desde: Any = None,
+    incluir_sensiveis: bool = False,
+) -> Plano:
+    """Monta a consulta e fixa `ate` (maior marca agora, menos a folga)."""
+    conjunto = CONJUNTOS.get(nome)
+    if conjunto is None:
+        raise KeyError(nome)
+    fonte = conjunto.fonte()
+    colunas = [c for c in fonte.colunas if incluir_sensiveis or _nome(c) not in conjunto.sensiveis]
+    marca_tipo = _tipo(fonte.marca)
+    if isinstance(desde, str):
+        desde = ler_marca(desde, marca_tipo)
+
+    filtros: List[Any] = []
+    if municipio_id is not None:
+        if fonte.municipio is None:
+            raise ValueError(f"conjunto {nome} não tem município para filtrar")
+        filtros.append(fonte.municipio == int(municipio_id))
+
+    ate = conn.execute(select(func.max(fonte.marca)).select_from(fonte.de).where(*filtros)).scalar()
+    if isinstance(ate, datetime):
+        ate = min(ate, datetime.utcnow() - timedelta(seconds=_atraso_s()))
+    if desde is not None and (ate is None or ate < desde):
+        # nada novo (ou só dentro da folga): a marca não volta
+        ate = desde
+
+    if desde is not None:
+        filtros.append(fonte.marca > desde)
+        filtros.append(fonte.marca <= ate)
+    elif ate is not None:
+        # carga completa: linhas sem marca também vão
+        filtros.append(or_(fonte.marca <= ate, fonte.marca.is_(None)))
+
+    consulta = select(*colunas).select_from(fonte.de)
+    if filtros:
+        consulta = consulta.where(and_(*filtros))
+    consulta = consulta.order_by(fonte.marca, fonte.chave)
+    return Plano(
+        conjunto=nome,
+        colunas=colunas,
+        nomes=[_nome(c) for c in colunas],
+        tipos=[_tipo(c) for c in colunas],
+        consulta=consulta,
+        desde=desde,
+        ate=ate,
+        marca_tipo=marca_tipo,
+    )
+
+
+# ============================
+# Escritores (bloco a bloco)
+# ============================
+class _EscritorCSV:
+    def __init__(self, sink: BinaryIO, plano: Plano) -> None:
+        self.sink = sink
+        self._buf = io.StringIO()
+        self._w = csv.writer(self._buf, lineterminator="\n")
+        self._w.writerow(plano.nomes)
+        self._flush()
+
+    def _flush(self) -> None:
+        self.sink.write(self._buf.getvalue().encode("utf-8"))
+        self._buf.seek(0)
+        self._buf.truncate()
+
+    @staticmethod
+    def _valor(v: Any) -> Any:
+        if v is None:
+            return ""
+        if isinstance(v, bool):
+            return "true" if v else "false"
+        if isinstance(v, (datetime, date)):
+            return v.isoformat()
+        return v
+
+    def escrever(self, linhas: List[Any]) -> None:
+        self._w.writerows([self._valor(v) for v in ln] for ln in linhas)
+        self._flush()
+
+    def fechar(self) -> None:
+        pass
+
+
+def _schema_arrow(plano: Plano) -> Any:
+    tipos = {
+        "bool": pa.bool_(),
+        "int": pa.int64(),
+        "float": pa.float64(),
+        "datetime": pa.timestamp("us"),
+        "date": pa.date32(),
+        "str": pa.string(),
+    }
+    return pa.schema([pa.field(n, tipos[t]) for n, t in zip(plano.nomes, plano.tipos)])
+
+
+class _EscritorArrow:
+    """Parquet (1 row group por bloco) ou Arrow IPC stream (1 record batch por bloco)."""
+
+    def __init__(self, sink: BinaryIO, plano: Plano, formato: str) -> None:
+        if pa is None:
+            raise RuntimeError("formato requer pyarrow (pip install pyarrow)")
+        self.schema = _schema_arrow(plano)
+        self.tipos = plano.tipos
+        if formato == "parquet":
+            self._w = pq.ParquetWriter(sink, self.schema, compression="snappy")
+        else:
+            self._w = pa.ipc.new_stream(sink, self.schema)
+
+    def escrever(self, linhas: List[Any]) -> None:
+        colunas = list(zip(*linhas)) if linhas else [()] * len(self.tipos)
+        arrays = []
+        for valores, t, campo in zip(colunas, self.tipos, self.schema):
+            if t == "str":
+                valores = [None if v is None else str(v) for v in valores]
+            arrays.append(pa.array(valores, type=campo.type))
+        self._w.write_batch(pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+
+    def fechar(self) -> None:
+        self._w.close()
+
+
+def _escritor(sink: BinaryIO, plano: Plano, formato: str) -> Any:
+    if formato not in FORMATOS:
+        raise ValueError(f"formato inválido: {formato!r}")
+    if formato == "csv":
+        return _EscritorCSV(sink, plano)
+    return _EscritorArrow(sink, plano, formato)
+
+
+class _Buffer(io.RawIOBase):
+    """Sink em memória esvaziado a cada bloco (streaming HTTP)."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._partes: List[bytes] = []
+        self._pos = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b: Any) -> int:
+        dados = bytes(b)
+        self._partes.append(dados)
+        self._pos += len(dados)
+        return len(dados)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def drenar(self) -> bytes:
+        out = b"".join(self._partes)
+        self._partes = []
+        return out
+
+
+@dataclass
+class Resultado:
+    linhas: int = 0
+    blocos: int = 0
+
+
+def _blocos(conn: Any, plano: Plano, chunk: int) -> Iterator[List[Any]]:
+    res = conn.execution_options(stream_results=True, yield_per=max(1, int(chunk))).execute(plano.consulta)
+    for parte in res.partitions():
+        yield [tuple(r) for r in parte]
+
+
+def exportar(conn: Any, plano: Plano, sink: BinaryIO, formato: str, chunk: int = CHUNK_PADRAO) -> Resultado:
+    """Escreve o conjunto inteiro em `sink` (arquivo aberto em binário)."""
+    w = _escritor(sink, plano, formato)
+    out = Resultado()
+    for linhas in _blocos(conn, plano, chunk):
+        w.escrever(linhas)
+        out.linhas += len(linhas)
+        out.blocos += 1
+    w.fechar()
+    return out
+
+
+def gerar(engine: Any, plano: Plano, formato: str, chunk: int = CHUNK_PADRAO) -> Iterator[bytes]:
+    """Mesmo que `exportar`, devolvendo os bytes bloco a bloco (StreamingResponse)."""
+    buf = _Buffer()
+    w = _escritor(buf, plano, formato)
+    cabecalho = buf.drenar()
+    if cabecalho:
+        yield cabecalho
+    with engine.connect() as conn:
+        for linhas in _blocos(conn, plano, chunk):
+            w.escrever(linhas)
+            dados = buf.drenar()
+            if dados:
+                yield dados
+    w.fechar()
+    resto = buf.drenar()
+    if resto:
+        yield resto
+
+
+# ============================
+# Marca por destino (CLI incremental)
+# ============================
+def marca_salva(session: Any, destino: str, conjunto: str, municipio_id: Optional[int]) -> Optional[str]:
+    from app.models.exportacao_marca import ExportacaoMarca
+
+    row = session.execute(
+        select(ExportacaoMarca).where(
+            ExportacaoMarca.destino == destino,
+            ExportacaoMarca.conjunto == conjunto,
+            ExportacaoMarca.municipio_id == int(municipio_id or 0),
+        )
+    ).scalars().first()
+    return row.valor if row else None
+
+
+def salvar_marca(session: Any, destino: str, conjunto: str, municipio_id: Optional[int], valor: Any, linhas: int) -> None:
+    from app.models.exportacao_marca import ExportacaoMarca
+
+    texto = texto_marca(valor)
+    if texto is None:
+        return
+    row = session.execute(
+        select(ExportacaoMarca).where(
+            ExportacaoMarca.destino == destino,
+            ExportacaoMarca.conjunto == conjunto,
+            ExportacaoMarca.municipio_id == int(municipio_id or 0),
+        )
+    ).scalars().first()
+    if row is None:
+        row = ExportacaoMarca(destino=destino, conjunto=conjunto, municipio_id=int(municipio_id or 0), valor=texto)
+    row.valor = texto
+    row.linhas = int(linhas)
+    row.atualizado_em = datetime.utcnow()
+    session.add(row)
+    session.commit()
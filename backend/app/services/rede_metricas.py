@@ -0,0 +1,493 @@
+# app/services/rede_metricas.py
+"""
+Agregados da rede (encaminhamentos CRAS e intermunicipais) para
+/gestao/rede/metricas e /gestao/dashboard/sla?group_by=destino.
+
+Antes cada chamada lia TODOS os encaminhamentos (anos de histórico) para tirar
+médias e % no prazo por destino. Aqui:
+
+- contagens, somas de tempo e "no prazo" ficam em rede_metrica, por destino e
+  mês (AAAAMM do marco), atualizadas por delta a cada encaminhamento
+  criado/alterado/excluído: projeção "rede_metricas" (app/core/projecoes.py),
+  no mesmo commit da escrita, venha ela de qual rota vier; o acumulado do
+  destino é a soma dos meses e a série mensal (GET /gestao/rede/metricas/serie)
+  sai da mesma tabela
+- atrasados/em risco dependem do relógio e continuam calculados na leitura,
+  mas só sobre os pendentes: índices parciais (status fora de
+  concluido/cancelado) em app/core/db_indexes.py
+- "no prazo" usa o SLA vigente quando o marco é contado; a marca da rede
+  guarda a versão do SLA (services/sla_resolver.py) e, se as regras mudarem,
+  a próxima leitura recalcula a rede inteira com as regras novas
+- quem grava encaminhamentos "por fora" (seed, import direto) chama
+  `invalidar`; a rede sem marca é recalculada na próxima leitura
+
+Nenhuma função aqui faz commit, exceto `recalcular` (chamada na leitura, no
+banco principal mesmo quando a leitura vem de cópia/réplica, app/core/leitura.py,
+e pelo `scripts/projecoes.py rede_metricas`).
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, delete, func, insert, literal_column, or_, update
+from sqlmodel import Session, select
+
+from app.core import projecoes
+from app.models.cras_encaminhamento import CrasEncaminhamento
+from app.models.encaminhamentos import EncaminhamentoIntermunicipal
+from app.models.rede_metrica import RedeMetrica, RedeMetricaMarca
+from app.services.sla_resolver import SLA_PADRAO, resolvedor as resolvedor_sla
+
+REDES = ("cras", "intermunicipal")
+
+# (rede, municipio_id, municipio_destino_id, destino_tipo, destino_nome, periodo)
+Chave = Tuple[str, int, int, str, str, int]
+
+CONTADORES: Tuple[str, ...] = (
+    "total",
+    "concluidos",
+    "cancelados",
+    "recebidos",
+    "recebidos_no_prazo",
+    "soma_horas_recebido",
+    "devolutivas",
+    "devolutivas_no_prazo",
+    "devolutivas_medidas",
+    "soma_horas_devolutiva",
+    "conclusoes",
+    "conclusoes_no_prazo",
+    "conclusoes_medidas",
+    "soma_dias_conclusao",
+    "contatos",
+    "contatos_no_prazo",
+    "soma_horas_contato",
+)
+
+# literais (não bind params): o SQLite só usa o índice parcial se o WHERE bater com o dele
+_FINAIS = [literal_column("'concluido'"), literal_column("'cancelado'")]
+PENDENTE_CRAS = CrasEncaminhamento.status.not_in(_FINAIS)
+PENDENTE_INTER = EncaminhamentoIntermunicipal.status.not_in(_FINAIS)
+
+_CAMPOS_CRAS = (
+    "municipio_id",
+    "unidade_id",
+    "destino_tipo",
+    "destino_nome",
+    "status",
+    "criado_em",
+    "enviado_em",
+    "recebido_em",
+    "atendido_em",
+    "devolutiva_em",
+    "concluido_em",
+    "cancelado_em",
+)
+_CAMPOS_INTER = (
+    "municipio_origem_id",
+    "municipio_destino_id",
+    "status",
+    "criado_em",
+    "contato_em",
+    "concluido_em",
+    "cancelado_em",
+)
+
+
+# ============================
+# Estado de um encaminhamento
+# ============================
+def _ler_campos(enc: Any, campos: Tuple[str, ...]) -> Dict[str, Any]:
+    get = enc.get if isinstance(enc, dict) else (lambda k: getattr(enc, k, None))
+    return {c: get(c) for c in campos}
+
+
+def estado_cras(enc: Any) -> Optional[Dict[str, Any]]:
+    """Como o encaminhamento CRAS conta nos agregados (None = não conta: sem município)."""
+    d = _ler_campos(enc, _CAMPOS_CRAS)
+    if d["municipio_id"] is None:
+        return None
+    d["rede"] = "cras"
+    d["status"] = str(d["status"] or "").strip().lower() or "enviado"
+    return d
+
+
+def estado_inter(enc: Any) -> Optional[Dict[str, Any]]:
+    """Idem para o intermunicipal (None = sem município destino)."""
+    d = _ler_campos(enc, _CAMPOS_INTER)
+    if d["municipio_destino_id"] is None:
+        return None
+    d["rede"] = "intermunicipal"
+    d["status"] = str(d["status"] or "").strip().lower() or "solicitado"
+    return d
+
+
+def _periodo(dt: Any) -> int:
+    return dt.year * 100 + dt.month if isinstance(dt, datetime) else 0
+
+
+def _dt(v: Any) -> Optional[datetime]:
+    return v if isinstance(v, datetime) else None
+
+
+def _horas(fim: datetime, ini: datetime) -> float:
+    return max(0.0, (fim - ini).total_seconds() / 3600.0)
+
+
+def _contribuicoes(est: Dict[str, Any], sla: Callable[..., int]) -> Dict[Chave, Dict[str, float]]:
+    """Quanto UM encaminhamento soma em cada (destino, mês). Mesmas regras que
+    gestao_rede_metricas usava ao varrer a tabela."""
+    out: Dict[Chave, Dict[str, float]] = {}
+
+    if est["rede"] == "cras":
+        mid = int(est["municipio_id"])
+        uid = est.get("unidade_id")
+        tipo = str(est.get("destino_tipo") or "").strip().lower() or "outro"
+        nome = str(est.get("destino_nome") or "").strip() or "Sem destino"
+        base: Tuple[Any, ...] = ("cras", mid, 0, tipo, nome)
+    else:
+        mid = int(est.get("municipio_origem_id") or 0)
+        did = int(est["municipio_destino_id"])
+        base = ("intermunicipal", mid, did, "", "")
+
+    def _somar(dt: Optional[datetime], campo: str, v: float = 1) -> None:
+        d = out.setdefault(base + (_periodo(dt),), {})  # type: ignore[arg-type]
+        d[campo] = d.get(campo, 0) + v
+
+    st = est["status"]
+    if est["rede"] == "cras":
+        padrao = SLA_PADRAO["cras_encaminhamento"]
+
+        def _prazo(etapa: str) -> timedelta:
+            return timedelta(days=int(sla(mid, "cras", uid, "cras_encaminhamento", etapa, int(padrao.get(etapa, 2)))))
+
+        enviado = _dt(est.get("enviado_em"))
+        recebido = _dt(est.get("recebido_em"))
+        atendido = _dt(est.get("atendido_em"))
+        devolutiva = _dt(est.get("devolutiva_em"))
+        concluido = _dt(est.get("concluido_em"))
+        inicio = enviado or _dt(est.get("criado_em"))
+
+        _somar(inicio, "total")
+        if st == "concluido":
+            _somar(concluido or devolutiva or inicio, "concluidos")
+        elif st == "cancelado":
+            _somar(_dt(est.get("cancelado_em")) or inicio, "cancelados")
+
+        # tempo até recebido (SLA da etapa "enviado")
+        if enviado and recebido:
+            _somar(recebido, "recebidos")
+            _somar(recebido, "soma_horas_recebido", _horas(recebido, enviado))
+            if recebido <= enviado + _prazo("enviado"):
+                _somar(recebido, "recebidos_no_prazo")
+
+        # tempo até devolutiva: do "atendido" (fallback: enviado); SLA da etapa "atendido"
+        if devolutiva:
+            _somar(devolutiva, "devolutivas")
+            ref = atendido or enviado
+            if ref:
+                _somar(devolutiva, "devolutivas_medidas")
+                _somar(devolutiva, "soma_horas_devolutiva", _horas(devolutiva, ref))
+            if atendido and devolutiva <= atendido + _prazo("atendido"):
+                _somar(devolutiva, "devolutivas_no_prazo")
+
+        # conclusão: dias desde o envio; SLA da etapa "devolutiva"
+        if concluido:
+            _somar(concluido, "conclusoes")
+            if enviado:
+                _somar(concluido, "conclusoes_medidas")
+                _somar(concluido, "soma_dias_conclusao", _horas(concluido, enviado) / 24.0)
+            if devolutiva and concluido <= devolutiva + _prazo("devolutiva"):
+                _somar(concluido, "conclusoes_no_prazo")
+    else:
+        criado = _dt(est.get("criado_em"))
+        contato = _dt(est.get("contato_em"))
+
+        _somar(criado, "total")
+        if st == "concluido":
+            _somar(_dt(est.get("concluido_em")) or criado, "concluidos")
+        elif st == "cancelado":
+            _somar(_dt(est.get("cancelado_em")) or criado, "cancelados")
+
+        # SLA medido pelo município destino (quem responde)
+        if criado and contato:
+            _somar(contato, "contatos")
+            _somar(contato, "soma_horas_contato", _horas(contato, criado))
+            padrao = int(SLA_PADRAO["rede_intermunicipal"].get("solicitado", 2))
+            dias = int(sla(int(est["municipio_destino_id"]), None, None, "rede_intermunicipal", "solicitado", padrao))
+            if contato <= criado + timedelta(days=dias):
+                _somar(contato, "contatos_no_prazo")
+
+    return out
+
+
+# ============================
+# Gravação (deltas)
+# ============================
+def _acumular(deltas: Dict[Chave, Dict[str, float]], est: Dict[str, Any], sla: Callable[..., int], sinal: int) -> None:
+    for chave, valores in _contribuicoes(est, sla).items():
+        d = deltas.setdefault(chave, {})
+        for campo, v in valores.items():
+            d[campo] = d.get(campo, 0) + sinal * v
+
+
+def _aplicar(session: Session, deltas: Dict[Chave, Dict[str, float]]) -> None:
+    agora = datetime.utcnow()
+    for (rede, mid, did, tipo, nome, periodo), d in deltas.items():
+        d = {k: v for k, v in d.items() if abs(v) > 1e-9}
+        if not d:
+            continue
+        valores: Dict[str, Any] = {k: getattr(RedeMetrica, k) + v for k, v in d.items()}
+        valores["atualizado_em"] = agora
+        res = session.execute(
+            update(RedeMetrica)
+            .where(
+                RedeMetrica.rede == rede,
+                RedeMetrica.municipio_id == mid,
+                RedeMetrica.municipio_destino_id == did,
+                RedeMetrica.destino_tipo == tipo,
+                RedeMetrica.destino_nome == nome,
+                RedeMetrica.periodo == periodo,
+            )
+            .values(**valores)
+        )
+        if not res.rowcount:
+            session.add(
+                RedeMetrica(
+                    rede=rede,
+                    municipio_id=mid,
+                    municipio_destino_id=did,
+                    destino_tipo=tipo,
+                    destino_nome=nome,
+                    periodo=periodo,
+                    atualizado_em=agora,
+                    **d,
+                )
+            )
+            session.flush()
+
+
+def aplicar_eventos(session: Session, eventos: Iterable[projecoes.Evento]) -> None:
+    """Projeção: encaminhamentos criados/alterados/excluídos no commit.
+
+    Evento com antes=None é criação, depois=None é exclusão; o SLA é resolvido
+    uma vez para o lote e todos os deltas saem num só `_aplicar`.
+    """
+    sla: Optional[Callable[..., int]] = None
+    deltas: Dict[Chave, Dict[str, float]] = {}
+    for ev in eventos:
+        estado = estado_cras if ev.tabela == CrasEncaminhamento.__tablename__ else estado_inter
+        antes = estado(ev.antes) if ev.antes is not None else None
+        depois = estado(ev.depois) if ev.depois is not None else None
+        if antes == depois:
+            continue
+        if sla is None:
+            sla = resolvedor_sla(session).dias
+        if antes is not None:
+            _acumular(deltas, antes, sla, -1)
+        if depois is not None:
+            _acumular(deltas, depois, sla, +1)
+    _aplicar(session, deltas)
+
+
+def invalidar(session: Session, rede: Optional[str] = None) -> None:
+    """Força recálculo na próxima leitura (uma rede ou as duas)."""
+    stmt = delete(RedeMetricaMarca)
+    if rede is not None:
+        stmt = stmt.where(RedeMetricaMarca.rede == rede)
+    session.execute(stmt)
+
+
+def recalcular(session: Session, rede: str) -> int:
+    """Reconstrói rede_metrica da rede a partir dos encaminhamentos e commita.
+    Devolve quantos encaminhamentos foram lidos."""
+    res = resolvedor_sla(session)
+    if rede == "cras":
+        model, campos, estado = CrasEncaminhamento, _CAMPOS_CRAS, estado_cras
+    else:
+        model, campos, estado = EncaminhamentoIntermunicipal, _CAMPOS_INTER, estado_inter
+
+    deltas: Dict[Chave, Dict[str, float]] = {}
+    lidos = 0
+    # em ordem de id: a primeira linha de cada destino fica com o menor id (desempate de por_destino)
+    stmt = select(*[getattr(model, c) for c in campos]).order_by(model.id).execution_options(yield_per=2000)
+    for row in session.exec(stmt):
+        lidos += 1
+        est = estado(dict(zip(campos, row)))
+        if est is not None:
+            _acumular(deltas, est, res.dias, +1)
+
+    agora = datetime.utcnow()
+    linhas = [
+        dict(
+            {c: 0 for c in CONTADORES},
+            rede=r,
+            municipio_id=mid,
+            municipio_destino_id=did,
+            destino_tipo=tipo,
+            destino_nome=nome,
+            periodo=periodo,
+            atualizado_em=agora,
+            **d,
+        )
+        for (r, mid, did, tipo, nome, periodo), d in deltas.items()
+    ]
+    session.execute(delete(RedeMetrica).where(RedeMetrica.rede == rede))
+    if linhas:
+        session.execute(insert(RedeMetrica), linhas)
+    marca = session.get(RedeMetricaMarca, rede)
+    if marca is None:
+        marca = RedeMetricaMarca(rede=rede)
+    marca.sla_versao = res.versao
+    marca.recalculado_em = agora
+    session.add(marca)
+    session.commit()
+    return lidos
+
+
+def _atualizada(session: Session, rede: str) -> bool:
+    try:
+        marca = session.get(RedeMetricaMarca, rede)
+    except Exception:  # cópia de leitura anterior à tabela
+        return False
+    return marca is not None and marca.sla_versao == resolvedor_sla(session).versao
+
+
+def _com_agregados(session: Session, rede: str, fn: Callable[[Session], Any]) -> Any:
+    """Roda `fn` numa sessão com rede_metrica em dia (recalcula no principal se preciso)."""
+    if _atualizada(session, rede):
+        return fn(session)
+    from app.core.db import engine
+
+    with Session(engine) as s:
+        lidos = recalcular(s, rede)
+        print(f"INFO: rede_metricas: {rede} recalculada ({lidos} encaminhamentos)")
+        return fn(s)
+
+
+# ============================
+# Leitura
+# ============================
+def _somas() -> List[Any]:
+    return [func.coalesce(func.sum(getattr(RedeMetrica, c)), 0).label(c) for c in CONTADORES]
+
+
+def por_destino(session: Session, rede: str, municipio_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Acumulado por destino (cras: destino_tipo+destino_nome; intermunicipal:
+    municipio_destino_id), com pendentes = total - concluídos - cancelados.
+
+    Ordem: destino do encaminhamento mais antigo primeiro (menor id em
+    rede_metrica), a mesma em que a versão antiga montava os buckets; o sort
+    estável de /gestao/rede/metricas mantém essa ordem nos empates de score."""
+
+    def _ler(s: Session) -> List[Dict[str, Any]]:
+        if rede == "cras":
+            grupo = [RedeMetrica.destino_tipo, RedeMetrica.destino_nome]
+        else:
+            grupo = [RedeMetrica.municipio_destino_id]
+        stmt = (
+            select(*grupo, *_somas())
+            .where(RedeMetrica.rede == rede)
+            .group_by(*grupo)
+            .order_by(func.min(RedeMetrica.id))
+        )
+        if municipio_id is not None:
+            mid = int(municipio_id)
+            if rede == "cras":
+                stmt = stmt.where(RedeMetrica.municipio_id == mid)
+            else:
+                stmt = stmt.where(or_(RedeMetrica.municipio_id == mid, RedeMetrica.municipio_destino_id == mid))
+        out: List[Dict[str, Any]] = []
+        for row in s.exec(stmt).all():
+            d = dict(row._mapping)
+            d["pendentes"] = max(0, int(d["total"]) - int(d["concluidos"]) - int(d["cancelados"]))
+            out.append(d)
+        return out
+
+    return _com_agregados(session, rede, _ler)
+
+
+def serie(
+    session: Session,
+    rede: str,
+    municipio_id: Optional[int] = None,
+    meses: int = 12,
+    destino_tipo: Optional[str] = None,
+    destino_nome: Optional[str] = None,
+    municipio_destino_id: Optional[int] = None,
+    hoje: Optional[datetime] = None,
+) -> List[Dict[str, Any]]:
+    """Contadores por mês (AAAAMM) dos últimos `meses`, do mais antigo ao atual;
+    meses sem movimento vêm zerados."""
+    hoje = hoje or datetime.utcnow()
+    periodos: List[int] = []
+    ano, mes = hoje.year, hoje.month
+    for _ in range(max(1, int(meses))):
+        periodos.append(ano * 100 + mes)
+        ano, mes = (ano, mes - 1) if mes > 1 else (ano - 1, 12)
+    periodos.reverse()
+
+    def _ler(s: Session) -> List[Dict[str, Any]]:
+        stmt = (
+            select(RedeMetrica.periodo, *_somas())
+            .where(RedeMetrica.rede == rede, RedeMetrica.periodo >= periodos[0], RedeMetrica.periodo <= periodos[-1])
+            .group_by(RedeMetrica.periodo)
+        )
+        if municipio_id is not None:
+            mid = int(municipio_id)
+            if rede == "cras":
+                stmt = stmt.where(RedeMetrica.municipio_id == mid)
+            else:
+                stmt = stmt.where(or_(RedeMetrica.municipio_id == mid, RedeMetrica.municipio_destino_id == mid))
+        if destino_tipo:
+            stmt = stmt.where(RedeMetrica.destino_tipo == destino_tipo.strip().lower())
+        if destino_nome:
+            stmt = stmt.where(RedeMetrica.destino_nome == destino_nome.strip())
+        if municipio_destino_id is not None:
+            stmt = stmt.where(RedeMetrica.municipio_destino_id == int(municipio_destino_id))
+        por = {int(r.periodo): dict(r._mapping) for r in s.exec(stmt).all()}
+        vazio = {c: 0 for c in CONTADORES}
+        return [dict(por.get(p) or vazio, periodo=p) for p in periodos]
+
+    return _com_agregados(session, rede, _ler)
+
+
+def pendentes_cras(session: Session, municipio_id: Optional[int] = None) -> List[CrasEncaminhamento]:
+    """Encaminhamentos CRAS em aberto (para atrasados/em risco, que dependem do relógio)."""
+    stmt = select(CrasEncaminhamento).where(PENDENTE_CRAS)
+    if municipio_id is not None:
+        stmt = stmt.where(CrasEncaminhamento.municipio_id == int(municipio_id))
+    return list(session.exec(stmt).all())
+
+
+def pendentes_inter(session: Session, municipio_id: Optional[int] = None) -> List[EncaminhamentoIntermunicipal]:
+    if municipio_id is None:
+        return list(session.exec(select(EncaminhamentoIntermunicipal).where(PENDENTE_INTER)).all())
+    mid = int(municipio_id)
+    # condição repetida em cada ramo do OR: cada um usa o seu índice parcial
+    stmt = select(EncaminhamentoIntermunicipal).where(
+        or_(
+            and_(PENDENTE_INTER, EncaminhamentoIntermunicipal.municipio_origem_id == mid),
+            and_(PENDENTE_INTER, EncaminhamentoIntermunicipal.municipio_destino_id == mid),
+        )
+    )
+    return list(session.exec(stmt).all())
+
+
+def reconstruir(session: Session, municipio_id: Optional[int] = None) -> Dict[str, Any]:
+    """Recalcula as duas redes (o agregado intermunicipal cruza municípios,
+    então `municipio_id` não restringe)."""
+    return {rede: recalcular(session, rede) for rede in REDES}
+
+
+projecoes.registrar(
+    projecoes.Projecao(
+        nome="rede_metricas",
+        tabelas=(CrasEncaminhamento.__tablename__, EncaminhamentoIntermunicipal.__tablename__),
+        aplicar=aplicar_eventos,
+        reconstruir=reconstruir,
+        descricao="Agregados por destino/mês de /gestao/rede/metricas",
+        invalidar=invalidar,
+    )
+)
@@ -0,0 +1,314 @@
+# app/services/sla_resolver.py
+"""
+Resolução de SLA efetivo (sla_regra) compartilhada por Config e Gestão.
+
+A mesma regra de seleção ("mais específica ganha") existia duas vezes:
+`_selecionar_regra_sla` em routers/config.py e `_resolver_sla_dias` em
+routers/gestao.py, e as duas varriam a lista inteira de regras a cada consulta
+(a fila do secretário faz uma por encaminhamento/etapa).
+
+Aqui as regras ativas viram, por município, uma matriz pré-computada
+(modulo, etapa) -> melhor regra por nível de escopo; cada consulta é no máximo
+8 buscas em dict. A matriz é refeita quando as regras mudam: a versão é a
+impressão digital de sla_regra (count, max(id), max(atualizado_em)), lida UMA
+vez por `resolvedor(session)`.
+
+Prioridade (mais específico ganha; empate -> atualizado_em mais recente):
+  1) municipio + unidade_tipo + unidade_id
+  2) municipio + unidade_tipo
+  3) municipio
+  4) global (municipio_id=None), na mesma ordem
+"""
+
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from app.models.sla_regra import SlaRegra
+
+# SLA padrão (dias) por módulo/etapa quando não há regra configurada
+SLA_PADRAO: Dict[str, Dict[str, int]] = {
+    "cras_encaminhamento": {
+        "enviado": 2,        # prazo para acusar recebimento
+        "recebido": 5,       # prazo para agendar
+        "agendado": 7,       # prazo para atender
+        "atendido": 2,       # prazo para registrar devolutiva
+        "devolutiva": 2,     # prazo para concluir após devolutiva
+    },
+    "rede_intermunicipal": {
+        "solicitado": 2,
+        "contato": 2,
+        "aceito": 7,
+        "agendado": 7,
+        "passagem": 3,
+        "contrarreferencia": 3,
+    },
+}
+
+# tipo de unidade que cada módulo usa na consulta (None = sem unidade)
+UNIDADE_TIPO_MODULO: Dict[str, Optional[str]] = {
+    "cras_encaminhamento": "cras",
+    "rede_intermunicipal": None,
+}
+
+SLA_DIAS_FALLBACK = 7
+
+
+def _norm(v: Any) -> Optional[str]:
+    if v is None:
+        return None
+    s = str(v).strip().lower()
+    return s or None
+
+
+@dataclass(frozen=True)
+class RegraSla:
+    """Cópia leve de SlaRegra (a matriz vive entre sessões)."""
+
+    id: int
+    municipio_id: Optional[int]
+    unidade_tipo: Optional[str]
+    unidade_id: Optional[int]
+    modulo: str
+    etapa: str
+    sla_dias: int
+    atualizado_em: Optional[datetime]
+
+    @classmethod
+    def de(cls, r: Any) -> "RegraSla":
+        mid = getattr(r, "municipio_id", None)
+        uid = getattr(r, "unidade_id", None)
+        return cls(
+            id=int(getattr(r, "id", 0) or 0),
+            municipio_id=int(mid) if mid is not None else None,
+            unidade_tipo=_norm(getattr(r, "unidade_tipo", None)),
+            unidade_id=int(uid) if uid is not None else None,
+            modulo=_norm(getattr(r, "modulo", None)) or "",
+            etapa=_norm(getattr(r, "etapa", None)) or "",
+            sla_dias=int(getattr(r, "sla_dias", SLA_DIAS_FALLBACK)),
+            atualizado_em=getattr(r, "atualizado_em", None),
+        )
+
+
+# chave de escopo dentro de (modulo, etapa): (municipal?, unidade_tipo, unidade_id)
+_Escopo = Tuple[bool, Optional[str], Optional[int]]
+
+
+def _candidatos(ut: Optional[str], uid: Optional[int]) -> List[_Escopo]:
+    """Escopos que casam com a consulta, do mais para o menos específico."""
+    out: List[_Escopo] = []
+    for municipal in (True, False):
+        if ut is not None and uid is not None:
+            out.append((municipal, ut, uid))
+        if ut is not None:
+            out.append((municipal, ut, None))
+        if uid is not None:
+            out.append((municipal, None, uid))
+        out.append((municipal, None, None))
+    return out
+
+
+class MatrizSla:
+    """Regras aplicáveis a UM município (municipais + globais), indexadas por escopo."""
+
+    def __init__(self, municipio_id: Optional[int], regras: Iterable[RegraSla]) -> None:
+        self.municipio_id = int(municipio_id) if municipio_id is not None else None
+        self._idx: Dict[Tuple[str, str], Dict[_Escopo, RegraSla]] = {}
+        for r in regras:
+            if r.municipio_id is not None and r.municipio_id != self.municipio_id:
+                continue
+            por_escopo = self._idx.setdefault((r.modulo, r.etapa), {})
+            chave = (r.municipio_id is not None, r.unidade_tipo, r.unidade_id)
+            atual = por_escopo.get(chave)
+            if (
+                atual is None
+                or isinstance(r.atualizado_em, datetime)
+                and isinstance(atual.atualizado_em, datetime)
+                and r.atualizado_em > atual.atualizado_em
+            ):
+                por_escopo[chave] = r
+
+    def chaves(self) -> List[Tuple[str, str]]:
+        return list(self._idx.keys())
+
+    def escopos(self, modulo: str, etapa: str) -> List[_Escopo]:
+        return list((self._idx.get((modulo, etapa)) or {}).keys())
+
+    def regra(self, unidade_tipo: Optional[str], unidade_id: Optional[int], modulo: str, etapa: str) -> Optional[RegraSla]:
+        por_escopo = self._idx.get((_norm(modulo) or "", _norm(etapa) or ""))
+        if not por_escopo:
+            return None
+        uid = int(unidade_id) if unidade_id is not None else None
+        for chave in _candidatos(_norm(unidade_tipo), uid):
+            r = por_escopo.get(chave)
+            if r is not None:
+                return r
+        return None
+
+    def dias(self, unidade_tipo: Optional[str], unidade_id: Optional[int], modulo: str, etapa: str, default_dias: int) -> int:
+        r = self.regra(unidade_tipo, unidade_id, modulo, etapa)
+        return int(r.sla_dias) if r is not None else int(default_dias)
+
+
+class _Versao:
+    def __init__(self, chave: Tuple[Any, ...], regras: List[RegraSla]) -> None:
+        self.chave = chave
+        self.regras = regras
+        self.matrizes: Dict[Optional[int], MatrizSla] = {}
+
+
+_estado: Optional[_Versao] = None
+_lock = threading.Lock()
+
+
+def _impressao_digital(session: Session) -> Tuple[Any, ...]:
+    row = session.exec(select(func.count(), func.max(SlaRegra.id), func.max(SlaRegra.atualizado_em))).one()
+    return tuple(str(v) if v is not None else None for v in row)
+
+
+def _carregar(session: Session, chave: Tuple[Any, ...]) -> _Versao:
+    global _estado
+    with _lock:
+        if _estado is not None and _estado.chave == chave:
+            return _estado
+    rows = session.exec(select(SlaRegra).where(SlaRegra.ativo == True).order_by(SlaRegra.id)).all()  # noqa: E712
+    versao = _Versao(chave, [RegraSla.de(r) for r in rows])
+    with _lock:
+        _estado = versao
+    return versao
+
+
+class ResolvedorSla:
+    """Matrizes por município de uma versão das regras (uma consulta de versão por instância)."""
+
+    def __init__(self, versao: _Versao) -> None:
+        self._versao = versao
+
+    @property
+    def versao(self) -> str:
+        return ":".join(str(v) for v in self._versao.chave)
+
+    def matriz(self, municipio_id: Optional[int]) -> MatrizSla:
+        mid = int(municipio_id) if municipio_id is not None else None
+        m = self._versao.matrizes.get(mid)
+        if m is None:
+            m = MatrizSla(mid, self._versao.regras)
+            with _lock:
+                self._versao.matrizes[mid] = m
+        return m
+
+    def dias(
+        self,
+        municipio_id: Optional[int],
+        unidade_tipo: Optional[str],
+        unidade_id: Optional[int],
+        modulo: str,
+        etapa: str,
+        default_dias: int,
+    ) -> int:
+        """Mesma assinatura do `sla_lookup` das rotas de Gestão."""
+        return self.matriz(municipio_id).dias(unidade_tipo, unidade_id, modulo, etapa, default_dias)
+
+
+def resolvedor(session: Session) -> ResolvedorSla:
+    """Resolvedor da versão atual das regras.
+
+    Se a impressão digital não puder ser lida, segue com a última versão
+    carregada (avisa no log); sem nenhuma carregada, o erro sobe — um
+    conjunto vazio faria tudo cair em SLA_PADRAO como se não houvesse regra.
+    """
+    try:
+        chave = _impressao_digital(session)
+    except Exception as e:
+        with _lock:
+            atual = _estado
+        if atual is None:
+            raise
+        print("WARN: sla_resolver: versão das regras indisponível; usando a última carregada:", e)
+        return ResolvedorSla(atual)
+    return ResolvedorSla(_carregar(session, chave))
+
+
+def invalidar() -> None:
+    """Descarta as matrizes (a impressão digital já cobre mudanças; útil em scripts)."""
+    global _estado
+    with _lock:
+        _estado = None
+
+
+def _unidades_do_municipio(session: Session, municipio_id: Optional[int]) -> Dict[str, List[int]]:
+    out: Dict[str, List[int]] = {}
+    if municipio_id is None:
+        return out
+    try:
+        from app.models.cras_unidade import CrasUnidade
+        from app.models.creas_unidade import CreasUnidade
+    except Exception:
+        return out
+    for tipo, model in (("cras", CrasUnidade), ("creas", CreasUnidade)):
+        ids = session.exec(
+            select(model.id).where(model.municipio_id == int(municipio_id), model.ativo == True).order_by(model.id)  # noqa: E712
+        ).all()
+        out[tipo] = [int(i) for i in ids]
+    return out
+
+
+def montar_matriz(session: Session, municipio_id: Optional[int]) -> Dict[str, Any]:
+    """Matriz completa modulo x etapa x unidade do município (SLA efetivo de cada célula).
+
+    Módulos/etapas: os padrões de SLA_PADRAO + os que têm regra. Unidades: o
+    nível município (sem unidade) + as unidades ativas do tipo que o módulo usa
+    + qualquer unidade citada em regra do módulo.
+    """
+    res = resolvedor(session)
+    matriz = res.matriz(municipio_id)
+    unidades = _unidades_do_municipio(session, municipio_id)
+
+    pares: Dict[Tuple[str, str], int] = {}
+    for mod, etapas in SLA_PADRAO.items():
+        for et, dias in etapas.items():
+            pares[(mod, et)] = int(dias)
+    for chave in matriz.chaves():
+        pares.setdefault(chave, SLA_DIAS_FALLBACK)
+
+    celulas: List[Dict[str, Any]] = []
+    for (mod, et), padrao in sorted(pares.items()):
+        escopos: List[Tuple[Optional[str], Optional[int]]] = [(None, None)]
+        ut_mod = UNIDADE_TIPO_MODULO.get(mod)
+        if ut_mod:
+            escopos.append((ut_mod, None))
+            escopos.extend((ut_mod, uid) for uid in unidades.get(ut_mod, []))
+        for _municipal, ut, uid in matriz.escopos(mod, et):
+            if ut is not None and (ut, None) not in escopos:
+                escopos.append((ut, None))
+                escopos.extend((ut, u) for u in unidades.get(ut, []))
+            if (ut, uid) not in escopos:
+                escopos.append((ut, uid))
+
+        for ut, uid in escopos:
+            r = matriz.regra(ut, uid, mod, et)
+            celulas.append(
+                {
+                    "modulo": mod,
+                    "etapa": et,
+                    "unidade_tipo": ut,
+                    "unidade_id": uid,
+                    "sla_dias": int(r.sla_dias) if r is not None else int(padrao),
+                    "regra_id": r.id if r is not None else None,
+                    "regra_municipal": (r.municipio_id is not None) if r is not None else None,
+                    "fallback_usado": r is None,
+                }
+            )
+
+    return {
+        "municipio_id": municipio_id,
+        "versao": res.versao,
+        "unidades": unidades,
+        "celulas": celulas,
+    }
@@ -0,0 +1,88 @@
+# app/services/usuarios_diretorio.py
+"""
+Diretório de usuários (id -> nome) com resolução em lote.
+
+Usado pelas telas de linha do metrô / histórico, que precisam do nome do
+responsável de vários registros. Evita o padrão `session.get(Usuario, uid)`
+por linha (N+1):
+
+- cache por request: a instância vive junto com a Session da rota
+- cache por processo: TTL curto, compartilhado entre requests
+- ids que faltam nos dois caches saem em UMA query (IN)
+
+Defasagem: o cache de processo não é invalidado. Não há rota que altere
+usuário (eles vêm de app/seed_usuarios.py, rodado em outro processo), então
+um nome/e-mail trocado no banco aparece em até 5 min em cada worker. Se uma
+rota de edição de usuário for criada, ela deve limpar `_CACHE_PROCESSO` do id.
+
+Uso em rotas:
+    diretorio: DiretorioUsuarios = Depends(get_diretorio_usuarios)
+    nomes = diretorio.resolve(ids)
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Iterable, Optional
+
+from fastapi import Depends
+from sqlmodel import Session, select
+
+from app.core.cache import TTLCache
+from app.core.db import get_session
+from app.models.usuario import Usuario
+
+
+# Nome de usuário muda raramente; 5 min de TTL é suficiente.
+_CACHE_PROCESSO = TTLCache(ttl_s=300, max_itens=5000)
+
+
+def _nome_exibicao(uid: int, nome: Optional[str], email: Optional[str]) -> str:
+    return nome or email or f"Usuário {uid}"
+
+
+class DiretorioUsuarios:
+    def __init__(self, session: Session) -> None:
+        self.session = session
+        self._local: Dict[int, str] = {}
+
+    def resolve(self, ids: Iterable[Optional[int]]) -> Dict[int, str]:
+        """Resolve vários ids de uma vez. Ids inexistentes ficam fora do mapa."""
+        pedidos = set()
+        for x in ids:
+            try:
+                if x is not None:
+                    pedidos.add(int(x))
+            except (TypeError, ValueError):
+                continue
+
+        faltando = []
+        for uid in pedidos:
+            if uid in self._local:
+                continue
+            nome = _CACHE_PROCESSO.get(uid)
+            if nome is not None:
+                self._local[uid] = nome
+            else:
+                faltando.append(uid)
+
+        if faltando:
+            rows = self.session.exec(
+                select(Usuario.id, Usuario.nome, Usuario.email).where(Usuario.id.in_(faltando))
+            ).all()
+            for uid, nome, email in rows:
+                n = _nome_exibicao(int(uid), nome, email)
+                self._local[int(uid)] = n
+                _CACHE_PROCESSO.set(int(uid), n)
+
+        return {uid: self._local[uid] for uid in pedidos if uid in self._local}
+
+    def nome(self, uid: Optional[int]) -> Optional[str]:
+        if uid is None:
+            return None
+        return self.resolve([uid]).get(int(uid))
+
+
+def get_diretorio_usuarios(session: Session = Depends(get_session)) -> DiretorioUsuarios:
+    """Dependency FastAPI: um diretório por request (mesma Session da rota)."""
+    return DiretorioUsuarios(session)
+
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Arquivamento de casos encerrados e eventos antigos (tabelas arq_*).
+
+Mesmo motor da execução diária do agendador (app/services/arquivo.py, POPRUA_ARQUIVO=1).
+
+Como rodar (na raiz do projeto):
+  ~/POPNEWS1/backend/.venv/bin/python backend/scripts/arquivar.py --status
+  ~/POPNEWS1/backend/.venv/bin/python backend/scripts/arquivar.py --simular
+  ~/POPNEWS1/backend/.venv/bin/python backend/scripts/arquivar.py --grupo caso_cras --grupo creas_caso --dias 730
+
+Grupos: casopoprua, caso_cras, creas_caso (encerrados há mais que POPRUA_ARQUIVO_DIAS)
+        rma_evento, ficha_evento (mais antigos que POPRUA_ARQUIVO_DIAS_EVENTOS)
+Usa o banco de POPRUA_DATABASE_URL (padrão: ./poprua.db, como o backend).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import List
+
+THIS = Path(__file__).resolve()
+BACKEND_DIR = THIS.parents[1]  # backend/
+
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+
+def main(argv: List[str] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--grupo", action="append", default=None, help="grupo a arquivar (repetível; padrão: todos)")
+    ap.add_argument("--dias", type=int, default=None, help="horizonte em dias (sobrepõe o do grupo)")
+    ap.add_argument("--lote", type=int, default=None, help="raízes por transação")
+    ap.add_argument("--simular", action="store_true", help="só conta o que seria movido")
+    ap.add_argument("--status", action="store_true", help="linhas quentes x arquivadas por tabela e sai")
+    args = ap.parse_args(argv)
+
+    from app.core.db import engine, init_db
+    from app.services import arquivo
+
+    init_db(backfill_auto=False)
+
+    if args.status:
+        with engine.connect() as conn:
+            print(json.dumps(arquivo.contagens(conn), ensure_ascii=False, indent=2))
+        return 0
+
+    grupos = args.grupo or list(arquivo.GRUPOS)
+    desconhecidos = [g for g in grupos if g not in arquivo.GRUPOS]
+    if desconhecidos:
+        print(f"WARN: grupos desconhecidos: {', '.join(desconhecidos)} (use {', '.join(arquivo.GRUPOS)})")
+        return 2
+
+    def _progresso(r: "arquivo.Resultado") -> None:
+        print(f"INFO: {r.grupo}: lote {r.lotes} raizes={r.raizes} retidos={r.retidos}", flush=True)
+
+    res = arquivo.arquivar(engine, grupos, dias=args.dias, lote=args.lote, simular=args.simular, ao_progresso=_progresso)
+    print(json.dumps([r.como_dict() for r in res], ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
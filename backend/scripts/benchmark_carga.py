@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+"""Benchmark de carga reprodutível (volume escalado + mix de requisições).
+
+O smoke_comissao.py mede uma latência por rota num DB mínimo. Aqui:
+
+- seed escalado: roda app/seed_simulacao_muni1.py para N municípios, com
+  volumes = escala x simulação padrão (200 casos por módulo, 40 enc. CRAS,
+  30 intermunicipais). O DB fica em backend/storage/bench/ e é reaproveitado
+  entre execuções com os mesmos parâmetros (--reseed para refazer).
+- mix realista: fila, dashboards, ficha, RMA, rede e geração de documento,
+  sorteados com pesos fixos (seed do RNG fixa), por usuários de vários
+  municípios + um gestor de consórcio. Tudo in-process (TestClient).
+- relatório JSON por endpoint: p50/p95/p99 (ms), média, máx, erros e
+  quantidade de queries SQL por requisição. --comparar aponta regressões
+  contra um relatório anterior (sai com código 1 se houver).
+
+Como rodar (na raiz do projeto):
+  ~/POPNEWS1/backend/.venv/bin/python backend/scripts/benchmark_carga.py --escala 10 --municipios 3
+  ~/POPNEWS1/backend/.venv/bin/python backend/scripts/benchmark_carga.py --escala 10 --saida /tmp/antes.json
+  ~/POPNEWS1/backend/.venv/bin/python backend/scripts/benchmark_carga.py --escala 10 --comparar /tmp/antes.json
+
+Obs: o seed de 100x leva vários minutos (é feito uma vez por combinação).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+THIS = Path(__file__).resolve()
+BACKEND_DIR = THIS.parents[1]  # backend/
+
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+BENCH_DIR = BACKEND_DIR / "storage" / "bench"
+
+# volumes da simulação padrão (seed_simulacao_muni1) multiplicados por --escala
+VOLUME_BASE = {"cases_cras": 200, "cases_creas": 200, "cases_poprua": 200, "enc_cras": 40, "enc_inter": 30}
+
+# diferenças menores que isso (ms) são ruído, mesmo se passarem da tolerância relativa
+RUIDO_MS = 5.0
+
+
+def _percentil(values: List[float], p: float) -> float:
+    """Percentil por posto mais próximo (mesma regra do _p95 do smoke_comissao)."""
+    if not values:
+        return 0.0
+    s = sorted(values)
+    idx = max(0, min(len(s) - 1, int(math.ceil(p * len(s))) - 1))
+    return float(s[idx])
+
+
+def _commit_atual() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=str(BACKEND_DIR),
+            capture_output=True,
+            text=True,
+            timeout=10,
+        )
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def _preparar_db(args: argparse.Namespace) -> Path:
+    BENCH_DIR.mkdir(parents=True, exist_ok=True)
+    db_path = Path(args.db) if args.db else BENCH_DIR / f"bench_e{args.escala}_m{args.municipios}_s{args.seed}.db"
+    if args.reseed and db_path.exists():
+        db_path.unlink()
+    novo = not db_path.exists()
+
+    # antes de importar app.*: engine lê POPRUA_DATABASE_URL no import
+    os.environ["POPRUA_DATABASE_URL"] = f"sqlite:///{db_path.as_posix()}"
+    os.environ["POPRUA_AGENDADOR"] = "false"
+    os.environ.setdefault("GESTAO_AUTOMACOES_SEED", "false")
+
+    if novo:
+        from app import seed_simulacao_muni1 as sim
+
+        t0 = time.perf_counter()
+        for mid in range(1, args.municipios + 1):
+            argv = ["--municipio-id", str(mid), "--seed", str(args.seed + mid)]
+            for campo, base in VOLUME_BASE.items():
+                argv += [f"--{campo.replace('_', '-')}", str(base * args.escala)]
+            sim.executar(sim.parse_args(argv))
+        print(f"[BENCH] seed concluído em {time.perf_counter() - t0:.1f}s: {db_path}")
+    else:
+        print(f"[BENCH] reaproveitando {db_path} (use --reseed para refazer)")
+    return db_path
+
+
+def _volumes(session: Any) -> Dict[str, int]:
+    from sqlalchemy import text
+
+    out: Dict[str, int] = {}
+    for tabela in (
+        "usuarios",
+        "pessoa_suas",
+        "caso_cras",
+        "creas_caso",
+        "casopoprua",
+        "crastarefa",
+        "cras_encaminhamento",
+        "encaminhamentos_intermunicipais",
+        "cadunico_precadastro",
+    ):
+        try:
+            out[tabela] = int(session.execute(text(f"SELECT count(*) FROM {tabela}")).scalar() or 0)
+        except Exception:
+            session.rollback()
+    return out
+
+
+class Contexto:
+    """Usuários/tokens e ids de referência por município (carregados uma vez)."""
+
+    def __init__(self, session: Any, municipios: int) -> None:
+        from sqlmodel import select
+
+        from app.core.security import criar_token_acesso, hash_senha
+        from app.models.pessoa_suas import PessoaSUAS
+        from app.models.usuario import Usuario
+
+        def token(u: Any) -> Dict[str, str]:
+            return {"Authorization": f"Bearer {criar_token_acesso(u)}"}
+
+        self.mids = list(range(1, municipios + 1))
+        self.coord: Dict[int, Dict[str, str]] = {}
+        self.tecnico: Dict[int, Dict[str, str]] = {}
+        self.pessoas: Dict[int, List[int]] = {}
+        for mid in self.mids:
+            coord = session.exec(
+                select(Usuario).where(Usuario.municipio_id == mid, Usuario.perfil == "coord_municipal").order_by(Usuario.id)
+            ).first()
+            tec = session.exec(
+                select(Usuario).where(Usuario.municipio_id == mid, Usuario.perfil == "tecnico").order_by(Usuario.id)
+            ).first()
+            if coord is None or tec is None:
+                raise SystemExit(f"[BENCH] município {mid} sem usuários da simulação (rode com --reseed).")
+            self.coord[mid] = token(coord)
+            self.tecnico[mid] = token(tec)
+            self.pessoas[mid] = [
+                int(i)
+                for i in session.exec(
+                    select(PessoaSUAS.id).where(PessoaSUAS.municipio_id == mid).order_by(PessoaSUAS.id).limit(500)
+                ).all()
+            ]
+
+        email = "bench.consorcio@local"
+        u = session.exec(select(Usuario).where(Usuario.email == email)).first()
+        if u is None:
+            u = Usuario(
+                nome="Consórcio (BENCH)",
+                email=email,
+                perfil="gestor_consorcio",
+                municipio_id=None,
+                senha_hash=hash_senha("bench123"),
+                ativo=True,
+            )
+            session.add(u)
+            session.commit()
+            session.refresh(u)
+        self.consorcio = token(u)
+
+
+# (chave do relatório, peso, montador) — montador devolve (método, url, kwargs do client)
+Montador = Callable[[random.Random, Contexto], Tuple[str, str, Dict[str, Any]]]
+
+
+def _mix() -> List[Tuple[str, int, Montador]]:
+    mes = date.today().strftime("%Y-%m")
+
+    def mid(rng: random.Random, ctx: Contexto) -> int:
+        return rng.choice(ctx.mids)
+
+    def fila(rng, ctx):
+        m = mid(rng, ctx)
+        return "GET", "/gestao/fila", {"params": {"limit": 50}, "headers": ctx.coord[m]}
+
+    def fila_consorcio(rng, ctx):
+        return "GET", "/gestao/fila", {"params": {"limit": 50}, "headers": ctx.consorcio}
+
+    def dash_gestao(rng, ctx):
+        m = mid(rng, ctx)
+        return "GET", "/gestao/dashboard/resumo", {"headers": ctx.coord[m]}
+
+    def dash_overview(rng, ctx):
+        m = mid(rng, ctx)
+        return "GET", "/dashboard/overview", {"headers": ctx.coord[m]}
+
+    def tarefas_resumo(rng, ctx):
+        m = mid(rng, ctx)
+        return "GET", "/cras/tarefas/resumo", {"headers": ctx.tecnico[m]}
+
+    def ficha(rng, ctx):
+        m = mid(rng, ctx)
+        pid = rng.choice(ctx.pessoas[m]) if ctx.pessoas[m] else 1
+        return "GET", f"/cras/ficha/pessoas/{pid}", {"headers": ctx.tecnico[m]}
+
+    def rma(rng, ctx):
+        m = mid(rng, ctx)
+        return "GET", "/cras/rma/mes", {"params": {"mes": mes}, "headers": ctx.coord[m]}
+
+    def rede(rng, ctx):
+        m = mid(rng, ctx)
+        return "GET", "/gestao/rede/encaminhamentos", {"headers": ctx.coord[m]}
+
+    def encaminhamentos(rng, ctx):
+        m = mid(rng, ctx)
+        return "GET", "/encaminhamentos/", {"headers": ctx.tecnico[m]}
+
+    def documento(rng, ctx):
+        m = mid(rng, ctx)
+        body = {
+            "tipo": "oficio",
+            "assunto": "BENCH - Ofício",
+            "campos": {"texto": "Documento de benchmark", "assinante_nome": "Coordenação", "assinante_cargo": "Coordenação"},
+            "emissor": "smas",
+            "salvar": False,
+        }
+        return "POST", "/documentos/gerar", {"json": body, "headers": ctx.coord[m]}
+
+    return [
+        ("GET /gestao/fila", 20, fila),
+        ("GET /gestao/fila [consorcio]", 5, fila_consorcio),
+        ("GET /gestao/dashboard/resumo", 10, dash_gestao),
+        ("GET /dashboard/overview", 5, dash_overview),
+        ("GET /cras/tarefas/resumo", 10, tarefas_resumo),
+        ("GET /cras/ficha/pessoas/{id}", 15, ficha),
+        ("GET /cras/rma/mes", 5, rma),
+        ("GET /gestao/rede/encaminhamentos", 5, rede),
+        ("GET /encaminhamentos/", 10, encaminhamentos),
+        ("POST /documentos/gerar", 3, documento),
+    ]
+
+
+def _executar_mix(args: argparse.Namespace) -> Dict[str, Any]:
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event
+    from sqlmodel import Session
+
+    from app.core.db import engine
+    from app.main import app
+
+    contador = {"n": 0}
+
+    def _conta(*_a: Any, **_k: Any) -> None:
+        contador["n"] += 1
+
+    amostras: Dict[str, List[Tuple[float, int, int]]] = defaultdict(list)
+    mix = _mix()
+    chaves = [c for c, _p, _m in mix]
+    pesos = [p for _c, p, _m in mix]
+    montadores = {c: m for c, _p, m in mix}
+
+    with TestClient(app) as client:
+        with Session(engine) as session:
+            ctx = Contexto(session, args.municipios)
+            volumes = _volumes(session)
+
+        event.listen(engine, "before_cursor_execute", _conta)
+        try:
+            # aquecimento: cada endpoint algumas vezes, fora das estatísticas
+            rng = random.Random(args.seed)
+            for chave in chaves:
+                for _ in range(args.aquecimento):
+                    metodo, url, kw = montadores[chave](rng, ctx)
+                    client.request(metodo, url, **kw)
+
+            rng = random.Random(args.seed)
+            sorteio = rng.choices(chaves, weights=pesos, k=args.requisicoes)
+            t_total = time.perf_counter()
+            for chave in sorteio:
+                metodo, url, kw = montadores[chave](rng, ctx)
+                contador["n"] = 0
+                t0 = time.perf_counter()
+                resp = client.request(metodo, url, **kw)
+                ms = (time.perf_counter() - t0) * 1000.0
+                amostras[chave].append((ms, contador["n"], resp.status_code))
+            duracao = time.perf_counter() - t_total
+        finally:
+            event.remove(engine, "before_cursor_execute", _conta)
+
+    endpoints: Dict[str, Any] = {}
+    for chave in chaves:
+        lst = amostras.get(chave) or []
+        if not lst:
+            continue
+        tempos = [a[0] for a in lst]
+        queries = [float(a[1]) for a in lst]
+        status: Dict[str, int] = defaultdict(int)
+        for a in lst:
+            status[str(a[2])] += 1
+        endpoints[chave] = {
+            "n": len(lst),
+            "erros": sum(1 for a in lst if a[2] >= 400),
+            "status": dict(status),
+            "p50_ms": round(_percentil(tempos, 0.50), 2),
+            "p95_ms": round(_percentil(tempos, 0.95), 2),
+            "p99_ms": round(_percentil(tempos, 0.99), 2),
+            "media_ms": round(sum(tempos) / len(tempos), 2),
+            "max_ms": round(max(tempos), 2),
+            "queries_p50": int(_percentil(queries, 0.50)),
+            "queries_p95": int(_percentil(queries, 0.95)),
+            "queries_max": int(max(queries)),
+        }
+
+    return {
+        "gerado_em": datetime.now().isoformat(timespec="seconds"),
+        "commit": _commit_atual(),
+        "parametros": {
+            "escala": args.escala,
+            "municipios": args.municipios,
+            "seed": args.seed,
+            "requisicoes": args.requisicoes,
+            "aquecimento": args.aquecimento,
+        },
+        "volumes": volumes,
+        "duracao_s": round(duracao, 2),
+        "endpoints": endpoints,
+    }
+
+
+def _comparar(atual: Dict[str, Any], base: Dict[str, Any], tolerancia: float) -> List[Dict[str, Any]]:
+    """Linhas de comparação por endpoint; `regressao` se p95 ou queries pioraram."""
+    out: List[Dict[str, Any]] = []
+    base_ep = base.get("endpoints") or {}
+    for chave, cur in (atual.get("endpoints") or {}).items():
+        ant = base_ep.get(chave)
+        if not ant:
+            continue
+        p95_a, p95_b = float(ant.get("p95_ms") or 0.0), float(cur.get("p95_ms") or 0.0)
+        q_a, q_b = int(ant.get("queries_p50") or 0), int(cur.get("queries_p50") or 0)
+        lento = p95_b > p95_a * (1.0 + tolerancia) and (p95_b - p95_a) > RUIDO_MS
+        out.append(
+            {
+                "endpoint": chave,
+                "p95_antes": p95_a,
+                "p95_depois": p95_b,
+                "variacao_pct": round(((p95_b - p95_a) / p95_a * 100.0) if p95_a else 0.0, 1),
+                "queries_antes": q_a,
+                "queries_depois": q_b,
+                "regressao": bool(lento or q_b > q_a),
+            }
+        )
+    return out
+
+
+def _imprimir(rel: Dict[str, Any], comparacao: Optional[List[Dict[str, Any]]]) -> None:
+    p = rel["parametros"]
+    print(f"\n[BENCH] escala={p['escala']}x municipios={p['municipios']} requisicoes={p['requisicoes']} commit={rel.get('commit')}")
+    print("[BENCH] volumes: " + ", ".join(f"{k}={v}" for k, v in rel["volumes"].items()))
+    print(f"{'endpoint':40s} {'n':>4s} {'p50':>9s} {'p95':>9s} {'p99':>9s} {'q50':>5s} {'qmax':>5s} {'err':>4s}")
+    for chave, e in rel["endpoints"].items():
+        print(
+            f"{chave:40s} {e['n']:4d} {e['p50_ms']:9.1f} {e['p95_ms']:9.1f} {e['p99_ms']:9.1f} "
+            f"{e['queries_p50']:5d} {e['queries_max']:5d} {e['erros']:4d}"
+        )
+    if comparacao:
+        print("\n[BENCH] comparação (p95 ms / queries p50):")
+        for c in comparacao:
+            marca = "REGRESSAO" if c["regressao"] else "ok"
+            print(
+                f"{c['endpoint']:40s} {c['p95_antes']:9.1f} -> {c['p95_depois']:9.1f} ({c['variacao_pct']:+.1f}%) "
+                f"q {c['queries_antes']} -> {c['queries_depois']}  {marca}"
+            )
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Benchmark de carga (seed escalado + mix de requisições)")
+    ap.add_argument("--escala", type=int, default=10, help="multiplicador da simulação padrão (ex.: 10, 50, 100)")
+    ap.add_argument("--municipios", type=int, default=3, help="municípios semeados (1..7)")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--requisicoes", type=int, default=300, help="requisições medidas (sorteadas pelo mix)")
+    ap.add_argument("--aquecimento", type=int, default=2, help="requisições por endpoint antes de medir")
+    ap.add_argument("--db", type=str, default=None, help="arquivo sqlite (padrão: storage/bench/bench_e<escala>_m<mun>_s<seed>.db)")
+    ap.add_argument("--reseed", action="store_true", help="apaga e refaz o DB do benchmark")
+    ap.add_argument("--saida", type=str, default=None, help="relatório JSON (padrão: storage/bench/benchmark_<commit>.json)")
+    ap.add_argument("--comparar", type=str, default=None, help="relatório anterior para comparar")
+    ap.add_argument("--tolerancia", type=float, default=0.25, help="piora relativa de p95 aceita na comparação (0.25 = 25%%)")
+    args = ap.parse_args()
+
+    args.municipios = max(1, min(7, int(args.municipios)))
+    args.escala = max(1, int(args.escala))
+
+    _preparar_db(args)
+    rel = _executar_mix(args)
+
+    comparacao = None
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            comparacao = _comparar(rel, json.load(f), float(args.tolerancia))
+        rel["comparacao"] = {"base": args.comparar, "tolerancia": args.tolerancia, "endpoints": comparacao}
+
+    saida = Path(args.saida) if args.saida else BENCH_DIR / f"benchmark_{rel.get('commit') or 'local'}.json"
+    saida.parent.mkdir(parents=True, exist_ok=True)
+    with open(saida, "w", encoding="utf-8") as f:
+        json.dump(rel, f, ensure_ascii=False, indent=2)
+
+    _imprimir(rel, comparacao)
+    print(f"\n[BENCH] relatório: {saida}")
+
+    if comparacao and any(c["regressao"] for c in comparacao):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
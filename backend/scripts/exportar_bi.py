@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Exportação analítica (BI) para arquivos Parquet/Arrow/CSV, completa ou incremental.
+
+Mesmo motor do GET /exportacao/{conjunto} (app/services/exportacao.py), lendo
+direto do banco em blocos. No modo --incremental a marca d'água de cada
+conjunto fica em exportacao_marca (por pasta de destino + município): cada
+execução grava só o que mudou desde a anterior, num arquivo novo.
+
+Como rodar (na raiz do projeto):
+  ~/POPNEWS1/backend/.venv/bin/python backend/scripts/exportar_bi.py --listar
+  ~/POPNEWS1/backend/.venv/bin/python backend/scripts/exportar_bi.py --saida /dados/bi --incremental
+  ~/POPNEWS1/backend/.venv/bin/python backend/scripts/exportar_bi.py casos_cras_bi rma_eventos_bi \\
+      --formato csv --municipio-id 1 --saida /tmp/bi
+
+Arquivos: <saida>/<conjunto>/<conjunto>[_m<municipio>]_<completo|incr>_<marca>.<ext>
+Parquet/Arrow exigem pyarrow (pip install pyarrow); sem ele use --formato csv.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+THIS = Path(__file__).resolve()
+BACKEND_DIR = THIS.parents[1]  # backend/
+
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+
+def main(argv: List[str] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("conjuntos", nargs="*", help="conjuntos a exportar (padrão: todos)")
+    ap.add_argument("--listar", action="store_true", help="lista conjuntos e colunas e sai")
+    ap.add_argument("--formato", default="parquet", choices=("parquet", "arrow", "csv"))
+    ap.add_argument("--saida", default=str(BACKEND_DIR / "storage" / "export"), help="pasta de destino")
+    ap.add_argument("--municipio-id", type=int, default=None)
+    ap.add_argument("--incremental", action="store_true", help="a partir da marca salva para esta pasta")
+    ap.add_argument("--desde", default=None, help="marca inicial explícita (ignora a salva)")
+    ap.add_argument("--chunk", type=int, default=5000, help="linhas por bloco")
+    ap.add_argument("--sensiveis", action="store_true", help="inclui identificação e textos livres")
+    args = ap.parse_args(argv)
+
+    from sqlmodel import Session
+
+    from app.core.db import engine, init_db
+    from app.services import exportacao
+
+    if args.listar:
+        print(json.dumps([exportacao.descrever(c) for c in exportacao.CONJUNTOS.values()], ensure_ascii=False, indent=2))
+        return 0
+    if args.formato not in exportacao.formatos_disponiveis():
+        print(f"WARN: formato {args.formato} requer pyarrow (pip install pyarrow)")
+        return 2
+
+    init_db(backfill_auto=False)
+
+    nomes = args.conjuntos or list(exportacao.CONJUNTOS)
+    desconhecidos = [n for n in nomes if n not in exportacao.CONJUNTOS]
+    if desconhecidos:
+        print(f"WARN: conjuntos desconhecidos: {', '.join(desconhecidos)}")
+        return 2
+
+    saida = Path(args.saida).resolve()
+    destino = f"{saida}|{args.formato}"
+    resumo = []
+    for nome in nomes:
+        t0 = time.perf_counter()
+        with Session(engine) as session:
+            desde = args.desde
+            if desde is None and args.incremental:
+                desde = exportacao.marca_salva(session, destino, nome, args.municipio_id)
+            with engine.connect() as conn:
+                plano = exportacao.planejar(conn, nome, municipio_id=args.municipio_id, desde=desde, incluir_sensiveis=args.sensiveis)
+                marca = re.sub(r"[^0-9A-Za-z]", "", exportacao.texto_marca(plano.ate) or "vazio")
+                pasta = saida / nome
+                pasta.mkdir(parents=True, exist_ok=True)
+                mun = f"_m{args.municipio_id}" if args.municipio_id is not None else ""
+                tipo = "incr" if plano.desde is not None else "completo"
+                arquivo = pasta / f"{nome}{mun}_{tipo}_{marca}.{exportacao.EXTENSOES[args.formato]}"
+                tmp = arquivo.with_name(arquivo.name + ".parcial")
+                with open(tmp, "wb") as f:
+                    res = exportacao.exportar(conn, plano, f, args.formato, args.chunk)
+                if res.linhas == 0 and plano.desde is not None:
+                    os.remove(tmp)  # incremental sem novidades: não gera arquivo vazio
+                    arquivo = None
+                else:
+                    os.replace(tmp, arquivo)
+            if args.incremental or args.desde is not None:
+                exportacao.salvar_marca(session, destino, nome, args.municipio_id, plano.ate, res.linhas)
+
+        item = {
+            "conjunto": nome,
+            "linhas": res.linhas,
+            "blocos": res.blocos,
+            "desde": exportacao.texto_marca(plano.desde),
+            "ate": exportacao.texto_marca(plano.ate),
+            "arquivo": str(arquivo) if arquivo else None,
+            "bytes": arquivo.stat().st_size if arquivo else 0,
+            "segundos": round(time.perf_counter() - t0, 2),
+        }
+        print(f"INFO: {nome}: {res.linhas} linhas em {item['segundos']}s -> {arquivo or '(sem novidades)'}")
+        resumo.append(item)
+
+    print(json.dumps(resumo, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
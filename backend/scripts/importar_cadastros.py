@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Importação em lote do cadastro SUAS (CSV ou extrato CadÚnico) pela linha de comando.
+
+Mesmo motor do POST /cras/cadastros/importar (app/services/cadastro_importacao.py):
+leitura em streaming, upsert por CPF/NIS em lotes, progresso a cada lote.
+
+Como rodar (na raiz do projeto):
+  ~/POPNEWS1/backend/.venv/bin/python backend/scripts/importar_cadastros.py familias.csv --municipio-id 1
+  ~/POPNEWS1/backend/.venv/bin/python backend/scripts/importar_cadastros.py extrato.csv --layout cadunico \\
+      --municipio-id 1 --unidade-id 3 --lote 2000
+  ... --simular        (só valida e conta; não grava)
+  ... --erros erros.json   (grava a lista de erros por linha)
+
+Usa o banco de POPRUA_DATABASE_URL (padrão: ./poprua.db, como o backend).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+THIS = Path(__file__).resolve()
+BACKEND_DIR = THIS.parents[1]  # backend/
+
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+
+def main(argv: List[str] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("arquivo", help="CSV a importar")
+    ap.add_argument("--layout", default="csv", choices=("csv", "cadunico"))
+    ap.add_argument("--municipio-id", type=int, required=True)
+    ap.add_argument("--unidade-id", type=int, default=None, help="cria pré-cadastro CadÚnico (pendente) por família")
+    ap.add_argument("--lote", type=int, default=1000, help="linhas por transação")
+    ap.add_argument("--encoding", default=None, help="padrão: UTF-8, ou cp1252 se o arquivo não for UTF-8")
+    ap.add_argument("--simular", action="store_true", help="não grava; só conta o que seria feito")
+    ap.add_argument("--erros", default=None, help="grava os erros por linha (JSON) neste arquivo")
+    args = ap.parse_args(argv)
+
+    from app.core.db import init_db
+    from app.services import cadastro_importacao
+
+    init_db(backfill_auto=False)
+
+    t0 = time.perf_counter()
+
+    def _progresso(p: "cadastro_importacao.Progresso") -> None:
+        pct = f" {100 * p.bytes_lidos / p.bytes_total:5.1f}%" if p.bytes_total else ""
+        print(
+            f"INFO:{pct} linhas={p.linhas_lidas} pessoas +{p.pessoas_inseridas}/~{p.pessoas_atualizadas} "
+            f"familias +{p.familias_inseridas}/~{p.familias_atualizadas} membros +{p.membros_inseridos} "
+            f"erros={p.linhas_com_erro} ({time.perf_counter() - t0:.1f}s)",
+            flush=True,
+        )
+
+    with open(args.arquivo, "rb") as f:
+        p = cadastro_importacao.importar(
+            f,
+            municipio_id=args.municipio_id,
+            layout=args.layout,
+            unidade_id=args.unidade_id,
+            lote=args.lote,
+            simular=args.simular,
+            encoding=args.encoding,
+            ao_progresso=_progresso,
+        )
+
+    resumo = dict(p.contadores(), segundos=round(time.perf_counter() - t0, 2), simular=bool(args.simular))
+    print(json.dumps(resumo, ensure_ascii=False, indent=2))
+    if args.erros:
+        Path(args.erros).write_text(json.dumps(p.erros, ensure_ascii=False, indent=2, default=str), encoding="utf-8")
+    for e in p.erros[:10]:
+        print(f"WARN: linha {e['linha']}: {e['erro']}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
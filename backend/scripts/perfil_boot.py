@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Perfil do boot do backend (tempo de import + startup + primeira requisição).
+
+Cada medição roda num processo novo (como um worker do uvicorn subindo):
+
+- import: `python -X importtime -c "import app.main"`, agregado por pacote
+  (top N por tempo cumulativo) — mostra quem pesa no import do worker
+- boot: import + startup (init_db etc.) + GET /health, em modo lazy e eager
+  (POPRUA_ROTAS_LAZY=1/0), N repetições
+- primeira requisição por prefixo (modo lazy): custo do import sob demanda
+
+Como rodar (na raiz do projeto):
+  ~/POPNEWS1/backend/.venv/bin/python backend/scripts/perfil_boot.py
+  ~/POPNEWS1/backend/.venv/bin/python backend/scripts/perfil_boot.py --repeticoes 5 --top 30 --saida /tmp/boot.json
+
+Obs: o primeiro boot num banco novo (ou após mudar app/models) verifica o
+esquema; os seguintes pulam (impressão digital em schema_impressao).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+THIS = Path(__file__).resolve()
+BACKEND_DIR = THIS.parents[1]  # backend/
+
+_BOOT = r"""
+import json, sys, time
+t0 = time.perf_counter()
+from app.main import app
+t1 = time.perf_counter()
+from fastapi.testclient import TestClient
+out = {}
+with TestClient(app) as c:
+    t2 = time.perf_counter()
+    c.get("/health")
+    t3 = time.perf_counter()
+    for caminho in sys.argv[1:]:
+        a = time.perf_counter()
+        r = c.get(caminho)
+        out[caminho] = {"status": r.status_code, "ms": round((time.perf_counter() - a) * 1000, 1)}
+print(json.dumps({
+    "import_ms": round((t1 - t0) * 1000, 1),
+    "startup_ms": round((t2 - t1) * 1000, 1),
+    "health_ms": round((t3 - t2) * 1000, 1),
+    "total_ms": round((t3 - t0) * 1000, 1),
+    "modulos": len(sys.modules),
+    "primeira": out,
+}))
+"""
+
+# uma rota barata por área (sem auth: 401 também paga o import do router)
+CAMINHOS_PADRAO = ["/municipios/", "/cras/unidades", "/creas/unidades", "/gestao/fila", "/documentos/templates", "/config/sla"]
+
+
+def _rodar(codigo: str, args: List[str], env: Dict[str, str], extra: List[str] = ()) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *extra, "-c", codigo, *args],
+        cwd=str(BACKEND_DIR),
+        env=env,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+
+
+def perfil_import(env: Dict[str, str], top: int) -> List[Dict[str, Any]]:
+    env = dict(env, POPRUA_ROTAS_LAZY=env.get("POPRUA_ROTAS_LAZY", "1"))
+    p = _rodar("import app.main", [], env, extra=["-X", "importtime"])
+    por_pacote: Dict[str, int] = {}
+    for linha in p.stderr.splitlines():
+        if not linha.startswith("import time:") or "|" not in linha:
+            continue
+        partes = [x.strip() for x in linha[len("import time:"):].split("|")]
+        if len(partes) != 3 or not partes[0].isdigit():
+            continue
+        proprio_us, nome = int(partes[0]), partes[2].strip()
+        raiz = nome.split(".")[0]
+        if raiz == "app":
+            raiz = ".".join(nome.split(".")[:2])
+        por_pacote[raiz] = por_pacote.get(raiz, 0) + proprio_us
+    itens = sorted(por_pacote.items(), key=lambda kv: kv[1], reverse=True)[:top]
+    return [{"pacote": k, "ms": round(v / 1000, 1)} for k, v in itens]
+
+
+def perfil_boot(env: Dict[str, str], lazy: bool, repeticoes: int, caminhos: List[str]) -> Dict[str, Any]:
+    env = dict(env, POPRUA_ROTAS_LAZY="1" if lazy else "0")
+    rodadas: List[Dict[str, Any]] = []
+    for _ in range(repeticoes):
+        p = _rodar(_BOOT, caminhos, env)
+        if p.returncode != 0:
+            return {"erro": (p.stderr or p.stdout).strip().splitlines()[-1:]}
+        rodadas.append(json.loads(p.stdout.strip().splitlines()[-1]))
+    out: Dict[str, Any] = {"modulos": rodadas[-1]["modulos"]}
+    for campo in ("import_ms", "startup_ms", "health_ms", "total_ms"):
+        out[campo] = round(statistics.median(r[campo] for r in rodadas), 1)
+    out["primeira"] = {
+        c: {"status": rodadas[-1]["primeira"][c]["status"], "ms": round(statistics.median(r["primeira"][c]["ms"] for r in rodadas), 1)}
+        for c in caminhos
+    }
+    return out
+
+
+def main(argv: List[str] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--repeticoes", type=int, default=3, help="boots por modo (mediana)")
+    ap.add_argument("--top", type=int, default=20, help="pacotes no perfil de import")
+    ap.add_argument("--caminho", action="append", default=None, help="rota para medir a 1ª requisição (repetível)")
+    ap.add_argument("--saida", default=None, help="grava o relatório JSON neste arquivo")
+    args = ap.parse_args(argv)
+
+    env = dict(os.environ)
+    caminhos = args.caminho or CAMINHOS_PADRAO
+    relatorio = {
+        "import_por_pacote": perfil_import(env, args.top),
+        "lazy": perfil_boot(env, True, args.repeticoes, caminhos),
+        "eager": perfil_boot(env, False, args.repeticoes, caminhos),
+    }
+    txt = json.dumps(relatorio, ensure_ascii=False, indent=2)
+    if args.saida:
+        Path(args.saida).write_text(txt, encoding="utf-8")
+    print(txt)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Reconstrução de projeções (read models mantidos por evento, app/core/projecoes.py).
+
+Use depois de import/seed direto no banco, restauração de backup ou mudança na
+regra de uma projeção: refaz o read model a partir das tabelas fonte.
+
+Como rodar (na raiz do projeto):
+  ~/POPNEWS1/backend/.venv/bin/python backend/scripts/projecoes.py --listar
+  ~/POPNEWS1/backend/.venv/bin/python backend/scripts/projecoes.py rede_metricas
+  ~/POPNEWS1/backend/.venv/bin/python backend/scripts/projecoes.py cras_tarefas_contadores --municipio-id 1
+  ~/POPNEWS1/backend/.venv/bin/python backend/scripts/projecoes.py --todas
+
+Usa o banco de POPRUA_DATABASE_URL (padrão: ./poprua.db, como o backend).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+THIS = Path(__file__).resolve()
+BACKEND_DIR = THIS.parents[1]  # backend/
+
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+
+def main(argv: List[str] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("nomes", nargs="*", help="projeções a reconstruir")
+    ap.add_argument("--todas", action="store_true", help="reconstrói todas as projeções registradas")
+    ap.add_argument("--municipio-id", type=int, default=None, help="só este município (quando a projeção permite)")
+    ap.add_argument("--listar", action="store_true", help="lista as projeções e as tabelas que observam e sai")
+    args = ap.parse_args(argv)
+
+    from app.core import projecoes
+    from app.core.db import init_db
+
+    init_db(backfill_auto=False)
+    registradas = projecoes.projecoes()
+
+    if args.listar:
+        for nome, p in sorted(registradas.items()):
+            modo = "assíncrona" if p.assincrona else "síncrona"
+            print(f"{nome:<28} {modo:<10} {', '.join(p.tabelas):<50} {p.descricao}")
+        return 0
+
+    nomes = sorted(registradas) if args.todas else args.nomes
+    if not nomes:
+        ap.print_help()
+        return 2
+    desconhecidas = [n for n in nomes if n not in registradas]
+    if desconhecidas:
+        print(f"WARN: projeções desconhecidas: {', '.join(desconhecidas)} (use {', '.join(sorted(registradas))})")
+        return 2
+
+    out = {}
+    for nome in nomes:
+        t0 = time.perf_counter()
+        res = projecoes.reconstruir(nome, municipio_id=args.municipio_id)
+        ms = (time.perf_counter() - t0) * 1000.0
+        print(f"INFO: {nome}: reconstruída em {ms:.0f}ms", flush=True)
+        out[nome] = res
+    print(json.dumps(out, ensure_ascii=False, indent=2, default=str))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -9,9 +9,14 @@
 Como rodar (na raiz do projeto):
   ~/POPNEWS1/backend/.venv/bin/python backend/scripts/smoke_comissao.py
 
+Roda duas vezes, cada uma num processo: routers sob demanda (padrão de
+produção, POPRUA_ROTAS_LAZY=1) e todos no boot (POPRUA_ROTAS_LAZY=0). Com
+POPRUA_ROTAS_LAZY definido no ambiente, roda só aquele modo.
+
 Saída:
 - imprime um resumo PASS/FAIL + TOP lentas
 - salva um relatório JSON em backend/storage/smoke/smoke_comissao_report.json
+  (modo sob demanda) e smoke_comissao_report_completo.json (tudo no boot)
 
 Obs:
 - Rotas opcionais (de patches) inexistentes viram SKIP.
@@ -23,6 +28,7 @@ from __future__ import annotations
 import json
 import math
 import os
+import subprocess
 import sys
 import time
 from dataclasses import dataclass
@@ -44,7 +50,8 @@ if str(BACKEND_DIR) not in sys.path:
 
 SMOKE_DIR = BACKEND_DIR / "storage" / "smoke"
 SMOKE_DIR.mkdir(parents=True, exist_ok=True)
-REPORT_PATH = SMOKE_DIR / "smoke_comissao_report.json"
+_LAZY = str(os.getenv("POPRUA_ROTAS_LAZY", "1")).strip().lower() in ("1", "true", "yes", "on")
+REPORT_PATH = SMOKE_DIR / ("smoke_comissao_report.json" if _LAZY else "smoke_comissao_report_completo.json")
 DB_PATH = SMOKE_DIR / "smoke_comissao.db"
 
 # Usa DB isolado (absoluto) para não sujar poprua.db
@@ -121,6 +128,10 @@ def _safe_json(obj: Any) -> str:
 
 
 def _has_route(app, path: str, method: str) -> bool:
+    # routers sob demanda (app/core/rotas.py): carrega os do prefixo antes de olhar app.routes
+    carregador = getattr(app.state, "carregador_rotas", None)
+    if carregador is not None:
+        carregador.garantir(path)
     m = method.upper()
     for r in getattr(app, "routes", []):
         try:
@@ -771,5 +782,15 @@ def _print_summary(results: List[StepResult], perf: List[PerfSample]) -> None:
         print(f"{s.ms:7.0f}ms  {s.key}  status={s.status_code}{b}")
 
 
+def _rodar_os_dois_modos() -> int:
+    """Um processo por modo de carga dos routers (o modo é lido no import de app.main)."""
+    falhas = 0
+    for modo, nome in (("1", "routers sob demanda"), ("0", "routers no boot")):
+        print(f"\n##### POPRUA_ROTAS_LAZY={modo} ({nome}) #####", flush=True)
+        env = dict(os.environ, POPRUA_ROTAS_LAZY=modo)
+        falhas += subprocess.call([sys.executable, str(THIS)], env=env) != 0
+    return 1 if falhas else 0
+
+
 if __name__ == "__main__":
-    sys.exit(main())
+    sys.exit(main() if "POPRUA_ROTAS_LAZY" in os.environ else _rodar_os_dois_modos())
@@ -0,0 +1,518 @@
+#!/usr/bin/env python3
+"""Regressões dos contratos de leitura que já quebraram uma vez.
+
+Cada seção monta o próprio cenário num DB sqlite isolado e confere um
+contrato que uma otimização mexeu e depois teve de ser corrigido:
+
+- encaminhamentos: GET /encaminhamentos/ sem limit/cursor devolve a lista
+  inteira com registro completo; com limit, páginas leves + X-Next-Cursor
+  cujo passeio dá exatamente a lista inteira
+- cadastros: /cras/cadastros/pessoas e /familias — mesmo contrato (lista
+  inteira com registro completo sem limit; página leve com cursor) e busca `q`
+  sem acento/pontuação no banco
+- arquivo: casos encerrados movidos para arq_* (app/services/arquivo.py) não
+  mudam listas, relatórios, dashboard, linha do metrô nem a visibilidade
+  municipal de pessoas
+- tarefas: /cras/tarefas/resumo (contadores incrementais) bate com a contagem
+  direta em crastarefa depois de criar, concluir, reatribuir e excluir, e
+  continua batendo depois da reconstrução da projeção
+
+Como rodar (na raiz do projeto):
+  ~/POPNEWS1/backend/.venv/bin/python backend/scripts/smoke_regressao.py [secao ...]
+
+Sem argumentos roda todas. Sai com 1 se alguma verificação falhar.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+THIS = Path(__file__).resolve()
+BACKEND_DIR = THIS.parents[1]  # backend/
+
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+SMOKE_DIR = BACKEND_DIR / "storage" / "smoke"
+SMOKE_DIR.mkdir(parents=True, exist_ok=True)
+DB_PATH = SMOKE_DIR / "smoke_regressao.db"
+
+# DB isolado, recriado a cada execução
+os.environ.setdefault("POPRUA_DATABASE_URL", f"sqlite:///{DB_PATH.as_posix()}")
+os.environ.setdefault("GESTAO_AUTOMACOES_SEED", "false")
+
+
+@dataclass
+class Verificacao:
+    secao: str
+    nome: str
+    ok: bool
+    detalhe: str = ""
+
+
+class Contexto:
+    """Cliente, tokens e o registro das verificações de uma execução."""
+
+    def __init__(self, client: Any, engine: Any, tokens: Dict[str, str]) -> None:
+        self.client = client
+        self.engine = engine
+        self.tokens = tokens
+        self.secao = ""
+        self.resultados: List[Verificacao] = []
+
+    def h(self, quem: str = "admin") -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.tokens[quem]}"}
+
+    def get(self, url: str, quem: str = "admin", **kw: Any) -> Any:
+        r = self.client.get(url, headers=self.h(quem), **kw)
+        if r.status_code != 200:
+            raise RuntimeError(f"GET {url}: HTTP {r.status_code} {r.text[:300]}")
+        return r
+
+    def conferir(self, nome: str, ok: bool, detalhe: str = "") -> bool:
+        self.resultados.append(Verificacao(self.secao, nome, bool(ok), "" if ok else detalhe))
+        return bool(ok)
+
+    def igual(self, nome: str, obtido: Any, esperado: Any) -> bool:
+        return self.conferir(nome, obtido == esperado, f"obtido={_resumo(obtido)} esperado={_resumo(esperado)}")
+
+
+def _resumo(v: Any, n: int = 200) -> str:
+    s = repr(v)
+    return s if len(s) <= n else s[:n] + "..."
+
+
+def _paginas(ctx: Contexto, url: str, quem: str = "admin", limite: int = 7) -> Tuple[List[Any], int]:
+    """Passeia pelo X-Next-Cursor; devolve (itens, nº de páginas)."""
+    itens: List[Any] = []
+    cursor: Optional[str] = None
+    paginas = 0
+    sep = "&" if "?" in url else "?"
+    while True:
+        u = f"{url}{sep}limit={limite}" + (f"&cursor={cursor}" if cursor else "")
+        r = ctx.get(u, quem)
+        paginas += 1
+        itens.extend(r.json())
+        cursor = r.headers.get("X-Next-Cursor")
+        if not cursor or paginas > 1000:
+            return itens, paginas
+
+
+# ---------------------------
+# Seções
+# ---------------------------
+def secao_encaminhamentos(ctx: Contexto) -> None:
+    from sqlmodel import Session
+
+    from app.models.encaminhamentos import EncaminhamentoIntermunicipal
+
+    # 1->2, 2->1 (o município 1 vê os dois lados) e 2->3 (o município 1 não vê)
+    with Session(ctx.engine) as s:
+        for i in range(30):
+            origem, destino = ((1, 2), (2, 1), (2, 3))[i % 3]
+            s.add(
+                EncaminhamentoIntermunicipal(
+                    pessoa_id=1000 + i,
+                    municipio_origem_id=origem,
+                    municipio_destino_id=destino,
+                    motivo=f"regressão {i}",
+                    status=("solicitado", "contato", "concluido")[i % 3],
+                )
+            )
+        s.commit()
+
+    for quem, esperado in (("admin", 30), ("operador", 20)):
+        inteira = ctx.get("/encaminhamentos/", quem).json()
+        ids = [x["id"] for x in inteira]
+        ctx.igual(f"{quem}: sem limit devolve tudo", len(inteira), esperado)
+        ctx.igual(f"{quem}: ordem id desc", ids, sorted(ids, reverse=True))
+        ctx.conferir(
+            f"{quem}: sem limit traz registro completo + linha do metrô",
+            all("linha_metro" in x and "motivo" in x for x in inteira),
+            _resumo(inteira[:1]),
+        )
+        r = ctx.get("/encaminhamentos/", quem)
+        ctx.conferir(f"{quem}: sem limit não pagina", "X-Next-Cursor" not in r.headers, str(dict(r.headers)))
+
+        paginas, n = _paginas(ctx, "/encaminhamentos/", quem)
+        ctx.igual(f"{quem}: passeio pelo cursor = lista inteira", [x["id"] for x in paginas], ids)
+        ctx.igual(f"{quem}: nº de páginas", n, -(-esperado // 7))
+        ctx.conferir(f"{quem}: página é leve", all("linha_metro" not in x for x in paginas), _resumo(paginas[:1]))
+
+        exp = ctx.get("/encaminhamentos/?limit=5&expand=linha_metro", quem).json()
+        ctx.conferir(f"{quem}: expand=linha_metro na página", len(exp) == 5 and all("linha_metro" in x for x in exp), _resumo(exp[:1]))
+
+    so_mun1 = ctx.get("/encaminhamentos/?limit=500", "operador").json()
+    ctx.conferir(
+        "operador: só origem/destino do próprio município",
+        all(1 in (x.get("municipio_origem_id"), x.get("municipio_destino_id")) for x in so_mun1),
+        _resumo(so_mun1[:2]),
+    )
+    filtrado = ctx.get("/encaminhamentos/?status_filtro=contato").json()
+    ctx.igual("filtro de status: só os do status", sorted({x["status"] for x in filtrado}), ["contato"])
+    pag_filtrado, _ = _paginas(ctx, "/encaminhamentos/?status_filtro=contato", limite=3)
+    ctx.igual("filtro de status: paginado = inteiro", [x["id"] for x in pag_filtrado], [x["id"] for x in filtrado])
+
+
+def secao_cadastros(ctx: Contexto) -> None:
+    nomes = ["José da Silva", "JOSÉ Pereira", "Maria Conceição", "João Batista", "Ana Lúcia"]
+    for i in range(20):
+        mid = 1 if i < 15 else 2
+        r = ctx.client.post(
+            "/cras/cadastros/pessoas",
+            headers=ctx.h("admin"),
+            json={
+                "municipio_id": mid,
+                "nome": f"{nomes[i % len(nomes)]} {i}",
+                "cpf": f"{i:03d}.456.789-00",
+                "email": f"p{i}@local",
+                "bairro": "São João" if i % 2 else "Centro",
+                "observacoes": f"obs {i}",
+            },
+        )
+        if r.status_code != 200:
+            raise RuntimeError(f"POST pessoa: HTTP {r.status_code} {r.text[:300]}")
+        r = ctx.client.post(
+            "/cras/cadastros/familias",
+            headers=ctx.h("admin"),
+            json={
+                "municipio_id": mid,
+                "nis_familia": f"77{i:02d}-1",
+                "bairro": "São João" if i % 2 else "Centro",
+                "endereco": f"Rua {i}",
+                "observacoes": f"obs família {i}",
+            },
+        )
+        if r.status_code != 200:
+            raise RuntimeError(f"POST família: HTTP {r.status_code} {r.text[:300]}")
+
+    for rota, completo_campo in (("pessoas", "email"), ("familias", "observacoes")):
+        url = f"/cras/cadastros/{rota}"
+        for quem, esperado in (("admin", 20), ("operador", 15)):
+            r = ctx.get(url, quem)
+            inteira = r.json()
+            ids = [x["id"] for x in inteira]
+            ctx.igual(f"{rota}/{quem}: sem limit devolve tudo", len(inteira), esperado)
+            ctx.igual(f"{rota}/{quem}: ordem id desc", ids, sorted(ids, reverse=True))
+            ctx.conferir(
+                f"{rota}/{quem}: sem limit traz registro completo",
+                all(completo_campo in x and "observacoes" in x and "busca" not in x for x in inteira),
+                _resumo(inteira[:1]),
+            )
+            ctx.conferir(f"{rota}/{quem}: sem limit não pagina", "X-Next-Cursor" not in r.headers, str(dict(r.headers)))
+
+            paginas, n = _paginas(ctx, url, quem, limite=4)
+            ctx.igual(f"{rota}/{quem}: passeio pelo cursor = lista inteira", [x["id"] for x in paginas], ids)
+            ctx.igual(f"{rota}/{quem}: nº de páginas", n, -(-esperado // 4))
+            ctx.conferir(
+                f"{rota}/{quem}: página é leve",
+                all("observacoes" not in x and "busca" not in x for x in paginas),
+                _resumo(paginas[:1]),
+            )
+
+        exp = ctx.get(f"{url}?limit=3&expand=completo").json()
+        ctx.conferir(f"{rota}: expand=completo na página", len(exp) == 3 and all("observacoes" in x for x in exp), _resumo(exp[:1]))
+
+    buscas = (
+        ("pessoas", "jose", 8),  # José / JOSÉ, nos dois municípios
+        ("pessoas", "CONCEICAO", 4),
+        ("pessoas", "jo", 16),  # curta (LIKE): José, JOSÉ, João + bairro São João
+        ("pessoas", "003456", 1),  # CPF sem pontuação
+        ("familias", "sao joao", 10),
+        ("familias", "77-07", 1),  # NIS com pontuação no termo
+    )
+    for rota, q, esperado in buscas:
+        url = f"/cras/cadastros/{rota}?q={q}"
+        inteira = ctx.get(url).json()
+        ctx.igual(f"{rota}: q={q!r} acha {esperado}", len(inteira), esperado)
+        paginas, _ = _paginas(ctx, url, limite=3)
+        ctx.igual(f"{rota}: q={q!r} paginado = inteiro", [x["id"] for x in paginas], [x["id"] for x in inteira])
+
+    so_mun1 = ctx.get("/cras/cadastros/pessoas?q=jose", "operador").json()
+    ctx.conferir(
+        "operador: busca só no próprio município",
+        len(so_mun1) > 0 and all(x["municipio_id"] == 1 for x in so_mun1),
+        _resumo(so_mun1[:2]),
+    )
+
+
+def secao_arquivo(ctx: Contexto) -> None:
+    from datetime import datetime, timedelta
+
+    from sqlmodel import Session, select
+
+    from app.models.caso_cras import CasoCras, CasoCrasHistorico
+    from app.models.caso_pop_rua import CasoPopRua, CasoPopRuaEtapaHistorico
+    from app.models.creas_caso import CreasCaso, CreasCasoHistorico
+    from app.models.cras_unidade import CrasUnidade
+    from app.models.creas_unidade import CreasUnidade
+    from app.models.pessoa import PessoaRua
+    from app.services import arquivo
+
+    agora = datetime.utcnow()
+    with Session(ctx.engine) as s:
+        cras_u = CrasUnidade(municipio_id=1, nome="CRAS (REGRESSÃO)")
+        creas_u = CreasUnidade(municipio_id=1, nome="CREAS (REGRESSÃO)")
+        s.add(cras_u)
+        s.add(creas_u)
+        s.flush()
+        # o último de cada tabela fica aberto e recente (o de maior id nunca é movido)
+        for i in range(9):
+            antigo = i < 8
+            abertura = agora - timedelta(days=500 - i * 10) if antigo else agora - timedelta(days=3)
+            fim = abertura + timedelta(days=60) if antigo else None
+            status = "encerrado" if antigo else "em_andamento"
+
+            # pessoa de outro município: o operador do município 1 só a vê pelo caso
+            pessoa = PessoaRua(nome_social=f"Pessoa arquivo {i}", municipio_origem_id=2)
+            s.add(pessoa)
+            s.flush()
+            pop = CasoPopRua(
+                pessoa_id=pessoa.id,
+                municipio_id=1,
+                status=status,
+                ativo=not antigo,
+                etapa_atual="ENCERRADO" if antigo else "ABORDAGEM",
+                data_abertura=abertura,
+                data_ultima_atualizacao=fim or abertura,
+                data_inicio_etapa_atual=fim or abertura,
+                data_encerramento=fim,
+            )
+            cras = CasoCras(
+                municipio_id=1,
+                unidade_id=cras_u.id,
+                status=status,
+                etapa_atual="ENCERRADO" if antigo else "TRIAGEM",
+                data_abertura=abertura,
+                data_inicio_etapa_atual=fim or abertura,
+                data_encerramento=fim,
+                atualizado_em=fim or abertura,
+            )
+            creas = CreasCaso(
+                municipio_id=1,
+                unidade_id=creas_u.id,
+                status=status,
+                etapa_atual="encerrado" if antigo else "entrada",
+                data_abertura=abertura,
+                data_inicio_etapa_atual=fim or abertura,
+                data_encerramento=fim,
+                atualizado_em=fim or abertura,
+            )
+            s.add(pop)
+            s.add(cras)
+            s.add(creas)
+            s.flush()
+            s.add(CasoPopRuaEtapaHistorico(caso_id=pop.id, etapa="ABORDAGEM", data_acao=abertura, usuario_responsavel="Regressão"))
+            s.add(CasoCrasHistorico(caso_id=cras.id, etapa="TRIAGEM", tipo_acao="abertura", criado_em=abertura))
+            s.add(CreasCasoHistorico(caso_id=creas.id, etapa="entrada", tipo_acao="abertura", criado_em=abertura))
+            if antigo:
+                s.add(CasoCrasHistorico(caso_id=cras.id, etapa="ENCERRADO", tipo_acao="encerramento", criado_em=fim))
+                s.add(CreasCasoHistorico(caso_id=creas.id, etapa="encerrado", tipo_acao="encerramento", criado_em=fim))
+        s.commit()
+        ids_cras = list(s.exec(select(CasoCras.id).order_by(CasoCras.id)).all())
+        unidade = cras_u.id
+
+    def capturar() -> Dict[str, Any]:
+        urls = {
+            "casos": ("/casos/?limit=500", "admin"),
+            "casos_inativos": ("/casos/?limit=500&incluir_inativos=true", "admin"),
+            "cras_casos": ("/cras/casos", "admin"),
+            "cras_encerrados": ("/cras/casos?status=encerrado", "admin"),
+            "creas_casos": ("/creas/casos", "admin"),
+            "creas_overview": ("/creas/relatorios/overview", "admin"),
+            "cras_serie": (f"/cras/relatorios/serie?unidade_id={unidade}&meses=60", "admin"),
+            "cras_cruzamentos": (f"/cras/relatorios/cruzamentos?unidade_id={unidade}&meses=60", "admin"),
+            "dashboard": ("/dashboard/overview?municipio_id=1", "admin"),
+            "pessoas_municipio": ("/pessoas/?limit=1000", "operador"),
+        }
+        for cid in (ids_cras[0], ids_cras[-1]):
+            urls[f"cras_linha_metro_{cid}"] = (f"/cras/casos/{cid}/linha-metro", "admin")
+        return {k: ctx.get(u, quem).json() for k, (u, quem) in urls.items()}
+
+    antes = capturar()
+    ctx.igual("casos encerrados no cenário", len(antes["cras_encerrados"]), 8)
+    ctx.igual("pessoas de outro município visíveis pelo caso", len(antes["pessoas_municipio"]), 9)
+
+    arquivo.arquivar(ctx.engine, ["casopoprua", "caso_cras", "creas_caso"], dias=1)
+    with ctx.engine.connect() as conn:
+        cont = arquivo.contagens(conn)
+    for t in ("casopoprua", "caso_cras", "creas_caso", "caso_cras_historico", "creas_caso_historico"):
+        n = cont.get(t, {}).get("arquivo", 0)
+        ctx.conferir(f"{t}: linhas arquivadas", n > 0, _resumo(cont.get(t)))
+
+    depois = capturar()
+    for k in antes:
+        ctx.igual(f"{k}: igual antes/depois do arquivamento", depois[k], antes[k])
+
+
+def secao_tarefas(ctx: Contexto) -> None:
+    from datetime import date, timedelta
+
+    from sqlmodel import Session, select
+
+    from app.models.cras_tarefas import CrasTarefa, CrasTarefaContadorMunicipio
+    from app.models.usuario import Usuario
+    from app.services import cras_tarefas_contadores as contadores
+
+    with Session(ctx.engine) as s:
+        ids = {u.email: u.id for u in s.exec(select(Usuario)).all()}
+        # marca do município: o resumo passa a ler os contadores (não a contagem direta)
+        contadores.recalcular(s, 1)
+    admin_id, op_id = ids["regressao.admin@local"], ids["regressao.opa@local"]
+    hoje = date.today()
+
+    def esperado() -> Dict[str, Any]:
+        """Contagem direta em crastarefa, no formato do resumo."""
+        por: Dict[int, List[int]] = {}
+        with Session(ctx.engine) as s:
+            for t in s.exec(select(CrasTarefa).where(CrasTarefa.municipio_id == 1)).all():
+                c = por.setdefault(int(t.responsavel_id or 0), [0, 0, 0])
+                if t.status == "concluida":
+                    c[2] += 1
+                else:
+                    c[0] += 1
+                    if t.data_vencimento is not None and t.data_vencimento < hoje:
+                        c[1] += 1
+        return {
+            "total_abertas": sum(c[0] for c in por.values()),
+            "total_vencidas": sum(c[1] for c in por.values()),
+            "por_tecnico": {rid or None: tuple(c) for rid, c in por.items()},
+        }
+
+    def conferir_resumo(etapa: str) -> None:
+        r = ctx.get("/cras/tarefas/resumo", "operador").json()
+        obtido = {
+            "total_abertas": r["total_abertas"],
+            "total_vencidas": r["total_vencidas"],
+            "por_tecnico": {x["responsavel_id"]: (x["abertas"], x["vencidas"], x["concluidas"]) for x in r["por_tecnico"]},
+        }
+        ctx.igual(f"{etapa}: resumo = contagem direta", obtido, esperado())
+        nomes = {x["responsavel_id"]: x["responsavel_nome"] for x in r["por_tecnico"]}
+        ctx.conferir(
+            f"{etapa}: nome do técnico vem do usuário",
+            nomes.get(admin_id) in (None, "Admin (REGRESSÃO)") and nomes.get(op_id) in (None, "Operador A (REGRESSÃO)"),
+            _resumo(nomes),
+        )
+
+    def chamar(metodo: str, url: str, **kw: Any) -> Any:
+        r = ctx.client.request(metodo, url, headers=ctx.h("operador"), **kw)
+        if r.status_code != 200:
+            raise RuntimeError(f"{metodo} {url}: HTTP {r.status_code} {r.text[:300]}")
+        return r.json()
+
+    criadas: List[int] = []
+    for i in range(12):
+        venc = hoje + timedelta(days=(-3 if i % 3 == 0 else 5))
+        criadas.append(
+            chamar(
+                "POST",
+                "/cras/tarefas",
+                json={
+                    "ref_tipo": "manual",
+                    "titulo": f"Tarefa regressão {i}",
+                    "responsavel_id": (admin_id, op_id, None)[i % 3],
+                    "data_vencimento": venc.isoformat(),
+                },
+            )["id"]
+        )
+    conferir_resumo("criação")
+
+    for tid in criadas[:4]:
+        chamar("PATCH", f"/cras/tarefas/{tid}", json={"status": "concluida"})
+    for tid in criadas[4:7]:
+        chamar("PATCH", f"/cras/tarefas/{tid}", json={"responsavel_id": op_id})
+    chamar("PATCH", f"/cras/tarefas/{criadas[0]}", json={"status": "aberta", "responsavel_id": None})
+    chamar("PATCH", f"/cras/tarefas/{criadas[7]}", json={"status": "concluida", "responsavel_id": admin_id})
+    conferir_resumo("conclusão/reatribuição")
+
+    for tid in (criadas[1], criadas[8], criadas[11]):  # uma concluída, duas abertas
+        chamar("DELETE", f"/cras/tarefas/{tid}")
+    conferir_resumo("exclusão")
+
+    with Session(ctx.engine) as s:
+        ctx.conferir("município com marca de contadores", s.get(CrasTarefaContadorMunicipio, 1) is not None)
+        contadores.reconstruir(s, 1)
+    conferir_resumo("reconstrução")
+
+
+SECOES: Dict[str, Callable[[Contexto], None]] = {
+    "encaminhamentos": secao_encaminhamentos,
+    "cadastros": secao_cadastros,
+    "arquivo": secao_arquivo,
+    "tarefas": secao_tarefas,
+}
+
+
+# ---------------------------
+# Execução
+# ---------------------------
+def _preparar() -> Contexto:
+    if DB_PATH.exists():
+        DB_PATH.unlink()
+
+    from fastapi.testclient import TestClient
+    from sqlmodel import Session
+
+    from app.core.db import engine, init_db
+    from app.core.security import criar_token_acesso, hash_senha
+    from app.models.municipio import Municipio
+    from app.models.usuario import Usuario
+
+    from app.main import app
+
+    init_db()
+    tokens: Dict[str, str] = {}
+    with Session(engine) as s:
+        for mid in (1, 2, 3):
+            s.add(Municipio(id=mid, nome=f"Município {mid} (REGRESSÃO)", uf="SP", ativo=True))
+        usuarios = {
+            "admin": Usuario(nome="Admin (REGRESSÃO)", email="regressao.admin@local", perfil="admin", municipio_id=1),
+            "operador": Usuario(nome="Operador A (REGRESSÃO)", email="regressao.opa@local", perfil="operador", municipio_id=1),
+        }
+        for u in usuarios.values():
+            u.senha_hash = hash_senha("regressao123")
+            u.ativo = True
+            s.add(u)
+        s.commit()
+        for quem, u in usuarios.items():
+            s.refresh(u)
+            tokens[quem] = criar_token_acesso(u)
+
+    return Contexto(TestClient(app), engine, tokens)
+
+
+def main(argv: List[str]) -> int:
+    nomes = argv or list(SECOES)
+    desconhecidas = [n for n in nomes if n not in SECOES]
+    if desconhecidas:
+        print(f"Seções desconhecidas: {', '.join(desconhecidas)} (use: {', '.join(SECOES)})")
+        return 2
+
+    ctx = _preparar()
+    for nome in nomes:
+        ctx.secao = nome
+        t0 = time.perf_counter()
+        try:
+            SECOES[nome](ctx)
+        except Exception as e:
+            ctx.conferir("execução", False, f"{type(e).__name__}: {e}")
+        print(f"INFO: seção {nome} em {(time.perf_counter() - t0) * 1000:.0f}ms")
+
+    falhas = [r for r in ctx.resultados if not r.ok]
+    print("\n=== SMOKE REGRESSÃO ===")
+    print(f"DB: {os.environ.get('POPRUA_DATABASE_URL')}")
+    print(f"PASS={len(ctx.resultados) - len(falhas)}  FAIL={len(falhas)}")
+    for r in ctx.resultados:
+        tag = "PASS" if r.ok else "FAIL"
+        print(f"[{tag}] {r.secao}: {r.nome}" + (f" :: {r.detalhe}" if r.detalhe else ""))
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
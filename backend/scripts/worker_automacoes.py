@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Worker das automações (Gestão + CRAS) fora do processo da API.
+
+Roda o mesmo agendador de app/services/automacoes_agendador.py, mas num processo
+separado — a API não divide CPU/threads com a geração de documentos em lote.
+Pode rodar mais de um worker (ou worker + POPRUA_AGENDADOR=1 na API): cada regra
+tem lease no banco e só um executa.
+
+Como rodar (na raiz do projeto):
+  ~/POPNEWS1/backend/.venv/bin/python backend/scripts/worker_automacoes.py
+  ~/POPNEWS1/backend/.venv/bin/python backend/scripts/worker_automacoes.py --uma-vez   # cron
+  ~/POPNEWS1/backend/.venv/bin/python backend/scripts/worker_automacoes.py --uma-vez --escopo cras --municipio-id 1
+
+Saída:
+- modo contínuo: log a cada tick com regras executadas
+- --uma-vez: imprime o resultado do tick em JSON
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+THIS = Path(__file__).resolve()
+BACKEND_DIR = THIS.parents[1]  # backend/
+
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+# worker não deve subir outro agendador nem seed automático
+os.environ["POPRUA_AGENDADOR"] = "false"
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Worker das regras de automação (Gestão/CRAS)")
+    ap.add_argument("--uma-vez", action="store_true", help="executa um tick e sai (para cron)")
+    ap.add_argument("--escopo", choices=["gestao", "cras", "todos"], default="todos")
+    ap.add_argument("--municipio-id", type=int, default=None)
+    ap.add_argument("--intervalo", type=int, default=None, help="segundos entre ticks (padrão POPRUA_AGENDADOR_INTERVALO_S ou 60)")
+    args = ap.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    # registra os models das automações antes do create_all
+    import app.routers.cras_automacoes  # noqa: F401
+    import app.routers.gestao_automacoes  # noqa: F401
+    from app.core.db import init_db
+    from app.services import automacoes_agendador as ag
+
+    init_db()
+
+    escopos = ag.ESCOPOS if args.escopo == "todos" else (args.escopo,)
+
+    if args.uma_vez:
+        out = ag.executar_tick(escopos=escopos, municipio_id=args.municipio_id)
+        print(json.dumps(out, ensure_ascii=False, indent=2, default=str))
+        return 1 if out.get("erros") else 0
+
+    intervalo = args.intervalo or max(5, int(os.getenv("POPRUA_AGENDADOR_INTERVALO_S", "60") or 60))
+    logging.info("worker automacoes: escopos=%s intervalo=%ss dono=%s", ",".join(escopos), intervalo, ag.dono_lease())
+    try:
+        while True:
+            try:
+                ag.executar_tick(escopos=escopos, municipio_id=args.municipio_id)
+            except Exception:
+                logging.exception("worker automacoes: tick falhou")
+            time.sleep(intervalo)
+    except KeyboardInterrupt:
+        return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())